@@ -10,15 +10,23 @@ axb35_get() {
     return 1
   fi
 
-  # read all values from the module
-  mapfile -t axb35_vars < <(
-    cat \
-      $axb35_path/fan{1..3}/rpm \
-      $axb35_path/fan{1..3}/mode \
-      $axb35_path/fan{1..3}/level \
-      $axb35_path/temp1/{temp,min,max} \
-      $axb35_path/apu/power_mode
-  )
+  # read all values from the module, in one read on newer ones (rpm,
+  # mode and level, then the curves we skip, temp, min, max, power mode)
+  local state
+  if [ -r $axb35_path/state ] &&
+    read -r -a state < $axb35_path/state 2>/dev/null &&
+    [ ${#state[@]} -ge 19 ]; then
+    axb35_vars=("${state[@]:0:9}" "${state[@]:15:4}")
+  else
+    mapfile -t axb35_vars < <(
+      cat \
+        $axb35_path/fan{1..3}/rpm \
+        $axb35_path/fan{1..3}/mode \
+        $axb35_path/fan{1..3}/level \
+        $axb35_path/temp1/{temp,min,max} \
+        $axb35_path/apu/power_mode
+    )
+  fi
   
   # convert fan modes to numeric values
   for i in {3..5}; do
@@ -0,0 +1,13 @@
+"""
+Userspace tools for the ec_su_axb35 driver
+"""
+from .sysfs import (
+    ATTRIBUTES,
+    BASE_PATH,
+    FAN_MODES,
+    FANS,
+    POWER_MODES,
+    FanState,
+    Snapshot,
+    SysfsSampler,
+)
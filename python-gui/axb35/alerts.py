@@ -0,0 +1,477 @@
+"""
+Rule based alerts over the sample stream. Rules live in one JSON file:
+
+    {"rules": [
+      {"name": "hot", "attr": "temp", "above": 85, "for": 10,
+       "actions": ["notify", {"log": "/var/log/axb35-alerts.log"}]},
+      {"name": "fan1 stuck", "stalled": 1, "for": 3,
+       "actions": [{"fan_level": 5, "fans": [1, 2]}]},
+      {"name": "fan1 back to curve", "attr": "fan1_mode",
+       "from": "fixed", "to": "curve", "actions": ["log"]},
+      {"name": "new high", "attr": "temp_max", "rising": 1,
+       "actions": [{"run": "/usr/local/bin/page-me"}]}
+    ]}
+
+Rule kinds:
+
+  above/below  attr over/under a value, for at least `for` seconds
+  stalled      fan N reads 0 rpm while its level is above 0
+  from/to      attr changed, from and to are optional
+  rising       attr went up by at least N within `within` seconds
+
+Rules are evaluated incrementally: each sample is compared with the
+previous one and only the rules of attributes that changed are looked
+at. Threshold rules are kept sorted per attribute, so a change from
+70 to 71 °C only touches the rules with a threshold in between. Rules
+waiting out their `for` sit in a heap of deadlines.
+
+A rule fires once when its condition starts to hold (or after `for`
+seconds of it), and not again within its `cooldown`. Actions run on
+the sampling thread and don't wait for child processes.
+"""
+import bisect
+import heapq
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import deque, namedtuple
+
+from .sysfs import ATTRIBUTES, FANS
+
+ALERTS_PATH = (os.environ.get("AXB35_ALERTS")
+               or "/etc/ec-fan-control.alerts.json")
+
+# state is "firing" or "resolved", value the one that triggered
+Alert = namedtuple("Alert", "rule state value timestamp message")
+
+
+class Rule:
+    """Base of all rules, `attributes` are the ones the rule reads"""
+    attributes = ()
+    # events fire on a change and have no "resolved"
+    event = False
+
+    def __init__(self, name, duration=0.0, cooldown=0.0, actions=(),
+                 message=None):
+        self.name = name
+        self.duration = duration
+        self.cooldown = cooldown
+        self.actions = list(actions)
+        self.message = message
+
+    def check(self, values, now):
+        """Condition (or event) for the current sample"""
+        raise NotImplementedError
+
+    def value(self, values):
+        return values.get(self.attributes[0])
+
+    def describe(self, values):
+        return self.name
+
+
+class Threshold(Rule):
+    def __init__(self, name, attr, limit, above=True, **kwargs):
+        super().__init__(name, **kwargs)
+        self.attributes = (attr,)
+        self.attr = attr
+        self.limit = limit
+        self.above = above
+
+    def check(self, values, now):
+        value = values.get(self.attr)
+        if value is None:
+            return False
+        return value > self.limit if self.above else value < self.limit
+
+    def describe(self, values):
+        text = (f"{self.attr} {values.get(self.attr)} "
+                f"{'>' if self.above else '<'} {self.limit:g}")
+        if self.duration:
+            text += f" for {self.duration:g}s"
+        return text
+
+
+class Stalled(Rule):
+    def __init__(self, name, fan, **kwargs):
+        super().__init__(name, **kwargs)
+        self.fan = fan
+        self.attributes = (f"fan{fan}_rpm", f"fan{fan}_level")
+
+    def check(self, values, now):
+        rpm, level = (values.get(a) for a in self.attributes)
+        return rpm == 0 and level is not None and level > 0
+
+    def describe(self, values):
+        return (f"fan{self.fan} at 0 rpm on level "
+                f"{values.get(self.attributes[1])}")
+
+
+class Changed(Rule):
+    event = True
+
+    def __init__(self, name, attr, old=None, new=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.attributes = (attr,)
+        self.attr = attr
+        self.old = old
+        self.new = new
+        self._last = None
+
+    def check(self, values, now):
+        last, value = self._last, values.get(self.attr)
+        if value is None:
+            # a failed read is not a change
+            return False
+        self._last = value
+        if last is None or last == value:
+            return False
+        return ((self.old is None or last == self.old) and
+                (self.new is None or value == self.new))
+
+    def describe(self, values):
+        return f"{self.attr} changed to {values.get(self.attr)}"
+
+
+class Rising(Rule):
+    """Keeps the window's minimum in a monotonic deque"""
+    event = True
+
+    def __init__(self, name, attr, by=1, within=60.0, **kwargs):
+        super().__init__(name, **kwargs)
+        self.attributes = (attr,)
+        self.attr = attr
+        self.by = by
+        self.within = within
+        self._window = deque()
+
+    def check(self, values, now):
+        value = values.get(self.attr)
+        if value is None:
+            return False
+        window = self._window
+        while window and window[0][0] < now - self.within:
+            window.popleft()
+        low = window[0][1] if window else value
+        while window and window[-1][1] >= value:
+            window.pop()
+        window.append((now, value))
+        if value - low >= self.by:
+            # the rise is reported once, count the next one from here
+            window.clear()
+            window.append((now, value))
+            return True
+        return False
+
+    def describe(self, values):
+        return (f"{self.attr} rose to {values.get(self.attr)} "
+                f"(+{self.by:g} within {self.within:g}s)")
+
+
+class _State:
+    __slots__ = ("since", "firing", "last_fired")
+
+    def __init__(self):
+        self.since = None
+        self.firing = False
+        self.last_fired = None
+
+
+class _ThresholdIndex:
+    """The above (or below) rules of one attribute, sorted by limit"""
+
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda r: r.limit)
+        self.limits = [r.limit for r in self.rules]
+
+    def between(self, old, new, above):
+        """Rules whose condition can differ between the two values"""
+        if old is None or new is None:
+            return self.rules
+        low, high = min(old, new), max(old, new)
+        if above:
+            # value > limit flips for low <= limit < high
+            lo = bisect.bisect_left(self.limits, low)
+            hi = bisect.bisect_left(self.limits, high)
+        else:
+            # value < limit flips for low < limit <= high
+            lo = bisect.bisect_right(self.limits, low)
+            hi = bisect.bisect_right(self.limits, high)
+        return self.rules[lo:hi]
+
+
+class AlertEngine:
+    """
+    Evaluates `rules` on every `feed(values)`, values being a sampler's
+    attribute name -> value dict. Fired and resolved alerts are passed
+    to the rule's actions and to `on_alert(alert)`.
+    """
+
+    def __init__(self, rules, on_alert=None, clock=time.monotonic):
+        names = [r.name for r in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("rule names must be unique")
+        self.rules = list(rules)
+        self.on_alert = on_alert
+        self.clock = clock
+        self.states = {rule: _State() for rule in self.rules}
+        self.attributes = tuple(a for a in ATTRIBUTES
+                                if any(a in r.attributes for r in self.rules))
+        self._above = {}
+        self._below = {}
+        self._other = {}
+        for attr in self.attributes:
+            above = [r for r in self.rules if isinstance(r, Threshold)
+                     and r.attr == attr and r.above]
+            below = [r for r in self.rules if isinstance(r, Threshold)
+                     and r.attr == attr and not r.above]
+            if above:
+                self._above[attr] = _ThresholdIndex(above)
+            if below:
+                self._below[attr] = _ThresholdIndex(below)
+            self._other[attr] = [r for r in self.rules
+                                 if not isinstance(r, Threshold)
+                                 and attr in r.attributes]
+        self._deadlines = []
+        self._last = None
+        self.samples = 0
+        self.checks = 0
+        self.fired = 0
+
+    def feed(self, values, now=None):
+        """Evaluate one sample, returns the alerts it produced"""
+        now = self.clock() if now is None else now
+        self.samples += 1
+        last = self._last
+        self._last = values
+        alerts = []
+        if last is None:
+            for rule in self.rules:
+                self._update(rule, values, now, alerts)
+        else:
+            seen = set()
+            for attr in self.attributes:
+                old, new = last.get(attr), values.get(attr)
+                if old == new:
+                    continue
+                for index, above in ((self._above.get(attr), True),
+                                     (self._below.get(attr), False)):
+                    if index is not None:
+                        for rule in index.between(old, new, above):
+                            self._update(rule, values, now, alerts)
+                for rule in self._other[attr]:
+                    if rule not in seen:
+                        seen.add(rule)
+                        self._update(rule, values, now, alerts)
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, _, since, rule = heapq.heappop(deadlines)
+            state = self.states[rule]
+            if state.since == since and not state.firing:
+                self._fire(rule, state, values, now, alerts)
+        return alerts
+
+    def _update(self, rule, values, now, alerts):
+        self.checks += 1
+        state = self.states[rule]
+        if rule.check(values, now):
+            if rule.event:
+                self._fire(rule, state, values, now, alerts)
+            elif state.since is None:
+                state.since = now
+                if rule.duration <= 0:
+                    self._fire(rule, state, values, now, alerts)
+                else:
+                    heapq.heappush(self._deadlines, (now + rule.duration,
+                                                     id(rule), now, rule))
+        elif state.since is not None:
+            state.since = None
+            if state.firing:
+                state.firing = False
+                self._emit(rule, "resolved", values, now, alerts)
+
+    def _fire(self, rule, state, values, now, alerts):
+        if (state.last_fired is not None and
+                now - state.last_fired < rule.cooldown):
+            return
+        state.firing = not rule.event
+        state.last_fired = now
+        self.fired += 1
+        self._emit(rule, "firing", values, now, alerts)
+
+    def _emit(self, rule, state, values, now, alerts):
+        if state == "resolved":
+            message = "cleared at " + ", ".join(
+                f"{a} {values.get(a)}" for a in rule.attributes)
+        else:
+            message = rule.message or rule.describe(values)
+        alert = Alert(rule, state, rule.value(values), time.time(), message)
+        alerts.append(alert)
+        for action in rule.actions:
+            try:
+                action(alert)
+            except (OSError, ValueError) as e:
+                print(f"alert {rule.name}: action failed: {e}",
+                      file=sys.stderr)
+        if self.on_alert:
+            self.on_alert(alert)
+
+    def active(self):
+        """Names of the rules currently firing"""
+        return [r.name for r in self.rules if self.states[r].firing]
+
+
+def _format(alert):
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S",
+                          time.localtime(alert.timestamp))
+    return f"{stamp} {alert.state} {alert.rule.name}: {alert.message}"
+
+
+class LogAction:
+    """Append a line per alert to `path`, stderr without one"""
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def __call__(self, alert):
+        line = _format(alert) + "\n"
+        if self.path is None:
+            sys.stderr.write(line)
+            return
+        with open(self.path, "a") as f:
+            f.write(line)
+
+
+class _Spawner:
+    def __init__(self):
+        self.children = []
+
+    def spawn(self, *args, **kwargs):
+        # reap the ones that are done, nobody waits for them
+        self.children = [p for p in self.children if p.poll() is None]
+        self.children.append(subprocess.Popen(
+            *args, stdin=subprocess.DEVNULL, **kwargs))
+
+
+class NotifyAction(_Spawner):
+    """Desktop notification through notify-send, firing alerts only"""
+
+    def __init__(self):
+        super().__init__()
+        self.command = shutil.which("notify-send")
+
+    def __call__(self, alert):
+        if self.command is None or alert.state != "firing":
+            return
+        self.spawn([self.command, "-u", "critical", "-a", "axb35",
+                    f"axb35: {alert.rule.name}", alert.message])
+
+
+class RunAction(_Spawner):
+    """
+    Run a shell command for every alert with AXB35_ALERT, AXB35_STATE,
+    AXB35_VALUE and AXB35_MESSAGE in its environment
+    """
+
+    def __init__(self, command):
+        super().__init__()
+        self.command = command
+
+    def __call__(self, alert):
+        env = dict(os.environ, AXB35_ALERT=alert.rule.name,
+                   AXB35_STATE=alert.state, AXB35_VALUE=str(alert.value),
+                   AXB35_MESSAGE=alert.message)
+        self.spawn(self.command, shell=True, env=env)
+
+
+class FanLevelAction:
+    """Put `fans` in fixed mode at `level` when the rule fires"""
+
+    def __init__(self, device, level, fans=FANS):
+        self.device = device
+        self.level = level
+        self.fans = tuple(fans)
+
+    def __call__(self, alert):
+        if alert.state != "firing":
+            return
+        for fan in self.fans:
+            self.device.set_fan_mode(fan, "fixed")
+            self.device.set_fan_level(fan, self.level)
+
+
+def _number(spec, key, default=None):
+    value = spec.get(key, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"rule {spec.get('name')!r}: {key} must be a number")
+    return value
+
+
+def make_action(spec, device=None):
+    """Action from its config: "notify", "log" or a one key object"""
+    if spec == "notify":
+        return NotifyAction()
+    if spec == "log":
+        return LogAction()
+    if isinstance(spec, dict):
+        if "log" in spec:
+            return LogAction(spec["log"])
+        if "run" in spec:
+            return RunAction(spec["run"])
+        if "fan_level" in spec:
+            level = spec["fan_level"]
+            fans = spec.get("fans", FANS)
+            if level not in range(6) or any(f not in FANS for f in fans):
+                raise ValueError(f"invalid fan_level action {spec!r}")
+            if device is None:
+                raise ValueError("fan_level needs a device")
+            return FanLevelAction(device, level, fans)
+    raise ValueError(f"invalid action {spec!r}")
+
+
+def make_rule(spec, device=None):
+    """Rule from its config, raises ValueError"""
+    if not isinstance(spec, dict) or not spec.get("name"):
+        raise ValueError(f"rule needs a name: {spec!r}")
+    name = spec["name"]
+    common = {
+        "duration": _number(spec, "for", 0.0),
+        "cooldown": _number(spec, "cooldown", 0.0),
+        "actions": [make_action(a, device)
+                    for a in spec.get("actions", ["log"])],
+        "message": spec.get("message"),
+    }
+    if "stalled" in spec:
+        if spec["stalled"] not in FANS:
+            raise ValueError(f"rule {name!r}: invalid fan {spec['stalled']!r}")
+        return Stalled(name, spec["stalled"], **common)
+    attr = spec.get("attr")
+    if attr not in ATTRIBUTES:
+        raise ValueError(f"rule {name!r}: invalid attr {attr!r}")
+    if "above" in spec or "below" in spec:
+        if attr.endswith(("_mode", "_curve")):
+            raise ValueError(f"rule {name!r}: {attr} is not a number")
+        above = "above" in spec
+        return Threshold(name, attr, _number(spec, "above" if above
+                                             else "below"), above, **common)
+    if "rising" in spec:
+        return Rising(name, attr, _number(spec, "rising"),
+                      _number(spec, "within", 60.0), **common)
+    if "from" in spec or "to" in spec:
+        return Changed(name, attr, spec.get("from"), spec.get("to"), **common)
+    raise ValueError(f"rule {name!r}: needs above, below, stalled, rising "
+                     f"or from/to")
+
+
+def load_rules(path=None, device=None):
+    """Rules from the alerts file, raises OSError/ValueError"""
+    with open(path or ALERTS_PATH) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise ValueError("alerts file needs a \"rules\" list")
+    return [make_rule(spec, device) for spec in data["rules"]]
@@ -0,0 +1,647 @@
+"""
+Root broker: one process owns the sysfs descriptors, samples the EC
+once per interval and hands the result to any number of unprivileged
+clients over a Unix socket.
+
+The protocol is one JSON object per line. Clients send requests
+
+    {"id": 1, "op": "subscribe"}
+    {"id": 2, "op": "write", "name": "fan1_level", "value": 3}
+    {"id": 3, "op": "profile", "profile": {"apu_mode": "quiet"}}
+
+and get {"type": "reply", "id": ..., "ok": true|false, ...} back. After
+"subscribe" every sample arrives as
+
+    {"type": "snapshot", "timestamp": ..., "values": {"temp": 61, ...}}
+
+Anyone who can open the socket may read. Writes need the peer (from
+SO_PEERCRED) to be root, the broker's own user or in `--group`.
+
+The same broker can listen on TCP as a fleet agent (axb35.fleet). TCP
+clients can only write after {"op": "auth", "token": ...} with the
+agent's token.
+"""
+import asyncio
+import errno
+import grp
+import hmac
+import json
+import os
+import pwd
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent import futures
+
+from .device import Device
+from .sysfs import ATTRIBUTES, BASE_PATH, Snapshot
+
+SOCKET_PATH = os.environ.get("AXB35_SOCKET") or "/run/axb35.sock"
+# subscribers with this much unsent data are dropped
+MAX_BACKLOG = 256 * 1024
+# longest request line
+MAX_LINE = 64 * 1024
+# RemoteDevice's wait before reconnecting, doubled up to the maximum
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 10.0
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def snapshot_message(timestamp, values):
+    return {"type": "snapshot", "timestamp": timestamp, "values": values}
+
+
+def snapshot_from_message(message):
+    """Snapshot and attribute name -> value dict of a snapshot message"""
+    values = {}
+    for name, value in message["values"].items():
+        if name in ATTRIBUTES:
+            values[name] = tuple(value) if isinstance(value, list) else value
+    return Snapshot.from_values(message["timestamp"], values), values
+
+
+def peer_credentials(writer):
+    """(uid, gid) of the process at the other end of a Unix socket"""
+    sock = writer.get_extra_info("socket")
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                            struct.calcsize("3i"))
+    _, uid, gid = struct.unpack("3i", creds)
+    return uid, gid
+
+
+def group_authorizer(group=None):
+    """
+    Write check allowing root, the broker's own user and, if given,
+    members of `group` (primary or supplementary)
+    """
+    group_gid = grp.getgrnam(group).gr_gid if group else None
+
+    def authorize(uid, gid):
+        if uid in (0, os.geteuid()):
+            return True
+        if group_gid is None:
+            return False
+        if gid == group_gid:
+            return True
+        try:
+            user = pwd.getpwuid(uid).pw_name
+            # looked up every time, so group changes apply at once
+            return user in grp.getgrgid(group_gid).gr_mem
+        except KeyError:
+            return False
+    return authorize
+
+
+def _error(reply, exc):
+    reply["ok"] = False
+    if isinstance(exc, OSError):
+        reply["errno"] = exc.errno or errno.EIO
+        reply["error"] = exc.strerror or str(exc)
+    else:
+        reply["errno"] = errno.EINVAL
+        reply["error"] = str(exc)
+    return reply
+
+
+class Broker:
+    """
+    Samples all attributes of `device` every `interval` seconds, and
+    right after each accepted write, on one I/O thread. The EC sees the
+    same reads whether no client or a thousand are connected.
+    """
+
+    def __init__(self, device, interval=1.0, authorize=None, token=None):
+        self.device = device
+        self.interval = interval
+        self.authorize = authorize or group_authorizer()
+        self.token = token
+        self.sampler = device.sampler()
+        # sampling and writes never run in parallel
+        self.executor = futures.ThreadPoolExecutor(
+            1, thread_name_prefix="axb35-io")
+        self.subscribers = set()
+        self._connections = {}  # handler task -> StreamWriter
+        self.latest = None       # last snapshot message
+        self.latest_line = None  # ... encoded once for all subscribers
+        self.samples = 0
+        self.writes = 0
+        self.clients = 0
+        self.dropped = 0
+        self._wake = None
+        self._sampling = None
+        self._servers = []
+
+    def _start_sampling(self):
+        if self._sampling is None:
+            self._wake = asyncio.Event()
+            self._sampling = asyncio.ensure_future(self._sample_loop())
+
+    async def start(self, path=SOCKET_PATH, mode=0o666):
+        """Listen on `path` and start sampling"""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self._servers.append(await asyncio.start_unix_server(
+            self._handle, path, limit=MAX_LINE))
+        os.chmod(path, mode)
+        self._start_sampling()
+        return self
+
+    async def start_tcp(self, host=None, port=0):
+        """Listen on TCP as well (or only), returns the bound port"""
+        server = await asyncio.start_server(self._handle, host, port,
+                                            limit=MAX_LINE)
+        self._servers.append(server)
+        self._start_sampling()
+        return server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._sampling.cancel()
+        for server in self._servers:
+            server.close()
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(self._sampling, *self._connections,
+                             return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self.executor.shutdown(wait=True)
+        self.sampler.close()
+
+    async def _io(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def _sample_loop(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            try:
+                await self._sample()
+            except Exception as e:
+                print(f"Broker sample error: {e}")
+            next_tick += self.interval
+            delay = next_tick - loop.time()
+            if delay <= 0:
+                next_tick = loop.time()
+                delay = 0
+            # not wait_for(): on 3.11 it can swallow the cancel from
+            # stop() when the timeout hits at the same time
+            timer = loop.call_later(delay, self._wake.set)
+            try:
+                await self._wake.wait()
+            finally:
+                timer.cancel()
+            self._wake.clear()
+
+    async def _sample(self):
+        values = await self._io(self.sampler.read_values)
+        self.latest = snapshot_message(time.time(), values)
+        self.latest_line = encode(self.latest)
+        self.samples += 1
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                # stuck client, it doesn't get to hold memory forever
+                self.dropped += 1
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(self.latest_line)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        self.clients += 1
+        try:
+            peer = {"creds": None, "token": False}
+            if writer.get_extra_info("socket").family == socket.AF_UNIX:
+                peer["creds"] = peer_credentials(writer)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("request must be an object")
+                except ValueError as e:
+                    writer.write(encode(_error({"type": "reply", "id": None},
+                                               ValueError(e))))
+                    continue
+                reply = await self._request(message, peer, writer)
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            # ValueError: line over MAX_LINE
+            pass
+        finally:
+            self.clients -= 1
+            self._connections.pop(task, None)
+            self.subscribers.discard(writer)
+            writer.close()
+
+    def _may_write(self, peer):
+        if peer["creds"] is not None:
+            return self.authorize(*peer["creds"])
+        return peer["token"]
+
+    async def _request(self, message, peer, writer):
+        op = message.get("op")
+        reply = {"type": "reply", "id": message.get("id"), "ok": True}
+        try:
+            if op == "subscribe":
+                self.subscribers.add(writer)
+                if self.latest_line:
+                    writer.write(self.latest_line)
+            elif op == "unsubscribe":
+                self.subscribers.discard(writer)
+            elif op == "get":
+                if self.latest is None:
+                    raise OSError(errno.EAGAIN, "no sample yet")
+                reply["snapshot"] = self.latest
+            elif op == "stats":
+                reply.update(samples=self.samples, writes=self.writes,
+                             clients=self.clients,
+                             subscribers=len(self.subscribers),
+                             dropped=self.dropped,
+                             reopens=self.sampler.reopen_count,
+                             errors=self.sampler.error_count)
+            elif op == "auth":
+                token = str(message.get("token", "")).encode()
+                if not self.token or not hmac.compare_digest(
+                        token, self.token.encode()):
+                    raise OSError(errno.EACCES, "wrong token")
+                peer["token"] = True
+            elif op in ("write", "profile"):
+                if not self._may_write(peer):
+                    raise OSError(errno.EACCES, "not allowed to write")
+                if op == "write":
+                    await self._io(self.device.set, message.get("name"),
+                                   message.get("value"))
+                    self.writes += 1
+                else:
+                    await self._apply_profile(message.get("profile"), reply)
+                # show the result to everyone now, not at the next tick
+                self._wake.set()
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (OSError, ValueError) as e:
+            _error(reply, e)
+        return reply
+
+    async def _apply_profile(self, profile, reply):
+        from .profiles import apply_profile
+
+        result = await self._io(apply_profile, self.device, profile)
+        self.writes += len(result.done)
+        reply["writes"] = len(result.done)
+        reply["elapsed"] = result.elapsed
+        if result.error:
+            name, exc = result.error
+            _error(reply, exc)
+            reply["error"] = f"{name}: {reply['error']}"
+            reply["rolled_back"] = result.rolled_back
+
+
+class BrokerClient:
+    """
+    asyncio client. `on_snapshot(snapshot, values)` is called for every
+    sample after subscribe(), snapshots() iterates over them instead.
+    """
+
+    def __init__(self, path=SOCKET_PATH, on_snapshot=None, queue_size=16,
+                 address=None):
+        self.path = path
+        self.address = address  # (host, port) of a TCP agent instead
+        self.on_snapshot = on_snapshot
+        self.latest = None
+        self.latest_values = {}
+        self._queue = asyncio.Queue(queue_size)
+        self._pending = {}
+        self._next_id = 0
+        self._reader = self._writer = self._task = None
+
+    async def connect(self):
+        if self.address:
+            self._reader, self._writer = await asyncio.open_connection(
+                *self.address, limit=MAX_BACKLOG)
+        else:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                self.path, limit=MAX_BACKLOG)
+        self._task = asyncio.ensure_future(self._read_loop())
+        return self
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._task.cancel()
+            self._writer = None
+
+    async def wait_closed(self):
+        """Wait until the broker closes the connection"""
+        try:
+            await asyncio.shield(self._task)
+        except asyncio.CancelledError:
+            if not self._task.cancelled():
+                raise
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("type") == "snapshot":
+                    self._on_snapshot(message)
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            # later requests fail right away instead of waiting for a
+            # reply that never comes
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(OSError(errno.ECONNRESET,
+                                                 "broker went away"))
+            self._pending.clear()
+            if self._queue.full():
+                self._queue.get_nowait()
+            # ends snapshots()
+            self._queue.put_nowait(None)
+
+    def _on_snapshot(self, message):
+        snapshot, values = snapshot_from_message(message)
+        self.latest, self.latest_values = snapshot, values
+        if self.on_snapshot:
+            self.on_snapshot(snapshot, values)
+        if self._queue.full():
+            # a slow reader only misses samples
+            self._queue.get_nowait()
+        self._queue.put_nowait(snapshot)
+
+    async def request(self, op, **fields):
+        """Send one request, returns the reply or raises OSError"""
+        if self._writer is None:
+            raise OSError(errno.ENOTCONN, "not connected")
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        self._writer.write(encode(dict(fields, id=self._next_id, op=op)))
+        await self._writer.drain()
+        reply = await future
+        if not reply.get("ok"):
+            raise OSError(reply.get("errno", errno.EIO),
+                          reply.get("error", "request failed"))
+        return reply
+
+    async def subscribe(self):
+        await self.request("subscribe")
+
+    async def snapshots(self):
+        """Yield snapshots as they arrive, until the connection closes"""
+        while True:
+            snapshot = await self._queue.get()
+            if snapshot is None:
+                return
+            yield snapshot
+
+    async def get(self):
+        reply = await self.request("get")
+        return snapshot_from_message(reply["snapshot"])[0]
+
+    async def write(self, name, value):
+        if isinstance(value, tuple):
+            value = list(value)
+        await self.request("write", name=name, value=value)
+
+    async def apply_profile(self, profile):
+        return await self.request("profile", profile=profile)
+
+    async def auth(self, token):
+        await self.request("auth", token=token)
+
+    async def stats(self):
+        return await self.request("stats")
+
+
+class RemoteSampler:
+    """SysfsSampler stand-in serving the broker's latest sample"""
+
+    def __init__(self, device, attributes=None):
+        self.device = device
+        self.attributes = tuple(attributes or ATTRIBUTES)
+        self.reopen_count = 0
+        self.error_count = 0
+
+    def read_values(self):
+        values = self.device.current()[1]
+        return {name: values.get(name) for name in self.attributes}
+
+    def sample(self):
+        snapshot, values = self.device.current()
+        return Snapshot.from_values(
+            snapshot.timestamp,
+            {name: values.get(name) for name in self.attributes},
+            snapshot.stale.intersection(self.attributes))
+
+    def close(self):
+        pass
+
+
+class RemoteDevice(Device):
+    """
+    Device for tools running without root: reads come from the broker's
+    samples, writes are sent to it. The BrokerClient runs on its own
+    event loop thread, so the blocking Device API keeps working.
+
+    When the broker goes away the last sample is served with every
+    attribute marked stale, writes fail at once and the connection is
+    retried every RECONNECT_MIN to RECONNECT_MAX seconds.
+    """
+
+    def __init__(self, socket_path=None, config_path=None, timeout=5.0):
+        super().__init__(BASE_PATH, config_path)
+        self.socket_path = socket_path or SOCKET_PATH
+        self.timeout = timeout
+        self.connected = False
+        self.reconnects = 0
+        self._cond = threading.Condition()
+        self._latest = None
+        self._keeper = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        daemon=True, name="axb35-broker")
+        self._thread.start()
+        try:
+            self.client = self._call(self._connect())
+        except BaseException:
+            self._stop_loop()
+            raise
+        self._loop.call_soon_threadsafe(self._keep_connected)
+
+    async def _connect(self):
+        client = BrokerClient(self.socket_path, on_snapshot=self._on_snapshot)
+        await client.connect()
+        try:
+            await client.subscribe()
+        except BaseException:
+            await client.close()
+            raise
+        self._set_connected(True)
+        return client
+
+    def _keep_connected(self):
+        self._keeper = asyncio.ensure_future(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        while True:
+            await self.client.wait_closed()
+            self._set_connected(False)
+            delay = RECONNECT_MIN
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    self.client = await self._connect()
+                    break
+                except OSError:
+                    delay = min(delay * 2, RECONNECT_MAX)
+            self.reconnects += 1
+
+    def _set_connected(self, connected):
+        with self._cond:
+            self.connected = connected
+            self._cond.notify_all()
+
+    def _call(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self.timeout)
+        except futures.TimeoutError:
+            future.cancel()
+            raise OSError(errno.ETIMEDOUT, "broker did not answer") from None
+
+    def _on_snapshot(self, snapshot, values):
+        with self._cond:
+            self._latest = (snapshot, values)
+            self._cond.notify_all()
+
+    def current(self):
+        """
+        (Snapshot, values) of the latest sample, waits for the first.
+        Everything is stale while the broker is away.
+        """
+        with self._cond:
+            if self._latest is None and self.connected:
+                self._cond.wait_for(
+                    lambda: self._latest is not None or not self.connected,
+                    self.timeout)
+            snapshot, values = self._latest or (Snapshot(None), {})
+            if not self.connected:
+                snapshot = snapshot._replace(stale=frozenset(ATTRIBUTES))
+            return snapshot, values
+
+    def exists(self):
+        return self.current()[0].timestamp is not None
+
+    def read(self, name):
+        return self.current()[1].get(name)
+
+    def write(self, name, value):
+        if not self.connected:
+            raise OSError(errno.ENOTCONN, "broker went away, reconnecting")
+        self._call(self.client.write(name, value))
+
+    def set(self, name, value):
+        self.write(name, value)
+
+    def sampler(self, attributes=None):
+        return RemoteSampler(self, attributes)
+
+    def has_state(self):
+        return False
+
+    def state_sampler(self, max_age=None):
+        raise OSError(errno.EOPNOTSUPP,
+                      "the state attribute needs sysfs, not the broker")
+
+    def watcher(self, attributes=None, **kw):
+        raise OSError(errno.EOPNOTSUPP,
+                      "change notifications need sysfs, not the broker")
+
+    def snapshot(self, attributes=None):
+        return self.sampler(attributes).sample()
+
+    def close(self):
+        if self._thread.is_alive():
+            try:
+                self._call(self._close())
+            except OSError:
+                pass
+            self._stop_loop()
+
+    async def _close(self):
+        if self._keeper is not None:
+            self._keeper.cancel()
+        await self.client.close()
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=self.timeout)
+
+
+def serve(device, path=None, interval=1.0, group=None, tcp=None,
+          token=None):
+    """
+    Run a broker on the Unix socket `path`, or as a fleet agent on
+    `tcp` = (host, port), until interrupted or SIGTERM
+    """
+    path = path or SOCKET_PATH
+
+    async def main():
+        broker = Broker(device, interval, group_authorizer(group), token)
+        if tcp:
+            port = await broker.start_tcp(*tcp)
+            where = f"{tcp[0] or '*'}:{port}"
+        else:
+            await broker.start(path)
+            where = path
+        print(f"serving {where}, sampling every {interval:g}s",
+              file=sys.stderr)
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                      stop.set)
+        try:
+            await stop.wait()
+        finally:
+            await broker.stop()
+            if not tcp:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,364 @@
+"""
+Fan characterization: level -> rpm tables with their spread, and how
+long the fans take to spin up and down.
+
+All three fans are swept at once in fixed mode, 0 -> 1 -> ... -> 5 and
+then straight back to 0, and each fan moves to its next level as soon
+as its own reading has settled.
+Instead of sleeping a fixed time, SteadyState decides from the samples
+since the level write:
+
+  - the samples are fitted with the approach of a fan with inertia,
+    rpm(t) = end + (start - end) * exp(-t / tau), by least squares;
+    the step is settled once the standard error of `end` and the
+    spread of the last `confirm` estimates are within tolerance, so
+    the end value is known before the fan gets there
+  - or the sliding window of the last `window` seconds is flat: its
+    regression slope moves the rpm by less than the tolerance
+
+The fitted tau gives the 90% spin-up/spin-down time when the samples
+themselves didn't get there before the fan was moved on.
+"""
+import math
+import time
+from collections import deque, namedtuple
+
+from .sysfs import FANS
+
+LEVELS = (0, 1, 2, 3, 4, 5)
+
+# rpm: settled value, std: noise of the readings around the fit or the
+# window, tau: time constant of the approach (None if it was flat),
+# elapsed: seconds from the level write until settled
+Settled = namedtuple("Settled", "rpm std tau elapsed timed_out")
+# one step of a sweep, t90 in seconds (None if unknown)
+Measurement = namedtuple("Measurement",
+                         "fan level previous rpm std t90 elapsed timed_out")
+
+# time constants the fit looks at, 1.15 apart
+_TAUS = [0.05 * 1.15 ** i for i in range(46)]
+
+
+def _fit(trace, t0, tau):
+    """
+    Least squares (end, start, residual sum) of the approach with time
+    constant `tau` from `t0`, both rpm values free
+    """
+    s11 = s12 = s22 = b1 = b2 = 0.0
+    for t, rpm in trace:
+        e = math.exp((t0 - t) / tau)
+        x = 1.0 - e
+        s11 += x * x
+        s12 += x * e
+        s22 += e * e
+        b1 += x * rpm
+        b2 += e * rpm
+    det = s11 * s22 - s12 * s12
+    if det <= 1e-12 * max(1.0, s11 * s22):
+        return None
+    end = (b1 * s22 - b2 * s12) / det
+    start = (b2 * s11 - b1 * s12) / det
+    ssr = 0.0
+    for t, rpm in trace:
+        e = math.exp((t0 - t) / tau)
+        ssr += (rpm - end - (start - end) * e) ** 2
+    return end, start, ssr
+
+
+def _end_error(trace, t0, tau, end, start, sigma):
+    """Standard error of `end` with start and tau fitted as well"""
+    m = [[0.0] * 3 for _ in range(3)]
+    for t, _ in trace:
+        e = math.exp((t0 - t) / tau)
+        row = (1.0 - e, e, (start - end) * e * (t - t0) / tau ** 2)
+        for i in range(3):
+            for j in range(3):
+                m[i][j] += row[i] * row[j]
+    # (J^T J)^-1 [0][0] by cofactors
+    det = (m[0][0] * (m[1][1] * m[2][2] - m[1][2] * m[2][1])
+           - m[0][1] * (m[1][0] * m[2][2] - m[1][2] * m[2][0])
+           + m[0][2] * (m[1][0] * m[2][1] - m[1][1] * m[2][0]))
+    if det <= 0:
+        return math.inf
+    cofactor = m[1][1] * m[2][2] - m[1][2] * m[2][1]
+    return sigma * math.sqrt(max(0.0, cofactor / det))
+
+
+class SteadyState:
+    """
+    Convergence test for one level step. Tolerance is max(`tolerance`
+    rpm, `rel_tolerance` x rpm).
+    """
+
+    def __init__(self, window=0.6, tolerance=30.0, rel_tolerance=0.02,
+                 min_samples=8):
+        self.window = window
+        self.tolerance = tolerance
+        self.rel_tolerance = rel_tolerance
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self, now=None):
+        self.trace = []
+        self.start = now
+        self.estimates = deque()
+        self._tau_index = len(_TAUS) // 2
+
+    def tolerance_at(self, rpm):
+        return max(self.tolerance, self.rel_tolerance * abs(rpm))
+
+    def add(self, t, rpm):
+        """Add a sample, returns a Settled once converged, else None"""
+        if self.start is None:
+            self.start = t
+        self.trace.append((t, rpm))
+        if len(self.trace) < self.min_samples:
+            return None
+        settled = self._fitted()
+        if settled is None:
+            settled = self._flat()
+        return settled
+
+    def _flat(self):
+        window = [(t, v) for t, v in self.trace
+                  if t >= self.trace[-1][0] - self.window]
+        if (len(window) < self.min_samples or
+                window[-1][0] - window[0][0] < 0.9 * self.window):
+            return None
+        n = len(window)
+        mt = sum(t for t, _ in window) / n
+        mv = sum(v for _, v in window) / n
+        stt = sum((t - mt) ** 2 for t, _ in window)
+        slope = sum((t - mt) * (v - mv) for t, v in window) / stt
+        residual = sum((v - mv - slope * (t - mt)) ** 2 for t, v in window)
+        sigma = math.sqrt(residual / max(1, n - 2))
+        # what is left to go at this slope, with the slope's own noise
+        # counted against it; a slow fan moves little per window
+        horizon = max(3 * self.window, _TAUS[self._tau_index])
+        remaining = (abs(slope) + 2 * sigma / math.sqrt(stt)) * horizon
+        if remaining > self.tolerance_at(mv):
+            return None
+        return Settled(mv, sigma, None, self.trace[-1][0] - self.start, False)
+
+    def _fitted(self):
+        trace = self.trace
+        # start from the last tau, the best one moves little per sample
+        lo = max(0, self._tau_index - 4)
+        hi = min(len(_TAUS), self._tau_index + 5)
+        best = None
+        for i in range(lo, hi):
+            fit = _fit(trace, self.start, _TAUS[i])
+            if fit is not None and (best is None or fit[2] < best[1][2]):
+                best = (i, fit)
+        if best is None:
+            return None
+        i, (end, start, ssr) = best
+        self._tau_index = i
+        tau = _TAUS[i]
+        sigma = math.sqrt(ssr / max(1, len(trace) - 3))
+        now = trace[-1][0]
+        estimates = self.estimates
+        estimates.append((now, end))
+        while estimates[0][0] < now - self.window:
+            estimates.popleft()
+        values = [e for _, e in estimates]
+        tol = self.tolerance_at(end)
+        # the estimates of the last window must agree, one lucky fit
+        # on a short noisy trace is not enough
+        if (now - self.start < 2 * self.window or
+                max(values) - min(values) > tol):
+            return None
+        if 2 * _end_error(trace, self.start, tau, end, start, sigma) > tol:
+            return None
+        return Settled(end, sigma, tau, trace[-1][0] - self.start, False)
+
+    def fallback(self, t):
+        """Best guess when time is up: the mean of the last window"""
+        values = [v for u, v in self.trace if u >= t - self.window] or [0]
+        mean = sum(values) / len(values)
+        std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+        return Settled(mean, std, None, t - (self.start or t), True)
+
+
+def t90(trace, start_rpm, settled):
+    """
+    Seconds from the level write until 90% of the change was made: from
+    the samples if they got there, else from the fitted time constant
+    """
+    change = settled.rpm - start_rpm
+    if abs(change) < 1:
+        return 0.0
+    for t, rpm in trace:
+        if (rpm - start_rpm) / change >= 0.9:
+            return t
+    if settled.tau:
+        return settled.tau * math.log(10)
+    return None
+
+
+class Calibrator:
+    """
+    Sweeps `fans` on `device` up through `levels` and back down,
+    sampling every `interval` seconds. A step gives up after `timeout`
+    seconds and keeps the window mean. The fans' modes and levels are
+    put back by restore(), which run() always calls.
+    """
+
+    def __init__(self, device, fans=FANS, levels=LEVELS, interval=0.05,
+                 timeout=20.0, detector=SteadyState, clock=time.monotonic,
+                 sleep=time.sleep, on_step=None):
+        for fan in fans:
+            if fan not in FANS:
+                raise ValueError(f"invalid fan {fan!r}")
+        self.device = device
+        self.fans = tuple(fans)
+        self.levels = tuple(levels)
+        self.interval = interval
+        self.timeout = timeout
+        self.detector = detector
+        self.clock = clock
+        self.sleep = sleep
+        self.on_step = on_step
+        self.saved = {}
+        self.steps = []
+        self.duration = None
+
+    def sequence(self):
+        """
+        Levels to visit: the lowest one to start from, up one level at
+        a time, then straight back to the lowest for the spin-down
+        """
+        up = sorted(self.levels)
+        return up + up[:1]
+
+    def save(self):
+        for fan in self.fans:
+            self.saved[fan] = (self.device.read_fan_mode(fan),
+                               self.device.read_fan_level(fan))
+
+    def restore(self):
+        for fan, (mode, level) in self.saved.items():
+            try:
+                self.device.set_fan_mode(fan, mode or "curve")
+                if mode == "fixed" and level is not None:
+                    self.device.set_fan_level(fan, level)
+            except (OSError, ValueError) as e:
+                print(f"Failed to restore fan{fan}: {e}")
+        self.saved.clear()
+
+    def run(self):
+        """Sweep all fans at once, returns the Measurements"""
+        self.save()
+        try:
+            for fan in self.fans:
+                self.device.set_fan_mode(fan, "fixed")
+            self._sweep()
+        finally:
+            self.restore()
+        return self.steps
+
+    def _sweep(self):
+        sequence = self.sequence()
+        sampler = self.device.sampler([f"fan{f}_rpm" for f in self.fans])
+        t_start = self.clock()
+        # per fan: position in the sequence, detector, write time, the
+        # settled rpm before it and the samples since the write
+        state = {fan: {"pos": -1, "rpm": None} for fan in self.fans}
+        try:
+            now = self.clock()
+            for fan in self.fans:
+                self._next_level(fan, state[fan], sequence, now)
+            next_tick = now
+            while any(s["pos"] < len(sequence) for s in state.values()):
+                values = sampler.read_values()
+                now = self.clock()
+                for fan in self.fans:
+                    s = state[fan]
+                    if s["pos"] >= len(sequence):
+                        continue
+                    rpm = values.get(f"fan{fan}_rpm")
+                    if rpm is None:
+                        continue
+                    s["trace"].append((now - s["since"], rpm))
+                    settled = s["detector"].add(now, rpm)
+                    if settled is None and now - s["since"] >= self.timeout:
+                        settled = s["detector"].fallback(now)
+                    if settled is not None:
+                        self._record(fan, s, sequence, settled)
+                        self._next_level(fan, s, sequence, now)
+                next_tick += self.interval
+                delay = next_tick - self.clock()
+                if delay > 0:
+                    self.sleep(delay)
+                else:
+                    next_tick = self.clock()
+        finally:
+            sampler.close()
+        self.duration = self.clock() - t_start
+
+    def _next_level(self, fan, s, sequence, now):
+        s["pos"] += 1
+        if s["pos"] >= len(sequence):
+            return
+        self.device.set_fan_level(fan, sequence[s["pos"]])
+        s["since"] = now
+        s["trace"] = []
+        s["detector"] = self.detector()
+        s["detector"].reset(now)
+
+    def _record(self, fan, s, sequence, settled):
+        pos = s["pos"]
+        previous = sequence[pos - 1] if pos > 0 else None
+        spin = None
+        if s["rpm"] is not None:
+            spin = t90(s["trace"], s["rpm"], settled)
+        step = Measurement(fan, sequence[pos], previous, settled.rpm,
+                           settled.std, spin, settled.elapsed,
+                           settled.timed_out)
+        s["rpm"] = settled.rpm
+        self.steps.append(step)
+        if self.on_step:
+            self.on_step(step)
+
+
+def tables(steps):
+    """
+    fan -> level -> {"rpm", "std", "rpm_down", "spin_up", "spin_down"}
+    from the Measurements of a sweep
+    """
+    result = {}
+    for step in steps:
+        row = result.setdefault(step.fan, {}).setdefault(step.level, {
+            "rpm": None, "std": None, "rpm_down": None, "spin_up": None,
+            "spin_down": None})
+        if step.previous is None or step.previous < step.level:
+            row["rpm"] = round(step.rpm)
+            row["std"] = round(step.std, 1)
+            if step.previous is not None:
+                row["spin_up"] = step.t90
+        else:
+            row["rpm_down"] = round(step.rpm)
+            row["spin_down"] = step.t90
+            if row["rpm"] is None:
+                row["rpm"] = round(step.rpm)
+                row["std"] = round(step.std, 1)
+    return result
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.1f}s"
+
+
+def format_tables(result):
+    lines = []
+    for fan in sorted(result):
+        lines.append(f"fan{fan}")
+        lines.append(f"{'level':>5} {'rpm':>6} {'std':>6} {'rpm down':>9} "
+                     f"{'t90 up':>7} {'t90 down':>9}")
+        for level in sorted(result[fan]):
+            r = result[fan][level]
+            down = "-" if r["rpm_down"] is None else r["rpm_down"]
+            lines.append(f"{level:>5} {r['rpm']:>6} {r['std']:>6} "
+                         f"{down:>9} {_seconds(r['spin_up']):>7} "
+                         f"{_seconds(r['spin_down']):>9}")
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+"""
+Canvas chart of the History, temperature on the left axis and fan
+RPMs on the right one
+"""
+import tkinter as tk
+from tkinter import ttk
+
+# label -> seconds shown
+WINDOWS = {
+    "5 min": 300,
+    "30 min": 1800,
+    "2 h": 7200,
+    "12 h": 43200,
+    "7 days": 7 * 86400,
+}
+
+TEMP_RANGE = (30, 100)
+COLORS = ("#d62728", "#1f77b4", "#2ca02c", "#9467bd")
+LABELS = ("Temp", "Fan 1", "Fan 2", "Fan 3")
+MARGIN = 40
+# coordinates that hide a line while there is nothing to show
+EMPTY = (0, 0, 0, 0)
+
+
+class HistoryChart(ttk.Frame):
+    """
+    Line items are created once and only get new coordinates on
+    redraw, so a redraw costs O(canvas width) no matter how much
+    history is held.
+    """
+
+    def __init__(self, parent, history, height=160, rpm_max=6000):
+        super().__init__(parent)
+        self.history = history
+        self.rpm_max = rpm_max
+        self.window_var = tk.StringVar(value="5 min")
+
+        bar = ttk.Frame(self)
+        bar.pack(fill=tk.X)
+        ttk.Label(bar, text="Window:").pack(side=tk.LEFT)
+        combo = ttk.Combobox(bar, textvariable=self.window_var,
+                             values=list(WINDOWS), width=8, state='readonly')
+        combo.pack(side=tk.LEFT, padx=5)
+        combo.bind('<<ComboboxSelected>>', lambda e: self.redraw())
+        for color, label in zip(COLORS, LABELS):
+            tk.Label(bar, text=label, fg=color).pack(side=tk.LEFT, padx=4)
+
+        self.canvas = tk.Canvas(self, height=height, background="white",
+                                highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.canvas.bind('<Configure>', lambda e: self._layout())
+
+        self.axis_items = []
+        # temp max band first so the averages are drawn on top of it
+        self.temp_max_line = self.canvas.create_line(
+            0, 0, 0, 0, fill=COLORS[0], dash=(2, 2))
+        self.lines = [self.canvas.create_line(0, 0, 0, 0, fill=color,
+                                              width=2 if i == 0 else 1)
+                      for i, color in enumerate(COLORS)]
+
+    def _layout(self):
+        c = self.canvas
+        for item in self.axis_items:
+            c.delete(item)
+        w, h = c.winfo_width(), c.winfo_height()
+        lo, hi = TEMP_RANGE
+        self.axis_items = [
+            c.create_rectangle(MARGIN, 5, w - MARGIN, h - 5, outline="#ccc"),
+            c.create_text(MARGIN - 4, 5, text=f"{hi}°C", anchor=tk.NE),
+            c.create_text(MARGIN - 4, h - 5, text=f"{lo}°C", anchor=tk.SE),
+            c.create_text(w - MARGIN + 4, 5, text=f"{self.rpm_max}",
+                          anchor=tk.NW),
+            c.create_text(w - MARGIN + 4, h - 5, text="0", anchor=tk.SW),
+        ]
+        self.redraw()
+
+    def redraw(self):
+        c = self.canvas
+        w, h = c.winfo_width(), c.winfo_height()
+        plot_w = w - 2 * MARGIN
+        end = self.history.latest_time()
+        if end is None or plot_w < 2:
+            return
+        span = WINDOWS[self.window_var.get()]
+        start = end - span
+        times, _, maxs, avgs = self.history.series(start, end, plot_w)
+
+        def x(t):
+            return MARGIN + (t - start) * plot_w / span
+
+        lo, hi = TEMP_RANGE
+        scales = [(lo, hi)] + [(0, self.rpm_max)] * (len(self.lines) - 1)
+        for item, values, (vmin, vmax) in zip(self.lines, avgs, scales):
+            c.coords(item, *(_points(times, values, x, vmin, vmax, h)
+                             or EMPTY))
+        c.coords(self.temp_max_line,
+                 *(_points(times, maxs[0], x, lo, hi, h) or EMPTY))
+
+
+def _points(times, values, x, vmin, vmax, height):
+    """Flat canvas coordinate list, gaps (None) are skipped"""
+    top, bottom = 5, height - 5
+    scale = (bottom - top) / (vmax - vmin)
+    coords = []
+    for t, v in zip(times, values):
+        if v is None:
+            continue
+        v = min(max(v, vmin), vmax)
+        coords += (x(t), bottom - (v - vmin) * scale)
+    return coords if len(coords) >= 4 else None
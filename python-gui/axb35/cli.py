@@ -0,0 +1,1002 @@
+"""
+Command line interface, usable on headless machines without Tk
+"""
+import argparse
+import json
+import sys
+import time
+
+from .device import CONFIG_PATH, Device, config_from_snapshot, load_config
+from .sysfs import ATTRIBUTES, BASE_PATH, FANS, MONITOR_ATTRIBUTES, OS_IO
+
+
+def format_snapshot(snapshot):
+    """One human readable line per snapshot"""
+    parts = [f"temp {snapshot.temp}°C"]
+    for n, fan in zip(FANS, snapshot.fans):
+        text = f"fan{n} {fan.rpm} rpm"
+        if fan.mode is not None:
+            text += f" {fan.mode}"
+        if fan.level is not None:
+            text += f" L{fan.level}"
+        parts.append(text)
+    if snapshot.power_mode is not None:
+        parts.append(snapshot.power_mode)
+    return " | ".join(parts)
+
+
+def emit(snapshot, as_json, out=None):
+    if out is None:
+        out = sys.stdout
+    if as_json:
+        out.write(json.dumps(snapshot.as_dict(), separators=(",", ":")))
+        out.write("\n")
+    else:
+        out.write(format_snapshot(snapshot) + "\n")
+    out.flush()
+
+
+def open_state(device):
+    """StateSampler for --state, None after an error message"""
+    if not device.has_state():
+        print("Error: --state needs a driver with the state attribute, "
+              "read through sysfs", file=sys.stderr)
+        return None
+    return device.state_sampler()
+
+
+def cmd_snapshot(device, args):
+    if args.state:
+        sampler = open_state(device)
+        if sampler is None:
+            return 2
+        with sampler:
+            snapshot = sampler.sample()
+        if sampler.age is None:
+            # the module was just loaded, its worker hasn't run yet
+            snapshot = device.snapshot()
+    else:
+        snapshot = device.snapshot()
+    if args.json:
+        json.dump(snapshot.as_dict(), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(format_snapshot(snapshot))
+    return 0
+
+
+def watch_changes(device, args):
+    """`watch --changes`: a line whenever a setting changes"""
+    from .writer import format_value
+
+    try:
+        watcher = device.watcher(fallback=args.interval)
+    except OSError as e:
+        print(f"Error: --changes: {e.strerror}", file=sys.stderr)
+        return 2
+    count = 0
+    try:
+        changed = watcher.wait()
+        while args.count is None or count < args.count:
+            if changed:
+                now = time.time()
+                if args.json:
+                    line = json.dumps({"timestamp": now, "changes": changed},
+                                      separators=(",", ":"))
+                else:
+                    stamp = time.strftime("%H:%M:%S", time.localtime(now))
+                    line = stamp + " " + " ".join(
+                        f"{name}={format_value(value)}"
+                        for name, value in changed.items())
+                print(line, flush=True)
+                count += 1
+            changed = watcher.wait()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        watcher.close()
+        print(f"{watcher.notifications} notified reads, {watcher.polls} "
+              f"fallback polls", file=sys.stderr)
+    return 0
+
+
+def cmd_watch(device, args):
+    if args.changes:
+        return watch_changes(device, args)
+    if args.state:
+        sampler = open_state(device)
+        if sampler is None:
+            return 2
+    else:
+        attributes = MONITOR_ATTRIBUTES if args.fast else None
+        sampler = device.sampler(attributes)
+    scheduler = None
+    if args.adaptive:
+        from .scheduler import AdaptiveScheduler
+
+        scheduler = AdaptiveScheduler(args.interval, args.max_interval,
+                                      temp_step=args.temp_step,
+                                      rpm_step=args.rpm_step)
+    count = 0
+    try:
+        next_tick = time.monotonic()
+        while args.count is None or count < args.count:
+            snapshot = sampler.sample()
+            emit(snapshot, args.json)
+            count += 1
+            interval = args.interval
+            if scheduler:
+                interval = scheduler.next_interval(snapshot)
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        sampler.close()
+    return 0
+
+
+def cmd_export(device, args):
+    from .exporter import MetricsExporter, make_server
+
+    exporter = MetricsExporter(device, args.interval).start()
+    server = make_server(exporter, args.listen, args.port)
+    host, port = server.server_address[:2]
+    print(f"serving http://{host or '0.0.0.0'}:{port}/metrics, "
+          f"sampling every {args.interval:g}s", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        exporter.stop()
+    return 0
+
+
+def cmd_control(device, args):
+    import signal
+    import threading
+    from functools import partial
+
+    from .controller import CurvePolicy, FanController, PidPolicy, RateLimiter
+    from .controller import parse_points
+
+    try:
+        fans = tuple(int(f) for f in args.fans.split(","))
+        if args.pid is not None:
+            policy = partial(PidPolicy, args.pid)
+        else:
+            policy = partial(CurvePolicy, parse_points(args.curve),
+                             args.hysteresis)
+        controller = FanController(
+            device, policy, fans, tick=args.tick,
+            limiter=lambda: RateLimiter(args.up_interval, args.down_interval),
+            panic_temp=args.panic_temp)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        controller.start()
+        controller.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+        print(f"{controller.ticks} ticks, {controller.level_writes} level "
+              f"writes", file=sys.stderr)
+    return 0
+
+
+def cmd_governor(device, args):
+    import signal
+    import threading
+
+    from .governor import CpuStat, PowerGovernor, format_switch
+    from .governor import parse_thresholds
+
+    def log(switch):
+        print(format_switch(switch), flush=True)
+
+    try:
+        governor = PowerGovernor(
+            device, CpuStat(args.proc_stat), up=parse_thresholds(args.up),
+            down=parse_thresholds(args.down), min_dwell=args.min_dwell,
+            down_dwell=args.down_dwell, max_switches=args.max_switches,
+            window=args.window, hot_temp=args.hot_temp, on_switch=log)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        governor.start()
+        print(f"starting in {governor.mode}", file=sys.stderr)
+        governor.run(args.interval, stop)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        governor.stop(restore=not args.keep)
+        governor.close()
+        print(f"{governor.ticks} ticks, {len(governor.switches)} switches, "
+              f"{governor.limited} rate limited", file=sys.stderr)
+    return 0
+
+
+def cmd_calibrate(device, args):
+    import signal
+
+    from .calibrate import Calibrator, format_tables, tables
+
+    def progress(step):
+        print(f"fan{step.fan} L{step.level}: {step.rpm:.0f} rpm after "
+              f"{step.elapsed:.1f}s" + (" (timed out)" if step.timed_out
+                                        else ""), file=sys.stderr)
+
+    try:
+        fans = tuple(int(f) for f in args.fans.split(","))
+        calibrator = Calibrator(device, fans, interval=args.interval,
+                                timeout=args.timeout, on_step=progress)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    # run() puts the modes and levels back on its way out
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+    try:
+        steps = calibrator.run()
+    except KeyboardInterrupt:
+        print("Interrupted, fans restored", file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    result = tables(steps)
+    if args.json:
+        json.dump({f"fan{fan}": {str(level): row
+                                 for level, row in levels.items()}
+                   for fan, levels in result.items()}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(format_tables(result))
+    print(f"{len(steps)} steps in {calibrator.duration:.1f} s",
+          file=sys.stderr)
+    return 0
+
+
+def _baseline(args, fan):
+    """The curves to compare against: --baseline, the fan's or the defaults"""
+    from .tuner import check_pair, default_baseline
+
+    if args.baseline:
+        try:
+            up, down = args.baseline.split("/")
+            pair = ([int(v) for v in up.split(",")],
+                    [int(v) for v in down.split(",")])
+        except ValueError:
+            raise ValueError(f"invalid --baseline {args.baseline!r}, "
+                             f"expected RAMPUP/RAMPDOWN") from None
+        check_pair(*pair)
+        return pair
+    device = Device(args.base_path, args.config)
+    if device.exists():
+        pair = (device.read_curve(fan, "rampup"),
+                device.read_curve(fan, "rampdown"))
+        if None not in pair:
+            try:
+                check_pair(*pair)
+                return pair
+            except ValueError:
+                pass
+    return default_baseline(fan)
+
+
+def cmd_tune(device, args):
+    try:
+        from . import tuner
+    except ImportError as e:
+        print(f"Error: tune needs NumPy: {e}", file=sys.stderr)
+        return 2
+    from .recording import parse_time
+
+    try:
+        fans = tuple(int(f) for f in args.fans.split(","))
+        if not fans or any(fan not in FANS for fan in fans):
+            raise ValueError(f"invalid --fans {args.fans!r}")
+        start = parse_time(args.start) if args.start else None
+        end = parse_time(args.end) if args.end else None
+        trace = tuner.load_trace(args.trace, start, end, args.ambient)
+        baseline = _baseline(args, fans[0])
+        if args.save:
+            from . import profiles
+
+            profiles.check_name(args.save)
+            table = profiles.load_profiles(args.profiles_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    front, now = tuner.tune(trace, args.candidates, args.seed, fans, baseline)
+    elapsed = time.perf_counter() - t0
+    max_temp = now.peak if args.max_temp is None else args.max_temp
+    max_switches = now.switches if args.max_switches is None \
+        else args.max_switches
+    best = tuner.pick(front, max_temp, max_switches)
+    shown = [c for c in front if c.switches <= max_switches][:args.top]
+    if best not in shown:
+        shown.append(best)
+
+    if args.json:
+        json.dump({"seconds": len(trace.power), "fans": list(fans),
+                   "baseline": now._asdict(),
+                   "front": [c._asdict() for c in front],
+                   "pick": best._asdict()}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print("  " + tuner.HEADER)
+        print("= " + tuner.format_candidate(now))
+        for candidate in shown:
+            mark = "* " if candidate == best else "  "
+            print(mark + tuner.format_candidate(candidate))
+    print(f"{len(trace.power) / 3600:.1f} h, {args.candidates} candidates "
+          f"in {elapsed:.1f} s, {len(front)} on the front; = now, * pick "
+          f"(<= {max_temp:g} °C, <= {max_switches} switches)",
+          file=sys.stderr)
+
+    if args.save:
+        table[args.save] = tuner.to_profile(best, fans)
+        profiles.save_profiles(table, args.profiles_file)
+        print(f"saved as profile {args.save!r}", file=sys.stderr)
+    return 0
+
+
+def cmd_probe(device, args):
+    from .instrument import format_table
+
+    instruments = args.instruments
+    if instruments is None:
+        print("Error: probe needs sysfs, not --broker", file=sys.stderr)
+        return 2
+    names = [a.strip() for a in args.attributes.split(",")] \
+        if args.attributes else list(ATTRIBUTES)
+    for name in names:
+        if name not in ATTRIBUTES:
+            print(f"Error: unknown attribute {name!r}", file=sys.stderr)
+            return 2
+    # one kept-open descriptor per attribute, read like the monitor does
+    samplers = [device.sampler([name]) for name in names]
+    try:
+        for _ in range(args.count):
+            for sampler in samplers:
+                sampler.read_values()
+    finally:
+        for sampler in samplers:
+            sampler.close()
+    if args.writes:
+        from .profiles import SETTINGS
+
+        # write back what is there; a level write reaches the EC in
+        # every mode, so only levels of fans in fixed mode
+        current = {name: device.read(name) for name in names
+                   if name in SETTINGS}
+        for name in list(current):
+            if current[name] is None or name.endswith("_level") and \
+                    device.read_fan_mode(int(name[3])) != "fixed":
+                del current[name]
+        for _ in range(args.count):
+            for name, value in current.items():
+                try:
+                    device.set(name, value)
+                except (OSError, ValueError):
+                    pass  # counted and kept by the instruments
+    data = instruments.as_dict()
+    if args.json:
+        json.dump(data, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(format_table(data))
+    return 0
+
+
+def cmd_profile(device, args):
+    from . import profiles
+
+    try:
+        table = profiles.load_profiles(args.file)
+        if args.action != "list":
+            if not args.name:
+                raise ValueError(f"profile {args.action} needs a NAME")
+            profiles.check_name(args.name)
+            if args.action in ("show", "apply", "delete") \
+                    and args.name not in table:
+                raise ValueError(f"no profile {args.name!r} in "
+                                 f"{args.file or profiles.PROFILES_PATH}")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.action == "list":
+        for name in sorted(table):
+            print(name)
+        return 0
+    if args.action == "show":
+        json.dump(table[args.name], sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0
+    if args.action in ("save", "delete"):
+        if args.action == "delete":
+            del table[args.name]
+        else:
+            try:
+                if args.from_config:
+                    data = load_config(args.from_config)
+                else:
+                    data = config_from_snapshot(
+                        device.snapshot(profiles.SETTINGS))
+                profiles.desired_state(data)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 2
+            table[args.name] = data
+        profiles.save_profiles(table, args.file)
+        return 0
+
+    desired = profiles.desired_state(table[args.name])
+    snapshot = device.snapshot(profiles.state_attributes(desired))
+    current = profiles.current_state(snapshot)
+    steps = profiles.plan(desired, current)
+    for step in steps:
+        print(f"{step.name}: {step.old} -> {step.value}")
+    if args.dry_run:
+        return 0
+    result = profiles.apply(device, steps, current, args.budget)
+    if result.error:
+        name, error = result.error
+        print(f"Error: writing {name} failed: {error}, "
+              + ("rolled back" if result.rolled_back
+                 else "could not roll back everything"), file=sys.stderr)
+        return 1
+    print(f"{len(result.done)} writes in {result.elapsed * 1e3:.1f} ms",
+          file=sys.stderr)
+    if result.over_budget:
+        print(f"Warning: over the {args.budget * 1e3:.0f} ms budget",
+              file=sys.stderr)
+    return 0
+
+
+def cmd_alert(device, args):
+    import signal
+
+    from .alerts import AlertEngine, load_rules
+
+    try:
+        rules = load_rules(args.rules, device)
+        engine = AlertEngine(rules)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if args.check:
+        for rule in rules:
+            print(f"{rule.name}: {type(rule).__name__.lower()} on "
+                  f"{', '.join(rule.attributes)}")
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    sampler = device.sampler(engine.attributes)
+    print(f"{len(rules)} rules on {len(engine.attributes)} attributes, "
+          f"sampling every {args.interval:g}s", file=sys.stderr)
+    try:
+        next_tick = time.monotonic()
+        while True:
+            engine.feed(sampler.read_values())
+            next_tick += args.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.close()
+        print(f"{engine.samples} samples, {engine.fired} alerts",
+              file=sys.stderr)
+    return 0
+
+
+def cmd_record(device, args):
+    import signal
+
+    from .recording import RECORD_ATTRIBUTES, Recorder
+
+    try:
+        recorder = Recorder(args.file, args.block_records)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    sampler = device.sampler(RECORD_ATTRIBUTES)
+    try:
+        next_tick = time.monotonic()
+        while True:
+            recorder.append(time.time(), sampler.read_values())
+            next_tick += args.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.close()
+        recorder.close()
+        print(f"{recorder.samples} samples", file=sys.stderr)
+    return 0
+
+
+def _local_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def cmd_replay(device, args):
+    from .recording import Recording, parse_time
+
+    try:
+        recording = Recording(args.file)
+        start = parse_time(args.start) if args.start else None
+        end = parse_time(args.end) if args.end else None
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    try:
+        if args.info:
+            count = len(recording)
+            if not count:
+                print("empty")
+                return 0
+            first, last = recording.start_time, recording.end_time
+            print(f"{count} samples in {recording.blocks} blocks, "
+                  f"{recording.size / count:.1f} bytes/sample")
+            print(f"from {_local_time(first)} to {_local_time(last)} "
+                  f"({last - first:.0f} s)")
+            return 0
+        t0 = first = None
+        for snapshot in recording.snapshots(start, end):
+            if args.speed:
+                if t0 is None:
+                    t0, first = time.monotonic(), snapshot.timestamp
+                delay = (t0 + (snapshot.timestamp - first) / args.speed
+                         - time.monotonic())
+                if delay > 0:
+                    time.sleep(delay)
+            emit(snapshot, args.json)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        recording.close()
+    return 0
+
+
+def cmd_broker(device, args):
+    from .broker import serve
+
+    try:
+        return serve(device, args.socket, args.interval, args.group)
+    except KeyError:
+        print(f"Error: no group {args.group!r}", file=sys.stderr)
+        return 2
+
+
+def read_token(path):
+    if not path:
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+
+def cmd_agent(device, args):
+    from .broker import serve
+
+    try:
+        token = read_token(args.token_file)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    return serve(device, interval=args.interval, tcp=(args.listen, args.port),
+                 token=token)
+
+
+def cmd_fleet(device, args):
+    import asyncio
+
+    from .fleet import Fleet, format_table, parse_node
+    from .profiles import load_profiles
+
+    try:
+        specs = list(args.nodes)
+        if args.nodes_file:
+            with open(args.nodes_file) as f:
+                specs += [line.strip() for line in f
+                          if line.strip() and not line.startswith("#")]
+        if not specs:
+            raise ValueError("no nodes given")
+        nodes = [parse_node(spec) for spec in specs]
+        token = read_token(args.token_file)
+        profile = None
+        if args.profile:
+            profile = load_profiles(args.profiles_file).get(args.profile)
+            if profile is None:
+                raise ValueError(f"no profile {args.profile!r}")
+        fleet = Fleet(nodes, token, timeout=args.timeout)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    async def push():
+        await fleet.wait_connected(args.timeout)
+        if profile is not None:
+            results = await fleet.push_profile(profile)
+        else:
+            results = await fleet.push_power_mode(args.power_mode)
+        failed = 0
+        for name in sorted(results):
+            error = results[name]
+            failed += error is not None
+            print(f"{name}: {'ok' if error is None else error}")
+        return 1 if failed else 0
+
+    async def show():
+        clear = "\033[H\033[J" if sys.stdout.isatty() and not args.once else ""
+        await fleet.wait_connected(args.timeout)
+        while True:
+            sys.stdout.write(clear + format_table(fleet.nodes, args.sort,
+                                                  args.reverse) + "\n")
+            sys.stdout.flush()
+            if args.once:
+                return 0
+            await asyncio.sleep(args.interval)
+
+    async def main():
+        await fleet.start()
+        try:
+            if profile is not None or args.power_mode:
+                return await push()
+            return await show()
+        finally:
+            await fleet.stop()
+
+    try:
+        return asyncio.run(main())
+    except (KeyboardInterrupt, BrokenPipeError):
+        return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="axb35", description="ec_su_axb35 command line tool")
+    parser.add_argument("--base-path", default=BASE_PATH,
+                        help=f"sysfs class directory (default {BASE_PATH})")
+    parser.add_argument("--config", default=CONFIG_PATH,
+                        help=f"config file (default {CONFIG_PATH})")
+    parser.add_argument("--broker", nargs="?", const="", default=None,
+                        metavar="SOCKET",
+                        help="go through a running `axb35 broker` instead of "
+                        "sysfs (default socket $AXB35_SOCKET or "
+                        "/run/axb35.sock)")
+    parser.add_argument("--stats", metavar="FILE", default=None,
+                        help="time every sysfs read/write and write the "
+                        "latencies and errors as JSON to FILE on exit "
+                        "(- for stderr)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("snapshot", help="print the current state once")
+    p.add_argument("--json", action="store_true", help="JSON output")
+    p.add_argument("--state", action="store_true",
+                   help="read everything at once from the driver's state "
+                   "attribute, as of its last 1 s update")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser("watch", help="sample continuously")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between samples (default 1)")
+    p.add_argument("--count", type=int, default=None,
+                   help="stop after COUNT samples")
+    p.add_argument("--json", action="store_true",
+                   help="stream NDJSON, one object per line")
+    p.add_argument("--fast", action="store_true",
+                   help="only sample temp and rpm")
+    p.add_argument("--state", action="store_true",
+                   help="sample everything with one read of the driver's "
+                   "state attribute, values are up to 1 s old")
+    p.add_argument("--adaptive", action="store_true",
+                   help="back off from --interval to --max-interval while "
+                   "temp and rpm are flat")
+    p.add_argument("--max-interval", type=float, default=10.0,
+                   help="slowest adaptive interval (default 10)")
+    p.add_argument("--temp-step", type=float, default=2,
+                   help="°C change that restores the fast rate (default 2)")
+    p.add_argument("--rpm-step", type=int, default=300,
+                   help="rpm change that restores the fast rate (default 300)")
+    p.add_argument("--changes", action="store_true",
+                   help="print modes, levels, curves and temp min/max when "
+                   "they change; the driver announces them, older drivers "
+                   "are re-read every --interval")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("export", help="serve Prometheus metrics")
+    p.add_argument("--listen", default="",
+                   help="address to bind (default all)")
+    p.add_argument("--port", type=int, default=9535,
+                   help="TCP port (default 9535)")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between samples, independent of scrapes "
+                   "(default 1)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("control",
+                       help="run the fans from userspace in fixed mode")
+    p.add_argument("--fans", default="1,2",
+                   help="fans to control (default 1,2)")
+    p.add_argument("--tick", type=float, default=0.1,
+                   help="seconds between control steps (default 0.1)")
+    p.add_argument("--curve", default="40:0,50:1,68:2,78:3,86:4,93:5",
+                   help="temp:level points to interpolate between")
+    p.add_argument("--hysteresis", type=float, default=3.0,
+                   help="°C to cool down before a level drops (default 3)")
+    p.add_argument("--pid", type=float, default=None, metavar="TEMP",
+                   help="use a PID towards TEMP °C instead of --curve")
+    p.add_argument("--up-interval", type=float, default=0.5,
+                   help="min seconds between level increases (default 0.5)")
+    p.add_argument("--down-interval", type=float, default=5.0,
+                   help="min seconds between level decreases (default 5)")
+    p.add_argument("--panic-temp", type=float, default=95,
+                   help="all controlled fans to level 5 at this °C "
+                   "(default 95)")
+    p.set_defaults(func=cmd_control)
+
+    p = sub.add_parser("governor",
+                       help="set the APU power mode from the CPU load")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between load samples (default 1)")
+    p.add_argument("--up", default="25,60",
+                   help="%% CPU to go from quiet, from balanced up "
+                   "(default 25,60)")
+    p.add_argument("--down", default="10,40",
+                   help="%% CPU to go to quiet, to balanced down "
+                   "(default 10,40)")
+    p.add_argument("--min-dwell", type=float, default=5.0,
+                   help="min seconds in a mode (default 5)")
+    p.add_argument("--down-dwell", type=float, default=30.0,
+                   help="seconds of low load before stepping down "
+                   "(default 30)")
+    p.add_argument("--max-switches", type=int, default=6,
+                   help="max switches per --window (default 6)")
+    p.add_argument("--window", type=float, default=60.0,
+                   help="seconds the rate limit counts over (default 60)")
+    p.add_argument("--hot-temp", type=float, default=90,
+                   help="no performance mode from this °C (default 90)")
+    p.add_argument("--proc-stat", default="/proc/stat",
+                   help=argparse.SUPPRESS)
+    p.add_argument("--keep", action="store_true",
+                   help="leave the last mode on exit instead of the "
+                   "one it started with")
+    p.set_defaults(func=cmd_governor)
+
+    p = sub.add_parser("calibrate", help="measure level -> rpm tables and "
+                       "spin-up/down times of the fans")
+    p.add_argument("--fans", default="1,2,3",
+                   help="fans to sweep, all at once (default 1,2,3)")
+    p.add_argument("--interval", type=float, default=0.05,
+                   help="seconds between rpm samples (default 0.05)")
+    p.add_argument("--timeout", type=float, default=20.0,
+                   help="max seconds per level before the last readings "
+                   "are taken as they are (default 20)")
+    p.add_argument("--json", action="store_true", help="print JSON tables")
+    p.set_defaults(func=cmd_calibrate)
+
+    p = sub.add_parser("tune", help="search fan curves offline on a "
+                       "recorded or load trace (needs NumPy)")
+    p.add_argument("trace", help="an `axb35 record` file, or a CSV with "
+                   "time,load[,power_mode] columns")
+    p.add_argument("--start", default=None,
+                   help="unix time or ISO 8601 local time")
+    p.add_argument("--end", default=None,
+                   help="unix time or ISO 8601 local time")
+    p.add_argument("--fans", default="1,2",
+                   help="fans the curves are for, the others stay on the "
+                   "EC's auto curve (default 1,2)")
+    p.add_argument("--candidates", type=int, default=2048,
+                   help="curve pairs to try (default 2048)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--ambient", type=float, default=25.0,
+                   help="room temperature in °C (default 25)")
+    p.add_argument("--baseline", metavar="RAMPUP/RAMPDOWN",
+                   help="curves to compare with, e.g. "
+                   "60,70,83,95,97/40,50,80,94,96 (default the first fan's "
+                   "current curves, or the driver's)")
+    p.add_argument("--max-temp", type=float, default=None,
+                   help="peak °C the pick may reach (default the "
+                   "baseline's)")
+    p.add_argument("--max-switches", type=int, default=None,
+                   help="level switches the pick may make (default the "
+                   "baseline's)")
+    p.add_argument("--top", type=int, default=15,
+                   help="front entries to list (default 15)")
+    p.add_argument("--json", action="store_true",
+                   help="the whole front as JSON")
+    p.add_argument("--save", metavar="NAME",
+                   help="save the pick as a profile")
+    p.add_argument("--profiles-file", default=None,
+                   help="profiles file for --save")
+    p.set_defaults(func=cmd_tune, local=False)
+
+    p = sub.add_parser("probe", help="time the reads (and writes) of "
+                       "every attribute")
+    p.add_argument("--attributes", default=None,
+                   help="comma separated attributes (default all)")
+    p.add_argument("--count", type=int, default=20,
+                   help="reads per attribute (default 20)")
+    p.add_argument("--writes", action="store_true",
+                   help="also write the current value of every setting "
+                   "back COUNT times (levels only in fixed mode)")
+    p.add_argument("--json", action="store_true",
+                   help="the full histograms as JSON")
+    p.set_defaults(func=cmd_probe, trace=True)
+
+    p = sub.add_parser("profile", help="list, apply or save named profiles")
+    p.add_argument("action", choices=("list", "show", "apply", "save",
+                                      "delete"))
+    p.add_argument("name", nargs="?")
+    p.add_argument("--file", default=None,
+                   help="profiles file (default $AXB35_PROFILES or "
+                   "/etc/ec-fan-control.profiles.json)")
+    p.add_argument("--dry-run", action="store_true",
+                   help="only print the writes apply would do")
+    p.add_argument("--budget", type=float, default=0.5,
+                   help="warn when apply takes longer, seconds (default 0.5)")
+    p.add_argument("--from-config", metavar="FILE",
+                   help="save a GUI config file instead of the current state")
+    p.set_defaults(func=cmd_profile)
+
+    p = sub.add_parser("alert", help="evaluate alert rules on every sample")
+    p.add_argument("--rules", default=None,
+                   help="rules file (default $AXB35_ALERTS or "
+                   "/etc/ec-fan-control.alerts.json)")
+    p.add_argument("--interval", type=float, default=0.1,
+                   help="seconds between samples (default 0.1)")
+    p.add_argument("--check", action="store_true",
+                   help="only load and list the rules")
+    p.set_defaults(func=cmd_alert)
+
+    p = sub.add_parser("record", help="append samples to a binary "
+                       "recording")
+    p.add_argument("file")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between samples (default 1)")
+    p.add_argument("--block-records", type=int, default=4096,
+                   help="records per index block of a new file "
+                   "(default 4096)")
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser("replay", help="print the samples of a recording")
+    p.add_argument("file")
+    p.add_argument("--start", help="unix time or ISO 8601 local time")
+    p.add_argument("--end", help="unix time or ISO 8601 local time")
+    p.add_argument("--speed", type=float, default=0,
+                   help="pace the output at SPEED times real time "
+                   "(default 0, as fast as possible)")
+    p.add_argument("--json", action="store_true",
+                   help="NDJSON, like watch --json")
+    p.add_argument("--info", action="store_true",
+                   help="print the length and time range only")
+    p.set_defaults(func=cmd_replay, local=False)
+
+    p = sub.add_parser("broker",
+                       help="sample once for everyone, serve a Unix socket")
+    p.add_argument("--socket", default=None,
+                   help="socket path (default $AXB35_SOCKET or "
+                   "/run/axb35.sock)")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between samples (default 1)")
+    p.add_argument("--group", default=None,
+                   help="members of GROUP may write, besides root")
+    p.set_defaults(func=cmd_broker)
+
+    p = sub.add_parser("agent", help="broker on TCP for `axb35 fleet`")
+    p.add_argument("--listen", default="",
+                   help="address to bind (default all)")
+    p.add_argument("--port", type=int, default=9536,
+                   help="TCP port (default 9536)")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between samples (default 1)")
+    p.add_argument("--token-file", default=None,
+                   help="shared secret that allows writes, without one "
+                   "the agent is read-only")
+    p.set_defaults(func=cmd_agent)
+
+    p = sub.add_parser("fleet", help="table of many agents, bulk pushes")
+    p.add_argument("nodes", nargs="*", metavar="NODE",
+                   help="[name=]host[:port] of an agent")
+    p.add_argument("--nodes-file", help="one NODE per line")
+    p.add_argument("--token-file", default=None,
+                   help="agents' shared secret, needed for pushes")
+    p.add_argument("--sort", default="node",
+                   choices=("node", "temp", "fan1", "fan2", "fan3", "power",
+                            "age"),
+                   help="table column to sort by (default node)")
+    p.add_argument("--reverse", action="store_true", help="sort descending")
+    p.add_argument("--interval", type=float, default=1.0,
+                   help="seconds between table refreshes (default 1)")
+    p.add_argument("--once", action="store_true",
+                   help="print the table once all nodes answered")
+    p.add_argument("--timeout", type=float, default=5.0,
+                   help="connect/request timeout (default 5)")
+    p.add_argument("--power-mode", choices=("quiet", "balanced",
+                                            "performance"),
+                   help="set the power mode on all nodes and exit")
+    p.add_argument("--profile", metavar="NAME",
+                   help="apply a local profile on all nodes and exit")
+    p.add_argument("--profiles-file", default=None,
+                   help="profiles file for --profile")
+    p.set_defaults(func=cmd_fleet, local=False)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.instruments = None
+    if not getattr(args, "local", True):
+        # talks to other machines only
+        return args.func(None, args)
+    if args.broker is not None and args.func is not cmd_broker:
+        from .broker import RemoteDevice
+
+        try:
+            device = RemoteDevice(args.broker or None, args.config)
+        except OSError as e:
+            print(f"Error: can't reach the broker: {e}", file=sys.stderr)
+            return 2
+    else:
+        io = OS_IO
+        if args.stats is not None or getattr(args, "trace", False):
+            from .instrument import Instruments, TracedIO
+
+            args.instruments = Instruments(enabled=True)
+            io = TracedIO(OS_IO, args.base_path, args.instruments)
+        device = Device(args.base_path, args.config, io=io)
+    if not device.exists():
+        print(f"Error: {device.base_path} not found, is ec_su_axb35 loaded?",
+              file=sys.stderr)
+        return 2
+    try:
+        return args.func(device, args)
+    finally:
+        device.close()
+        if args.stats is not None and args.instruments is not None:
+            dump_stats(args.instruments, args.stats)
+
+
+def dump_stats(instruments, path):
+    data = json.dumps(instruments.as_dict(), indent=2) + "\n"
+    if path == "-":
+        sys.stderr.write(data)
+        return
+    try:
+        with open(path, "w") as f:
+            f.write(data)
+    except OSError as e:
+        print(f"Error: can't write {path}: {e}", file=sys.stderr)
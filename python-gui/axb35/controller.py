@@ -0,0 +1,270 @@
+"""
+Userspace closed-loop fan control.
+
+The driver's curve mode steps one level per second between the ten
+rampup/rampdown thresholds. FanController instead puts the fans in
+fixed mode and writes `level` itself, at any tick rate, from a policy:
+
+  CurvePolicy  piecewise linear temp -> level map with hysteresis
+  PidPolicy    PID on the distance to a target temperature
+
+Level changes are rate limited per fan. A tick reads temp1/temp only
+(one EC read) and writes a level only when it changes.
+"""
+import math
+import time
+
+from .sysfs import FANS
+
+# level 1 from 50 °C like the driver's curves for fans 1/2, which only
+# stop them below 40 °C: a 0/1 step in the idle range starts and stops
+# the fans on every load spike
+DEFAULT_POINTS = ((40, 0), (50, 1), (68, 2), (78, 3), (86, 4), (93, 5))
+
+
+def parse_points(text):
+    """Parse "50:0,60:1,..." into ((50.0, 0.0), (60.0, 1.0), ...)"""
+    points = []
+    for part in text.split(","):
+        temp, sep, level = part.partition(":")
+        if not sep:
+            raise ValueError(f"invalid curve point {part!r}")
+        points.append((float(temp), float(level)))
+    return tuple(points)
+
+
+class CurvePolicy:
+    """
+    Linear interpolation between (temp, level) points. Rising goes to
+    the level reached at the current temperature, falling waits until
+    the temperature is `hysteresis` °C below where the level was
+    reached.
+    """
+
+    def __init__(self, points=DEFAULT_POINTS, hysteresis=3.0):
+        points = sorted(points)
+        if len(points) < 2:
+            raise ValueError("a curve needs at least two points")
+        if any(b[1] < a[1] for a, b in zip(points, points[1:])):
+            raise ValueError("curve levels must not decrease with temperature")
+        self.temps = [float(t) for t, _ in points]
+        self.levels = [min(5.0, max(0.0, float(lv))) for _, lv in points]
+        self.hysteresis = hysteresis
+
+    def level_at(self, temp):
+        temps, levels = self.temps, self.levels
+        if temp <= temps[0]:
+            return levels[0]
+        if temp >= temps[-1]:
+            return levels[-1]
+        for i in range(1, len(temps)):
+            if temp < temps[i]:
+                t0, t1 = temps[i - 1], temps[i]
+                l0, l1 = levels[i - 1], levels[i]
+                return l0 + (l1 - l0) * (temp - t0) / (t1 - t0)
+        return levels[-1]
+
+    def target(self, temp, level, dt):
+        up = int(self.level_at(temp))
+        if up > level:
+            return up
+        down = int(self.level_at(temp + self.hysteresis))
+        return down if down < level else level
+
+    def reset(self):
+        pass
+
+
+class PidPolicy:
+    """
+    PID towards `setpoint` °C with the output clamped to 0-5. The
+    integral stops growing while the output is saturated, the
+    derivative is low-pass filtered over `d_tau` seconds because temp
+    only comes in whole degrees, and the level only changes once the
+    output is `deadband` past the half-way mark.
+    """
+
+    def __init__(self, setpoint=75.0, kp=0.3, ki=0.005, kd=1.0, d_tau=10.0,
+                 deadband=0.4):
+        self.setpoint = setpoint
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.d_tau = d_tau
+        self.deadband = deadband
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_error = None
+
+    def target(self, temp, level, dt):
+        error = temp - self.setpoint
+        if self.last_error is not None and dt > 0:
+            alpha = dt / (self.d_tau + dt)
+            raw = (error - self.last_error) / dt
+            self.derivative += alpha * (raw - self.derivative)
+        derivative = self.derivative
+        self.last_error = error
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        if 0.0 < output < 5.0 or (output <= 0.0) != (error < 0):
+            self.integral += error * dt
+        output = min(5.0, max(0.0, output))
+        if abs(output - level) < 0.5 + self.deadband:
+            return level
+        return int(round(output))
+
+
+class RateLimiter:
+    """
+    Lets a fan's level go up by any amount at most every `up_interval`
+    seconds and down one level at most every `down_interval` seconds
+    """
+
+    def __init__(self, up_interval=0.5, down_interval=5.0):
+        self.up_interval = up_interval
+        self.down_interval = down_interval
+        self.last_change = -math.inf
+
+    def limit(self, now, level, target):
+        if target == level:
+            return level
+        since = now - self.last_change
+        if target > level:
+            if since < self.up_interval:
+                return level
+        else:
+            if since < self.down_interval:
+                return level
+            target = level - 1
+        self.last_change = now
+        return target
+
+
+class FanController:
+    """
+    Runs a policy for each of `fans` on `device`, made by calling
+    `policy` (a class or factory, like `limiter`) once per fan so a
+    stateful one sees a single fan's ticks. start() switches them to fixed
+    mode, stop() puts back the modes they had. A fan whose mode is
+    changed by someone else (checked every `mode_check` seconds) is
+    handed over and no longer touched. At `panic_temp` all fans go to
+    level 5 at once, and when temp can't be read for `max_failures`
+    ticks the controller gives the fans back to the driver.
+    """
+
+    def __init__(self, device, policy, fans=(1, 2), tick=0.1,
+                 limiter=RateLimiter, panic_temp=95, mode_check=5.0,
+                 max_failures=10, clock=time.monotonic):
+        for fan in fans:
+            if fan not in FANS:
+                raise ValueError(f"invalid fan {fan!r}")
+        self.device = device
+        self.fans = tuple(fans)
+        self.tick_interval = tick
+        self.panic_temp = panic_temp
+        self.mode_check = mode_check
+        self.max_failures = max_failures
+        self.clock = clock
+        self.sampler = device.sampler(("temp",))
+        self.policies = {fan: policy() for fan in self.fans}
+        self.limiters = {fan: limiter() for fan in self.fans}
+        self.levels = {}
+        self.saved_modes = {}
+        self.saved_levels = {}
+        self.ticks = 0
+        self.level_writes = 0
+        self.failures = 0
+        self.running = False
+        self._last_tick = None
+        self._next_mode_check = 0.0
+
+    def start(self):
+        for fan in self.fans:
+            self.saved_modes[fan] = self.device.read_fan_mode(fan)
+            level = self.saved_levels[fan] = self.device.read_fan_level(fan)
+            self.device.set_fan_mode(fan, "fixed")
+            self.levels[fan] = level if level is not None else 5
+            self.device.set_fan_level(fan, self.levels[fan])
+        for policy in self.policies.values():
+            policy.reset()
+        self.running = True
+        self._next_mode_check = self.clock() + self.mode_check
+
+    def stop(self):
+        """Give the fans back in the mode (and fixed level) they had"""
+        self.running = False
+        for fan in list(self.levels):
+            mode = self.saved_modes.get(fan) or "curve"
+            try:
+                self.device.set_fan_mode(fan, mode)
+                if mode == "fixed" and self.saved_levels.get(fan) is not None:
+                    self.device.set_fan_level(fan, self.saved_levels[fan])
+            except (OSError, ValueError) as e:
+                print(f"Failed to restore fan{fan} mode: {e}")
+        self.levels.clear()
+        self.sampler.close()
+
+    def _release(self, fan, reason):
+        print(f"fan{fan}: {reason}, leaving it alone")
+        del self.levels[fan]
+
+    def _set_level(self, fan, level):
+        try:
+            self.device.set_fan_level(fan, level)
+        except OSError as e:
+            print(f"Failed to set fan{fan} level: {e}")
+            return
+        self.levels[fan] = level
+        self.level_writes += 1
+
+    def tick(self, now=None):
+        """One control step, returns the temperature it acted on"""
+        now = self.clock() if now is None else now
+        dt = 0.0 if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+        self.ticks += 1
+        temp = self.sampler.read_values()["temp"]
+        if temp is None:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                print("Can't read the temperature, back to driver control")
+                self.stop()
+            return None
+        self.failures = 0
+
+        if now >= self._next_mode_check:
+            self._next_mode_check = now + self.mode_check
+            for fan in list(self.levels):
+                mode = self.device.read_fan_mode(fan)
+                if mode != "fixed":
+                    self._release(fan, f"mode changed to {mode}")
+
+        panic = temp >= self.panic_temp
+        for fan, level in list(self.levels.items()):
+            if panic:
+                target = 5
+            else:
+                target = self.policies[fan].target(temp, level, dt)
+                target = self.limiters[fan].limit(now, level, target)
+            if target != level:
+                self._set_level(fan, target)
+        return temp
+
+    def run(self, stop_event=None):
+        """Tick every `tick_interval` seconds until stopped"""
+        next_tick = self.clock()
+        while self.running and self.levels:
+            if stop_event is not None and stop_event.is_set():
+                break
+            self.tick()
+            next_tick += self.tick_interval
+            delay = next_tick - self.clock()
+            if delay > 0:
+                if stop_event is not None:
+                    stop_event.wait(delay)
+                else:
+                    time.sleep(delay)
+            else:
+                next_tick = self.clock()
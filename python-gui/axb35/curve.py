@@ -0,0 +1,99 @@
+"""
+The rampup/rampdown curves of one fan, without any Tk.
+
+Both curves must rise from level 1 to level 5, and the rampdown point
+of a level must not be above its rampup point, or the driver would
+drop a level at a temperature that raises it again. Moving a point
+fixes everything it pushes in one pass and returns only the points
+that changed, so a view moves those and nothing else. Moving a point
+to where it already is changes nothing, which is how views ignore the
+echo of their own updates.
+"""
+from collections import namedtuple
+
+from .sysfs import CURVES
+
+POINTS = 5
+# the GUI's slider range, the driver takes 0..100
+TEMP_RANGE = (30, 100)
+
+# one moved point, value in °C
+Change = namedtuple("Change", "curve index value")
+
+
+class CurveModel:
+    """
+    Both curves of a fan. A curve that hasn't been read yet is all
+    None; its points can be moved but constrain nothing.
+    """
+
+    def __init__(self, rampup=None, rampdown=None, temp_range=TEMP_RANGE):
+        self.temp_range = temp_range
+        self.values = {curve: [None] * POINTS for curve in CURVES}
+        self.moves = 0
+        self.changes = 0
+        if rampup:
+            self.load("rampup", rampup)
+        if rampdown:
+            self.load("rampdown", rampdown)
+
+    def curve(self, curve_type):
+        """The points of a curve, None if it isn't known yet"""
+        values = self.values[curve_type]
+        return None if None in values else list(values)
+
+    def load(self, curve_type, values):
+        """
+        Take a curve as read from the device, as it is. Returns the
+        Changes against what was shown.
+        """
+        if values is None or len(values) != POINTS:
+            return []
+        current = self.values[curve_type]
+        changes = []
+        for i, value in enumerate(values):
+            value = int(value)
+            if current[i] != value:
+                current[i] = value
+                changes.append(Change(curve_type, i, value))
+        self.changes += len(changes)
+        return changes
+
+    def move(self, curve_type, index, value):
+        """
+        Put a point at `value` °C and push the points in its way: the
+        later points of its curve up to it, the earlier ones down, and
+        the other curve's points so rampdown stays at or below rampup.
+        Returns the Changes, the moved point first.
+        """
+        lo, hi = self.temp_range
+        value = min(max(int(round(float(value))), lo), hi)
+        values = self.values[curve_type]
+        self.moves += 1
+        if values[index] == value:
+            return []
+        changes = [Change(curve_type, index, value)]
+        values[index] = value
+        for i in range(POINTS):
+            if i == index or values[i] is None:
+                continue
+            if (i > index and values[i] < value or
+                    i < index and values[i] > value):
+                values[i] = value
+                changes.append(Change(curve_type, i, value))
+        # the other curve was ordered and this one still is, so taking
+        # the min (or max) per level keeps both ordered
+        if curve_type == "rampup":
+            other, limit = "rampdown", min
+        else:
+            other, limit = "rampup", max
+        others = self.values[other]
+        for i in range(POINTS):
+            if others[i] is None or values[i] is None:
+                continue
+            bound = limit(others[i], values[i])
+            if bound != others[i]:
+                others[i] = bound
+                changes.append(Change(other, i, bound))
+        self.changes += len(changes)
+        return changes
@@ -0,0 +1,166 @@
+"""
+Canvas view of a CurveModel: levels 1-5 left to right, °C bottom to
+top, and a handle per point that can be dragged up and down
+"""
+import tkinter as tk
+from tkinter import ttk
+
+from .curve import POINTS
+from .sysfs import CURVES
+
+COLORS = {"rampup": "#d62728", "rampdown": "#1f77b4"}
+MARGIN = 24
+RADIUS = 5
+# coordinates that hide an item while there is nothing to show
+EMPTY = (0, 0, 0, 0)
+
+
+class CurveEditor(ttk.Frame):
+    """
+    Items are created once; a drag event moves only the handles of the
+    points the model changed and the lines they are on. `on_change`
+    gets the Changes of every event.
+    """
+
+    def __init__(self, parent, model, on_change=None, width=240, height=150):
+        super().__init__(parent)
+        self.model = model
+        self.on_change = on_change
+        self.canvas = tk.Canvas(self, width=width, height=height,
+                                background="white", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.canvas.bind('<Configure>', lambda e: self._layout())
+
+        self.axis_items = []
+        self.lines = {}
+        self.handles = {}
+        # (curve, index) of the handle being dragged
+        self.drag = None
+        for curve in CURVES:
+            color = COLORS[curve]
+            self.lines[curve] = self.canvas.create_line(*EMPTY, fill=color,
+                                                        width=2)
+            self.handles[curve] = []
+            for i in range(POINTS):
+                item = self.canvas.create_oval(*EMPTY, fill=color,
+                                               outline=color)
+                self.canvas.tag_bind(item, '<ButtonPress-1>',
+                                     lambda e, c=curve, i=i: self._grab(c, i))
+                self.handles[curve].append(item)
+        self.canvas.bind('<B1-Motion>', self._on_drag)
+        self.canvas.bind('<ButtonRelease-1>', lambda e: self._release())
+        self.value_text = self.canvas.create_text(0, 0, text="",
+                                                  anchor=tk.S)
+
+    def _layout(self):
+        c = self.canvas
+        for item in self.axis_items:
+            c.delete(item)
+        w, h = c.winfo_width(), c.winfo_height()
+        lo, hi = self.model.temp_range
+        self.axis_items = [
+            c.create_rectangle(MARGIN, MARGIN // 2, w - MARGIN // 2,
+                               h - MARGIN, outline="#ccc"),
+            c.create_text(MARGIN - 2, MARGIN // 2, text=f"{hi}",
+                          anchor=tk.NE),
+            c.create_text(MARGIN - 2, h - MARGIN, text=f"{lo}",
+                          anchor=tk.SE),
+        ]
+        self.axis_items += [
+            c.create_text(self._x(i), h - MARGIN + 2, text=f"L{i + 1}",
+                          anchor=tk.N)
+            for i in range(POINTS)]
+        for item in self.axis_items:
+            c.tag_lower(item)
+        self.redraw()
+
+    def _x(self, index):
+        w = self.canvas.winfo_width()
+        return MARGIN + index * (w - MARGIN * 3 // 2) / (POINTS - 1)
+
+    def _y(self, temp):
+        h = self.canvas.winfo_height()
+        lo, hi = self.model.temp_range
+        top, bottom = MARGIN // 2, h - MARGIN
+        return bottom - (temp - lo) * (bottom - top) / (hi - lo)
+
+    def _temp(self, y):
+        h = self.canvas.winfo_height()
+        lo, hi = self.model.temp_range
+        top, bottom = MARGIN // 2, h - MARGIN
+        return lo + (bottom - y) * (hi - lo) / (bottom - top)
+
+    def redraw(self):
+        """Move every item to the model's values"""
+        for curve in CURVES:
+            for i in range(POINTS):
+                self._move_handle(curve, i)
+            self._move_line(curve)
+
+    def show(self, changes):
+        """Move the items of the changed points only"""
+        curves = set()
+        for change in changes:
+            self._move_handle(change.curve, change.index)
+            curves.add(change.curve)
+        for curve in curves:
+            self._move_line(curve)
+        if self.drag is not None:
+            self._move_value_text()
+
+    def _move_handle(self, curve, index):
+        value = self.model.values[curve][index]
+        item = self.handles[curve][index]
+        if value is None:
+            self.canvas.coords(item, *EMPTY)
+            return
+        x, y = self._x(index), self._y(value)
+        self.canvas.coords(item, x - RADIUS, y - RADIUS,
+                           x + RADIUS, y + RADIUS)
+
+    def _move_line(self, curve):
+        values = self.model.curve(curve)
+        if values is None:
+            self.canvas.coords(self.lines[curve], *EMPTY)
+            return
+        coords = []
+        for i, value in enumerate(values):
+            coords += (self._x(i), self._y(value))
+        self.canvas.coords(self.lines[curve], *coords)
+
+    def _move_value_text(self):
+        curve, index = self.drag
+        value = self.model.values[curve][index]
+        self.canvas.coords(self.value_text, self._x(index),
+                           self._y(value) - RADIUS - 2)
+
+    def _grab(self, curve, index):
+        value = self.model.values[curve][index]
+        if value is None:
+            return
+        self.drag = (curve, index)
+        self.canvas.itemconfig(self.value_text, text=f"{value}°C")
+        self._move_value_text()
+
+    def _on_drag(self, event):
+        if self.drag is None:
+            return
+        curve, index = self.drag
+        self.move(curve, index, self._temp(event.y))
+
+    def move(self, curve, index, value):
+        """Move a point as a drag would, returns the Changes"""
+        changes = self.model.move(curve, index, value)
+        if not changes:
+            return changes
+        self.show(changes)
+        if self.drag is not None:
+            self.canvas.itemconfig(self.value_text,
+                                   text=f"{changes[0].value}°C")
+        if self.on_change:
+            self.on_change(changes)
+        return changes
+
+    def _release(self):
+        self.drag = None
+        self.canvas.itemconfig(self.value_text, text="")
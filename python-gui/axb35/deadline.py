@@ -0,0 +1,146 @@
+"""
+Sampling that a stuck sysfs read can't freeze.
+
+An EC read can hang for seconds, e.g. while the firmware is busy or
+the module is reloaded. DeadlineSampler reads its attributes on a
+fixed number of worker threads and waits only until each attribute's
+deadline: what didn't arrive keeps its last value and is marked stale
+in the snapshot. An attribute has at most one read in flight, so a
+stuck one ties up one worker however many ticks it misses, and the
+queue holds at most one read per attribute. No thread is ever started
+after the first read.
+"""
+import threading
+import time
+from collections import deque
+
+from .sysfs import ATTRIBUTES, Snapshot
+
+
+class DeadlineSampler:
+    """
+    Reads `attributes` (default all) of `device` with `workers` threads.
+    A read waits `deadline` seconds, or `deadlines[name]`, for each
+    attribute. `stale` maps the attributes the last read gave up on to
+    the age of the value returned for them (None if never read).
+    """
+
+    def __init__(self, device, attributes=None, deadline=0.5, deadlines=None,
+                 workers=4, clock=time.monotonic):
+        self.device = device
+        self.attributes = tuple(attributes or ATTRIBUTES)
+        self.deadline = deadline
+        self.deadlines = dict(deadlines or {})
+        self.workers = workers
+        self.clock = clock
+        self.stale = {}
+        self.reads = 0
+        # reads with stale attributes, attribute reads that were late
+        self.partial = 0
+        self.missed = 0
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._in_flight = set()
+        # name -> (value, clock() when the read finished)
+        self._values = {}
+        # name -> one-attribute sampler, used by one worker at a time
+        self._samplers = {}
+        self._threads = []
+        self._running = True
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True,
+                                      name=f"axb35-reader-{i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                name = self._queue.popleft()
+                sampler = self._samplers.get(name)
+                if sampler is None:
+                    sampler = self._samplers[name] = \
+                        self.device.sampler([name])
+            try:
+                value = sampler.read_values().get(name)
+            except Exception:
+                value = None
+            with self._cond:
+                self._in_flight.discard(name)
+                self._values[name] = (value, self.clock())
+                if not self._running:
+                    # closed while this read hung
+                    sampler.close()
+                self._cond.notify_all()
+
+    def read_values(self, attributes=None, deadline=None):
+        """
+        Read `attributes` (default all of this sampler), returns a
+        name -> parsed value dict; see `stale` for the ones that are old.
+        `deadline` overrides the sampler's for this read.
+        """
+        names = tuple(attributes or self.attributes)
+        start = self.clock()
+        with self._cond:
+            if not self._threads:
+                self._start()
+            for name in names:
+                if name in self._in_flight:
+                    # still hung from an earlier read
+                    continue
+                self._in_flight.add(name)
+                self._queue.append(name)
+            self._cond.notify_all()
+            self.reads += 1
+
+            if deadline is None:
+                ends = {name: start + self.deadlines.get(name, self.deadline)
+                        for name in names}
+            else:
+                ends = dict.fromkeys(names, start + deadline)
+            waiting = set(names)
+            stale = {}
+            while waiting:
+                now = self.clock()
+                for name in list(waiting):
+                    value = self._values.get(name)
+                    if value is not None and value[1] >= start:
+                        waiting.discard(name)
+                    elif ends[name] <= now:
+                        waiting.discard(name)
+                        stale[name] = None if value is None else now - value[1]
+                if waiting:
+                    self._cond.wait(min(ends[n] for n in waiting) - now)
+            values = {name: self._values.get(name, (None, 0))[0]
+                      for name in names}
+        if stale:
+            self.partial += 1
+            self.missed += len(stale)
+        self.stale = stale
+        return values
+
+    def sample(self, attributes=None, deadline=None):
+        """Read once and return a Snapshot, stale attributes marked"""
+        values = self.read_values(attributes, deadline)
+        return Snapshot.from_values(time.time(), values, self.stale)
+
+    def close(self):
+        """Stop the workers, hung ones close their sampler on return"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            for name, sampler in self._samplers.items():
+                if name not in self._in_flight:
+                    sampler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,129 @@
+"""
+Debug window of the GUI: per-attribute EC latency and error counts,
+loop timers and the last errors from the Instruments, refreshed every
+second. Instrumentation is on while the window is open.
+"""
+import json
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+
+COLUMNS = (("reads", 60), ("read p50", 70), ("read p99", 70),
+           ("read max", 70), ("writes", 55), ("write p50", 70),
+           ("write max", 70), ("errors", 50))
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1e3:.2f}"
+
+
+class DebugPanel(tk.Toplevel):
+    """
+    `counters()`, if given, returns more name -> value pairs to show,
+    e.g. the Writer's and UiStats' counters. `keep_enabled` leaves the
+    instrumentation on when the window is closed.
+    """
+
+    def __init__(self, parent, instruments, counters=None,
+                 keep_enabled=False, interval=1000):
+        super().__init__(parent)
+        self.title("Debug - ec_su_axb35")
+        self.geometry("760x520")
+        self.instruments = instruments
+        self.counters = counters
+        self.keep_enabled = keep_enabled
+        self.interval = interval
+        self._after = None
+        instruments.enable()
+
+        bar = ttk.Frame(self, padding=5)
+        bar.pack(fill=tk.X)
+        ttk.Label(bar, text="latencies in ms").pack(side=tk.LEFT)
+        ttk.Button(bar, text="Save JSON...",
+                   command=self.save_json).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(bar, text="Reset",
+                   command=self.reset).pack(side=tk.RIGHT, padx=5)
+
+        self.tree = ttk.Treeview(self, columns=[c for c, _ in COLUMNS],
+                                 height=14)
+        self.tree.heading("#0", text="attribute / timer")
+        self.tree.column("#0", width=170)
+        for name, width in COLUMNS:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=width, anchor=tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+        self.counters_label = ttk.Label(self, padding=5, justify=tk.LEFT)
+        self.counters_label.pack(fill=tk.X)
+        ttk.Label(self, text="Last errors:", padding=(5, 0)).pack(anchor=tk.W)
+        self.errors_text = tk.Text(self, height=6, state=tk.DISABLED)
+        self.errors_text.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self._shown_errors = None
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self):
+        data = self.instruments.as_dict()
+        rows = {}
+        for name, a in data["attributes"].items():
+            r, w = a["reads"], a["writes"]
+            rows[name] = (r["count"], _ms(r["p50"]), _ms(r["p99"]),
+                          _ms(r["max"] if r["count"] else None), w["count"],
+                          _ms(w["p50"]), _ms(w["max"] if w["count"] else None),
+                          a["read_errors"] + a["write_errors"])
+        for name, t in data["timers"].items():
+            rows[name] = (t["count"], _ms(t["p50"]), _ms(t["p99"]),
+                          _ms(t["max"]), "", "", "", "")
+        for iid in self.tree.get_children():
+            if iid not in rows:
+                self.tree.delete(iid)
+        for name, values in rows.items():
+            if self.tree.exists(name):
+                if tuple(self.tree.item(name, "values")) != tuple(
+                        str(v) for v in values):
+                    self.tree.item(name, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=name, text=name,
+                                 values=values)
+
+        if self.counters:
+            text = "  ".join(f"{k} {v}" for k, v in self.counters().items())
+            self.counters_label.config(text=text)
+
+        errors = data["errors"]
+        if errors != self._shown_errors:
+            self._shown_errors = errors
+            self.errors_text.config(state=tk.NORMAL)
+            self.errors_text.delete("1.0", tk.END)
+            for e in errors[-20:]:
+                stamp = time.strftime("%H:%M:%S", time.localtime(e["time"]))
+                self.errors_text.insert(
+                    tk.END, f"{stamp} {e['source']}: {e['message']}\n")
+            self.errors_text.config(state=tk.DISABLED)
+        self._after = self.after(self.interval, self.refresh)
+
+    def reset(self):
+        self.instruments.reset()
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+
+    def save_json(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".json",
+            initialfile="axb35-debug.json")
+        if not path:
+            return
+        try:
+            with open(path, "w") as f:
+                json.dump(self.instruments.as_dict(), f, indent=2)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save:\n{e}",
+                                 parent=self)
+
+    def close(self):
+        if self._after is not None:
+            self.after_cancel(self._after)
+        if not self.keep_enabled:
+            self.instruments.enable(False)
+        self.destroy()
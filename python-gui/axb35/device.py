@@ -0,0 +1,228 @@
+"""
+Tk-free access to the EC: reading state, writing settings and the
+JSON config file shared with the GUI
+"""
+import json
+import os
+
+from .notify import ChangeWatcher
+from .sysfs import (
+    ATTRIBUTES,
+    BASE_PATH,
+    CURVES,
+    FAN_MODES,
+    FANS,
+    OS_IO,
+    POWER_MODES,
+    StateSampler,
+    SysfsSampler,
+    has_state,
+    parse_value,
+    read_sysfs,
+    write_sysfs,
+)
+
+CONFIG_PATH = os.environ.get("AXB35_CONFIG") or "/etc/ec-fan-control.json"
+
+
+class Device:
+    """The ec_su_axb35 class directory at `base_path`"""
+
+    def __init__(self, base_path=None, config_path=None, io=OS_IO):
+        self.base_path = base_path or BASE_PATH
+        self.config_path = config_path or CONFIG_PATH
+        self.io = io
+        self._samplers = {}
+
+    def path(self, name):
+        """Absolute path of attribute `name`"""
+        return os.path.join(self.base_path, ATTRIBUTES[name])
+
+    def exists(self):
+        try:
+            self.io.stat(self.base_path)
+        except OSError:
+            return False
+        return True
+
+    def read(self, name):
+        """Read and parse one attribute, None on failure"""
+        try:
+            raw = read_sysfs(self.path(name), self.io)
+        except OSError:
+            return None
+        return parse_value(name, raw.encode())
+
+    def write(self, name, value):
+        """Write one attribute, raises OSError"""
+        if isinstance(value, (list, tuple)):
+            value = ",".join(map(str, value))
+        write_sysfs(self.path(name), value, self.io)
+
+    def sampler(self, attributes=None):
+        """Return a new SysfsSampler for this device"""
+        return SysfsSampler(self.base_path, attributes, self.io)
+
+    def has_state(self):
+        """Whether the driver serves all attributes in one "state" read"""
+        return has_state(self.base_path, self.io)
+
+    def state_sampler(self, max_age=None):
+        """Return a new StateSampler for this device"""
+        return StateSampler(self.base_path, self.io, max_age)
+
+    def watcher(self, attributes=None, **kw):
+        """Return a new ChangeWatcher for this device"""
+        return ChangeWatcher(self.base_path, attributes, self.io, **kw)
+
+    def snapshot(self, attributes=None):
+        """Sample `attributes` (default all) through a cached sampler"""
+        key = tuple(attributes or ATTRIBUTES)
+        sampler = self._samplers.get(key)
+        if sampler is None:
+            sampler = self._samplers[key] = self.sampler(key)
+        return sampler.sample()
+
+    def close(self):
+        for sampler in self._samplers.values():
+            sampler.close()
+        self._samplers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_fan_mode(self, fan_num):
+        return self.read(f"fan{fan_num}_mode")
+
+    def read_fan_level(self, fan_num):
+        return self.read(f"fan{fan_num}_level")
+
+    def read_curve(self, fan_num, curve_type):
+        return self.read(f"fan{fan_num}_{curve_type}_curve")
+
+    def read_power_mode(self):
+        return self.read("power_mode")
+
+    def set_fan_mode(self, fan_num, mode):
+        _check(fan_num in FANS, f"invalid fan {fan_num!r}")
+        _check(mode in FAN_MODES, f"invalid fan mode {mode!r}")
+        self.write(f"fan{fan_num}_mode", mode)
+
+    def set_fan_level(self, fan_num, level):
+        _check(fan_num in FANS, f"invalid fan {fan_num!r}")
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid fan level {level!r}") from None
+        _check(0 <= level <= 5, f"invalid fan level {level!r}")
+        self.write(f"fan{fan_num}_level", level)
+
+    def set_curve(self, fan_num, curve_type, values):
+        _check(fan_num in FANS, f"invalid fan {fan_num!r}")
+        _check(curve_type in CURVES, f"invalid curve {curve_type!r}")
+        values = check_curve(values)
+        self.write(f"fan{fan_num}_{curve_type}_curve", values)
+
+    def set_power_mode(self, mode):
+        _check(mode in POWER_MODES, f"invalid power mode {mode!r}")
+        self.write("power_mode", mode)
+
+    def set(self, name, value):
+        """Validated write of a setting by attribute name, e.g. "fan1_level" """
+        if not isinstance(name, str):
+            raise ValueError(f"{name!r} is not a setting")
+        if name == "power_mode":
+            return self.set_power_mode(value)
+        if name in ATTRIBUTES and name.startswith("fan"):
+            fan_num, attr = int(name[3]), name[5:]
+            if attr == "mode":
+                return self.set_fan_mode(fan_num, value)
+            if attr == "level":
+                return self.set_fan_level(fan_num, value)
+            if attr.endswith("_curve"):
+                if isinstance(value, str):
+                    value = value.replace(",", " ").split()
+                return self.set_curve(fan_num, attr[:-len("_curve")], value)
+        raise ValueError(f"{name!r} is not a setting")
+
+
+def _check(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+
+def check_curve(values):
+    """Validate a 5 point curve, returns it as a list of ints"""
+    try:
+        values = [int(v) for v in values]
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid curve {values!r}") from None
+    _check(len(values) == 5, f"curve needs 5 values, got {len(values)}")
+    _check(all(0 <= v <= 100 for v in values), f"curve out of range {values}")
+    return values
+
+
+def config_from_snapshot(snapshot):
+    """Config dict in the format written by the GUI's "Save Config" """
+    data = {
+        "apu_mode": snapshot.power_mode,
+        "fans": {}
+    }
+    for n, fan in zip(FANS, snapshot.fans):
+        data["fans"][str(n)] = {
+            "mode": fan.mode,
+            "level": "" if fan.level is None else str(fan.level),
+            "rampup_curve": list(fan.rampup or [None] * 5),
+            "rampdown_curve": list(fan.rampdown or [None] * 5),
+        }
+    return data
+
+
+def load_config(path=None):
+    with open(path or CONFIG_PATH) as f:
+        return json.load(f)
+
+
+def save_config(data, path=None):
+    with open(path or CONFIG_PATH, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def apply_config(device, data):
+    """
+    Write a config dict to the device, same order as the GUI always
+    used. Returns a list of (attribute, error) for failed writes.
+    """
+    errors = []
+
+    def attempt(name, fn, *args):
+        try:
+            fn(*args)
+        except (OSError, ValueError) as e:
+            errors.append((name, e))
+
+    apu = data.get("apu_mode")
+    if apu:
+        attempt("power_mode", device.set_power_mode, apu)
+
+    for fan_num_str, cfg in data.get("fans", {}).items():
+        fan_num = int(fan_num_str)
+        if fan_num not in FANS:
+            continue
+        mode = cfg.get("mode")
+        if mode:
+            attempt(f"fan{fan_num}_mode", device.set_fan_mode, fan_num, mode)
+        level = cfg.get("level")
+        if level not in (None, "") and mode == "fixed":
+            attempt(f"fan{fan_num}_level", device.set_fan_level, fan_num,
+                    level)
+        if mode == "curve":
+            for curve_type in CURVES:
+                values = cfg.get(f"{curve_type}_curve")
+                if values and len(values) == 5:
+                    attempt(f"fan{fan_num}_{curve_type}_curve",
+                            device.set_curve, fan_num, curve_type, values)
+    return errors
@@ -0,0 +1,218 @@
+"""
+Prometheus exporter: serves /metrics from a snapshot cache that one
+thread refreshes every `interval` seconds, so the EC sees the same
+reads no matter how many scrapers there are
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .instrument import Histogram
+from .sysfs import EC_READS, FAN_MODES, FANS, POWER_MODES
+
+DEFAULT_PORT = 9535
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class CachedSampler:
+    """
+    Samples `sampler` on its own thread every `interval` seconds.
+    Readers only ever get the cached snapshot, `on_sample(snapshot)` is
+    called on the sampler thread after every refresh.
+    """
+
+    def __init__(self, sampler, interval=1.0, on_sample=None):
+        self.sampler = sampler
+        self.interval = interval
+        self.on_sample = on_sample
+        self.latency = Histogram()
+        self.samples = 0
+        self.errors = 0
+        self._snapshot = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="axb35-cached-sampler")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.sampler.close()
+
+    def get(self, timeout=None):
+        """Latest snapshot, waits up to `timeout` for the first one"""
+        self._ready.wait(timeout)
+        return self._snapshot
+
+    def refresh(self):
+        t0 = time.perf_counter()
+        try:
+            snapshot = self.sampler.sample()
+        except Exception as e:
+            self.errors += 1
+            print(f"Sampler error: {e}")
+            return
+        self.latency.observe(time.perf_counter() - t0)
+        self.samples += 1
+        self._snapshot = snapshot
+        self._ready.set()
+        if self.on_sample:
+            self.on_sample(snapshot)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.refresh()
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay <= 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+
+def _family(out, name, kind, help_text):
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} {kind}")
+
+
+def snapshot_lines(snapshot):
+    """Metric lines for everything in `snapshot`, None values are left out"""
+    out = []
+    for name, value, help_text in (
+            ("axb35_temperature_celsius", snapshot.temp,
+             "APU temperature"),
+            ("axb35_temperature_min_celsius", snapshot.temp_min,
+             "lowest temperature seen by the driver"),
+            ("axb35_temperature_max_celsius", snapshot.temp_max,
+             "highest temperature seen by the driver")):
+        if value is not None:
+            _family(out, name, "gauge", help_text)
+            out.append(f"{name} {value}")
+
+    _family(out, "axb35_fan_rpm", "gauge", "fan speed")
+    for n, fan in zip(FANS, snapshot.fans):
+        if fan.rpm is not None:
+            out.append(f'axb35_fan_rpm{{fan="{n}"}} {fan.rpm}')
+    _family(out, "axb35_fan_mode", "gauge",
+            "fan control mode, 1 for the active one")
+    for n, fan in zip(FANS, snapshot.fans):
+        if fan.mode is not None:
+            for mode in FAN_MODES:
+                out.append(f'axb35_fan_mode{{fan="{n}",mode="{mode}"}} '
+                           f'{int(fan.mode == mode)}')
+    _family(out, "axb35_fan_level", "gauge", "fan level 0-5")
+    for n, fan in zip(FANS, snapshot.fans):
+        if fan.level is not None:
+            out.append(f'axb35_fan_level{{fan="{n}"}} {fan.level}')
+    _family(out, "axb35_fan_curve_celsius", "gauge",
+            "curve mode threshold per level")
+    for n, fan in zip(FANS, snapshot.fans):
+        for curve, values in (("rampup", fan.rampup),
+                              ("rampdown", fan.rampdown)):
+            for level, value in enumerate(values or (), 1):
+                out.append(f'axb35_fan_curve_celsius{{fan="{n}",'
+                           f'curve="{curve}",level="{level}"}} {value}')
+
+    if snapshot.power_mode is not None:
+        _family(out, "axb35_power_mode", "gauge",
+                "APU power mode, 1 for the active one")
+        for mode in POWER_MODES:
+            out.append(f'axb35_power_mode{{mode="{mode}"}} '
+                       f'{int(snapshot.power_mode == mode)}')
+    _family(out, "axb35_sample_timestamp_seconds", "gauge",
+            "when the cached values were read")
+    out.append(f"axb35_sample_timestamp_seconds {snapshot.timestamp!r}")
+    return out
+
+
+class MetricsExporter:
+    """
+    Keeps the rendered /metrics body of the latest snapshot, so a
+    scrape only appends a few counters to cached text
+    """
+
+    def __init__(self, device, interval=1.0, attributes=None):
+        self.sampler = device.sampler(attributes)
+        self.ec_reads_per_sample = sum(EC_READS[name]
+                                       for name in self.sampler.attributes)
+        self.cache = CachedSampler(self.sampler, interval, self._render)
+        self.scrapes = 0
+        self._body = ""
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.cache.start()
+        self.cache.get(timeout=10)
+        return self
+
+    def stop(self):
+        self.cache.stop()
+
+    def _render(self, snapshot):
+        body = "\n".join(snapshot_lines(snapshot)) + "\n"
+        with self._lock:
+            self._body = body
+
+    def render(self):
+        """The full /metrics text"""
+        with self._lock:
+            self.scrapes += 1
+            body, scrapes = self._body, self.scrapes
+        cache, sampler = self.cache, self.sampler
+        out = []
+        _family(out, "axb35_sampler_duration_seconds", "histogram",
+                "time to read one snapshot from sysfs")
+        out += cache.latency.lines("axb35_sampler_duration_seconds")
+        for name, value, help_text in (
+                ("axb35_samples_total", cache.samples, "snapshots read"),
+                ("axb35_sampler_errors_total",
+                 cache.errors + sampler.error_count, "failed sysfs reads"),
+                ("axb35_sampler_reopens_total", sampler.reopen_count,
+                 "sysfs descriptors reopened, e.g. after a module reload"),
+                ("axb35_ec_reads_total",
+                 cache.samples * self.ec_reads_per_sample,
+                 "EC register reads caused by the exporter"),
+                ("axb35_scrapes_total", scrapes, "/metrics requests")):
+            _family(out, name, "counter", help_text)
+            out.append(f"{name} {value}")
+        return body + "\n".join(out) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, scrapers reuse their connection
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as two writes, don't wait for ACKs
+    disable_nagle_algorithm = True
+    exporter = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = self.exporter.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 makes bursts of scrapers retry SYNs
+    request_queue_size = 64
+
+
+def make_server(exporter, host="", port=DEFAULT_PORT):
+    """HTTP server serving `exporter`, call serve_forever()"""
+    handler = type("Handler", (_Handler,), {"exporter": exporter})
+    return _Server((host, port), handler)
@@ -0,0 +1,237 @@
+"""
+Fleet view over many boxes. Every node runs `axb35 agent`, a broker
+listening on TCP, and one aggregator keeps a persistent connection to
+each of them on a single event loop. Lost connections are retried with
+backoff, and a node that stops sending is reconnected.
+
+Pushes (power mode, profile) go to all connected nodes at once and
+report per node.
+"""
+import asyncio
+import errno
+import time
+
+from .broker import BrokerClient
+from .sysfs import POWER_MODES
+
+DEFAULT_PORT = 9536
+RETRY_MIN = 0.5
+RETRY_MAX = 30.0
+
+COLUMNS = ("node", "temp", "fan1", "fan2", "fan3", "power", "age")
+
+
+def parse_node(text, default_port=DEFAULT_PORT):
+    """"name=host:port", "host:port" or "host" -> (name, host, port)"""
+    name, sep, address = text.partition("=")
+    if not sep:
+        name, address = None, text
+    host, sep, port = address.rpartition(":")
+    if not sep or "]" in port:
+        host, port = address, default_port
+    host = host.strip("[]")
+    if not host:
+        raise ValueError(f"invalid node {text!r}")
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"invalid port in {text!r}") from None
+    return name or f"{host}:{port}", host, port
+
+
+class Node:
+    def __init__(self, name, host, port):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.client = None
+        self.snapshot = None
+        self.last_seen = None
+        self.updates = 0
+        self.connects = 0
+        self.error = None
+
+    @property
+    def connected(self):
+        return self.client is not None
+
+    def row(self, now=None):
+        """Values for COLUMNS, None where unknown"""
+        now = time.monotonic() if now is None else now
+        s = self.snapshot
+        age = None if self.last_seen is None else now - self.last_seen
+        if s is None:
+            return (self.name, None, None, None, None, None, age)
+        return (self.name, s.temp, *s.rpms, s.power_mode, age)
+
+
+def sort_rows(rows, column="node", reverse=False):
+    """Sort by a COLUMNS name, unknown values last either way"""
+    index = COLUMNS.index(column)
+    known = [r for r in rows if r[index] is not None]
+    unknown = [r for r in rows if r[index] is None]
+    known.sort(key=lambda r: r[index], reverse=reverse)
+    return known + unknown
+
+
+def _cell(value):
+    return "-" if value is None else value
+
+
+def format_table(nodes, column="node", reverse=False, now=None):
+    now = time.monotonic() if now is None else now
+    rows = sort_rows([n.row(now) for n in nodes], column, reverse)
+    width = max([len(COLUMNS[0])] + [len(r[0]) for r in rows])
+    lines = [f"{'node':<{width}} {'temp':>5} {'fan1':>6} {'fan2':>6} "
+             f"{'fan3':>6} {'power':<12} {'age':>6}"]
+    by_name = {n.name: n for n in nodes}
+    for name, temp, f1, f2, f3, power, age in rows:
+        line = (f"{name:<{width}} {_cell(temp):>5} {_cell(f1):>6} "
+                f"{_cell(f2):>6} {_cell(f3):>6} {_cell(power):<12} "
+                f"{'-' if age is None else f'{age:.1f}s':>6}")
+        node = by_name[name]
+        if not node.connected and node.error:
+            line += f"  {node.error}"
+        lines.append(line)
+    connected = sum(n.connected for n in nodes)
+    lines.append(f"{connected}/{len(nodes)} nodes connected")
+    return "\n".join(lines)
+
+
+class Fleet:
+    """
+    Connections to `nodes` ((name, host, port) tuples). `on_update(node)`
+    is called on the event loop for every snapshot. A node silent for
+    `stale_after` seconds is reconnected.
+    """
+
+    def __init__(self, nodes, token=None, timeout=5.0, stale_after=10.0,
+                 on_update=None):
+        self.nodes = [Node(*n) for n in nodes]
+        names = [n.name for n in self.nodes]
+        if len(set(names)) != len(names):
+            raise ValueError("node names must be unique")
+        self.token = token
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.on_update = on_update
+        self._tasks = []
+        self._connected = None
+        self._stopping = False
+
+    async def start(self):
+        self._connected = asyncio.Condition()
+        self._tasks = [asyncio.ensure_future(self._run_node(node))
+                       for node in self.nodes]
+        return self
+
+    async def stop(self):
+        # wait_for() before Python 3.12 loses a cancel that comes in as
+        # its future finishes, the node tasks check this flag as well
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def wait_connected(self, timeout=None):
+        """Wait until every node has sent a snapshot, or `timeout`"""
+        async def all_in():
+            async with self._connected:
+                await self._connected.wait_for(
+                    lambda: all(n.connected and n.snapshot is not None
+                                for n in self.nodes))
+        try:
+            await asyncio.wait_for(all_in(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return sum(n.connected for n in self.nodes)
+
+    def _on_snapshot(self, node, snapshot, values):
+        first = node.snapshot is None
+        node.snapshot = snapshot
+        node.last_seen = time.monotonic()
+        node.updates += 1
+        if first:
+            asyncio.ensure_future(self._notify())
+        if self.on_update:
+            self.on_update(node)
+
+    async def _notify(self):
+        async with self._connected:
+            self._connected.notify_all()
+
+    async def _run_node(self, node):
+        delay = RETRY_MIN
+        while True:
+            client = BrokerClient(
+                address=(node.host, node.port),
+                on_snapshot=lambda s, v: self._on_snapshot(node, s, v))
+            try:
+                await asyncio.wait_for(self._open(node, client), self.timeout)
+                node.connects += 1
+                node.error = None
+                delay = RETRY_MIN
+                await self._watch(node, client)
+            except (OSError, asyncio.TimeoutError) as e:
+                node.error = str(e) or "timeout"
+            finally:
+                node.client = None
+                await client.close()
+            if self._stopping:
+                return
+            await asyncio.sleep(delay)
+            delay = min(RETRY_MAX, delay * 2)
+
+    async def _open(self, node, client):
+        await client.connect()
+        if self.token:
+            await client.auth(self.token)
+        # connected before the first snapshot comes in
+        node.client = client
+        await client.subscribe()
+
+    async def _watch(self, node, client):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(client.wait_closed(), self.stale_after)
+                node.error = "connection closed"
+                return
+            except asyncio.TimeoutError:
+                if (node.last_seen is None or
+                        time.monotonic() - node.last_seen > self.stale_after):
+                    node.error = "no data"
+                    return
+
+    async def push(self, op, names=None, **fields):
+        """
+        Send one request to every connected node (or those in `names`),
+        returns name -> None or the error
+        """
+        targets = [n for n in self.nodes if names is None or n.name in names]
+
+        async def one(node):
+            client = node.client
+            if client is None:
+                return node.name, OSError(errno.ENOTCONN, "not connected")
+            try:
+                await asyncio.wait_for(client.request(op, **fields),
+                                       self.timeout)
+            except asyncio.TimeoutError:
+                return node.name, OSError(errno.ETIMEDOUT, "timeout")
+            except OSError as e:
+                return node.name, e
+            return node.name, None
+        return dict(await asyncio.gather(*(one(n) for n in targets)))
+
+    async def push_power_mode(self, mode, names=None):
+        if mode not in POWER_MODES:
+            raise ValueError(f"invalid power mode {mode!r}")
+        return await self.push("write", names, name="power_mode", value=mode)
+
+    async def push_profile(self, profile, names=None):
+        from .profiles import desired_state
+
+        desired_state(profile)
+        return await self.push("profile", names, profile=profile)
+
@@ -0,0 +1,263 @@
+"""
+Load driven APU power mode.
+
+PowerGovernor picks quiet, balanced or performance from the CPU
+utilization since its last tick, read from the first line of
+/proc/stat on a descriptor that stays open, and caps the mode at
+balanced while the EC temperature is high. Going up takes one tick of
+load and may skip balanced; going down takes `down_dwell` seconds of
+low load and steps one mode at a time. Every mode is held at least
+`min_dwell` seconds and at most `max_switches` switches happen per
+`window`, except when it's too hot.
+"""
+import math
+import os
+import time
+from collections import deque, namedtuple
+
+from .sysfs import OS_IO, POWER_MODES
+
+PROC_STAT = "/proc/stat"
+
+# one switch, `dwell` seconds spent in `old`, `write` seconds to set `new`
+Switch = namedtuple("Switch", "timestamp old new reason util temp dwell write")
+
+
+class CpuStat:
+    """Busy share of all CPUs between two reads of /proc/stat"""
+
+    def __init__(self, path=PROC_STAT, io=OS_IO):
+        self.io = io
+        self.fd = io.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        # the "cpu" line with all fields stays well under this
+        self._buf = bytearray(256)
+        self._last = None
+
+    def times(self):
+        """(busy, total) jiffies since boot, summed over all CPUs"""
+        n = self.io.preadv(self.fd, [self._buf], 0)
+        line = bytes(self._buf[:n]).split(b"\n", 1)[0].split()
+        if not line or line[0] != b"cpu":
+            raise ValueError("no cpu line in /proc/stat")
+        # user nice system idle iowait irq softirq steal, guest time is
+        # already counted in user
+        fields = [int(v) for v in line[1:9]]
+        total = sum(fields)
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+        return total - idle, total
+
+    def utilization(self):
+        """0.0 - 1.0 since the last call, None on the first"""
+        busy, total = self.times()
+        last, self._last = self._last, (busy, total)
+        if last is None or total <= last[1]:
+            return None
+        return (busy - last[0]) / (total - last[1])
+
+    def close(self):
+        if self.fd is not None:
+            self.io.close(self.fd)
+            self.fd = None
+
+
+def parse_thresholds(text):
+    """Parse percentages "25,60" into (0.25, 0.6)"""
+    values = [float(part) / 100 for part in text.split(",")]
+    if len(values) != len(POWER_MODES) - 1:
+        raise ValueError(f"need {len(POWER_MODES) - 1} thresholds, "
+                         f"got {text!r}")
+    return tuple(values)
+
+
+class PowerGovernor:
+    """
+    Sets `device`'s power mode from the load `cpu` reports.
+
+    The load moves the mode up past `up[i]` (from mode i) and down
+    below `down[i]` (from mode i + 1). At `hot_temp` °C performance is
+    left right away and not entered again until the temperature is
+    `temp_hysteresis` below it. A power mode changed by someone else
+    (checked every `mode_check` seconds) is taken as the new starting
+    point. `on_switch` gets every Switch, the last `keep` are in
+    `switches`. `write`, if given, replaces device.set_power_mode.
+    """
+
+    def __init__(self, device, cpu=None, up=(0.25, 0.6), down=(0.1, 0.4),
+                 min_dwell=5.0, down_dwell=30.0, max_switches=6,
+                 window=60.0, hot_temp=90, temp_hysteresis=5,
+                 mode_check=30.0, on_switch=None, write=None, keep=100,
+                 clock=time.monotonic):
+        if len(up) != len(POWER_MODES) - 1 or len(down) != len(up):
+            raise ValueError(f"need {len(POWER_MODES) - 1} up and down "
+                             f"thresholds")
+        if any(d >= u for d, u in zip(down, up)):
+            raise ValueError("each down threshold must be below its up one")
+        if list(up) != sorted(up) or list(down) != sorted(down):
+            raise ValueError("thresholds must rise with the mode")
+        self.device = device
+        self.cpu = cpu if cpu is not None else CpuStat()
+        self.up = tuple(up)
+        self.down = tuple(down)
+        self.min_dwell = min_dwell
+        self.down_dwell = down_dwell
+        self.max_switches = max_switches
+        self.window = window
+        self.hot_temp = hot_temp
+        self.temp_hysteresis = temp_hysteresis
+        self.mode_check = mode_check
+        self.on_switch = on_switch
+        self.write = write or device.set_power_mode
+        self.clock = clock
+        self.sampler = None
+        self.switches = deque(maxlen=keep)
+        self.mode = None
+        self.saved_mode = None
+        self.hot = False
+        self.ticks = 0
+        self.limited = 0
+        self._since = -math.inf
+        self._low_since = None
+        self._recent = deque()
+        self._next_mode_check = 0.0
+
+    def start(self):
+        """Take over from the current mode, prime the load counters"""
+        self.mode = self.saved_mode = self.device.read_power_mode()
+        if self.mode not in POWER_MODES:
+            self.mode = "balanced"
+        self._since = self.clock()
+        self._next_mode_check = self._since + self.mode_check
+        self.cpu.utilization()
+
+    def stop(self, restore=True):
+        """Put back the mode from before start() if `restore`"""
+        if restore and self.saved_mode in POWER_MODES and \
+                self.saved_mode != self.mode:
+            try:
+                self.write(self.saved_mode)
+            except (OSError, ValueError) as e:
+                print(f"Failed to restore power mode: {e}")
+        self.mode = None
+        if self.sampler is not None:
+            self.sampler.close()
+            self.sampler = None
+
+    def close(self):
+        self.cpu.close()
+
+    def _read_temp(self):
+        if self.sampler is None:
+            self.sampler = self.device.sampler(("temp",))
+        return self.sampler.read_values()["temp"]
+
+    def target(self, now, util, temp):
+        """(mode, reason) the load and temperature ask for, or (mode, None)"""
+        index = POWER_MODES.index(self.mode)
+        if temp is not None:
+            if temp >= self.hot_temp:
+                self.hot = True
+            elif temp <= self.hot_temp - self.temp_hysteresis:
+                self.hot = False
+        cap = len(POWER_MODES) - 2 if self.hot else len(POWER_MODES) - 1
+        if index > cap:
+            self._low_since = None
+            return POWER_MODES[cap], "hot"
+        if util is None:
+            return self.mode, None
+
+        want = index
+        while want < cap and util >= self.up[want]:
+            want += 1
+        if want > index:
+            self._low_since = None
+            return POWER_MODES[want], "load"
+        if index > 0 and util < self.down[index - 1]:
+            if self._low_since is None:
+                self._low_since = now
+            if now - self._low_since >= self.down_dwell:
+                return POWER_MODES[index - 1], "idle"
+        else:
+            self._low_since = None
+        return self.mode, None
+
+    def allowed(self, now):
+        """Whether dwell time and rate limit let the mode change now"""
+        if now - self._since < self.min_dwell:
+            return False
+        while self._recent and now - self._recent[0] >= self.window:
+            self._recent.popleft()
+        return len(self._recent) < self.max_switches
+
+    def tick(self, temp=None, now=None):
+        """
+        One step, `temp` from the caller's own sampling or read here.
+        Returns the Switch made, if any.
+        """
+        now = self.clock() if now is None else now
+        self.ticks += 1
+        util = self.cpu.utilization()
+        if temp is None:
+            try:
+                temp = self._read_temp()
+            except OSError:
+                temp = None
+
+        if now >= self._next_mode_check:
+            self._next_mode_check = now + self.mode_check
+            current = self.device.read_power_mode()
+            if current in POWER_MODES and current != self.mode:
+                return self._switched(now, current, "external", util, temp,
+                                      0.0)
+
+        mode, reason = self.target(now, util, temp)
+        if reason is None:
+            return None
+        if reason != "hot" and not self.allowed(now):
+            self.limited += 1
+            return None
+        t0 = time.perf_counter()
+        try:
+            self.write(mode)
+        except (OSError, ValueError) as e:
+            print(f"Failed to set power mode {mode}: {e}")
+            return None
+        self._recent.append(now)
+        return self._switched(now, mode, reason, util, temp,
+                              time.perf_counter() - t0)
+
+    def _switched(self, now, mode, reason, util, temp, write):
+        switch = Switch(time.time(), self.mode, mode, reason, util, temp,
+                        now - self._since, write)
+        self.mode = mode
+        self._since = now
+        self._low_since = None
+        self.switches.append(switch)
+        if self.on_switch:
+            self.on_switch(switch)
+        return switch
+
+    def run(self, interval=1.0, stop_event=None):
+        """Tick every `interval` seconds until stopped"""
+        next_tick = self.clock()
+        while self.mode is not None:
+            if stop_event is not None and stop_event.is_set():
+                break
+            self.tick()
+            next_tick += interval
+            delay = next_tick - self.clock()
+            if delay > 0:
+                if stop_event is not None:
+                    stop_event.wait(delay)
+                else:
+                    time.sleep(delay)
+            else:
+                next_tick = self.clock()
+
+
+def format_switch(switch):
+    util = "-" if switch.util is None else f"{switch.util:.0%}"
+    temp = "-" if switch.temp is None else f"{switch.temp}°C"
+    stamp = time.strftime("%H:%M:%S", time.localtime(switch.timestamp))
+    return (f"{stamp} {switch.old} -> {switch.new} ({switch.reason}, cpu "
+            f"{util}, {temp}) after {switch.dwell:.1f} s, write "
+            f"{switch.write * 1e3:.1f} ms")
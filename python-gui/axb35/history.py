@@ -0,0 +1,269 @@
+"""
+Fixed memory telemetry history for temp and the three fan RPMs.
+
+Samples go into a raw ring buffer and are rolled up incrementally into
+coarser tiers (10 s and 1 min buckets holding min/max/avg). Every tier
+is a preallocated array, so memory does not grow with uptime, and
+`History.series()` reads from whichever tier gives at most a few
+points per pixel, so its cost does not depend on how much is stored.
+The points it returns are cached, a redraw of a window that moved on
+only rolls up the samples added since.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left
+
+CHANNELS = ("temp", "fan1_rpm", "fan2_rpm", "fan3_rpm")
+
+NAN = float("nan")
+
+
+class Ring:
+    """Preallocated ring of rows: a timestamp plus `width` floats"""
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.width = width
+        self.times = array('d', [NAN]) * capacity
+        self.values = [array('d', [NAN]) * capacity for _ in range(width)]
+        self.head = 0   # next slot to write
+        self.count = 0
+        self.total = 0  # entries ever appended
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, row):
+        i = self.head
+        self.times[i] = timestamp
+        for column, value in zip(self.values, row):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+        self.total += 1
+        if self.count < self.capacity:
+            self.count += 1
+
+    def seq(self, n):
+        """Sequence number of the n-th oldest entry, stable across appends"""
+        return self.total - self.count + n
+
+    def index(self, n):
+        """Storage slot of the n-th oldest entry"""
+        return (self.head - self.count + n) % self.capacity
+
+    def time_at(self, n):
+        return self.times[self.index(n)]
+
+    def find(self, timestamp):
+        """Logical position of the first entry at or after `timestamp`"""
+        return bisect_left(_TimeView(self), timestamp)
+
+
+class _TimeView:
+    """Sequence view of a ring's timestamps in age order, for bisect"""
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def __len__(self):
+        return self.ring.count
+
+    def __getitem__(self, n):
+        return self.ring.time_at(n)
+
+
+class Tier:
+    """Rollup of fixed `period` second buckets, min/max/avg per channel"""
+
+    def __init__(self, period, capacity, channels=len(CHANNELS)):
+        self.period = period
+        self.channels = channels
+        # columns: min, max, avg for channel 0, then channel 1, ...
+        self.ring = Ring(capacity, 3 * channels)
+        self._bucket = None
+        self._reset()
+
+    def _reset(self):
+        self._count = [0] * self.channels
+        self._sum = [0.0] * self.channels
+        self._min = [math.inf] * self.channels
+        self._max = [-math.inf] * self.channels
+
+    def _flush(self):
+        row = []
+        for c in range(self.channels):
+            if self._count[c]:
+                row += (self._min[c], self._max[c],
+                        self._sum[c] / self._count[c])
+            else:
+                row += (NAN, NAN, NAN)
+        self.ring.append(self._bucket * self.period, row)
+        self._reset()
+
+    def add(self, timestamp, row):
+        bucket = int(timestamp // self.period)
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket != self._bucket:
+            self._flush()
+            self._bucket = bucket
+        for c, value in enumerate(row):
+            if value is None or value != value:
+                continue
+            self._count[c] += 1
+            self._sum[c] += value
+            if value < self._min[c]:
+                self._min[c] = value
+            if value > self._max[c]:
+                self._max[c] = value
+
+
+class History:
+    """
+    Raw samples plus 10 s and 1 min rollups. The defaults keep an hour
+    of 1 Hz samples, 12 hours of 10 s buckets and a week of 1 min
+    buckets in well under 2 MB.
+    """
+
+    # (ring, stride) pairs whose points are kept, one per chart window
+    CACHED_STRIDES = 4
+
+    def __init__(self, raw_capacity=3600, tiers=((10, 4320), (60, 10080))):
+        self.raw = Ring(raw_capacity, len(CHANNELS))
+        self.tiers = [Tier(period, capacity) for period, capacity in tiers]
+        self.lock = threading.Lock()
+        # (id(ring), stride) -> {bucket: point}, see _decimate()
+        self._points = {}
+        self._last = None
+
+    def add(self, snapshot):
+        """Append one Snapshot, O(1)"""
+        row = (snapshot.temp,) + snapshot.rpms
+        return self.add_row(snapshot.timestamp, row)
+
+    def add_row(self, timestamp, row):
+        """
+        Append one sample. One that is not newer than the last, e.g. a
+        replay's or the broker's sample served again until the next is
+        due, is dropped and False returned.
+        """
+        with self.lock:
+            if timestamp is None or (self._last is not None
+                                     and timestamp <= self._last):
+                return False
+            self._last = timestamp
+            self.raw.append(timestamp, [NAN if v is None else v for v in row])
+            for tier in self.tiers:
+                tier.add(timestamp, row)
+        return True
+
+    def nbytes(self):
+        """Memory held by the sample arrays"""
+        rings = [self.raw] + [tier.ring for tier in self.tiers]
+        return sum(r.times.itemsize * r.capacity * (1 + r.width)
+                   for r in rings)
+
+    def latest_time(self):
+        with self.lock:
+            if not self.raw.count:
+                return None
+            return self.raw.time_at(self.raw.count - 1)
+
+    def series(self, start, end, points):
+        """
+        Return (times, mins, maxs, avgs) for [start, end] with at most
+        `points` entries; mins/maxs/avgs are lists with one list per
+        channel. Raw data is used while it covers the window densely
+        enough, otherwise the finest rollup that does.
+        """
+        with self.lock:
+            source, lo, hi = self._pick(start, end, points)
+            return self._decimate(source, lo, hi, points)
+
+    def _pick(self, start, end, points):
+        candidates = [(self.raw, False)]
+        candidates += [(tier.ring, True) for tier in self.tiers]
+        chosen = None
+        for ring, rolled in candidates:
+            if not ring.count:
+                continue
+            lo = ring.find(start)
+            hi = ring.find(end + 1e-9)
+            # a ring that has not wrapped yet holds everything recorded
+            covers = ring.count < ring.capacity or ring.time_at(0) <= start
+            chosen = (ring, rolled), lo, hi
+            if covers and hi - lo <= 2 * points:
+                break
+        if chosen is None:
+            return (self.raw, False), 0, 0
+        return chosen
+
+    def _decimate(self, source, lo, hi, points):
+        """
+        Entries lo..hi of the source in points of `stride` entries,
+        aligned on sequence numbers so a point stays the same while the
+        window moves. Points wholly inside the range are cached, only
+        the partial ones at the ends and new ones are rolled up.
+        """
+        ring, rolled = source
+        channels = ring.width // 3 if rolled else ring.width
+        times = []
+        mins = [[] for _ in range(channels)]
+        maxs = [[] for _ in range(channels)]
+        avgs = [[] for _ in range(channels)]
+        n = hi - lo
+        if n <= 0 or points <= 0:
+            return times, mins, maxs, avgs
+        stride = max(1, math.ceil(n / points))
+        key = (id(ring), stride)
+        cache = self._points.pop(key, None)
+        if cache is None:
+            cache = {}
+            if len(self._points) >= self.CACHED_STRIDES:
+                del self._points[next(iter(self._points))]
+        # most recently used last
+        self._points[key] = cache
+        first_seq, end_seq = ring.seq(lo), ring.seq(hi)
+        first_bucket = first_seq // stride
+        for bucket in [b for b in cache if b < first_bucket]:
+            del cache[bucket]
+        offset = ring.seq(0)
+        for bucket in range(first_bucket, (end_seq - 1) // stride + 1):
+            start = bucket * stride
+            stop = start + stride
+            whole = start >= first_seq and stop <= end_seq
+            point = cache.get(bucket) if whole else None
+            if point is None:
+                point = _roll_up(ring, rolled, channels,
+                                 max(start, first_seq) - offset,
+                                 min(stop, end_seq) - offset)
+                if whole:
+                    cache[bucket] = point
+            t, lows, highs, means = point
+            times.append(t)
+            for c in range(channels):
+                mins[c].append(lows[c])
+                maxs[c].append(highs[c])
+                avgs[c].append(means[c])
+        return times, mins, maxs, avgs
+
+
+def _roll_up(ring, rolled, channels, first, last):
+    """(time, mins, maxs, avgs) of entries first..last, one per channel"""
+    slots = [ring.index(k) for k in range(first, last)]
+    lows_out, highs_out, means_out = [], [], []
+    for c in range(channels):
+        if rolled:
+            lows = [ring.values[3 * c][s] for s in slots]
+            highs = [ring.values[3 * c + 1][s] for s in slots]
+            means = [ring.values[3 * c + 2][s] for s in slots]
+        else:
+            lows = highs = means = [ring.values[c][s] for s in slots]
+        lows = [v for v in lows if v == v]
+        highs = [v for v in highs if v == v]
+        means = [v for v in means if v == v]
+        lows_out.append(min(lows) if lows else None)
+        highs_out.append(max(highs) if highs else None)
+        means_out.append(sum(means) / len(means) if means else None)
+    return ring.times[slots[0]], lows_out, highs_out, means_out
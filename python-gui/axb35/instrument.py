@@ -0,0 +1,287 @@
+"""
+Optional instrumentation of the hot paths: latency histograms and
+read/write/error counters per sysfs attribute, timers for loops such as
+the GUI's monitor tick and the Tk queue lag, and the last errors.
+
+TracedIO wraps an OsIO-like object. While the Instruments are disabled
+its preadv()/write() are the wrapped object's own functions, set as
+instance attributes, so untraced reads cost one attribute lookup more
+than going to the io directly. open() and close() always go through
+the wrapper to know which attribute a descriptor belongs to; they
+don't reach the EC and a dict update is noise next to the syscall.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+
+from .sysfs import ATTRIBUTES, STATE_PATH
+
+# seconds, a monitor tick is ~25us, a full snapshot with slow EC ~50ms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25)
+# seconds, a sysfs read served from driver memory takes a few us, one
+# that waits for an ACPI EC transaction a few ms
+IO_BUCKETS = (0.00001, 0.000025, 0.00005) + LATENCY_BUCKETS
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense, thread safe"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def state(self):
+        """(cumulative counts per bucket incl. +Inf, sum, count)"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def lines(self, name, labels=""):
+        cumulative, total, count = self.state()
+        sep = "," if labels else ""
+        out = []
+        for bound, c in zip(self.buckets + ("+Inf",), cumulative):
+            out.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {c}')
+        suffix = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{suffix} {total!r}")
+        out.append(f"{name}_count{suffix} {count}")
+        return out
+
+    def quantile(self, q):
+        """
+        Estimate, interpolated within the bucket it falls in, None
+        without observations
+        """
+        cumulative, _, count = self.state()
+        if not count:
+            return None
+        rank = q * count
+        lower = 0.0
+        below = 0
+        for bound, c in zip(self.buckets, cumulative):
+            if c >= rank:
+                share = (rank - below) / (c - below)
+                return min(lower + (bound - lower) * share, self.max)
+            lower, below = bound, c
+        return self.max
+
+    def as_dict(self):
+        cumulative, total, count = self.state()
+        return {
+            "count": count,
+            "sum": total,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): c for bound, c in
+                        zip(self.buckets + ("+Inf",), cumulative)},
+        }
+
+
+class AttributeStats:
+    """What the EC did for one sysfs attribute"""
+    __slots__ = ("reads", "writes", "read_errors", "write_errors")
+
+    def __init__(self):
+        self.reads = Histogram(IO_BUCKETS)
+        self.writes = Histogram(IO_BUCKETS)
+        self.read_errors = 0
+        self.write_errors = 0
+
+    def as_dict(self):
+        return {
+            "reads": self.reads.as_dict(),
+            "writes": self.writes.as_dict(),
+            "read_errors": self.read_errors,
+            "write_errors": self.write_errors,
+        }
+
+
+class Instruments:
+    """
+    Per-attribute stats, named timers and the last `max_errors` errors.
+    Errors are kept even while disabled, they are rare.
+    """
+
+    def __init__(self, enabled=False, max_errors=50):
+        self.enabled = enabled
+        self.attributes = {}
+        self.timers = {}
+        self.errors = deque(maxlen=max_errors)
+        self.started = time.time()
+        self._ios = []
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        for io in self._ios:
+            io.bind()
+
+    def attribute(self, name):
+        stats = self.attributes.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self.attributes.setdefault(name, AttributeStats())
+        return stats
+
+    def timer(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            with self._lock:
+                timer = self.timers.setdefault(name,
+                                               Histogram(LATENCY_BUCKETS))
+        return timer
+
+    def observe(self, name, seconds):
+        """Add a duration to timer `name`, if enabled"""
+        if self.enabled:
+            self.timer(name).observe(seconds)
+
+    def error(self, source, message):
+        self.errors.append((time.time(), source, str(message)))
+
+    def reset(self):
+        with self._lock:
+            self.attributes = {}
+            self.timers = {}
+            self.errors.clear()
+            self.started = time.time()
+
+    def as_dict(self):
+        return {
+            "enabled": self.enabled,
+            "since": self.started,
+            "attributes": {name: stats.as_dict() for name, stats in
+                           sorted(self.attributes.items())},
+            "timers": {name: timer.as_dict() for name, timer in
+                       sorted(self.timers.items())},
+            "errors": [{"time": t, "source": source, "message": message}
+                       for t, source, message in list(self.errors)],
+        }
+
+
+class TracedIO:
+    """
+    OsIO stand-in that times preadv() and write() per attribute of the
+    class directory at `base_path` while `instruments` are enabled
+    """
+
+    def __init__(self, io, base_path, instruments):
+        self.io = io
+        self.instruments = instruments
+        self._names = {os.path.join(base_path, rel): name
+                       for name, rel in ATTRIBUTES.items()}
+        self._names[os.path.join(base_path, STATE_PATH)] = "state"
+        # descriptor -> attribute name
+        self._fds = {}
+        self.stat = io.stat
+        self.poll = io.poll
+        instruments._ios.append(self)
+        self.bind()
+
+    def bind(self):
+        """Pick the traced or the plain calls, see Instruments.enable()"""
+        if self.instruments.enabled:
+            self.preadv = self._traced_preadv
+            self.write = self._traced_write
+        else:
+            self.preadv = self.io.preadv
+            self.write = self.io.write
+
+    def open(self, path, flags, mode=0o777):
+        name = self._names.get(path)
+        try:
+            fd = self.io.open(path, flags, mode)
+        except OSError as e:
+            if name is not None:
+                self._failed(name, flags & (os.O_WRONLY | os.O_RDWR), e)
+            raise
+        if name is not None:
+            self._fds[fd] = name
+        return fd
+
+    def close(self, fd):
+        self._fds.pop(fd, None)
+        self.io.close(fd)
+
+    def _failed(self, name, writing, error):
+        stats = self.instruments.attribute(name)
+        if writing:
+            stats.write_errors += 1
+        else:
+            stats.read_errors += 1
+        self.instruments.error(name, error)
+
+    def _traced_preadv(self, fd, buffers, offset):
+        name = self._fds.get(fd)
+        if name is None:
+            return self.io.preadv(fd, buffers, offset)
+        t0 = time.perf_counter()
+        try:
+            return self.io.preadv(fd, buffers, offset)
+        except OSError as e:
+            self._failed(name, False, e)
+            raise
+        finally:
+            self.instruments.attribute(name).reads.observe(
+                time.perf_counter() - t0)
+
+    def _traced_write(self, fd, data):
+        name = self._fds.get(fd)
+        if name is None:
+            return self.io.write(fd, data)
+        t0 = time.perf_counter()
+        try:
+            return self.io.write(fd, data)
+        except OSError as e:
+            self._failed(name, True, e)
+            raise
+        finally:
+            self.instruments.attribute(name).writes.observe(
+                time.perf_counter() - t0)
+
+
+def format_table(data):
+    """Text table of Instruments.as_dict(), latencies in ms"""
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1e3:.3f}"
+
+    lines = [f"{'attribute (ms)':<22} {'reads':>7} {'p50':>8} {'p99':>8} "
+             f"{'max':>8} {'writes':>6} {'p50':>8} {'max':>8} {'errors':>6}"]
+    for name, a in data["attributes"].items():
+        r, w = a["reads"], a["writes"]
+        lines.append(
+            f"{name:<22} {r['count']:>7} {ms(r['p50']):>8} "
+            f"{ms(r['p99']):>8} {ms(r['max'] if r['count'] else None):>8} "
+            f"{w['count']:>6} {ms(w['p50']):>8} "
+            f"{ms(w['max'] if w['count'] else None):>8} "
+            f"{a['read_errors'] + a['write_errors']:>6}")
+    for name, t in data["timers"].items():
+        lines.append(f"{name:<22} {t['count']:>7} {ms(t['p50']):>8} "
+                     f"{ms(t['p99']):>8} {ms(t['max']):>8}")
+    for e in data["errors"]:
+        lines.append(f"{time.strftime('%H:%M:%S', time.localtime(e['time']))}"
+                     f" {e['source']}: {e['message']}")
+    return "\n".join(lines)
@@ -0,0 +1,143 @@
+"""
+Netdata external plugin, a long-running replacement for
+contrib/netdata/axb35.chart.sh with the same chart ids and values.
+
+The attributes stay open in a SysfsSampler and every collection is a
+single precompiled format string, so a cycle costs no fork, no open()
+and no string matching beyond dict lookups.
+"""
+import argparse
+import sys
+import time
+
+from .sysfs import BASE_PATH, FANS, SysfsSampler
+
+# same numbers as axb35.chart.sh, 0 for anything unknown
+FAN_MODE_VALUES = {"auto": 1, "curve": 2, "fixed": 3}
+POWER_MODE_VALUES = {"quiet": 1, "balanced": 2, "performance": 3}
+# the level chart shows 6 for fans the EC controls itself
+AUTO_LEVEL = 6
+
+_CHART = ("CHART axb35.{id} 'axb35{n}' \"{title}\" \"{units}\" \"{family}\" "
+          "'' {kind} {priority} {update_every} '' '' 'axb35'")
+CHARTS = (
+    ("cputemp", "CPU Temp", "Degrees", "CPU Temperature", "line",
+     ("cputemp", "cputempmin", "cputempmax")),
+    ("fanrpm", "Fan RPMs", "rpm", "Fan RPMs", "stacked",
+     tuple(f"fan{n}rpm" for n in FANS)),
+    ("fanmode", "Fan Modes (1 = Auto, 2 = Curve, 3 = Manual)", "Mode",
+     "Fan Modes", "line", tuple(f"fan{n}mode" for n in FANS)),
+    ("fanlevel", "Fan Power Levels (6 = Auto)", "Level", "Fan Power Levels",
+     "line", tuple(f"fan{n}level" for n in FANS)),
+    ("powermode", "Power Mode (1 = Quiet, 2 = Balanced, 3 = Performance)",
+     "Mode", "Power Modes", "line", ("powermode",)),
+    # not in axb35.chart.sh
+    ("fancurve", "Fan Curves", "Degrees", "Fan Curves", "line",
+     tuple(f"fan{n}{curve}{level}" for n in FANS
+           for curve in ("rampup", "rampdown") for level in range(1, 6))),
+)
+# collection order in axb35.chart.sh
+UPDATE_ORDER = ("fanrpm", "fanmode", "fanlevel", "cputemp", "powermode",
+                "fancurve")
+
+
+def chart_definitions(update_every=1, priority=1):
+    """CHART and DIMENSION lines, sent once at startup"""
+    out = []
+    for i, (chart_id, title, units, family, kind, dims) in enumerate(CHARTS):
+        out.append(_CHART.format(id=chart_id, n=i + 1, title=title,
+                                 units=units, family=family, kind=kind,
+                                 priority=priority + i,
+                                 update_every=update_every))
+        out += [f"DIMENSION {dim} '' absolute 1 1" for dim in dims]
+    return "\n".join(out) + "\n"
+
+
+def _update_template():
+    dims = {chart[0]: chart[5] for chart in CHARTS}
+    out = []
+    for chart_id in UPDATE_ORDER:
+        out.append(f"BEGIN axb35.{chart_id}{{usec}}")
+        out += [f"SET {dim} = {{}}" for dim in dims[chart_id]]
+        out.append("END")
+    # values fill the "{}" slots in order, usec goes by name
+    return "\n".join(out) + "\n"
+
+
+UPDATE_TEMPLATE = _update_template()
+
+
+def _blank(value):
+    return "" if value is None else value
+
+
+def update_values(snapshot):
+    """SET values of one collection, in UPDATE_TEMPLATE order"""
+    fans = snapshot.fans
+    values = [_blank(f.rpm) for f in fans]
+    values += [FAN_MODE_VALUES.get(f.mode, 0) for f in fans]
+    values += [AUTO_LEVEL if f.mode == "auto" else _blank(f.level)
+               for f in fans]
+    values += [_blank(snapshot.temp), _blank(snapshot.temp_min),
+               _blank(snapshot.temp_max),
+               POWER_MODE_VALUES.get(snapshot.power_mode, 0)]
+    for f in fans:
+        values += f.rampup or ("",) * 5
+        values += f.rampdown or ("",) * 5
+    return values
+
+
+def format_update(snapshot, usec=None):
+    """BEGIN/SET/END block for `snapshot`"""
+    return UPDATE_TEMPLATE.format(*update_values(snapshot),
+                                  usec="" if usec is None else f" {usec}")
+
+
+def run(sampler, update_every=1, count=None, out=sys.stdout, priority=1):
+    """Collect every `update_every` seconds until stdout goes away"""
+    out.write(chart_definitions(max(1, int(update_every)), priority))
+    out.flush()
+    n = 0
+    last = None
+    next_tick = time.monotonic()
+    try:
+        while count is None or n < count:
+            now = time.monotonic()
+            usec = None if last is None else int((now - last) * 1e6)
+            last = now
+            out.write(format_update(sampler.sample(), usec))
+            out.flush()
+            n += 1
+            next_tick += update_every
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    return 0
+
+
+def main(argv=None):
+    """Entry point of axb35.plugin, netdata passes update_every"""
+    parser = argparse.ArgumentParser(prog="axb35.plugin")
+    parser.add_argument("update_every", nargs="?", type=float, default=1.0)
+    parser.add_argument("--base-path", default=BASE_PATH)
+    parser.add_argument("--count", type=int, default=None,
+                        help="stop after COUNT collections")
+    args = parser.parse_args(argv)
+
+    sampler = SysfsSampler(args.base_path)
+    if sampler.sample().temp is None:
+        # tells netdata not to restart the plugin
+        print("DISABLE", flush=True)
+        return 1
+    try:
+        return run(sampler, args.update_every, args.count)
+    finally:
+        sampler.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
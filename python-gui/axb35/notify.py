@@ -0,0 +1,148 @@
+"""
+Change notification for the settings the driver announces.
+
+The driver calls sysfs_notify() when a fan mode or level, the power
+mode, a curve or temp min/max changes, including the level steps of
+its curve worker. ChangeWatcher keeps those attributes open, waits with
+poll(POLLPRI) and reads an attribute only after it was notified.
+
+Older drivers and plain files (a fake tree) never notify. Until the
+first notification comes in, every attribute is re-read each
+`fallback` seconds; after it, each `notified_fallback` seconds (None:
+never), for what the driver can't see, e.g. other software writing the
+EC or the EC's own level changes in auto mode. Attributes that can't
+be opened, e.g. while the module is reloaded, are retried each `retry`
+seconds.
+"""
+import select
+import time
+
+from .sysfs import BASE_PATH, NOTIFY_ATTRIBUTES, OS_IO, SysfsSampler
+
+EVENTS = select.POLLPRI | select.POLLERR
+
+
+class ChangeWatcher:
+    """
+    `wait()` returns the attributes that changed. `notifications` and
+    `polls` count attribute reads after a notification and full
+    fallback re-reads.
+    """
+
+    def __init__(self, base_path=BASE_PATH, attributes=None, io=OS_IO,
+                 fallback=10.0, notified_fallback=60.0, retry=1.0,
+                 clock=time.monotonic):
+        self.sampler = SysfsSampler(base_path, attributes or NOTIFY_ATTRIBUTES,
+                                    io)
+        self.attributes = self.sampler.attributes
+        self.fallback = fallback
+        self.notified_fallback = notified_fallback
+        self.retry = retry
+        self.clock = clock
+        self.values = None
+        self.notified = False
+        self.notifications = 0
+        self.polls = 0
+        self._poller = io.poll()
+        self._registered = {}   # fd -> attribute name
+        self._next_poll = None
+        self._next_retry = None
+
+    def _register(self):
+        """Follow descriptors the sampler reopened"""
+        fds = {}
+        for name in self.attributes:
+            fd = self.sampler.fileno(name)
+            if fd >= 0:
+                fds[fd] = name
+        if len(fds) < len(self.attributes):
+            if self._next_retry is None:
+                self._next_retry = self.clock() + self.retry
+        else:
+            self._next_retry = None
+        if fds == self._registered:
+            return
+        for fd in self._registered:
+            try:
+                self._poller.unregister(fd)
+            except KeyError:
+                pass
+        for fd in fds:
+            self._poller.register(fd, EVENTS)
+        self._registered = fds
+
+    def _schedule(self, now):
+        interval = self.notified_fallback if self.notified else self.fallback
+        self._next_poll = None if interval is None else now + interval
+
+    def _update(self, name, value, changed):
+        if value is not None and value != self.values.get(name):
+            self.values[name] = value
+            changed[name] = value
+
+    def wait(self, timeout=None):
+        """
+        Block until something changed, at most `timeout` seconds (None:
+        no limit). Returns a name -> new value dict, empty on timeout.
+        The first call returns the current value of every attribute.
+        """
+        if self.values is None:
+            # reading arms the notification
+            self.values = self.sampler.read_values()
+            self._register()
+            self._schedule(self.clock())
+            return {name: value for name, value in self.values.items()
+                    if value is not None}
+        end = None if timeout is None else self.clock() + timeout
+        changed = {}
+        while True:
+            now = self.clock()
+            until = None
+            for deadline in (self._next_poll, self._next_retry, end):
+                if deadline is not None and (until is None or
+                                             deadline < until):
+                    until = deadline
+            ms = None if until is None else max(0.0, (until - now) * 1000)
+            events = self._poller.poll(ms)
+            if events:
+                reopened = self.sampler.reopen_count
+                for fd, _ in events:
+                    name = self._registered.get(fd)
+                    if name is None:
+                        continue
+                    self.notifications += 1
+                    value = self.sampler.read_value(name)
+                    if (not self.notified and value is not None and
+                            self.sampler.reopen_count == reopened):
+                        # not a module reload: the driver does notify
+                        self.notified = True
+                        self._schedule(self.clock())
+                    self._update(name, value, changed)
+                self._register()
+            now = self.clock()
+            if self._next_retry is not None and now >= self._next_retry:
+                # no notification can come in for what isn't open
+                self._next_retry = None
+                missing = set(self.attributes) - set(self._registered.values())
+                self._register()
+                for name in missing & set(self._registered.values()):
+                    self._update(name, self.sampler.read_value(name), changed)
+            if self._next_poll is not None and now >= self._next_poll:
+                self.polls += 1
+                for name, value in self.sampler.read_values().items():
+                    self._update(name, value, changed)
+                self._register()
+                self._schedule(now)
+            if changed:
+                return changed
+            if end is not None and self.clock() >= end:
+                return changed
+
+    def close(self):
+        self.sampler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
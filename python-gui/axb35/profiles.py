@@ -0,0 +1,273 @@
+"""
+Named profiles ("quiet-night", "render-farm", ...) stored in one JSON
+file. Every profile uses the GUI's config format and may leave out
+anything it doesn't care about:
+
+    {"profiles": {"quiet-night": {"apu_mode": "quiet",
+                                  "fans": {"1": {"mode": "curve",
+                                                 "rampup_curve": [...]}}}}}
+
+Applying a profile writes only the attributes that differ from the
+current state, in an order that never leaves the fans weaker than
+needed, and writes the old values back if one of the writes fails.
+"""
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+from .device import check_curve
+from .sysfs import ATTRIBUTES, CURVES, FAN_MODES, FANS, POWER_MODES
+from .writer import format_value
+
+PROFILES_PATH = (os.environ.get("AXB35_PROFILES")
+                 or "/etc/ec-fan-control.profiles.json")
+# seconds a profile switch may take, EC writes are a few ms each
+DEFAULT_BUDGET = 0.5
+
+# everything a profile can set, in sysfs.ATTRIBUTES order
+SETTINGS = tuple(name for name in ATTRIBUTES
+                 if name == "power_mode" or name.endswith(
+                     ("_mode", "_level", "_curve")))
+
+_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+# one write: attribute, new value, value before (None if unknown)
+Step = namedtuple("Step", "name value old")
+ApplyResult = namedtuple("ApplyResult",
+                         "steps done elapsed over_budget error rolled_back")
+
+
+def desired_state(profile):
+    """
+    Validate a profile and return it as attribute name -> value, with
+    values formatted like the Writer does. Raises ValueError.
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("profile must be an object")
+    state = {}
+    apu = profile.get("apu_mode")
+    if apu:
+        if apu not in POWER_MODES:
+            raise ValueError(f"invalid power mode {apu!r}")
+        state["power_mode"] = apu
+    fans = profile.get("fans", {})
+    if not isinstance(fans, dict):
+        raise ValueError("fans must be an object")
+    for key, cfg in fans.items():
+        try:
+            fan = int(key)
+        except ValueError:
+            fan = None
+        if fan not in FANS:
+            raise ValueError(f"invalid fan {key!r}")
+        if not isinstance(cfg, dict):
+            raise ValueError(f"fan {fan}: settings must be an object")
+        mode = cfg.get("mode")
+        if mode:
+            if mode not in FAN_MODES:
+                raise ValueError(f"fan {fan}: invalid mode {mode!r}")
+            state[f"fan{fan}_mode"] = mode
+        level = cfg.get("level")
+        # saved configs carry a level for every mode, it only counts
+        # in fixed mode
+        if level not in (None, "") and mode == "fixed":
+            try:
+                level = int(level)
+            except (TypeError, ValueError):
+                level = None
+            if level is None or not 0 <= level <= 5:
+                raise ValueError(f"fan {fan}: invalid level "
+                                 f"{cfg.get('level')!r}")
+            state[f"fan{fan}_level"] = str(level)
+        curves = {}
+        for curve in CURVES:
+            values = cfg.get(f"{curve}_curve")
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple)):
+                raise ValueError(f"fan {fan}: {curve}: curve must be a list")
+            if None in values:
+                continue
+            try:
+                curves[curve] = check_curve(values)
+            except ValueError as e:
+                raise ValueError(f"fan {fan}: {curve}: {e}") from None
+            state[f"fan{fan}_{curve}_curve"] = format_value(curves[curve])
+        if len(curves) == 2 and any(
+                d > u for u, d in zip(curves["rampup"], curves["rampdown"])):
+            raise ValueError(f"fan {fan}: rampdown above rampup")
+    return state
+
+
+def current_state(snapshot):
+    """Attribute name -> formatted value for everything known in `snapshot`"""
+    state = {}
+    if snapshot.power_mode is not None:
+        state["power_mode"] = snapshot.power_mode
+    for n, fan in zip(FANS, snapshot.fans):
+        for attr, value in (("mode", fan.mode), ("level", fan.level),
+                            ("rampup_curve", fan.rampup),
+                            ("rampdown_curve", fan.rampdown)):
+            if value is not None:
+                state[f"fan{n}_{attr}"] = format_value(value)
+    return state
+
+
+def state_attributes(desired):
+    """
+    Attributes to read before applying `desired`: what it sets, plus
+    mode and level of every fan it touches for the rollback
+    """
+    names = set(desired)
+    for n in FANS:
+        if any(name.startswith(f"fan{n}_") for name in desired):
+            names.update((f"fan{n}_mode", f"fan{n}_level"))
+    return tuple(name for name in SETTINGS if name in names)
+
+
+def _power_rank(mode):
+    return POWER_MODES.index(mode) if mode in POWER_MODES else -1
+
+
+def plan(desired, current):
+    """
+    Ordered writes that turn `current` into `desired`:
+    - a power mode that draws less goes first, one that draws more last,
+      so the fans are set up before the heat arrives
+    - per fan the curves come before the mode, switching to curve picks
+      the initial level from the new rampup curve
+    - the level comes after the mode, it only sticks in fixed mode
+    - a rampup that moves up is written before the rampdown, and the
+      other way round, so rampdown <= rampup holds in between
+    """
+    def step(name):
+        value = desired.get(name)
+        if value is None or current.get(name) == value:
+            return []
+        return [Step(name, value, current.get(name))]
+
+    steps = []
+    power = step("power_mode")
+    power_up = power and (_power_rank(power[0].value)
+                          > _power_rank(power[0].old))
+    if not power_up:
+        steps += power
+    for n in FANS:
+        curves = [f"fan{n}_rampup_curve", f"fan{n}_rampdown_curve"]
+        old_up = current.get(curves[0])
+        new_up = desired.get(curves[0])
+        if old_up and new_up and (sum(map(int, new_up.split(",")))
+                                  < sum(map(int, old_up.split(",")))):
+            curves.reverse()
+        for name in curves:
+            steps += step(name)
+        steps += step(f"fan{n}_mode")
+        if desired.get(f"fan{n}_mode", current.get(f"fan{n}_mode")) == "fixed":
+            steps += step(f"fan{n}_level")
+    if power_up:
+        steps += power
+    return steps
+
+
+def apply(device, steps, current=None, budget=DEFAULT_BUDGET):
+    """
+    Write `steps` in one go. On the first failure the steps already done
+    are written back with their old values, in reverse order. Returns an
+    ApplyResult, `error` is (attribute, exception) or None and
+    `over_budget` is set when the writes took longer than `budget` s.
+    """
+    current = current or {}
+    start = time.monotonic()
+    done = []
+    error = None
+    for s in steps:
+        try:
+            device.write(s.name, s.value)
+        except OSError as e:
+            error = (s.name, e)
+            break
+        done.append(s)
+    rolled_back = False
+    if error:
+        rolled_back = _rollback(device, done, current)
+    elapsed = time.monotonic() - start
+    over_budget = budget is not None and elapsed > budget
+    return ApplyResult(steps, done, elapsed, over_budget, error, rolled_back)
+
+
+def _rollback(device, done, current):
+    ok = True
+    written = {s.name for s in done}
+    for s in reversed(done):
+        if s.old is None:
+            ok = False
+            continue
+        try:
+            device.write(s.name, s.old)
+            # back in fixed mode the driver keeps whatever level the
+            # failed switch left behind
+            level = s.name.replace("_mode", "_level")
+            if (s.name.endswith("_mode") and s.name != "power_mode"
+                    and s.old == "fixed" and level not in written
+                    and current.get(level) is not None):
+                device.write(level, current[level])
+        except OSError:
+            ok = False
+    return ok
+
+
+def apply_profile(device, profile, snapshot=None, budget=DEFAULT_BUDGET):
+    """
+    Validate, diff against `snapshot` and apply. Without a snapshot only
+    the attributes the profile needs are read, through the device's
+    cached sampler for that set.
+    """
+    desired = desired_state(profile)
+    if snapshot is None:
+        snapshot = device.snapshot(state_attributes(desired))
+    current = current_state(snapshot)
+    return apply(device, plan(desired, current), current, budget)
+
+
+def load_profiles(path=None):
+    """name -> profile dict, every profile validated, raises ValueError"""
+    try:
+        with open(path or PROFILES_PATH) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    profiles = data.get("profiles") if isinstance(data, dict) else None
+    if not isinstance(profiles, dict):
+        raise ValueError("profiles file needs a \"profiles\" object")
+    for name, profile in profiles.items():
+        check_name(name)
+        try:
+            desired_state(profile)
+        except ValueError as e:
+            raise ValueError(f"profile {name!r}: {e}") from None
+    return profiles
+
+
+def save_profiles(profiles, path=None):
+    """Replace the profiles file atomically"""
+    import tempfile
+
+    path = path or PROFILES_PATH
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix=".profiles-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"profiles": profiles}, f, indent=2)
+            f.write("\n")
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def check_name(name):
+    if not isinstance(name, str) or not _NAME.match(name):
+        raise ValueError(f"invalid profile name {name!r}")
+    return name
@@ -0,0 +1,471 @@
+"""
+Compact binary recordings of the sample stream, for week-long captures
+of thermal incidents.
+
+A recording is a 32 byte file header followed by fixed size blocks.
+Every block starts with a 32 byte index header (record count, first
+and last timestamp) and holds up to `block_records` records of 14
+bytes:
+
+    u32  milliseconds since the block's first timestamp
+    u8   temp °C                      (255 = unknown)
+    u16  fan1/fan2/fan3 rpm           (65535 = unknown)
+    u16  5 bits per fan: mode (2 bits, 0 = unknown) | level << 2
+                                      (level 7 = unknown)
+    u8   power mode                   (0 = unknown)
+
+Blocks sit at fixed offsets, so a time lookup is a binary search over
+the block headers and then over the records of one block, O(log n)
+either way. Readers mmap the file and decode records in place.
+"""
+import errno
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from .device import Device
+from .sysfs import ATTRIBUTES, FAN_MODES, FANS, POWER_MODES, Snapshot
+
+MAGIC = b"AXB35REC"
+VERSION = 1
+BLOCK_MAGIC = b"BLK1"
+FILE_HEADER = struct.Struct("<8sHHI16x")
+BLOCK_HEADER = struct.Struct("<4sIdd8x")
+RECORD = struct.Struct("<IB3HHB")
+# 4096 records are 68 minutes at 1 Hz and 57 KiB
+BLOCK_RECORDS = 4096
+# the u32 millisecond offset runs out after 49 days
+MAX_BLOCK_SPAN = (2 ** 32 - 1) / 1000.0
+
+# what a record holds, in sysfs.ATTRIBUTES order
+RECORD_ATTRIBUTES = tuple(
+    name for name in ATTRIBUTES
+    if name in ("temp", "power_mode") or name.endswith(("_rpm", "_mode",
+                                                        "_level")))
+
+_MODE_CODES = {mode: i for i, mode in enumerate(FAN_MODES, 1)}
+_POWER_CODES = {mode: i for i, mode in enumerate(POWER_MODES, 1)}
+_NO_LEVEL = 7
+
+
+def _small(value, limit):
+    """value clamped to 0..limit-1, `limit` for unknown"""
+    if value is None:
+        return limit
+    return min(limit - 1, max(0, int(value)))
+
+
+def encode_modes(values):
+    packed = 0
+    for shift, n in zip((0, 5, 10), FANS):
+        level = values.get(f"fan{n}_level")
+        level = _NO_LEVEL if level is None or not 0 <= level <= 5 else level
+        packed |= (_MODE_CODES.get(values.get(f"fan{n}_mode"), 0)
+                   | level << 2) << shift
+    return packed
+
+
+def decode(row):
+    """Record tuple (timestamp first) -> attribute name -> value dict"""
+    timestamp, temp, rpm1, rpm2, rpm3, modes, power = row
+    values = {"temp": None if temp == 255 else temp}
+    for n, rpm in zip(FANS, (rpm1, rpm2, rpm3)):
+        bits = modes >> (5 * (n - 1))
+        mode = bits & 3
+        level = bits >> 2 & 7
+        values[f"fan{n}_rpm"] = None if rpm == 0xFFFF else rpm
+        values[f"fan{n}_mode"] = FAN_MODES[mode - 1] if mode else None
+        values[f"fan{n}_level"] = None if level == _NO_LEVEL else level
+    values["power_mode"] = POWER_MODES[power - 1] if 0 < power <= 3 else None
+    return values
+
+
+def to_snapshot(row):
+    return Snapshot.from_values(row[0], decode(row))
+
+
+def parse_time(text):
+    """Unix seconds or an ISO 8601 local time -> unix seconds"""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"invalid time {text!r}") from None
+
+
+class Recorder:
+    """
+    Appends samples to the recording at `path`, creating it or
+    continuing an existing one. Records are written out every
+    `flush_every` samples and on close(), so a crash loses at most
+    that many.
+    """
+
+    def __init__(self, path, block_records=BLOCK_RECORDS, flush_every=10):
+        self.path = path
+        self.flush_every = flush_every
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            self._load(block_records)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        self._pending = bytearray()
+        self._pending_at = 0
+        self.samples = 0
+
+    def _load(self, block_records):
+        size = os.fstat(self.fd).st_size
+        if size == 0:
+            os.pwrite(self.fd, FILE_HEADER.pack(MAGIC, VERSION, RECORD.size,
+                                                block_records), 0)
+        else:
+            block_records = _read_file_header(
+                os.pread(self.fd, FILE_HEADER.size, 0), self.path)
+        self.block_records = block_records
+        self.block_size = BLOCK_HEADER.size + block_records * RECORD.size
+        # continue in the last block, a header-less one is written over
+        self.block = -(-(size - FILE_HEADER.size) // self.block_size) - 1
+        while self.block >= 0:
+            magic, count, base, last = BLOCK_HEADER.unpack(
+                os.pread(self.fd, BLOCK_HEADER.size, self._offset(self.block)))
+            if magic == BLOCK_MAGIC:
+                self.count, self.base, self.last = count, base, last
+                return
+            self.block -= 1
+        self.count = block_records
+        self.base = self.last = None
+
+    def _offset(self, block):
+        return FILE_HEADER.size + block * self.block_size
+
+    def append(self, timestamp, values):
+        """Add one sample, `values` as returned by a sampler"""
+        if self.last is not None and timestamp < self.last:
+            # keep the file sorted when the clock steps back
+            timestamp = self.last
+        if (self.count >= self.block_records or
+                timestamp - self.base > MAX_BLOCK_SPAN):
+            self.flush()
+            self.block += 1
+            self.count = 0
+            self.base = timestamp
+        if not self._pending:
+            self._pending_at = self.count
+        rpms = [_small(values.get(f"fan{n}_rpm"), 0xFFFF) for n in FANS]
+        self._pending += RECORD.pack(
+            round((timestamp - self.base) * 1000),
+            _small(values.get("temp"), 255), *rpms, encode_modes(values),
+            _POWER_CODES.get(values.get("power_mode"), 0))
+        self.count += 1
+        self.last = timestamp
+        self.samples += 1
+        if self.count - self._pending_at >= self.flush_every:
+            self.flush()
+
+    def add(self, snapshot):
+        """Add a Snapshot"""
+        self.append(snapshot.timestamp, _values(snapshot))
+
+    def flush(self):
+        """Write pending records, then the block header that counts them"""
+        if not self._pending:
+            return
+        offset = self._offset(self.block)
+        os.pwrite(self.fd, self._pending,
+                  offset + BLOCK_HEADER.size + self._pending_at * RECORD.size)
+        os.pwrite(self.fd, BLOCK_HEADER.pack(BLOCK_MAGIC, self.count,
+                                             self.base, self.last), offset)
+        self._pending = bytearray()
+
+    def close(self):
+        if self.fd >= 0:
+            self.flush()
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_file_header(data, path):
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"{path}: not a recording")
+    magic, version, record_size, block_records = FILE_HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a recording")
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path}: unsupported recording version {version}")
+    return block_records
+
+
+class _BlockEnds:
+    """Sequence of the blocks' last timestamps, for bisect"""
+
+    def __init__(self, recording):
+        self.recording = recording
+
+    def __len__(self):
+        return self.recording.blocks
+
+    def __getitem__(self, i):
+        return self.recording.block_header(i)[2]
+
+
+class _RecordTimes:
+    """Sequence of one block's record timestamps, for bisect"""
+
+    def __init__(self, recording, block):
+        self.offset = recording.records_offset(block)
+        self.count, self.base, _ = recording.block_header(block)
+        self.buf = recording.buf
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        ms, = struct.unpack_from("<I", self.buf, self.offset + i * RECORD.size)
+        return self.base + ms / 1000.0
+
+
+class Recording:
+    """
+    Read-only, mmap'ed recording. Only the pages that are looked at
+    are read from disk. A recording that is still being written is
+    seen as it was when opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < FILE_HEADER.size:
+                raise ValueError(f"{path}: not a recording")
+            self._mmap = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self._mmap)
+        self.size = size
+        try:
+            self.block_records = _read_file_header(
+                self.buf[:FILE_HEADER.size], path)
+        except ValueError:
+            self.close()
+            raise
+        self.block_size = BLOCK_HEADER.size + self.block_records * RECORD.size
+        self.blocks = -(-(size - FILE_HEADER.size) // self.block_size)
+        # drop a trailing block whose header was never written
+        while self.blocks and self.block_header(self.blocks - 1)[0] == 0:
+            self.blocks -= 1
+        self._len = None
+
+    def close(self):
+        self.buf.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # a generator still holds a view, the GC closes it later
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _offset(self, block):
+        return FILE_HEADER.size + block * self.block_size
+
+    def records_offset(self, block):
+        return self._offset(block) + BLOCK_HEADER.size
+
+    def block_header(self, block):
+        """(count, first timestamp, last timestamp) of a block"""
+        offset = self._offset(block)
+        if offset + BLOCK_HEADER.size > self.size:
+            return 0, 0.0, 0.0
+        magic, count, base, last = BLOCK_HEADER.unpack_from(self.buf, offset)
+        if magic != BLOCK_MAGIC:
+            return 0, 0.0, 0.0
+        # a block cut short by a crash counts what is in the file
+        count = min(count, (self.size - offset - BLOCK_HEADER.size)
+                    // RECORD.size)
+        return count, base, last
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(self.block_header(b)[0]
+                            for b in range(self.blocks))
+        return self._len
+
+    @property
+    def start_time(self):
+        return self.block_header(0)[1] if self.blocks else None
+
+    @property
+    def end_time(self):
+        return self.block_header(self.blocks - 1)[2] if self.blocks else None
+
+    def find(self, timestamp):
+        """(block, index) of the first record at or after `timestamp`"""
+        block = bisect_left(_BlockEnds(self), timestamp)
+        if block >= self.blocks:
+            return self.blocks, 0
+        return block, bisect_left(_RecordTimes(self, block), timestamp)
+
+    def rows(self, start=None, end=None):
+        """
+        Record tuples (timestamp, temp, rpm1, rpm2, rpm3, modes, power)
+        for start <= timestamp <= end, decoded straight from the map
+        """
+        block, index = (0, 0) if start is None else self.find(start)
+        unpack = RECORD.iter_unpack
+        for b in range(block, self.blocks):
+            count, base, _ = self.block_header(b)
+            offset = self.records_offset(b)
+            view = self.buf[offset + index * RECORD.size:
+                            offset + count * RECORD.size]
+            try:
+                for ms, *rest in unpack(view):
+                    timestamp = base + ms / 1000.0
+                    if end is not None and timestamp > end:
+                        return
+                    yield (timestamp, *rest)
+            finally:
+                view.release()
+            index = 0
+
+    def snapshots(self, start=None, end=None):
+        for row in self.rows(start, end):
+            yield to_snapshot(row)
+
+
+class Replay:
+    """
+    Walks a recording in real time times `speed`, from `start` (or the
+    beginning). advance() returns the snapshots that became due.
+    """
+
+    def __init__(self, recording, speed=1.0, start=None, end=None,
+                 clock=time.monotonic):
+        if speed <= 0:
+            raise ValueError("replay speed must be above 0")
+        self.recording = recording
+        self.speed = speed
+        self.clock = clock
+        self._rows = recording.rows(start, end)
+        self._next = next(self._rows, None)
+        self.origin = self._next[0] if self._next else start
+        self._t0 = clock()
+        self.latest = None
+
+    @property
+    def finished(self):
+        return self._next is None
+
+    def position(self):
+        """Recording time the replay has reached"""
+        return self.origin + (self.clock() - self._t0) * self.speed
+
+    def advance(self):
+        due = []
+        if self._next is None:
+            return due
+        now = self.position()
+        while self._next is not None and self._next[0] <= now:
+            due.append(to_snapshot(self._next))
+            self._next = next(self._rows, None)
+        if due:
+            self.latest = due[-1]
+        return due
+
+
+class ReplaySampler:
+    """SysfsSampler stand-in serving the replay position"""
+
+    def __init__(self, device, attributes=None):
+        self.device = device
+        self.attributes = tuple(attributes or ATTRIBUTES)
+        self.reopen_count = 0
+        self.error_count = 0
+
+    def sample(self):
+        return self.device.current()
+
+    def read_values(self):
+        values = self.device.current_values()
+        return {name: values.get(name) for name in self.attributes}
+
+    def close(self):
+        pass
+
+
+class ReplayDevice(Device):
+    """
+    Device showing a recording instead of sysfs, for the GUI and the
+    CLI. Reads return the sample due at the replay position, writes
+    fail with EROFS. Samples a reader skipped over (e.g. at a high
+    speed) are passed to `on_skipped(snapshot)`.
+    """
+
+    def __init__(self, recording, speed=1.0, start=None, config_path=None,
+                 on_skipped=None):
+        super().__init__(recording.path, config_path)
+        self.recording = recording
+        self.replay = Replay(recording, speed, start)
+        self.on_skipped = on_skipped
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def current(self):
+        """
+        Snapshot at the replay position. Until the next sample is due,
+        and for good once finished, the last one again with the same
+        timestamp (History drops it).
+        """
+        with self._lock:
+            due = self.replay.advance()
+            if due:
+                if self.on_skipped:
+                    for snapshot in due[:-1]:
+                        self.on_skipped(snapshot)
+                self._values = _values(due[-1])
+            return self.replay.latest or Snapshot(None)
+
+    def current_values(self):
+        self.current()
+        return self._values
+
+    def exists(self):
+        return bool(self.recording.blocks)
+
+    def read(self, name):
+        return self.current_values().get(name)
+
+    def write(self, name, value):
+        raise OSError(errno.EROFS, "replaying a recording")
+
+    def sampler(self, attributes=None):
+        return ReplaySampler(self, attributes)
+
+    def snapshot(self, attributes=None):
+        return self.current()
+
+    def close(self):
+        self.recording.close()
+
+
+def _values(snapshot):
+    values = {"temp": snapshot.temp, "power_mode": snapshot.power_mode}
+    for n, fan in zip(FANS, snapshot.fans):
+        values.update({f"fan{n}_rpm": fan.rpm, f"fan{n}_mode": fan.mode,
+                       f"fan{n}_level": fan.level})
+    return values
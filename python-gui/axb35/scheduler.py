@@ -0,0 +1,105 @@
+"""
+Adaptive poll interval: slow while temperature and fans are flat, fast
+as soon as something moves
+"""
+from collections import deque
+
+
+class AdaptiveScheduler:
+    """
+    Feed every snapshot to `next_interval()` and sleep for what it
+    returns.
+
+    Activity is a temperature change of `temp_step` °C, an RPM change
+    of `rpm_step` or a fan starting or stopping, each measured against
+    the last active snapshot so slow drifts are caught too, or a
+    temperature slope above `temp_slope` °C/s. The slope is a least
+    squares fit over the last `slope_window` seconds of samples, so one
+    degree steps of the sensor don't count as one. Activity drops the
+    interval to `min_interval` and keeps it there for `hold` seconds;
+    after that it grows by `backoff` per quiet tick up to
+    `max_interval`.
+    """
+
+    def __init__(self, min_interval=0.5, max_interval=10.0, temp_step=2,
+                 temp_slope=0.5, rpm_step=300, hold=10.0, backoff=1.5,
+                 slope_window=10.0):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("need 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.temp_step = temp_step
+        self.temp_slope = temp_slope
+        self.rpm_step = rpm_step
+        self.hold = hold
+        self.backoff = backoff
+        self.slope_window = slope_window
+        self.interval = min_interval
+        self.samples = 0
+        self.triggers = 0
+        self._anchor = None
+        self._last_active = None
+        # (timestamp, temp) back to the last one before the window
+        self._temps = deque()
+
+    def is_active(self, snapshot):
+        """Whether `snapshot` differs enough from the last active one"""
+        anchor = self._anchor
+        if anchor is None:
+            return True
+        temp = snapshot.temp
+        if temp is not None and anchor.temp is not None:
+            if abs(temp - anchor.temp) >= self.temp_step:
+                return True
+            slope = self._slope(snapshot)
+            if slope is not None and abs(slope) >= self.temp_slope:
+                return True
+        for rpm, old in zip(snapshot.rpms, anchor.rpms):
+            if rpm is None or old is None:
+                continue
+            if (rpm == 0) != (old == 0) or abs(rpm - old) >= self.rpm_step:
+                return True
+        return False
+
+    def _slope(self, snapshot):
+        """°C/s over the window up to `snapshot`, None until it is full"""
+        now = snapshot.timestamp
+        start = now - self.slope_window
+        window = []
+        for t, v in self._temps:
+            if t <= start:
+                # only the last sample before the window
+                window.clear()
+            window.append((t, v))
+        window.append((now, snapshot.temp))
+        if len(window) < 2 or now - window[0][0] < self.slope_window:
+            return None
+        n = len(window)
+        mt = sum(t for t, _ in window) / n
+        mv = sum(v for _, v in window) / n
+        stt = sum((t - mt) ** 2 for t, _ in window)
+        return sum((t - mt) * (v - mv) for t, v in window) / stt
+
+    def next_interval(self, snapshot):
+        """Seconds to wait before the next sample"""
+        self.samples += 1
+        now = snapshot.timestamp
+        if self.is_active(snapshot):
+            self.triggers += 1
+            self._anchor = snapshot
+            self._last_active = now
+            self.interval = self.min_interval
+        elif now - self._last_active >= self.hold:
+            self.interval = min(self.interval * self.backoff,
+                                self.max_interval)
+        if snapshot.temp is not None:
+            temps = self._temps
+            temps.append((now, snapshot.temp))
+            while len(temps) > 1 and temps[1][0] <= now - self.slope_window:
+                temps.popleft()
+        return self.interval
+
+    def reset(self):
+        """Go back to the fast rate, e.g. after a user action"""
+        self._anchor = None
+        self.interval = self.min_interval
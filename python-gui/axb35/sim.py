@@ -0,0 +1,726 @@
+"""
+Simulated ec_su_axb35 for benchmarks and development without the
+driver loaded.
+
+SimulatedEC models the EC registers, the fans and the APU temperature
+and runs the same show()/store() logic as the driver on top of them,
+including the curve worker and fan3's "8000 rpm" reading. SimIO serves
+it as a sysfs tree through the OsIO interface, TreeMirror keeps a real
+directory in sync with it for tools that open the files themselves
+(the GUI in a subprocess, the bash scripts).
+
+    python3 -m axb35.sim DIR [--load 0.3] [--latency 0.002]
+
+keeps DIR mirrored until interrupted, point tools at it with
+AXB35_PATH=DIR.
+"""
+import errno
+import os
+import random
+import select
+import stat as stat_mod
+import threading
+import time
+
+from .sysfs import ATTRIBUTES, FANS, STATE_FIELDS, STATE_PATH
+
+DEFAULT_VALUES = {
+    "temp": "52",
+    "temp_min": "38",
+    "temp_max": "74",
+    "fan1_rpm": "1830",
+    "fan2_rpm": "1795",
+    "fan3_rpm": "0",
+    "fan1_mode": "curve",
+    "fan2_mode": "curve",
+    "fan3_mode": "auto",
+    "fan1_level": "1",
+    "fan2_level": "1",
+    "fan3_level": "0",
+    "fan1_rampup_curve": "60,70,83,95,97",
+    "fan2_rampup_curve": "60,70,83,95,97",
+    "fan3_rampup_curve": "20,60,83,95,97",
+    "fan1_rampdown_curve": "40,50,80,94,96",
+    "fan2_rampdown_curve": "40,50,80,94,96",
+    "fan3_rampdown_curve": "0,50,80,94,96",
+    "power_mode": "balanced",
+}
+
+
+def make_fake_tree(path, values=None, state=True):
+    """
+    Create a static copy of the class directory below `path`, with the
+    "state" attribute unless `state` is false, like older drivers
+    """
+    merged = dict(DEFAULT_VALUES)
+    merged.update(values or {})
+    for name, rel in ATTRIBUTES.items():
+        full = os.path.join(path, rel)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w") as f:
+            f.write(f"{merged[name]}\n")
+    if state:
+        with open(os.path.join(path, STATE_PATH), "w") as f:
+            f.write(" ".join(merged[name] for name in STATE_FIELDS) + " 0\n")
+    return path
+
+
+# driver side constants, see ec_fans[] and friends in ec_su_axb35.c
+AUTO, FIXED, CURVE = "auto", "fixed", "curve"
+MODE_REGS = {1: 0x21, 2: 0x23, 3: 0x25}
+TEMP_REG = 0x70
+POWER_MODE_REG = 0x31
+SPEED_REGS = {1: (0x35, 0x36), 2: (0x37, 0x38), 3: (0x28, 0x29)}
+POWER_MODE_VALUES = {"balanced": 0x00, "performance": 0x01, "quiet": 0x02}
+POWER_MODES_BY_VALUE = {v: k for k, v in POWER_MODE_VALUES.items()}
+LEVEL_NIBBLES = (0x7, 0x2, 0x3, 0x4, 0x5, 0x6)
+DEFAULT_CURVES = {
+    1: ((0, 60, 70, 83, 95, 97), (0, 40, 50, 80, 94, 96)),
+    2: ((0, 60, 70, 83, 95, 97), (0, 40, 50, 80, 94, 96)),
+    3: ((0, 20, 60, 83, 95, 97), (0, 0, 50, 80, 94, 96)),
+}
+
+# physical model
+LEVEL_RPMS = {1: (0, 1800, 2600, 3400, 4200, 5000),
+              2: (0, 1800, 2600, 3400, 4200, 5000),
+              3: (0, 1200, 1800, 2400, 3000, 3600)}
+# levels the EC firmware picks on its own in auto mode
+EC_AUTO_CURVE = (50, 60, 70, 80, 90)
+PACKAGE_POWER = {"quiet": 55.0, "balanced": 85.0, "performance": 120.0}
+IDLE_POWER = 15.0
+HEAT_CAPACITY = 200.0       # J/°C
+CONDUCTANCE = 0.3           # W/°C with all fans stopped
+FAN_CONDUCTANCE = 0.8       # W/°C per 5000 rpm of airflow
+SPINUP_TAU = 1.5            # s
+SPINDOWN_TAU = 3.0          # s
+FAN3_QUIRK_RPM = 400        # fan3 reads 8000 while stopping below this
+MAX_STEP = 0.1              # s, integration step
+WORKER_PERIOD = 1.0         # s, ec_update_worker
+STATE_ACTIVE = 10.0         # s, full state refresh every tick after a read
+STATE_IDLE = 10.0           # s, full state refresh period otherwise
+
+
+class SimulatedEC:
+    """
+    EC registers plus a lumped thermal model: a heat capacity heated by
+    the APU (idle power + load x package power of the power mode) and
+    cooled towards `ambient` through a conductance that grows with the
+    airflow of the three fans.
+
+    Time advances lazily on every access using `clock`, pass a callable
+    returning seconds to drive it from virtual time. Every ec_read() and
+    ec_write() of the driver sleeps `latency` seconds and is counted in
+    `ec_reads`/`ec_writes`, `worker_reads` counts the part done by the
+    1 s worker. RPM readings get `rpm_noise` relative gaussian noise,
+    like the tach of a real fan. Where the driver calls sysfs_notify(),
+    `events[name]` is counted up and `changed` notified, unless `notify`
+    is false, like a driver from before it did.
+    """
+
+    def __init__(self, load=0.2, ambient=25.0, temp=None, latency=0.0,
+                 clock=time.monotonic, sleep=time.sleep, rpm_noise=0.0,
+                 seed=None, notify=True):
+        self.load = load
+        self.rpm_noise = rpm_noise
+        self._rnd = random.Random(seed)
+        self.ambient = ambient
+        self.latency = latency
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.RLock()
+        self.notify = notify
+        self.events = dict.fromkeys(ATTRIBUTES, 0)
+        self.changed = threading.Condition(self.lock)
+        self.ec_reads = 0
+        self.ec_writes = 0
+        self.worker_reads = 0
+        self.generation = 0
+        self._now = clock()
+        self._worker_due = self._now + WORKER_PERIOD
+        # fan1/2 in curve mode at level 1, fan3 left to the EC
+        self.regs = {POWER_MODE_REG: POWER_MODE_VALUES["balanced"]}
+        for n in FANS:
+            base = (MODE_REGS[n] - 0x21) * 8 + 0x10
+            self.regs[MODE_REGS[n]] = base if n == 3 else base + 1
+            self.regs[MODE_REGS[n] + 1] = base + LEVEL_NIBBLES[n != 3]
+        self.temp = ambient + 25.0 if temp is None else float(temp)
+        self.rpm = {n: 0.0 for n in FANS}
+        # per integration step, so both rpm registers agree
+        self._jitter = {n: 1.0 for n in FANS}
+        self._fan3_quirk = False
+        self._load_driver()
+        # settle the fans at the power-on levels
+        for n in FANS:
+            self.rpm[n] = float(LEVEL_RPMS[n][self.level(n)])
+
+    def _load_driver(self):
+        """Driver state after insmod: default curves, modes from the EC"""
+        self.curves = {n: [list(up), list(down)]
+                       for n, (up, down) in DEFAULT_CURVES.items()}
+        self.modes = {}
+        self.temp_min = 0
+        self.temp_max = 0
+        # ec_state: what the worker read on its last tick
+        self.state = None
+        self._state_read = self._now
+        for n in FANS:
+            self.modes[n] = AUTO
+            self._update_fan_mode(n, count=False)
+
+    def reload(self):
+        """rmmod + insmod: driver state is reset, the EC keeps its registers"""
+        with self.lock:
+            self.generation += 1
+            self._load_driver()
+            # open descriptors poll as ready, like removed sysfs files
+            self.changed.notify_all()
+
+    # ec_read()/ec_write()
+
+    def ec_read(self, reg):
+        self.ec_reads += 1
+        if self.latency:
+            self.sleep(self.latency)
+        if reg == TEMP_REG:
+            return int(round(self.temp)) & 0xFF
+        for n, (hi, lo) in SPEED_REGS.items():
+            if reg in (hi, lo):
+                rpm = self._raw_rpm(n)
+                return rpm >> 8 if reg == hi else rpm & 0xFF
+        return self.regs.get(reg, 0)
+
+    def ec_write(self, reg, val):
+        self.ec_writes += 1
+        if self.latency:
+            self.sleep(self.latency)
+        self.regs[reg] = val & 0xFF
+
+    def _raw_rpm(self, n):
+        if n == 3 and self._fan3_quirk:
+            return 8000
+        return max(0, int(round(self.rpm[n] * self._jitter[n])))
+
+    # physical model
+
+    def level(self, n):
+        """Level register of fan `n`, without counting an EC read"""
+        nibble = self.regs[MODE_REGS[n] + 1] & 0xF
+        try:
+            return LEVEL_NIBBLES.index(nibble)
+        except ValueError:
+            return 0
+
+    def airflow(self):
+        return sum(self.rpm.values()) / 5000.0
+
+    def power(self):
+        mode = POWER_MODES_BY_VALUE.get(self.regs[POWER_MODE_REG], "balanced")
+        return IDLE_POWER + self.load * PACKAGE_POWER[mode]
+
+    def _integrate(self, dt):
+        for n in FANS:
+            if self.regs[MODE_REGS[n]] & 0xF == 0:
+                # auto: the EC firmware picks the level
+                level = sum(1 for t in EC_AUTO_CURVE if self.temp >= t)
+                self.regs[MODE_REGS[n] + 1] = (
+                    self.regs[MODE_REGS[n]] + LEVEL_NIBBLES[level])
+            target = LEVEL_RPMS[n][self.level(n)]
+            tau = SPINUP_TAU if target > self.rpm[n] else SPINDOWN_TAU
+            self.rpm[n] += (target - self.rpm[n]) * min(1.0, dt / tau)
+            if target == 0 and self.rpm[n] < 50:
+                self.rpm[n] = 0.0
+            if self.rpm_noise:
+                self._jitter[n] = 1.0 + self._rnd.gauss(0.0, self.rpm_noise)
+        # fan3 shows 8000 on its way down to a stop
+        self._fan3_quirk = (LEVEL_RPMS[3][self.level(3)] == 0
+                            and 0 < self.rpm[3] < FAN3_QUIRK_RPM)
+        conductance = CONDUCTANCE + FAN_CONDUCTANCE * self.airflow()
+        heat = self.power() - conductance * (self.temp - self.ambient)
+        self.temp += heat * dt / HEAT_CAPACITY
+
+    def advance(self, now=None):
+        """Run the model and the driver's 1 s worker up to `now`"""
+        with self.lock:
+            now = self.clock() if now is None else now
+            while self._now < now:
+                step = min(MAX_STEP, now - self._now,
+                           max(self._worker_due - self._now, 1e-6))
+                self._integrate(step)
+                self._now += step
+                if self._now >= self._worker_due:
+                    self._worker()
+                    self._worker_due += WORKER_PERIOD
+
+    def step(self, seconds):
+        """Advance by `seconds` regardless of the clock, for virtual time"""
+        with self.lock:
+            self.advance(self._now + seconds)
+
+    def set_load(self, load):
+        with self.lock:
+            self.advance()
+            self.load = load
+
+    # driver logic, mirrors ec_su_axb35.c
+
+    def _notify(self, name):
+        if self.notify:
+            self.events[name] += 1
+            self.changed.notify_all()
+
+    def _fan_mode(self, n, val):
+        if val in (0x10, 0x20, 0x30):
+            return AUTO
+        if val in (0x11, 0x21, 0x31):
+            # fixed and curve look the same in the EC
+            return FIXED if self.modes[n] == FIXED else CURVE
+        return self.modes[n]
+
+    def _update_fan_mode(self, n, count=True):
+        val = self.ec_read(MODE_REGS[n]) if count else self.regs[MODE_REGS[n]]
+        self.modes[n] = self._fan_mode(n, val)
+
+    def _read_fan_level(self, n):
+        nibble = self.ec_read(MODE_REGS[n] + 1) & 0xF
+        if nibble in LEVEL_NIBBLES[1:]:
+            return LEVEL_NIBBLES.index(nibble)
+        return 0
+
+    def _write_fan_level(self, n, level):
+        base = (MODE_REGS[n] - 0x21) * 8 + 0x10
+        self.ec_write(MODE_REGS[n] + 1,
+                      base + LEVEL_NIBBLES[min(level, 5)])
+
+    def _read_rpm(self, n):
+        hi, lo = SPEED_REGS[n]
+        rpm = self.ec_read(hi) << 8 | self.ec_read(lo)
+        if n == 3 and rpm == 8000:
+            rpm = 0
+        return rpm
+
+    def _worker(self):
+        reads = self.ec_reads
+        temp = self._curve_step()
+        self._update_state(temp)
+        self.worker_reads += self.ec_reads - reads
+
+    def _update_state(self, temp):
+        if (self.state is not None
+                and self._now > self._state_read + STATE_ACTIVE
+                and self._now < self.state["updated"] + STATE_IDLE):
+            return
+        state = {"temp": temp}
+        for n in FANS:
+            state[f"fan{n}_rpm"] = self._read_rpm(n)
+            # like the driver, the worker leaves the fan's mode alone
+            state[f"fan{n}_mode"] = self._fan_mode(
+                n, self.ec_read(MODE_REGS[n]))
+            state[f"fan{n}_level"] = self._read_fan_level(n)
+        state["power_mode"] = self.ec_read(POWER_MODE_REG)
+        state["updated"] = self._now
+        self.state = state
+
+    def _show_state(self):
+        self._state_read = self._now
+        if self.state is None:
+            raise OSError(errno.ENODATA, os.strerror(errno.ENODATA))
+        state = self.state
+        fields = []
+        for name in STATE_FIELDS:
+            if name in ("temp_min", "temp_max"):
+                fields.append(str(getattr(self, name)))
+            elif name == "power_mode":
+                fields.append(POWER_MODES_BY_VALUE.get(state[name], "unknown"))
+            elif name.endswith("_curve"):
+                curve = self.curves[int(name[3])][
+                    0 if name.endswith("rampup_curve") else 1]
+                fields.append(",".join(str(v) for v in curve[1:]))
+            else:
+                fields.append(str(state[name]))
+        age = int((self._now - state["updated"]) * 1000)
+        return " ".join(fields) + f" {age}\n"
+
+    def _curve_step(self):
+        temp = self.ec_read(TEMP_REG)
+        if self.temp_min == 0 or temp < self.temp_min:
+            self.temp_min = temp
+            self._notify("temp_min")
+        if temp > self.temp_max:
+            self.temp_max = temp
+            self._notify("temp_max")
+        for n in FANS:
+            if self.modes[n] == CURVE:
+                up, down = self.curves[n]
+                level = self._read_fan_level(n)
+                if level < 5 and temp >= up[level + 1]:
+                    self._write_fan_level(n, level + 1)
+                    self._notify(f"fan{n}_level")
+                elif level > 0 and temp <= down[level]:
+                    self._write_fan_level(n, level - 1)
+                    self._notify(f"fan{n}_level")
+        return temp
+
+    def show(self, name):
+        """Contents of attribute `name`, like the driver's show()"""
+        with self.lock:
+            self.advance()
+            if name == "state":
+                return self._show_state()
+            if name == "temp":
+                return f"{self.ec_read(TEMP_REG)}\n"
+            if name == "temp_min":
+                return f"{self.temp_min}\n"
+            if name == "temp_max":
+                return f"{self.temp_max}\n"
+            if name == "power_mode":
+                val = self.ec_read(POWER_MODE_REG)
+                if val not in POWER_MODES_BY_VALUE:
+                    raise OSError(errno.EINVAL, "unknown power mode")
+                return f"{POWER_MODES_BY_VALUE[val]}\n"
+            n = int(name[3])
+            attr = name[5:]
+            if attr == "rpm":
+                return f"{self._read_rpm(n)}\n"
+            if attr == "mode":
+                self._update_fan_mode(n)
+                return f"{self.modes[n]}\n"
+            if attr == "level":
+                return f"{self._read_fan_level(n)}\n"
+            curve = self.curves[n][0 if attr == "rampup_curve" else 1]
+            return ",".join(str(v) for v in curve[1:]) + "\n"
+
+    def raw_rpm(self, n):
+        """rpm register contents without the driver's fan3 fixup"""
+        with self.lock:
+            self.advance()
+            return self._raw_rpm(n)
+
+    def store(self, name, data):
+        """Write attribute `name` like the driver's store(), OSError on error"""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode(errors="replace")
+        # sysfs_streq() ignores one trailing newline
+        value = data[:-1] if data.endswith("\n") else data
+        with self.lock:
+            self.advance()
+            if name == "power_mode":
+                if value not in POWER_MODE_VALUES:
+                    raise OSError(errno.EINVAL, "invalid power mode")
+                self.ec_write(POWER_MODE_REG, POWER_MODE_VALUES[value])
+                self._notify(name)
+                if self.state is not None:
+                    self.state[name] = POWER_MODE_VALUES[value]
+                return
+            if not name.startswith("fan") or name.endswith("_rpm"):
+                raise OSError(errno.EACCES, f"{name} is read-only")
+            n = int(name[3])
+            attr = name[5:]
+            if attr == "level":
+                try:
+                    level = int(value.strip())
+                except ValueError:
+                    raise OSError(errno.EINVAL, "invalid level")
+                if not 0 <= level <= 255:
+                    raise OSError(errno.EINVAL, "invalid level")
+                self._write_fan_level(n, level)
+                self._notify(name)
+                if self.state is not None:
+                    self.state[name] = min(level, 5)
+            elif attr == "mode":
+                if value not in (AUTO, FIXED, CURVE):
+                    raise OSError(errno.EINVAL, "invalid mode")
+                self.modes[n] = value
+                base = (MODE_REGS[n] - 0x21) * 8 + 0x10
+                self.ec_write(MODE_REGS[n], base if value == AUTO else base + 1)
+                if value == CURVE:
+                    temp = self.ec_read(TEMP_REG)
+                    up = self.curves[n][0]
+                    level = next((i for i in range(5, 0, -1)
+                                  if temp >= up[i]), 0)
+                    self._write_fan_level(n, level)
+                    self._notify(f"fan{n}_level")
+                    if self.state is not None:
+                        self.state[f"fan{n}_level"] = level
+                self._notify(name)
+                if self.state is not None:
+                    self.state[name] = value
+            else:
+                # like the driver, tokens after the fifth are ignored
+                try:
+                    values = [int(v) for v in value.split(",")[:5]]
+                except ValueError:
+                    raise OSError(errno.EINVAL, "invalid curve")
+                if len(values) != 5 or not all(0 <= v <= 100 for v in values):
+                    raise OSError(errno.EINVAL, "invalid curve")
+                curve = self.curves[n][0 if attr == "rampup_curve" else 1]
+                curve[1:] = values
+                self._notify(name)
+
+
+
+_READ_ONLY = ({"temp", "temp_min", "temp_max", "state"} |
+              {f"fan{n}_rpm" for n in FANS})
+
+
+class _SimFile:
+    __slots__ = ("name", "generation", "writable", "event")
+
+    def __init__(self, name, generation, writable):
+        self.name = name
+        self.generation = generation
+        self.writable = writable
+        # ec.events[name] at the last read, like kernfs' of->event
+        self.event = -1
+
+
+class SimIO:
+    """
+    OsIO stand-in serving `ec` as a sysfs tree below `base_path`.
+    Descriptors opened before `ec.reload()` fail with ENODEV like
+    real sysfs files of an unloaded module, and the class directory
+    gets a new inode number. `stall(name)`, if given, is called before
+    every read and returns the seconds the read of `name` hangs before
+    it reaches the driver. One that sleeps itself while holding
+    `ec.lock` stalls every EC access, like busy firmware.
+    """
+
+    def __init__(self, ec, base_path="/sys/class/ec_su_axb35", stall=None):
+        self.ec = ec
+        self.base_path = base_path
+        self.stall = stall
+        self._by_path = {os.path.join(base_path, rel): name
+                         for name, rel in ATTRIBUTES.items()}
+        self._dirs = {base_path} | {os.path.dirname(p) for p in self._by_path}
+        self._by_path[os.path.join(base_path, STATE_PATH)] = "state"
+        self._files = {}
+        self._next_fd = 1000
+        self._lock = threading.Lock()
+
+    def open(self, path, flags, mode=0o777):
+        name = self._by_path.get(path)
+        if name is None:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        writable = flags & (os.O_WRONLY | os.O_RDWR) != 0
+        if writable and name in _READ_ONLY:
+            raise OSError(errno.EACCES, os.strerror(errno.EACCES), path)
+        with self._lock:
+            fd = self._next_fd
+            self._next_fd += 1
+            self._files[fd] = _SimFile(name, self.ec.generation, writable)
+        return fd
+
+    def _file(self, fd):
+        f = self._files.get(fd)
+        if f is None:
+            raise OSError(errno.EBADF, os.strerror(errno.EBADF))
+        if f.generation != self.ec.generation:
+            raise OSError(errno.ENODEV, os.strerror(errno.ENODEV))
+        return f
+
+    def close(self, fd):
+        with self._lock:
+            if self._files.pop(fd, None) is None:
+                raise OSError(errno.EBADF, os.strerror(errno.EBADF))
+
+    def preadv(self, fd, buffers, offset):
+        f = self._file(fd)
+        name = f.name
+        if self.stall:
+            seconds = self.stall(name)
+            if seconds:
+                time.sleep(seconds)
+        f.event = self.ec.events.get(name, 0)
+        data = self.ec.show(name).encode()[offset:]
+        n = 0
+        for buf in buffers:
+            chunk = data[n:n + len(buf)]
+            buf[:len(chunk)] = chunk
+            n += len(chunk)
+            if n == len(data):
+                break
+        return n
+
+    def write(self, fd, data):
+        f = self._file(fd)
+        if not f.writable:
+            raise OSError(errno.EBADF, os.strerror(errno.EBADF))
+        self.ec.store(f.name, data)
+        return len(data)
+
+    def poll(self):
+        return SimPoll(self)
+
+    def stat(self, path):
+        if path in self._dirs:
+            mode = stat_mod.S_IFDIR | 0o755
+        elif path in self._by_path:
+            mode = stat_mod.S_IFREG | (
+                0o444 if self._by_path[path] in _READ_ONLY else 0o644)
+        else:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        # st_ino changes with every reload, SysfsSampler checks it
+        return os.stat_result((mode, hash(path) & 0xFFFF | self.ec.generation
+                               << 16, 0, 1, 0, 0, 4096, 0, 0, 0))
+
+
+class SimPoll:
+    """
+    select.poll() stand-in for SimIO descriptors: POLLPRI | POLLERR once
+    the attribute was notified after its last read, or the driver was
+    reloaded. Waiting runs the model, so the curve worker's changes
+    come in on time.
+    """
+
+    def __init__(self, io):
+        self.io = io
+        self._fds = {}
+
+    def register(self, fd, eventmask=select.POLLIN | select.POLLPRI |
+                 select.POLLOUT):
+        self._fds[fd] = eventmask
+
+    def modify(self, fd, eventmask):
+        if fd not in self._fds:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT))
+        self._fds[fd] = eventmask
+
+    def unregister(self, fd):
+        del self._fds[fd]
+
+    def _ready(self):
+        ec = self.io.ec
+        ready = []
+        for fd, mask in self._fds.items():
+            f = self.io._files.get(fd)
+            if f is None:
+                ready.append((fd, select.POLLNVAL))
+            elif (f.generation != ec.generation or
+                  f.event != ec.events.get(f.name, 0)):
+                ready.append((fd, (mask & select.POLLPRI) | select.POLLERR))
+        return ready
+
+    def poll(self, timeout=None):
+        """Ready (fd, events) pairs, waits up to `timeout` ms (None: forever)"""
+        ec = self.io.ec
+        end = None
+        if timeout is not None and timeout >= 0:
+            end = time.monotonic() + timeout / 1000
+        with ec.changed:
+            while True:
+                ec.advance()
+                ready = self._ready()
+                if ready:
+                    return ready
+                wait = max(0.001, ec._worker_due - ec._now)
+                if end is not None:
+                    left = end - time.monotonic()
+                    if left <= 0:
+                        return []
+                    wait = min(wait, left)
+                ec.changed.wait(wait)
+
+
+class TreeMirror:
+    """
+    Keeps a real directory in sync with `ec` from a background thread:
+    every `period` seconds values written to the files are passed to
+    ec.store() and all files are rewritten in place. Invalid writes
+    cannot fail like on sysfs, they are reverted on the next pass.
+    """
+
+    def __init__(self, ec, path, period=0.1):
+        self.ec = ec
+        self.path = path
+        self.period = period
+        self.store_errors = 0
+        self._rendered = {}
+        self._stop = threading.Event()
+        make_fake_tree(path, {name: ec.show(name).strip()
+                              for name in ATTRIBUTES})
+        self.sync()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="axb35-sim-mirror")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def sync(self):
+        """Pick up writes, then re-render every attribute"""
+        for name, rel in list(ATTRIBUTES.items()) + [("state", STATE_PATH)]:
+            full = os.path.join(self.path, rel)
+            if name not in _READ_ONLY and name in self._rendered:
+                try:
+                    with open(full, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    data = b""
+                # empty means a writer is between truncate and write
+                if data and data != self._rendered[name]:
+                    try:
+                        self.ec.store(name, data)
+                    except OSError:
+                        self.store_errors += 1
+            try:
+                data = self.ec.show(name).encode()
+            except OSError:
+                # e.g. state before the worker's first tick
+                data = b""
+            if data != self._rendered.get(name):
+                # in place, so open descriptors see the new value
+                fd = os.open(full, os.O_WRONLY)
+                try:
+                    os.pwrite(fd, data, 0)
+                    os.ftruncate(fd, len(data))
+                finally:
+                    os.close(fd)
+                self._rendered[name] = data
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self.sync()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python3 -m axb35.sim",
+        description="Mirror a simulated ec_su_axb35 into a directory")
+    parser.add_argument("path", help="directory to create the tree in")
+    parser.add_argument("--load", type=float, default=0.2,
+                        help="APU load 0..1 (default 0.2)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds per EC read/write (default 0)")
+    parser.add_argument("--period", type=float, default=0.1,
+                        help="seconds between syncs (default 0.1)")
+    parser.add_argument("--rpm-noise", type=float, default=0.0,
+                        help="relative noise of rpm readings (default 0)")
+    args = parser.parse_args(argv)
+
+    ec = SimulatedEC(load=args.load, latency=args.latency,
+                     rpm_noise=args.rpm_noise)
+    print(f"simulating ec_su_axb35 in {args.path}, "
+          f"use AXB35_PATH={args.path}")
+    with TreeMirror(ec, args.path, args.period):
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,456 @@
+"""
+Low level access to the /sys/class/ec_su_axb35 attributes
+"""
+import os
+import select
+import time
+from collections import namedtuple
+
+DEFAULT_BASE_PATH = "/sys/class/ec_su_axb35"
+# AXB35_PATH points every tool at another tree, e.g. a fake one
+BASE_PATH = os.environ.get("AXB35_PATH") or DEFAULT_BASE_PATH
+
+FANS = (1, 2, 3)
+FAN_MODES = ("auto", "fixed", "curve")
+POWER_MODES = ("quiet", "balanced", "performance")
+CURVES = ("rampup", "rampdown")
+
+# attribute name -> path relative to the class directory
+ATTRIBUTES = {
+    "temp": "temp1/temp",
+    "temp_min": "temp1/min",
+    "temp_max": "temp1/max",
+}
+for _fan in FANS:
+    for _attr in ("rpm", "mode", "level", "rampup_curve", "rampdown_curve"):
+        ATTRIBUTES[f"fan{_fan}_{_attr}"] = f"fan{_fan}/{_attr}"
+ATTRIBUTES["power_mode"] = "apu/power_mode"
+
+# what the GUI monitor loop polls every tick
+MONITOR_ATTRIBUTES = ("temp", "fan1_rpm", "fan2_rpm", "fan3_rpm")
+
+# what the driver calls sysfs_notify() on when it changes
+NOTIFY_ATTRIBUTES = tuple(name for name in ATTRIBUTES
+                          if name != "temp" and not name.endswith("_rpm"))
+
+# the class attribute with everything above in one line, served from
+# what the driver's worker read on its last tick; newer drivers only
+STATE_PATH = "state"
+STATE_FIELDS = (
+    tuple(f"fan{n}_{attr}" for attr in ("rpm", "mode", "level",
+                                        "rampup_curve", "rampdown_curve")
+          for n in FANS) +
+    ("temp", "temp_min", "temp_max", "power_mode"))
+# the values the worker read from the EC, the others are live
+STATE_CACHED = tuple(name for name in STATE_FIELDS
+                     if not name.endswith("_curve")
+                     and name not in ("temp_min", "temp_max"))
+
+# ec_read()/ec_write() calls the driver makes per show()/store(), the
+# curves and temp min/max only live in driver memory
+EC_READS = {"temp": 1, "temp_min": 0, "temp_max": 0, "power_mode": 1}
+EC_WRITES = {"power_mode": 1}
+for _fan in FANS:
+    EC_READS.update({f"fan{_fan}_rpm": 2, f"fan{_fan}_mode": 1,
+                     f"fan{_fan}_level": 1, f"fan{_fan}_rampup_curve": 0,
+                     f"fan{_fan}_rampdown_curve": 0})
+    # switching to curve also reads temp and writes a level
+    EC_WRITES.update({f"fan{_fan}_mode": 1, f"fan{_fan}_level": 1,
+                      f"fan{_fan}_rampup_curve": 0,
+                      f"fan{_fan}_rampdown_curve": 0})
+
+
+def parse_choice(value, choices):
+    """Extract the active entry from a "[auto] fixed curve" style value"""
+    if '[' in value:
+        for choice in choices:
+            if f'[{choice}]' in value:
+                return choice
+    return value
+
+
+def parse_curve(value):
+    """Parse a "60,70,83,95,97" curve into a tuple of 5 ints"""
+    try:
+        values = tuple(int(x) for x in value.replace(',', ' ').split())
+    except ValueError:
+        return None
+    return values if len(values) == 5 else None
+
+
+def _parse_int(raw):
+    return int(raw)
+
+
+def _parse_fan_mode(raw):
+    return parse_choice(raw.decode().strip(), FAN_MODES)
+
+
+def _parse_power_mode(raw):
+    return parse_choice(raw.decode().strip(), POWER_MODES)
+
+
+def _parse_curve(raw):
+    return parse_curve(raw.decode())
+
+
+def _parser_for(name):
+    if name == "power_mode":
+        return _parse_power_mode
+    if name.endswith("_mode"):
+        return _parse_fan_mode
+    if name.endswith("_curve"):
+        return _parse_curve
+    return _parse_int
+
+
+def parse_value(name, raw):
+    """Parse the raw bytes of attribute `name`, None if unparsable"""
+    try:
+        return _parser_for(name)(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# typing.NamedTuple would add ~10ms to every CLI start
+FanState = namedtuple("FanState", "rpm mode level rampup rampdown",
+                      defaults=(None,) * 5)
+
+
+class Snapshot(namedtuple("Snapshot", "timestamp temp temp_min temp_max "
+                          "fans power_mode stale",
+                          defaults=(None, None, None,
+                                    (FanState(),) * len(FANS), None,
+                                    frozenset()))):
+    """
+    State of the EC at one point in time, None for unread attributes.
+    `stale` names the attributes whose read didn't finish in time, they
+    hold the last value read before.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_values(cls, timestamp, values, stale=frozenset()):
+        """Build a snapshot from an attribute name -> parsed value mapping"""
+        get = values.get
+        fans = tuple(
+            FanState(get(f"fan{n}_rpm"), get(f"fan{n}_mode"),
+                     get(f"fan{n}_level"), get(f"fan{n}_rampup_curve"),
+                     get(f"fan{n}_rampdown_curve"))
+            for n in FANS)
+        return cls(timestamp, get("temp"), get("temp_min"), get("temp_max"),
+                   fans, get("power_mode"), frozenset(stale))
+
+    def fan(self, fan_num):
+        return self.fans[fan_num - 1]
+
+    @property
+    def rpms(self):
+        return tuple(f.rpm for f in self.fans)
+
+    def as_dict(self):
+        """JSON friendly layout, same keys as `su_axb35_monitor -j`"""
+        data = {"timestamp": self.timestamp}
+        for n, fan in zip(FANS, self.fans):
+            data[f"fan{n}"] = {
+                "rpm": fan.rpm,
+                "mode": fan.mode,
+                "level": fan.level,
+                "rampup_curve": list(fan.rampup) if fan.rampup else None,
+                "rampdown_curve": list(fan.rampdown) if fan.rampdown else None,
+            }
+        data["temperature"] = {
+            "current": self.temp,
+            "min": self.temp_min,
+            "max": self.temp_max,
+        }
+        data["power_mode"] = self.power_mode
+        if self.stale:
+            data["stale"] = sorted(self.stale)
+        return data
+
+
+if hasattr(os, "preadv"):
+    _preadv = os.preadv
+else:
+    def _preadv(fd, buffers, offset):
+        data = os.pread(fd, len(buffers[0]), offset)
+        buffers[0][:len(data)] = data
+        return len(data)
+
+
+class OsIO:
+    """
+    The system calls all sysfs access goes through. Anything with the
+    same methods can stand in, e.g. the simulated EC in axb35.sim.
+    """
+    open = staticmethod(os.open)
+    close = staticmethod(os.close)
+    write = staticmethod(os.write)
+    stat = staticmethod(os.stat)
+    preadv = staticmethod(_preadv)
+    poll = staticmethod(select.poll)
+
+
+OS_IO = OsIO()
+
+
+def read_sysfs(path, io=OS_IO):
+    """Read value from sysfs file, raises OSError"""
+    fd = io.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        buf = bytearray(4096)
+        n = io.preadv(fd, [buf], 0)
+    finally:
+        io.close(fd)
+    return buf[:n].decode().strip()
+
+
+def write_sysfs(path, value, io=OS_IO):
+    """Write value to sysfs file, raises OSError"""
+    fd = io.open(path, os.O_WRONLY | os.O_TRUNC | os.O_CLOEXEC)
+    try:
+        io.write(fd, str(value).encode())
+    finally:
+        io.close(fd)
+
+
+class SysfsSampler:
+    """
+    Keeps the sampled attributes open and re-reads them with pread()
+    at offset 0, which makes sysfs call the show() handler again.
+    Descriptors that fail, or whose class directory was recreated by
+    a module reload, are reopened.
+    """
+    BUFSIZE = 64
+
+    def __init__(self, base_path=BASE_PATH, attributes=None, io=OS_IO):
+        self.base_path = base_path
+        self.io = io
+        self.attributes = tuple(attributes or ATTRIBUTES)
+        self.paths = [os.path.join(base_path, ATTRIBUTES[name])
+                      for name in self.attributes]
+        self._parsers = [_parser_for(name) for name in self.attributes]
+        self._bufs = [bytearray(self.BUFSIZE) for _ in self.attributes]
+        self._views = [[memoryview(buf)] for buf in self._bufs]
+        self._fds = [-1] * len(self.attributes)
+        self._dir_id = None
+        self.reopen_count = 0
+        self.error_count = 0
+
+    def _open(self, index):
+        try:
+            self._fds[index] = self.io.open(self.paths[index],
+                                            os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self._fds[index] = -1
+        return self._fds[index]
+
+    def _close(self, index):
+        fd = self._fds[index]
+        self._fds[index] = -1
+        if fd >= 0:
+            try:
+                self.io.close(fd)
+            except OSError:
+                pass
+
+    def close(self):
+        for i in range(len(self._fds)):
+            self._close(i)
+
+    def reopen(self):
+        """Drop all descriptors, they are reopened lazily"""
+        self.close()
+        self.reopen_count += 1
+
+    def _revalidate(self):
+        try:
+            st = self.io.stat(self.base_path)
+            dir_id = (st.st_dev, st.st_ino)
+        except OSError:
+            dir_id = None
+        if dir_id != self._dir_id:
+            if self._dir_id is not None:
+                self.reopen()
+            self._dir_id = dir_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self, index):
+        fd = self._fds[index]
+        if fd < 0:
+            fd = self._open(index)
+            if fd < 0:
+                return None
+        try:
+            n = self.io.preadv(fd, self._views[index], 0)
+            return self._parsers[index](self._bufs[index][:n])
+        except OSError:
+            # stale descriptor, e.g. the module was reloaded
+            self.error_count += 1
+            self._close(index)
+            if self._open(index) < 0:
+                return None
+            self.reopen_count += 1
+            try:
+                n = self.io.preadv(self._fds[index], self._views[index], 0)
+                return self._parsers[index](self._bufs[index][:n])
+            except (OSError, ValueError, UnicodeDecodeError):
+                return None
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def fileno(self, name):
+        """Descriptor of attribute `name`, opened if needed, -1 if it can't be"""
+        index = self.attributes.index(name)
+        fd = self._fds[index]
+        return fd if fd >= 0 else self._open(index)
+
+    def read_value(self, name):
+        """Read attribute `name` only, None on failure"""
+        return self._read(self.attributes.index(name))
+
+    def read_values(self):
+        """Read all attributes, returns a name -> parsed value dict"""
+        self._revalidate()
+        return {name: self._read(i) for i, name in enumerate(self.attributes)}
+
+    def sample(self):
+        """Read all attributes once and return a Snapshot"""
+        values = self.read_values()
+        return Snapshot.from_values(time.time(), values)
+
+
+def parse_state(raw):
+    """
+    Parse the bytes of the "state" attribute into a name -> parsed
+    value dict and the age of the EC values in seconds. Raises
+    ValueError if the line is cut short.
+    """
+    fields = raw.split()
+    if len(fields) != len(STATE_FIELDS) + 1:
+        raise ValueError(f"state has {len(fields)} fields, expected "
+                         f"{len(STATE_FIELDS) + 1}")
+    values = {name: parse_value(name, field)
+              for name, field in zip(STATE_FIELDS, fields)}
+    if values["power_mode"] not in POWER_MODES:
+        # power_mode itself fails to read then
+        values["power_mode"] = None
+    return values, int(fields[-1]) / 1000
+
+
+class StateSampler:
+    """
+    Reads all attributes at once from the "state" attribute: one pread()
+    on a descriptor kept open and no EC access, the driver serves the
+    values its worker read at most a second ago, up to 10 s when state
+    wasn't read for a while. `age` is how old those were on the last
+    read, None if it failed. With `max_age`, older ones are listed in
+    `stale` like DeadlineSampler does, e.g. while the worker is stuck
+    behind a hung EC.
+    """
+    BUFSIZE = 1024
+
+    def __init__(self, base_path=BASE_PATH, io=OS_IO, max_age=None):
+        self.base_path = base_path
+        self.io = io
+        self.max_age = max_age
+        self.attributes = STATE_FIELDS
+        self.path = os.path.join(base_path, STATE_PATH)
+        self._buf = bytearray(self.BUFSIZE)
+        self._view = [memoryview(self._buf)]
+        self._fd = -1
+        self._dir_id = None
+        self.age = None
+        self.stale = {}
+        self.reopen_count = 0
+        self.error_count = 0
+
+    def _open(self):
+        try:
+            self._fd = self.io.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self._fd = -1
+        return self._fd
+
+    def close(self):
+        fd, self._fd = self._fd, -1
+        if fd >= 0:
+            try:
+                self.io.close(fd)
+            except OSError:
+                pass
+
+    def _revalidate(self):
+        try:
+            st = self.io.stat(self.base_path)
+            dir_id = (st.st_dev, st.st_ino)
+        except OSError:
+            dir_id = None
+        if dir_id != self._dir_id:
+            if self._dir_id is not None:
+                self.close()
+                self.reopen_count += 1
+            self._dir_id = dir_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self):
+        if self._fd < 0 and self._open() < 0:
+            return None
+        try:
+            n = self.io.preadv(self._fd, self._view, 0)
+        except OSError:
+            # stale descriptor, or ENODATA before the worker's first tick
+            self.error_count += 1
+            self.close()
+            if self._open() < 0:
+                return None
+            self.reopen_count += 1
+            try:
+                n = self.io.preadv(self._fd, self._view, 0)
+            except OSError:
+                return None
+        try:
+            return parse_state(self._buf[:n])
+        except ValueError:
+            return None
+
+    def read_values(self):
+        """Read the state once, returns a name -> parsed value dict"""
+        self._revalidate()
+        result = self._read()
+        if result is None:
+            self.age = None
+            self.stale = {}
+            return dict.fromkeys(STATE_FIELDS)
+        values, self.age = result
+        if self.max_age is not None and self.age > self.max_age:
+            self.stale = dict.fromkeys(STATE_CACHED, self.age)
+        else:
+            self.stale = {}
+        return values
+
+    def sample(self):
+        """Read once, the Snapshot is timestamped when the EC was read"""
+        values = self.read_values()
+        age = self.age or 0.0
+        return Snapshot.from_values(time.time() - age, values, self.stale)
+
+
+def has_state(base_path=BASE_PATH, io=OS_IO):
+    """Whether the driver at `base_path` has the "state" attribute"""
+    try:
+        io.stat(os.path.join(base_path, STATE_PATH))
+    except OSError:
+        return False
+    return True
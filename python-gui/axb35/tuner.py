@@ -0,0 +1,326 @@
+"""
+Offline fan curve tuning: replays a recorded day against thousands of
+candidate rampup/rampdown pairs at once and keeps the Pareto-best ones
+for peak temperature, fan level-seconds and level switches.
+
+A trace is the heat the APU put out, one value per second. It comes
+from a load trace (CSV with `time,load[,power_mode]` columns, through
+the power model of axb35.sim) or from an axb35 recording, by running
+the thermal model of axb35.sim backwards over the recorded temperature
+and fan speeds. Each candidate is then run through that model with the
+driver's curve worker: once a second a fan in curve mode steps one
+level up when the temperature reached the rampup point of the next
+level, or one down when it fell to the rampdown point of its own.
+Fans that aren't tuned are left to the EC's auto curve. Candidates
+live in the rows of NumPy arrays, so a step of the model is a few
+array operations for all of them.
+
+Candidates keep the rules the GUI enforces (see axb35.curve): both
+curves rise from level 1 to 5, within the sliders' range, and no
+rampdown point is above its rampup point.
+"""
+import csv
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .curve import POINTS, TEMP_RANGE
+from .recording import MAGIC, Recording
+from .sim import (CONDUCTANCE, DEFAULT_CURVES, EC_AUTO_CURVE, FAN_CONDUCTANCE,
+                  HEAT_CAPACITY, IDLE_POWER, LEVEL_RPMS, PACKAGE_POWER)
+from .sysfs import FANS
+
+# seconds per model step, the driver's worker period
+STEP = 1.0
+# whole degree readings the worker tables cover, hotter ones count as
+# the last
+READINGS = 128
+# fans the driver runs on a curve by default
+DEFAULT_FANS = (1, 2)
+
+# `power` is W per STEP, `temp` the °C to start from
+Trace = namedtuple("Trace", "power temp ambient")
+# one curve pair with its scores, over all tuned fans
+Candidate = namedtuple("Candidate",
+                       "rampup rampdown peak level_seconds switches")
+
+
+def trace_from_loads(loads, power_modes=None, ambient=25.0, temp=None):
+    """
+    Trace of per-second APU loads (0..1), in `power_modes` (one per
+    second, default balanced); starts at `temp`, like SimulatedEC
+    """
+    loads = np.clip(np.asarray(loads, dtype=float), 0.0, 1.0)
+    if power_modes is None:
+        package = PACKAGE_POWER["balanced"]
+    else:
+        package = np.array([PACKAGE_POWER.get(mode or "balanced",
+                                              PACKAGE_POWER["balanced"])
+                            for mode in power_modes])
+    temp = ambient + 25.0 if temp is None else float(temp)
+    return Trace(IDLE_POWER + loads * package, temp, ambient)
+
+
+def trace_from_recording(recording, start=None, end=None, ambient=25.0,
+                         smooth=30):
+    """
+    Trace of the heat behind a recording's temperature and fan speeds:
+    what heated the model's heat capacity by what it gained plus what
+    the fans carried away. The recorded whole degrees are smoothed over
+    `smooth` seconds first, gaps are bridged by interpolation.
+    """
+    rows = np.array([row[:5] for row in recording.rows(start, end)
+                     if row[1] != 255], dtype=float)
+    if len(rows) < 2:
+        raise ValueError("recording has less than 2 temperature samples")
+    times = np.arange(rows[0, 0], rows[-1, 0], STEP)
+    temp = np.interp(times, rows[:, 0], rows[:, 1])
+    # unknown rpm (65535) counts as stopped
+    rpms = np.where(rows[:, 2:5] == 0xFFFF, 0.0, rows[:, 2:5])
+    airflow = np.interp(times, rows[:, 0], rpms.sum(axis=1)) / 5000.0
+    if smooth > 1 and len(temp) > smooth:
+        kernel = np.ones(int(smooth)) / int(smooth)
+        pad = int(smooth) // 2
+        padded = np.pad(temp, (pad, int(smooth) - 1 - pad), mode="edge")
+        temp = np.convolve(padded, kernel, mode="valid")
+    gained = np.diff(temp, append=temp[-1]) * HEAT_CAPACITY / STEP
+    lost = (CONDUCTANCE + FAN_CONDUCTANCE * airflow) * (temp - ambient)
+    return Trace(np.maximum(gained + lost, 0.0), float(temp[0]), ambient)
+
+
+def load_trace(path, start=None, end=None, ambient=25.0):
+    """Trace from an axb35 recording or a load CSV, raises ValueError"""
+    with open(path, "rb") as f:
+        is_recording = f.read(len(MAGIC)) == MAGIC
+    if is_recording:
+        with Recording(path) as recording:
+            return trace_from_recording(recording, start, end, ambient)
+
+    loads, modes, times = [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                times.append(float(row["time"]))
+                loads.append(float(row["load"]))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{path}: need time and load columns, "
+                                 f"line {len(times) + 2}") from None
+            modes.append(row.get("power_mode") or None)
+    if len(times) < 2:
+        raise ValueError(f"{path}: less than 2 samples")
+    times = np.array(times)
+    keep = (times >= (start if start is not None else -math.inf)) & \
+        (times <= (end if end is not None else math.inf))
+    times, loads = times[keep], np.array(loads)[keep]
+    modes = [m for m, k in zip(modes, keep) if k]
+    if len(times) < 2:
+        raise ValueError(f"{path}: less than 2 samples in range")
+    # hold each sample until the next one, on a 1 s grid
+    grid = np.arange(times[0], times[-1], STEP)
+    index = np.searchsorted(times, grid, side="right") - 1
+    return trace_from_loads(loads[index], [modes[i] for i in index],
+                            ambient)
+
+
+def candidates(count, seed=0, temp_range=TEMP_RANGE, max_gap=15,
+               include=()):
+    """
+    (rampup, rampdown) int arrays of `count` random valid curve pairs,
+    rampdown at most `max_gap` °C under rampup; `include` pairs come
+    first
+    """
+    rnd = np.random.default_rng(seed)
+    lo, hi = temp_range
+    count = max(count, len(include))
+    up = np.sort(rnd.integers(lo, hi + 1, size=(count, POINTS)), axis=1)
+    gap = rnd.integers(0, max_gap + 1, size=(count, POINTS))
+    # a running max keeps rampdown rising and, as rampup rises too,
+    # never lifts it over rampup
+    down = np.maximum.accumulate(np.maximum(up - gap, lo), axis=1)
+    for i, (rampup, rampdown) in enumerate(include):
+        up[i], down[i] = rampup, rampdown
+    return up.astype(np.int16), down.astype(np.int16)
+
+
+def check_pair(rampup, rampdown):
+    """Raise ValueError unless a pair keeps the GUI's rules"""
+    if len(rampup) != POINTS or len(rampdown) != POINTS:
+        raise ValueError(f"curves need {POINTS} points")
+    if list(rampup) != sorted(rampup) or list(rampdown) != sorted(rampdown):
+        raise ValueError("curves must rise from level 1 to 5")
+    if any(d > u for u, d in zip(rampup, rampdown)):
+        raise ValueError("rampdown above rampup")
+
+
+def _block(n):
+    """States per level: one per candidate, at least one per reading"""
+    return max(n, READINGS)
+
+
+def _transitions(rampup, rampdown):
+    """
+    The worker as a table. A candidate's state is its level times
+    _block(n) plus its row; the table holds the state after one tick
+    at reading * (levels * block) + state. Candidates with the same
+    reading and level are next to each other, and as they all follow
+    the same trace, one tick touches a few small parts of it.
+    """
+    n = len(rampup)
+    block = _block(n)
+    # thresholds by level as the worker indexes them: up[level + 1]
+    # to step up, down[level] to step down; level 5 and 0 never do
+    up = np.full((POINTS + 1, block), np.inf)
+    up[:POINTS, :n] = rampup.T
+    down = np.full((POINTS + 1, block), -np.inf)
+    down[1:, :n] = rampdown.T
+    reading = np.arange(READINGS)[:, None, None]
+    level = np.arange(POINTS + 1)[None, :, None]
+    raise_ = reading >= up
+    lower = ~raise_ & (reading <= down)
+    after = (level + raise_ - lower) * block + np.arange(block)
+    return after.reshape(-1).astype(np.intp)
+
+
+def simulate(trace, rampup, rampdown, fans=DEFAULT_FANS):
+    """
+    Run every row of the (n, 5) `rampup`/`rampdown` arrays over
+    `trace`, on all of `fans`. Returns the arrays (peak °C, level
+    seconds, level switches), summed over the tuned fans.
+
+    Fans are taken to reach the speed of a level within the second,
+    their spin-up takes 1.5 s against minutes for the temperature.
+    """
+    rampup = np.asarray(rampup)
+    n = len(rampup)
+    block = _block(n)
+    fans = tuple(fans)
+    after = _transitions(rampup, np.asarray(rampdown))
+
+    # conductance at level * block + reading: the tuned fans at the
+    # level, the others where the EC's auto curve puts them
+    tuned = sum(np.array(LEVEL_RPMS[f], dtype=float) for f in fans)
+    auto = sum((np.array(LEVEL_RPMS[f], dtype=float)
+                for f in FANS if f not in fans), np.zeros(POINTS + 1))
+    auto_level = (np.arange(READINGS)[:, None] >=
+                  np.array(EC_AUTO_CURVE)).sum(axis=1)
+    conductance = np.zeros((POINTS + 1, block))
+    conductance[:, :READINGS] = CONDUCTANCE + FAN_CONDUCTANCE * (
+        tuned[:, None] + auto[auto_level][None, :]) / 5000.0
+    conductance = conductance.reshape(-1)
+    # an Euler step is temp * keep + gain + power * scale
+    scale = STEP / HEAT_CAPACITY
+    keep = 1.0 - conductance * scale
+    gain = conductance * trace.ambient * scale
+
+    temp = np.full(n, float(trace.temp))
+    # the driver picks the level for the temperature when curve mode
+    # is switched on
+    start = (round(trace.temp) >= rampup).sum(axis=1)
+    rows = np.arange(n, dtype=np.intp)
+    state = start * block + rows
+    stride = (POINTS + 1) * block
+    peak = temp.copy()
+    level_ticks = np.zeros(n, dtype=np.intp)
+    switches = np.zeros(n, dtype=np.intp)
+    half = np.empty(n)
+    reading = np.empty(n, dtype=np.intp)
+    index = np.empty(n, dtype=np.intp)
+    for power in trace.power:
+        # ec_update_worker: at most one level per tick, on whole degrees
+        # (temperatures are positive, so this rounds)
+        np.add(temp, 0.5, out=half)
+        np.copyto(reading, half, casting="unsafe")
+        np.minimum(reading, READINGS - 1, out=reading)
+        np.multiply(reading, stride, out=index)
+        index += state
+        new = after.take(index)
+        switches += new != state
+        state = new
+        # level * block, then the conductance at it and the reading
+        np.subtract(state, rows, out=index)
+        level_ticks += index
+        index += reading
+        temp *= keep.take(index)
+        temp += gain.take(index)
+        temp += power * scale
+        np.maximum(peak, temp, out=peak)
+    level_seconds = level_ticks // block * STEP * len(fans)
+    return peak, level_seconds, switches * len(fans)
+
+
+def pareto(*objectives):
+    """Indices of the rows no other row beats in every objective"""
+    points = np.column_stack(objectives)
+    # equal rows would keep each other, keep the first of each
+    points, first = np.unique(points, axis=0, return_index=True)
+    keep = np.ones(len(points), dtype=bool)
+    for i in range(len(points)):
+        if not keep[i]:
+            continue
+        dominated = np.all(points[i] <= points, axis=1) & \
+            np.any(points[i] < points, axis=1)
+        keep &= ~dominated
+    return np.sort(first[keep])
+
+
+def tune(trace, count=2048, seed=0, fans=DEFAULT_FANS, baseline=None,
+         temp_range=TEMP_RANGE, max_gap=15):
+    """
+    Search `count` candidates over `trace`. Returns the Pareto front
+    as Candidates, fewest level-seconds first, and the `baseline`
+    (rampup, rampdown) pair scored the same way, or None.
+    """
+    include = [baseline] if baseline is not None else []
+    up, down = candidates(count, seed, temp_range, max_gap, include)
+    peak, level_seconds, switches = simulate(trace, up, down, fans)
+    # whole tenths of a degree, finer differences are model noise
+    peak = np.round(peak, 1)
+
+    def candidate(i):
+        return Candidate(up[i].tolist(), down[i].tolist(), float(peak[i]),
+                         float(level_seconds[i]), int(switches[i]))
+
+    front = [candidate(i) for i in pareto(peak, level_seconds, switches)]
+    front.sort(key=lambda c: (c.level_seconds, c.peak, c.switches))
+    return front, candidate(0) if include else None
+
+
+def pick(front, max_temp=None, max_switches=None):
+    """
+    The front's candidate with the fewest level-seconds that stays at
+    or under `max_temp` °C and `max_switches`. If none does, the
+    coolest within `max_switches`, or the coolest of all.
+    """
+    calm = [c for c in front
+            if max_switches is None or c.switches <= max_switches] or front
+    fitting = [c for c in calm if max_temp is None or c.peak <= max_temp]
+    if not fitting:
+        return min(calm, key=lambda c: (c.peak, c.level_seconds))
+    return min(fitting, key=lambda c: (c.level_seconds, c.switches))
+
+
+def to_profile(candidate, fans=DEFAULT_FANS):
+    """A profile that puts `fans` in curve mode with the candidate's curves"""
+    return {"fans": {str(fan): {"mode": "curve",
+                                "rampup_curve": list(candidate.rampup),
+                                "rampdown_curve": list(candidate.rampdown)}
+                     for fan in fans}}
+
+
+def default_baseline(fan=1):
+    """The curves the driver loads with for `fan`"""
+    up, down = DEFAULT_CURVES[fan]
+    return list(up[1:]), list(down[1:])
+
+
+HEADER = (f"{'rampup':<15} {'rampdown':<15} {'peak °C':>7} {'level h':>8} "
+          f"{'switches':>8}")
+
+
+def format_candidate(candidate):
+    up = ",".join(map(str, candidate.rampup))
+    down = ",".join(map(str, candidate.rampdown))
+    return (f"{up:<15} {down:<15} {candidate.peak:>7.1f} "
+            f"{candidate.level_seconds / 3600:>8.1f} {candidate.switches:>8}")
+
@@ -0,0 +1,100 @@
+"""
+Coalesced, diff-based UI updates from the monitor thread.
+
+The monitor thread posts a snapshot per tick; at most one Tk callback
+is queued at a time and it always applies the newest snapshot, so
+ticks that arrive while the Tk loop is busy are dropped instead of
+piling up. Widgets are only reconfigured when their text changes.
+"""
+import threading
+import time
+
+
+class UiStats:
+    """Counts Tk callbacks, widget reconfigurations and dropped ticks"""
+
+    def __init__(self):
+        self.callbacks = 0
+        self.reconfigs = 0
+        self.dropped = 0
+        self._last = (time.monotonic(), 0, 0, 0)
+
+    def rates(self):
+        """Per second rates since the previous call"""
+        now = time.monotonic()
+        t, callbacks, reconfigs, dropped = self._last
+        self._last = (now, self.callbacks, self.reconfigs, self.dropped)
+        dt = max(now - t, 1e-9)
+        return {
+            "callbacks": (self.callbacks - callbacks) / dt,
+            "reconfigs": (self.reconfigs - reconfigs) / dt,
+            "dropped": (self.dropped - dropped) / dt,
+        }
+
+    def format(self):
+        r = self.rates()
+        return (f"ui: {r['callbacks']:.1f} callbacks/s, "
+                f"{r['reconfigs']:.1f} reconfigs/s, "
+                f"{r['dropped']:.1f} dropped/s")
+
+
+class WidgetCache:
+    """Remembers what each widget shows and skips no-op reconfigures"""
+
+    def __init__(self, stats=None):
+        self.stats = stats or UiStats()
+        self._shown = {}
+
+    def set_text(self, widget, text):
+        if self._shown.get(widget) == text:
+            return False
+        widget.config(text=text)
+        self._shown[widget] = text
+        self.stats.reconfigs += 1
+        return True
+
+    def forget(self, widget):
+        self._shown.pop(widget, None)
+
+
+class UiBatcher:
+    """
+    Hands the newest posted snapshot to `apply` on the Tk thread.
+    `on_lag(seconds)`, if set, gets the time each callback waited in
+    the Tk queue.
+    """
+
+    def __init__(self, root, apply, stats=None, on_lag=None):
+        self.root = root
+        self.apply = apply
+        self.stats = stats or UiStats()
+        self.on_lag = on_lag
+        self._lock = threading.Lock()
+        self._pending = None
+        self._scheduled = False
+        self._posted = 0.0
+
+    def post(self, snapshot):
+        """Called from any thread"""
+        with self._lock:
+            if self._scheduled:
+                # the Tk loop has not caught up, replace the stale one
+                self._pending = snapshot
+                self.stats.dropped += 1
+                return
+            self._pending = snapshot
+            self._scheduled = True
+            self._posted = time.monotonic()
+        self.root.after(0, self._drain)
+
+    def _drain(self):
+        with self._lock:
+            snapshot = self._pending
+            self._pending = None
+            self._scheduled = False
+            posted = self._posted
+        if self.on_lag:
+            self.on_lag(time.monotonic() - posted)
+        self.stats.callbacks += 1
+        if snapshot is not None:
+            self.apply(snapshot)
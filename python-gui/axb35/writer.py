@@ -0,0 +1,235 @@
+"""
+Single long-lived writer thread for sysfs attributes.
+
+Writes are queued per attribute: a newer value for the same attribute
+replaces the pending one (e.g. while a slider is dragged), values equal
+to the last known device value are skipped once a fresh read confirms
+it, and everything written in one batch is read back together after
+`verify_delay` seconds (None: not at all, e.g. while the driver
+announces its changes).
+"""
+import threading
+import time
+
+from .sysfs import ATTRIBUTES
+
+# write order inside a batch: mode before level and curves
+_ORDER = {name: i for i, name in enumerate(ATTRIBUTES)}
+
+
+def format_value(value):
+    """Normalised string form used for writing and comparing values"""
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(int(v)) for v in value)
+    return str(value).strip()
+
+
+class WriterStats:
+    def __init__(self):
+        self.submitted = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.skip_reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.verify_reads = 0
+        self.mismatches = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class Writer:
+    """
+    `on_error(name, value, exc)` is called for failed writes (printed
+    without one) and `on_verified(name, value)` with the read-back value
+    of every verified attribute; both run on the writer thread.
+    """
+
+    def __init__(self, device, verify_delay=10.0, on_error=None,
+                 on_verified=None):
+        self.device = device
+        self.verify_delay = verify_delay
+        self.on_error = on_error
+        self.on_verified = on_verified
+        self.stats = WriterStats()
+        self._cond = threading.Condition()
+        self._pending = {}   # name -> (value, due time)
+        self._verify = {}    # name -> due time
+        self._known = {}     # name -> formatted device value
+        self._running = True
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="axb35-writer")
+        self._thread.start()
+
+    def note(self, name, value):
+        """Record a value read from the device elsewhere"""
+        with self._cond:
+            if value is None:
+                self._known.pop(name, None)
+            else:
+                self._known[name] = format_value(value)
+
+    def known(self, name):
+        with self._cond:
+            return self._known.get(name)
+
+    def is_pending(self, name):
+        """Whether a write of `name` is queued and not done yet"""
+        with self._cond:
+            return name in self._pending
+
+    def submit(self, name, value, delay=0.0):
+        """Queue a write of `value` to attribute `name` in `delay` seconds"""
+        if name not in ATTRIBUTES:
+            raise KeyError(name)
+        with self._cond:
+            self.stats.submitted += 1
+            if name in self._pending:
+                self.stats.coalesced += 1
+            self._pending[name] = (format_value(value),
+                                   time.monotonic() + delay)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Write everything pending now, wait until it is done"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            now = time.monotonic()
+            self._pending = {n: (v, now) for n, (v, _) in
+                             self._pending.items()}
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, flush=True):
+        if flush:
+            self.flush(timeout=5.0)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+
+    def _take_writes(self, now):
+        due = sorted((n for n, (_, t) in self._pending.items() if t <= now),
+                     key=_ORDER.get)
+        return [(n, self._pending.pop(n)[0]) for n in due]
+
+    def _take_verifies(self, now):
+        due = sorted((n for n, t in self._verify.items() if t <= now),
+                     key=_ORDER.get)
+        for n in due:
+            del self._verify[n]
+        return due
+
+    def _next_due(self):
+        times = [due for _, due in self._pending.values()]
+        times += list(self._verify.values())
+        return min(times) if times else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    due = self._next_due()
+                    if due is not None and due <= now:
+                        break
+                    self._cond.wait(None if due is None else due - now)
+                if not self._running:
+                    return
+                now = time.monotonic()
+                writes = self._take_writes(now)
+                verifies = self._take_verifies(now)
+                self._busy = True
+            try:
+                self._write_batch(writes)
+                self._verify_batch(verifies)
+            except Exception as e:
+                # a failing callback must not stop the thread, flush()
+                # would wait for it forever
+                print(f"Writer error: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _unchanged(self, name, value):
+        """
+        Whether the device holds `value` already. The known value can
+        be out of date until the watcher's next poll, so it is only
+        trusted after a fresh read agrees.
+        """
+        with self._cond:
+            if self._known.get(name) != value:
+                return False
+        self.stats.skip_reads += 1
+        try:
+            current = self.device.read(name)
+        except Exception:
+            current = None
+        with self._cond:
+            if current is None:
+                self._known.pop(name, None)
+                return False
+            self._known[name] = format_value(current)
+            return self._known[name] == value
+
+    def _failed(self, name, value, exc):
+        self.stats.errors += 1
+        with self._cond:
+            self._known.pop(name, None)
+        if self.on_error:
+            self.on_error(name, value, exc)
+        else:
+            print(f"Failed to write {value!r} to {name}: {exc}")
+
+    def _write_batch(self, writes):
+        written = []
+        for name, value in writes:
+            if self._unchanged(name, value):
+                self.stats.skipped += 1
+                continue
+            try:
+                self.device.write(name, value)
+            except Exception as e:
+                # OSError from sysfs, ValueError or a timeout from the
+                # broker: reported, the next write still goes out
+                self._failed(name, value, e)
+                continue
+            self.stats.writes += 1
+            written.append(name)
+            with self._cond:
+                self._known[name] = value
+                if name.startswith("fan") and name.endswith("_mode"):
+                    # the driver picks a new level when switching to curve
+                    self._known.pop(name.replace("_mode", "_level"), None)
+        if written and self.verify_delay is not None:
+            with self._cond:
+                due = time.monotonic() + self.verify_delay
+                for name in written:
+                    self._verify[name] = due
+
+    def _verify_batch(self, names):
+        for name in names:
+            try:
+                value = self.device.read(name)
+            except Exception:
+                value = None
+            self.stats.verify_reads += 1
+            with self._cond:
+                expected = self._known.get(name)
+                if value is None:
+                    self._known.pop(name, None)
+                else:
+                    value_str = format_value(value)
+                    if expected is not None and value_str != expected:
+                        self.stats.mismatches += 1
+                    self._known[name] = value_str
+            if self.on_verified and value is not None:
+                self.on_verified(name, value)
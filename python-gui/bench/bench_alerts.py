@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cost of evaluating alert rules on every sample. A simulated EC runs a
+load trace in virtual time and is sampled at --rate Hz up front, then
+the samples are fed to the AlertEngine (incremental: only rules of
+changed attributes, thresholds by bisection, `for` timers in a heap)
+and to a loop that checks every rule on every sample. Reported per
+sample: rule checks, mean/p99 time and the share of one core at the
+sampling rate.
+
+Exits 1 when the incremental engine needs more than --max-cpu % of one
+core.
+
+usage: bench_alerts.py [--rules N] [--rate HZ] [--seconds S]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.alerts import AlertEngine, make_rule
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC
+from axb35.sysfs import FANS
+
+
+def make_rules(count, seed=1):
+    """A mix of all rule kinds over the attributes a monitor would use"""
+    rnd = random.Random(seed)
+    rules = []
+    for i in range(count):
+        kind = rnd.random()
+        spec = {"name": f"rule{i}", "actions": []}
+        if kind < 0.5:
+            attr = rnd.choice(("temp", "temp", "temp_max", "temp_min"))
+            spec.update({"attr": attr, rnd.choice(("above", "below")):
+                         rnd.randint(30, 100), "for": rnd.choice((0, 5, 30))})
+        elif kind < 0.65:
+            fan = rnd.choice(FANS)
+            spec.update({"attr": f"fan{fan}_rpm",
+                         "above": rnd.randrange(0, 5000, 100)})
+        elif kind < 0.75:
+            spec.update({"stalled": rnd.choice(FANS),
+                         "for": rnd.choice((0, 3))})
+        elif kind < 0.9:
+            attr = rnd.choice([f"fan{n}_mode" for n in FANS] +
+                              [f"fan{n}_level" for n in FANS] +
+                              ["power_mode"])
+            spec.update({"attr": attr, "to": None})
+        else:
+            spec.update({"attr": rnd.choice(("temp", "temp_max")),
+                         "rising": rnd.randint(1, 10),
+                         "within": rnd.choice((10, 60))})
+        rules.append(make_rule(spec))
+    return rules
+
+
+def record(attributes, rate, seconds, seed=1):
+    """Samples of a simulated EC under a changing load, virtual time"""
+    rnd = random.Random(seed)
+    ec = SimulatedEC(clock=lambda: 0.0, sleep=lambda s: None)
+    sampler = Device(io=SimIO(ec)).sampler(attributes)
+    samples = []
+    for i in range(int(seconds * rate)):
+        if i % int(60 * rate) == 0:
+            ec.load = rnd.random()
+        ec.step(1.0 / rate)
+        samples.append((i / rate, sampler.read_values()))
+    return samples
+
+
+def feed_all(engine, samples):
+    times = []
+    for now, values in samples:
+        t0 = time.perf_counter()
+        engine.feed(values, now)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def check_all(rules, samples):
+    """Every rule on every sample, the baseline"""
+    times = []
+    for now, values in samples:
+        t0 = time.perf_counter()
+        for rule in rules:
+            rule.check(values, now)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="samples per second (default 10)")
+    parser.add_argument("--seconds", type=float, default=600.0,
+                        help="virtual seconds of samples (default 600)")
+    parser.add_argument("--max-cpu", type=float, default=1.0,
+                        help="limit for the engine, %% of one core")
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    engine = AlertEngine(rules)
+    samples = record(engine.attributes, args.rate, args.seconds)
+    incremental = feed_all(engine, samples)
+    checks = engine.checks / len(samples)
+    full = check_all(make_rules(args.rules), samples)
+
+    print(f"{args.rules} rules on {len(engine.attributes)} attributes, "
+          f"{len(samples)} samples at {args.rate:g} Hz, "
+          f"{engine.fired} alerts")
+    print(f"{'':<12} {'checks':>8} {'mean us':>9} {'p99 us':>9} "
+          f"{'cpu %':>7}")
+    cpu = {}
+    for name, times, per_sample in (("incremental", incremental, checks),
+                                    ("every rule", full, len(rules))):
+        times.sort()
+        mean = sum(times) / len(times)
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        cpu[name] = 100 * mean * args.rate
+        print(f"{name:<12} {per_sample:>8.1f} {mean * 1e6:>9.1f} "
+              f"{p99 * 1e6:>9.1f} {cpu[name]:>7.3f}")
+    if cpu["incremental"] > args.max_cpu:
+        print(f"engine over {args.max_cpu:g}% of one core")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
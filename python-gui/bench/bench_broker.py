@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+EC reads and fan-out latency of `axb35 broker` with 0 to N subscribed
+clients. The broker runs on the simulated EC on its own event loop
+thread, the clients share another loop in this process and connect
+over a Unix socket in a temporary directory. Fan-out latency is from
+the broker's sample timestamp to a client's callback, so with many
+clients it mostly measures this process decoding the same line N times.
+
+EC reads per sample must not change with the number of clients, the
+script exits 1 if they do.
+
+usage: bench_broker.py [--clients 0,1,10,100] [--seconds S] [--interval S]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.broker import Broker, BrokerClient
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class BrokerThread:
+    def __init__(self, device, path, interval):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.broker = self.call(Broker(device, interval).start(path))
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self):
+        self.call(self.broker.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def measure(ec, broker, path, n, seconds):
+    clients = [await BrokerClient(path).connect() for _ in range(n)]
+    delays = []
+
+    def track(snapshot, values):
+        delays.append(time.time() - snapshot.timestamp)
+
+    for client in clients:
+        client.on_snapshot = track
+        await client.subscribe()
+    await asyncio.sleep(0.1)
+    delays.clear()
+    reads0 = ec.ec_reads - ec.worker_reads
+    samples0 = broker.samples
+    await asyncio.sleep(seconds)
+    reads = ec.ec_reads - ec.worker_reads - reads0
+    samples = broker.samples - samples0
+    for client in clients:
+        await client.close()
+    return reads, samples, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", default="0,1,10,100",
+                        help="comma separated client counts")
+    parser.add_argument("--seconds", type=float, default=3.0,
+                        help="measuring time per count (default 3)")
+    parser.add_argument("--interval", type=float, default=0.1,
+                        help="broker sampling interval (default 0.1)")
+    args = parser.parse_args()
+
+    ec = SimulatedEC()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "axb35.sock")
+        server = BrokerThread(Device(io=SimIO(ec)), path, args.interval)
+        print(f"{'clients':>8} {'samples':>8} {'EC reads':>9} "
+              f"{'reads/sample':>13} {'fan-out p50 ms':>15} {'p99 ms':>8}")
+        per_sample = set()
+        try:
+            for n in (int(c) for c in args.clients.split(",")):
+                reads, samples, delays = asyncio.run(
+                    measure(ec, server.broker, path, n, args.seconds))
+                # writes wake the sampler, there are none here
+                per_sample.add(round(reads / max(1, samples), 1))
+                p50 = f"{percentile(delays, 50) * 1e3:.2f}" if delays else "-"
+                p99 = f"{percentile(delays, 99) * 1e3:.2f}" if delays else "-"
+                print(f"{n:>8} {samples:>8} {reads:>9} "
+                      f"{reads / max(1, samples):>13.1f} {p50:>15} {p99:>8}")
+        finally:
+            server.stop()
+    if len(per_sample) > 1:
+        print("EC reads per sample depend on the number of clients")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
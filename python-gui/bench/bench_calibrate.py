@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+`axb35 calibrate` against the fixed sleeps of
+scripts/test_fan_mode_fixed.sh. Both run in virtual time on a simulated
+EC with fan inertia and --noise relative rpm noise, for --runs seeds:
+
+  - script: levels 0..5 on all fans, sleep --settle seconds, read once
+  - calibrate: steady-state detection on 20 Hz samples, levels 0..5 and
+    back to 0 (which the script doesn't measure)
+
+Reported: time for the sweep and the worst |rpm - true rpm| of a level
+over all fans, runs and levels.
+
+Exits 1 when a calibration takes longer than the script's sweep.
+
+usage: bench_calibrate.py [--noise 0.01] [--runs N] [--settle S]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.calibrate import LEVELS, Calibrator
+from axb35.device import Device
+from axb35.sim import LEVEL_RPMS, SimIO, SimulatedEC
+from axb35.sysfs import FANS
+
+
+def simulated(noise, seed):
+    now = [0.0]
+    ec = SimulatedEC(clock=lambda: now[0], rpm_noise=noise, seed=seed)
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    return Device(io=SimIO(ec)), (lambda: now[0]), sleep
+
+
+def script(noise, seed, settle):
+    """The bash script: write, fixed sleep, one reading"""
+    device, clock, sleep = simulated(noise, seed)
+    for fan in FANS:
+        device.set_fan_mode(fan, "fixed")
+    errors = []
+    for level in LEVELS:
+        for fan in FANS:
+            device.set_fan_level(fan, level)
+        sleep(settle)
+        for fan in FANS:
+            rpm = device.read(f"fan{fan}_rpm")
+            errors.append(abs(rpm - LEVEL_RPMS[fan][level]))
+    return clock(), max(errors)
+
+
+def calibrate(noise, seed):
+    device, clock, sleep = simulated(noise, seed)
+    calibrator = Calibrator(device, clock=clock, sleep=sleep)
+    steps = calibrator.run()
+    errors = [abs(s.rpm - LEVEL_RPMS[s.fan][s.level]) for s in steps]
+    return calibrator.duration, max(errors), sum(s.timed_out for s in steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--noise", type=float, default=0.01,
+                        help="relative rpm noise (default 0.01)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--settle", type=float, default=5.0,
+                        help="the script's sleep per level (default 5)")
+    args = parser.parse_args()
+
+    runs = range(1, args.runs + 1)
+    fixed = [script(args.noise, seed, args.settle) for seed in runs]
+    detected = [calibrate(args.noise, seed) for seed in runs]
+    timeouts = sum(r[2] for r in detected)
+
+    print(f"{args.runs} runs, rpm noise {args.noise * 100:g}%")
+    print(f"{'':<10} {'steps':>6} {'mean s':>7} {'max s':>6} "
+          f"{'max err rpm':>12}")
+    for name, results, steps in (
+            ("script", fixed, len(LEVELS)),
+            ("calibrate", detected, len(LEVELS) + 1)):
+        durations = [r[0] for r in results]
+        print(f"{name:<10} {steps:>6} "
+              f"{sum(durations) / len(durations):>7.1f} "
+              f"{max(durations):>6.1f} {max(r[1] for r in results):>12.0f}")
+    if timeouts:
+        print(f"{timeouts} steps timed out")
+    slowest = max(r[0] for r in detected)
+    if slowest > len(LEVELS) * args.settle:
+        print(f"calibration took {slowest:.1f} s, longer than the script")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compare `python3 -m axb35` with scripts/su_axb35_monitor on a fake tree:
+
+  startup     one full `snapshot --json` vs `su_axb35_monitor -j` run
+  per-sample  cost of one more sample in a running process, i.e.
+              `watch --json` vs the monitor's get_current_state()
+
+Startup is also shown minus a bare `python3 -c pass`, which is the
+part axb35 itself controls.
+
+usage: bench_cli.py [-n RUNS] [-s SAMPLES]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GUI_DIR = os.path.dirname(HERE)
+MONITOR = os.path.join(os.path.dirname(GUI_DIR), "scripts", "su_axb35_monitor")
+
+sys.path.insert(0, GUI_DIR)
+
+from axb35.sim import make_fake_tree
+
+# get_current_state() from su_axb35_monitor, in a loop
+BASH_SAMPLE_LOOP = r'''
+axb35_path=$1
+for ((n = 0; n < $2; n++)); do
+    mapfile -t axb35_vars < <(
+    cat \
+        $axb35_path/fan{1..3}/rpm \
+        $axb35_path/fan{1..3}/mode \
+        $axb35_path/fan{1..3}/level \
+        $axb35_path/fan{1..3}/rampup_curve \
+        $axb35_path/fan{1..3}/rampdown_curve \
+        $axb35_path/temp1/{temp,min,max} \
+        $axb35_path/apu/power_mode
+    )
+done
+'''
+
+
+def run_timed(cmd, env, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20, help="startup runs")
+    parser.add_argument("-s", type=int, default=500, help="samples")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = make_fake_tree(tmp)
+        env = dict(os.environ, AXB35_PATH=base)
+        env["PYTHONPATH"] = GUI_DIR
+
+        py_start = run_timed([sys.executable, "-m", "axb35", "snapshot",
+                              "--json"], env, args.n)
+        py_floor = run_timed([sys.executable, "-c", "pass"], env, args.n)
+        sh_start = run_timed(["bash", MONITOR, "-j"], env, args.n)
+
+        watch = [sys.executable, "-m", "axb35", "watch", "--json",
+                 "--interval", "0", "--count"]
+        py_one = run_timed(watch + ["1"], env, 3)
+        py_many = run_timed(watch + [str(args.s + 1)], env, 3)
+        py_sample = (py_many - py_one) / args.s
+        sh_sample = run_timed(["bash", "-c", BASH_SAMPLE_LOOP, "bash", base,
+                               str(args.s)], env, 1) / args.s
+
+    print(f"{'':<12} {'su_axb35_monitor':>17} {'axb35':>10} {'speedup':>8}")
+    print(f"{'startup ms':<12} {sh_start * 1e3:>17.2f} {py_start * 1e3:>10.2f}"
+          f" {sh_start / py_start:>7.1f}x")
+    print(f"{'  w/o python':<12} {'':>17} {(py_start - py_floor) * 1e3:>10.2f}")
+    print(f"{'sample us':<12} {sh_sample * 1e6:>17.1f} {py_sample * 1e6:>10.1f}"
+          f" {sh_sample / py_sample:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
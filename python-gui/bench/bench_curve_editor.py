@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Curve drag events per second: the old on_curve_change against the
+CurveModel behind the sliders and the canvas CurveEditor.
+
+Runs headless: fake sliders, labels and canvas count the Tk calls and
+can spin --call-us microseconds in each, to stand in for a slow X
+connection. As in Tk, a slider's command runs again at idle time after
+set() with the slider's value, whether or not the command was swapped
+out around the set(). The scripted drag sweeps rampup L1 and rampdown
+L5 over the whole range, pushing the other points back and forth.
+
+Exits 1 when the model path processes fewer than --min-rate events/s.
+
+usage: bench_curve_editor.py [--sweeps N] [--call-us US]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.curve import POINTS, CurveModel
+from axb35.sysfs import CURVES
+from axb35.uiupdate import WidgetCache
+
+RAMPUP = [60, 70, 83, 95, 97]
+RAMPDOWN = [40, 50, 80, 94, 96]
+
+
+class Tk:
+    """Counts Tk calls, queues slider echoes until idle"""
+
+    def __init__(self, call_us):
+        self.calls = 0
+        self.call_s = call_us / 1e6
+        self.idle = []
+
+    def call(self):
+        self.calls += 1
+        if self.call_s:
+            end = time.perf_counter() + self.call_s
+            while time.perf_counter() < end:
+                pass
+
+    def update_idletasks(self):
+        while self.idle:
+            idle, self.idle = self.idle, []
+            # one redraw per slider however often it was set
+            for scale in dict.fromkeys(idle):
+                command = scale.command
+                if command:
+                    command(str(scale.value))
+
+
+class FakeScale:
+    def __init__(self, tk, value):
+        self.tk = tk
+        self.value = value
+        self.command = None
+
+    def config(self, command=None):
+        self.tk.call()
+        self.command = command or None
+
+    def set(self, value):
+        self.tk.call()
+        if value != self.value:
+            self.value = value
+            self.tk.idle.append(self)
+
+    def drag(self, value):
+        """The user moves it: command right away"""
+        self.value = value
+        self.command(str(value))
+
+
+class FakeLabel:
+    def __init__(self, tk):
+        self.tk = tk
+
+    def config(self, **kw):
+        self.tk.call()
+
+
+class FakeCanvas:
+    def __init__(self, tk):
+        self.tk = tk
+
+    def winfo_width(self):
+        return 240
+
+    def winfo_height(self):
+        return 150
+
+    def coords(self, item, *coords):
+        self.tk.call()
+
+    def itemconfig(self, item, **kw):
+        self.tk.call()
+
+
+class Legacy:
+    """on_curve_change as it was, on fake widgets"""
+
+    def __init__(self, tk):
+        self.tk = tk
+        self.writes = 0
+        self.controls = {}
+        for curve, values in (("rampup", RAMPUP), ("rampdown", RAMPDOWN)):
+            sliders = [FakeScale(tk, v) for v in values]
+            for i, slider in enumerate(sliders):
+                slider.command = (lambda v, idx=i, curve=curve:
+                                  self.on_curve_change(curve, idx, v))
+            self.controls[f'{curve}_sliders'] = sliders
+            self.controls[f'{curve}_labels'] = [FakeLabel(tk)
+                                                for _ in values]
+            self.controls[f'{curve}_values'] = list(values)
+
+    def schedule_curve_write(self, curve_type, values):
+        self.writes += 1
+
+    def sliders(self, curve):
+        return self.controls[f'{curve}_sliders']
+
+    def _reset(self, sliders, i, curve):
+        sliders[i].config(command='')
+        sliders[i].set(self.controls[f'{curve}_values'][i])
+        sliders[i].config(command=lambda v, idx=i, curve=curve:
+                          self.on_curve_change(curve, idx, v))
+
+    def on_curve_change(self, curve_type, index, value):
+        c = self.controls
+        sliders = c[f'{curve_type}_sliders']
+        labels = c[f'{curve_type}_labels']
+        values = c[f'{curve_type}_values']
+        other_curve = 'rampdown' if curve_type == 'rampup' else 'rampup'
+        other_sliders = c[f'{other_curve}_sliders']
+        other_labels = c[f'{other_curve}_labels']
+        other_values = c[f'{other_curve}_values']
+        new_value = int(float(value))
+        other_modified = False
+        if new_value != values[index]:
+            values[index] = new_value
+            for i in range(index + 1, 5):
+                if values[i] < values[index]:
+                    values[i] = values[index]
+                    self._reset(sliders, i, curve_type)
+            for i in range(index - 1, -1, -1):
+                if values[i] > values[index]:
+                    values[i] = values[index]
+                    self._reset(sliders, i, curve_type)
+            if curve_type == 'rampup':
+                for i in range(5):
+                    if other_values[i] > values[i]:
+                        other_values[i] = values[i]
+                        self._reset(other_sliders, i, other_curve)
+                        other_modified = True
+            else:
+                for i in range(5):
+                    if other_values[i] < values[i]:
+                        other_values[i] = values[i]
+                        self._reset(other_sliders, i, other_curve)
+                        other_modified = True
+            if other_modified:
+                for i in range(4):
+                    if other_values[i + 1] < other_values[i]:
+                        other_values[i + 1] = other_values[i]
+                        self._reset(other_sliders, i + 1, other_curve)
+        for i, val in enumerate(values):
+            labels[i].config(text=f"{val}°C")
+        for i, val in enumerate(other_values):
+            other_labels[i].config(text=f"{val}°C")
+        self.schedule_curve_write(curve_type, values)
+        if other_modified:
+            self.schedule_curve_write(other_curve, other_values)
+
+
+class Modeled:
+    """The GUI's slider handlers on a CurveModel, with the editor"""
+
+    def __init__(self, tk, editor=True):
+        from axb35.curve_editor import CurveEditor
+
+        self.tk = tk
+        self.writes = 0
+        self.model = CurveModel(RAMPUP, RAMPDOWN)
+        self.widgets = WidgetCache()
+        self.slider_lists = {}
+        self.labels = {}
+        for curve in CURVES:
+            sliders = [FakeScale(tk, v) for v in self.model.values[curve]]
+            for i, slider in enumerate(sliders):
+                slider.command = (lambda v, idx=i, curve=curve:
+                                  self.on_curve_change(curve, idx, v))
+            self.slider_lists[curve] = sliders
+            self.labels[curve] = [FakeLabel(tk) for _ in range(POINTS)]
+        self.editor = None
+        if editor:
+            # the real drawing code on a fake canvas, no Tk window
+            self.editor = CurveEditor.__new__(CurveEditor)
+            self.editor.model = self.model
+            self.editor.canvas = FakeCanvas(tk)
+            self.editor.lines = {curve: 0 for curve in CURVES}
+            self.editor.handles = {curve: list(range(POINTS))
+                                   for curve in CURVES}
+            self.editor.drag = None
+            self.editor.on_change = self.on_curve_edit
+            self.editor.value_text = 0
+
+    def sliders(self, curve):
+        return self.slider_lists[curve]
+
+    def on_curve_change(self, curve_type, index, value):
+        changes = self.model.move(curve_type, index, value)
+        self.show_curve_changes(changes[1:], sliders=True)
+        self.show_curve_changes(changes[:1], sliders=False)
+        if self.editor is not None:
+            self.editor.show(changes)
+        self.write_curve_changes(changes)
+
+    def on_curve_edit(self, changes):
+        self.show_curve_changes(changes)
+        self.write_curve_changes(changes)
+
+    def show_curve_changes(self, changes, sliders=True):
+        for change in changes:
+            if sliders:
+                self.slider_lists[change.curve][change.index].set(
+                    change.value)
+            self.widgets.set_text(self.labels[change.curve][change.index],
+                                  f"{change.value}°C")
+
+    def write_curve_changes(self, changes):
+        self.writes += len({change.curve for change in changes})
+
+
+def script(sweeps):
+    """(curve, index, value) of a drag back and forth over both curves"""
+    up = list(range(30, 101))
+    path = up[::-1] + up
+    for _ in range(sweeps):
+        for value in path:
+            yield "rampup", 0, value
+        for value in path:
+            yield "rampdown", 4, value
+
+
+def run(view, tk, sweeps, canvas=False):
+    events = 0
+    t0 = time.perf_counter()
+    for curve, index, value in script(sweeps):
+        if canvas:
+            view.editor.drag = (curve, index)
+            view.editor.move(curve, index, value)
+        else:
+            view.sliders(curve)[index].drag(value)
+        tk.update_idletasks()
+        events += 1
+    elapsed = time.perf_counter() - t0
+    return events, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sweeps", type=int, default=20)
+    parser.add_argument("--call-us", type=float, default=20.0,
+                        help="time spent in each Tk call, microseconds "
+                        "(default 20)")
+    parser.add_argument("--min-rate", type=float, default=1000.0,
+                        help="events/s the model path must reach")
+    args = parser.parse_args()
+
+    print(f"{args.call_us:g} us per Tk call")
+    print(f"{'path':<16} {'events/s':>9} {'Tk calls':>9} {'writes':>7}")
+    rates = {}
+    for name, make, canvas in (
+            ("legacy sliders", lambda tk: Legacy(tk), False),
+            ("model sliders", lambda tk: Modeled(tk, editor=False), False),
+            ("model + editor", lambda tk: Modeled(tk), False),
+            ("editor drag", lambda tk: Modeled(tk), True)):
+        tk = Tk(args.call_us)
+        view = make(tk)
+        events, elapsed = run(view, tk, args.sweeps, canvas)
+        rates[name] = events / elapsed
+        print(f"{name:<16} {rates[name]:>9.0f} {tk.calls / events:>9.1f} "
+              f"{view.writes / events:>7.2f}")
+    slowest = min(rate for name, rate in rates.items()
+                  if name.startswith(("model", "editor")))
+    if slowest < args.min_rate:
+        print(f"model path under {args.min_rate:g} events/s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
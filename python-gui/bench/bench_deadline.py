@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Monitor ticks while EC reads hang: the sequential SysfsSampler against
+the DeadlineSampler, on a simulated EC whose reads stall for --stall
+seconds on a fixed schedule. Three single attribute reads hang, then a
+temp read hangs while holding the EC lock, which blocks every other
+attribute behind it like busy firmware does.
+
+Reports tick latency p50/p99/max, the ticks that came back partial,
+the attribute values that were stale and the most threads alive at
+once. Exits 1 when a DeadlineSampler tick takes longer than its
+deadline plus --slack seconds, or it ever runs more than its workers.
+
+usage: bench_deadline.py [--ticks N] [--interval S] [--stall S]
+                         [--deadline S] [--workers N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.deadline import DeadlineSampler
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC
+from axb35.sysfs import MONITOR_ATTRIBUTES
+
+
+class Schedule:
+    """stall() for SimIO: hangs the first read of a name at given ticks"""
+
+    def __init__(self, ec, ticks, seconds):
+        self.ec = ec
+        self.seconds = seconds
+        self.tick = 0
+        n = ticks
+        # tick -> (attribute, hold the EC lock)
+        self.plan = {n // 10: ("fan2_rpm", False),
+                     n * 3 // 10: ("temp", False),
+                     n // 2: ("fan3_rpm", False),
+                     n * 7 // 10: ("temp", True)}
+        self.done = set()
+
+    def __call__(self, name):
+        entry = self.plan.get(self.tick)
+        if entry is None or entry[0] != name or self.tick in self.done:
+            return 0
+        self.done.add(self.tick)
+        if entry[1]:
+            with self.ec.lock:
+                time.sleep(self.seconds)
+            return 0
+        return self.seconds
+
+
+def run(make_sampler, args):
+    ec = SimulatedEC(latency=0.001)
+    schedule = Schedule(ec, args.ticks, args.stall)
+    device = Device(io=SimIO(ec, stall=schedule))
+    sampler = make_sampler(device)
+    ticks, partial, stale, threads = [], 0, 0, 0
+    base_threads = threading.active_count()
+    for tick in range(args.ticks):
+        schedule.tick = tick
+        t0 = time.perf_counter()
+        snapshot = sampler.sample()
+        ticks.append(time.perf_counter() - t0)
+        threads = max(threads, threading.active_count() - base_threads)
+        if getattr(snapshot, "stale", None):
+            partial += 1
+            stale += len(snapshot.stale)
+        time.sleep(args.interval)
+    sampler.close()
+    ticks.sort()
+    return {
+        "p50": statistics.median(ticks),
+        "p99": ticks[min(len(ticks) - 1, int(len(ticks) * 0.99))],
+        "max": ticks[-1],
+        "partial": partial,
+        "stale": stale,
+        "threads": threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--stall", type=float, default=2.0)
+    parser.add_argument("--deadline", type=float, default=0.25)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--slack", type=float, default=0.05,
+                        help="seconds a tick may take over the deadline")
+    args = parser.parse_args()
+
+    print(f"{args.ticks} ticks every {args.interval:g} s, 4 stalls of "
+          f"{args.stall:g} s, deadline {args.deadline:g} s")
+    print(f"{'sampler':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'partial':>8} {'stale':>6} {'threads':>8}")
+    results = {}
+    for name, make in (
+            ("deadline", lambda device: DeadlineSampler(
+                device, MONITOR_ATTRIBUTES, deadline=args.deadline,
+                workers=args.workers)),
+            ("sysfs", lambda device: device.sampler(MONITOR_ATTRIBUTES))):
+        r = results[name] = run(make, args)
+        print(f"{name:<10} {r['p50'] * 1e3:>8.2f} {r['p99'] * 1e3:>8.1f} "
+              f"{r['max'] * 1e3:>8.1f} {r['partial']:>8} {r['stale']:>6} "
+              f"{r['threads']:>8}")
+        if name == "deadline":
+            # let the reads still hung in the workers finish
+            time.sleep(args.stall)
+
+    r = results["deadline"]
+    failed = False
+    if r["max"] > args.deadline + args.slack:
+        print(f"deadline tick over {args.deadline + args.slack:g} s")
+        failed = True
+    if r["threads"] > args.workers:
+        print(f"more than {args.workers} reader threads")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Scrape the /metrics exporter from several concurrent clients over
+local HTTP and check that the simulated EC only sees the reads of the
+sampling interval, however many scrapers there are.
+
+usage: bench_exporter.py [--seconds S] [--interval S] [--clients 1,8,32]
+"""
+import argparse
+import http.client
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.device import Device
+from axb35.exporter import MetricsExporter, make_server
+from axb35.sim import SimIO, SimulatedEC
+
+
+def scrape_loop(port, stop, latencies):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.request("GET", "/metrics")
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"HTTP {resp.status}")
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def run(clients, seconds, interval):
+    ec = SimulatedEC(latency=0.001)
+    exporter = MetricsExporter(Device(io=SimIO(ec)), interval).start()
+    server = make_server(exporter, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    reads0 = ec.ec_reads - ec.worker_reads
+    samples0 = exporter.cache.samples
+    t0 = time.monotonic()
+    stop = threading.Event()
+    latencies = []
+    threads = [threading.Thread(target=scrape_loop,
+                                args=(port, stop, latencies))
+               for _ in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+    reads = ec.ec_reads - ec.worker_reads - reads0
+    samples = exporter.cache.samples - samples0
+    server.shutdown()
+    server.server_close()
+    exporter.stop()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e3 if latencies else 0
+    return len(latencies) / elapsed, p99, samples / elapsed, reads / samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--clients", default="1,8,32")
+    args = parser.parse_args()
+
+    print(f"sampling every {args.interval:g}s, 14 EC reads per snapshot, "
+          f"1 ms per simulated EC read")
+    print(f"{'scrapers':>8} {'scrapes/s':>10} {'p99 ms':>8} {'samples/s':>10} "
+          f"{'EC reads/sample':>16}")
+    for clients in (int(c) for c in args.clients.split(",")):
+        rate, p99, samples, reads = run(clients, args.seconds, args.interval)
+        print(f"{clients:>8} {rate:>10.0f} {p99:>8.2f} {samples:>10.2f} "
+              f"{reads:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Aggregator cost with many agents on loopback. Agent host processes
+each run a share of the agents, every agent a Broker with its own fake
+tree and TCP port. The aggregator (axb35.fleet.Fleet) runs on one event
+loop in this process. Reported: time until all nodes sent a snapshot,
+snapshots/s received, CPU use of the aggregator, the oldest snapshot
+in the table and the time to push a power mode to every node.
+
+Exits 1 when the aggregator needs more than --max-cpu % of one core.
+
+usage: bench_fleet.py [--nodes N] [--hosts N] [--seconds S] [--interval S]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.broker import Broker
+from axb35.device import Device
+from axb35.fleet import Fleet
+from axb35.sim import make_fake_tree
+
+TOKEN = "bench"
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def agent_host(count, interval, tmp, ports, ready, stop):
+    """Run `count` agents, report their ports, wait for `stop`"""
+    raise_fd_limit()
+
+    async def main():
+        brokers = []
+        for i in range(count):
+            base = make_fake_tree(tempfile.mkdtemp(dir=tmp))
+            broker = Broker(Device(base), interval, token=TOKEN)
+            ports.put(await broker.start_tcp("127.0.0.1", 0))
+            brokers.append(broker)
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        for broker in brokers:
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def measure(ports, seconds, timeout):
+    nodes = [(f"node{i:03}", "127.0.0.1", port) for i, port in enumerate(ports)]
+    fleet = Fleet(nodes, TOKEN, timeout=timeout)
+    t0 = time.monotonic()
+    await fleet.start()
+    connected = await fleet.wait_connected(timeout)
+    connect_time = time.monotonic() - t0
+
+    updates0 = sum(n.updates for n in fleet.nodes)
+    c0, w0 = cpu_time(), time.monotonic()
+    await asyncio.sleep(seconds)
+    c1, w1 = cpu_time(), time.monotonic()
+    updates = sum(n.updates for n in fleet.nodes) - updates0
+    now = time.monotonic()
+    oldest = max(now - n.last_seen for n in fleet.nodes if n.last_seen)
+
+    t0 = time.monotonic()
+    results = await fleet.push_power_mode("balanced")
+    push_time = time.monotonic() - t0
+    failed = sum(error is not None for error in results.values())
+    await fleet.stop()
+    return {
+        "nodes connected": connected,
+        "connect all (s)": connect_time,
+        "snapshots/s": updates / (w1 - w0),
+        "aggregator cpu (%)": 100 * (c1 - c0) / (w1 - w0),
+        "oldest snapshot (s)": oldest,
+        "push to all (ms)": push_time * 1e3,
+        "push failures": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--hosts", type=int, default=4,
+                        help="agent host processes (default 4)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="agent sampling interval (default 1)")
+    parser.add_argument("--max-cpu", type=float, default=50.0,
+                        help="aggregator CPU limit, %% of one core")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    ports = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    hosts = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for h in range(args.hosts):
+            count = args.nodes // args.hosts + (h < args.nodes % args.hosts)
+            ready = multiprocessing.Event()
+            proc = multiprocessing.Process(
+                target=agent_host,
+                args=(count, args.interval, tmp, ports, ready, stop))
+            proc.start()
+            hosts.append((proc, ready))
+        try:
+            for proc, ready in hosts:
+                ready.wait(60)
+            port_list = [ports.get(timeout=10) for _ in range(args.nodes)]
+            results = asyncio.run(measure(port_list, args.seconds, 30.0))
+        finally:
+            stop.set()
+            for proc, _ in hosts:
+                proc.join(10)
+
+    for name, value in results.items():
+        print(f"{name:<22} {value:>10.2f}")
+    if results["aggregator cpu (%)"] > args.max_cpu:
+        print(f"aggregator over {args.max_cpu:g}% of one core")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+`axb35 governor` against the fixed power modes on a day-like load
+trace: --idle seconds of idle, then bursty inference jobs (30-300 s at
+90% CPU, 10-120 s apart) for --busy seconds. Runs in virtual time on a
+simulated EC, the governor reads a synthetic /proc/stat that follows
+the trace.
+
+Reported per policy: APU energy, the share of busy seconds spent in
+performance mode, the worst delay from a job start to performance
+mode, the most switches within a rate limit window and the peak
+temperature.
+
+Exits 1 when the governor uses as much energy as fixed performance,
+takes longer than --min-dwell plus one tick to reach performance for a
+job, or switches more often than its rate limit allows.
+
+usage: bench_governor.py [--idle S] [--busy S] [--seed N]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.device import Device
+from axb35.governor import CpuStat, PowerGovernor
+from axb35.sim import IDLE_POWER, PACKAGE_POWER, SimIO, SimulatedEC
+from axb35.sysfs import POWER_MODES
+
+CPUS = 32
+HZ = 100
+IDLE_LOAD = 0.03
+JOB_LOAD = 0.9
+
+
+def trace(idle, busy, seed):
+    """Per-second loads, and the seconds where a job starts"""
+    rnd = random.Random(seed)
+    loads = [IDLE_LOAD] * idle
+    starts = []
+    while len(loads) < idle + busy:
+        starts.append(len(loads))
+        loads += [JOB_LOAD] * rnd.randint(30, 300)
+        loads += [IDLE_LOAD] * rnd.randint(10, 120)
+    return loads, starts
+
+
+class ProcStat:
+    """OsIO stand-in serving a /proc/stat for the load at clock()"""
+
+    def __init__(self, loads, clock):
+        self.loads = loads
+        self.clock = clock
+        self.busy = 0.0
+        self.idle = 0.0
+        self._t = 0.0
+
+    def open(self, path, flags, mode=0o777):
+        return 3
+
+    def close(self, fd):
+        pass
+
+    def preadv(self, fd, buffers, offset):
+        now = self.clock()
+        while self._t < now:
+            load = self.loads[min(int(self._t), len(self.loads) - 1)]
+            step = min(1.0, now - self._t)
+            self.busy += load * CPUS * HZ * step
+            self.idle += (1 - load) * CPUS * HZ * step
+            self._t += step
+        data = (f"cpu  {int(self.busy)} 0 0 {int(self.idle)} 0 0 0 0 0 0\n"
+                f"cpu0 0 0 0 0 0 0 0 0 0 0\n").encode()[offset:]
+        buf = buffers[0]
+        n = min(len(buf), len(data))
+        buf[:n] = data[:n]
+        return n
+
+
+def run(policy, loads, starts, args):
+    now = [0.0]
+    clock = lambda: now[0]
+    ec = SimulatedEC(load=IDLE_LOAD, clock=clock)
+    device = Device(io=SimIO(ec))
+    governor = None
+    switched = []
+    if policy == "governor":
+        cpu = CpuStat("/proc/stat", io=ProcStat(loads, clock))
+        governor = PowerGovernor(
+            device, cpu, min_dwell=args.min_dwell,
+            max_switches=args.max_switches, window=args.window,
+            on_switch=lambda switch: switched.append(now[0]), clock=clock)
+        governor.start()
+    else:
+        device.set_power_mode(policy)
+
+    energy = 0.0
+    busy = busy_performance = 0
+    delays = []
+    peak = 0
+    job_start = None
+    starts = set(starts)
+    for second, load in enumerate(loads):
+        ec.set_load(load)
+        if governor is not None:
+            governor.tick()
+        mode = device.read_power_mode()
+        peak = max(peak, device.read("temp"))
+        energy += IDLE_POWER + load * PACKAGE_POWER[mode]
+        if second in starts:
+            if job_start is not None:
+                # the last job never got there
+                delays.append(second - job_start)
+            job_start = second
+        if load == JOB_LOAD:
+            busy += 1
+            if mode == "performance":
+                busy_performance += 1
+                if job_start is not None:
+                    delays.append(second - job_start)
+                    job_start = None
+        now[0] += 1.0
+    if governor is not None:
+        governor.close()
+
+    # most switches within any window
+    most = 0
+    for i, t in enumerate(switched):
+        most = max(most, sum(1 for u in switched[i:] if u - t < args.window))
+    return {
+        "energy": energy / 3600,
+        "performance": busy_performance / busy if busy else 0.0,
+        "delay": max(delays) if delays else None,
+        "switches": len(switched),
+        "most": most,
+        "peak": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--idle", type=int, default=3 * 3600,
+                        help="idle seconds before the jobs (default 3 h)")
+    parser.add_argument("--busy", type=int, default=3600,
+                        help="seconds of bursty jobs (default 1 h)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-dwell", type=float, default=5.0)
+    parser.add_argument("--max-switches", type=int, default=6)
+    parser.add_argument("--window", type=float, default=60.0)
+    args = parser.parse_args()
+
+    loads, starts = trace(args.idle, args.busy, args.seed)
+    print(f"{len(loads)} s, {len(starts)} jobs")
+    print(f"{'policy':<12} {'energy Wh':>9} {'busy in perf':>12} "
+          f"{'worst ramp s':>12} {'switches':>8} {'per window':>10} "
+          f"{'peak °C':>7}")
+    results = {}
+    for policy in POWER_MODES + ("governor",):
+        r = results[policy] = run(policy, loads, starts, args)
+        delay = "-" if r["delay"] is None else f"{r['delay']}"
+        print(f"{policy:<12} {r['energy']:>9.1f} {r['performance']:>12.0%} "
+              f"{delay:>12} {r['switches']:>8} {r['most']:>10} "
+              f"{r['peak']:>7}")
+
+    r = results["governor"]
+    failed = False
+    if r["energy"] >= results["performance"]["energy"]:
+        print("governor uses as much energy as fixed performance")
+        failed = True
+    if r["delay"] is None or r["delay"] > args.min_dwell + 1:
+        print(f"governor took over {args.min_dwell + 1:g} s to ramp up")
+        failed = True
+    if r["most"] > args.max_switches:
+        print(f"more than {args.max_switches} switches in {args.window:g} s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Cost of the History.series() call behind every chart redraw, for each
+chart window on a history filled with --days of 1 Hz samples.
+
+"cold" is the first redraw of a window (or after switching to it),
+"redraw" the median over --redraws redraws with one new sample between
+them, like the GUI's 1 s monitor loop. Points is what the chart draws.
+
+Exits 1 when a redraw takes longer than --limit ms for any window.
+
+usage: bench_history.py [--days D] [--width PX] [--redraws N] [--limit MS]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.chart import WINDOWS
+from axb35.history import History
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=float, default=8)
+    parser.add_argument("--width", type=int, default=700,
+                        help="plot width in pixels (default 700)")
+    parser.add_argument("--redraws", type=int, default=50)
+    parser.add_argument("--limit", type=float, default=2.0,
+                        help="ms a redraw may take (default 2)")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    history = History()
+    t = 0.0
+    for _ in range(int(args.days * 86400)):
+        t += 1.0
+        history.add_row(t, (50 + rnd.random() * 5, 1800, 2600, 0))
+
+    print(f"{args.days:g} days of 1 Hz samples, {args.width} px")
+    print(f"{'window':<8} {'points':>7} {'cold ms':>8} {'redraw ms':>10}")
+    failed = False
+    for name, span in WINDOWS.items():
+        t0 = time.perf_counter()
+        times = history.series(t - span, t, args.width)[0]
+        cold = time.perf_counter() - t0
+        costs = []
+        for _ in range(args.redraws):
+            t += 1.0
+            history.add_row(t, (50 + rnd.random() * 5, 1800, 2600, 0))
+            t0 = time.perf_counter()
+            times = history.series(t - span, t, args.width)[0]
+            costs.append(time.perf_counter() - t0)
+        redraw = statistics.median(costs) * 1e3
+        print(f"{name:<8} {len(times):>7} {cold * 1e3:>8.2f} {redraw:>10.2f}")
+        if redraw > args.limit:
+            print(f"{name}: redraw over {args.limit:g} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Cost of the instrumentation on the monitor's read path, and what it
+shows. A SysfsSampler reads the monitor attributes of a fake sysfs tree
+(real files, real syscalls) -n times through the plain OsIO, through a
+disabled TracedIO and through an enabled one; the best of --repeats
+runs is kept. Then every attribute of a simulated EC with --latency
+seconds per EC transaction is probed, to show which ones wait for the
+EC (rpm: two transactions, curves: none).
+
+Exits 1 when a disabled TracedIO costs more than --max-overhead % over
+the plain reads.
+
+usage: bench_instrument.py [-n TICKS] [--repeats N] [--latency S]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.device import Device
+from axb35.instrument import Instruments, TracedIO, format_table
+from axb35.sim import SimIO, SimulatedEC, make_fake_tree
+from axb35.sysfs import ATTRIBUTES, MONITOR_ATTRIBUTES, OS_IO, SysfsSampler
+
+
+def per_tick(sampler, ticks):
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        sampler.read_values()
+    return (time.perf_counter() - t0) / ticks
+
+
+def probe(latency, count):
+    ec = SimulatedEC(latency=latency)
+    instruments = Instruments(enabled=True)
+    base = "/sys/class/ec_su_axb35"
+    device = Device(base, io=TracedIO(SimIO(ec, base), base, instruments))
+    samplers = [device.sampler([name]) for name in ATTRIBUTES]
+    for _ in range(count):
+        for sampler in samplers:
+            sampler.read_values()
+    for sampler in samplers:
+        sampler.close()
+    return instruments.as_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000,
+                        help="monitor ticks per run (default 20000)")
+    parser.add_argument("--repeats", type=int, default=9)
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="simulated seconds per EC transaction "
+                        "(default 0.002)")
+    parser.add_argument("--max-overhead", type=float, default=5.0,
+                        help="limit for a disabled TracedIO, %% "
+                        "(default 5)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = make_fake_tree(tmp)
+        ios = {"plain": OS_IO,
+               "disabled": TracedIO(OS_IO, base, Instruments()),
+               "enabled": TracedIO(OS_IO, base, Instruments(enabled=True))}
+        samplers = {name: SysfsSampler(base, MONITOR_ATTRIBUTES, io)
+                    for name, io in ios.items()}
+        times = {}
+        # interleaved, so a busy moment hits all three alike
+        for _ in range(args.repeats):
+            for name, sampler in samplers.items():
+                t = per_tick(sampler, args.n)
+                times[name] = min(t, times.get(name, t))
+        for sampler in samplers.values():
+            sampler.close()
+
+    plain = times["plain"]
+    print(f"{len(MONITOR_ATTRIBUTES)} attributes per tick, best of "
+          f"{args.repeats} x {args.n} ticks")
+    print(f"{'io':<10} {'us/tick':>8} {'overhead':>9}")
+    for name, t in times.items():
+        print(f"{name:<10} {t * 1e6:>8.2f} {(t / plain - 1) * 100:>8.1f}%")
+
+    print(f"\nprobe of a simulated EC, {args.latency * 1e3:g} ms per "
+          f"transaction:")
+    print(format_table(probe(args.latency, 5)))
+
+    overhead = (times["disabled"] / plain - 1) * 100
+    if overhead > args.max_overhead:
+        print(f"disabled instrumentation costs {overhead:.1f}%, over "
+              f"{args.max_overhead:g}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+CPU time per 1000 collections of contrib/netdata/axb35.chart.sh and
+the Python axb35.plugin on a fake tree, user + system time of the
+collector and everything it forks, from getrusage(RUSAGE_CHILDREN).
+
+The bash collector runs axb35_update in one shell like charts.d does,
+the plugin runs as one process with update_every 0. The plugin is also
+shown without its interpreter startup (a run with --count 1).
+
+usage: bench_netdata.py [-n COLLECTIONS]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GUI_DIR = os.path.dirname(HERE)
+CONTRIB = os.path.join(os.path.dirname(GUI_DIR), "contrib", "netdata")
+
+sys.path.insert(0, GUI_DIR)
+
+from axb35.sim import make_fake_tree
+
+BASH_LOOP = r'''
+source "$1"
+axb35_path=$2
+axb35_create > /dev/null
+for ((n = 0; n < $3; n++)); do
+    axb35_update 1000000
+done
+'''
+
+
+def child_cpu(cmd, env):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (after.ru_utime - before.ru_utime
+            + after.ru_stime - before.ru_stime)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=1000, help="collections")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = make_fake_tree(tmp)
+        env = dict(os.environ, AXB35_LIB=GUI_DIR)
+        bash = child_cpu(["bash", "-c", BASH_LOOP, "bash",
+                          os.path.join(CONTRIB, "axb35.chart.sh"), base,
+                          str(args.n)], env)
+        plugin = [sys.executable, os.path.join(CONTRIB, "axb35.plugin"), "0",
+                  "--base-path", base, "--count"]
+        py = child_cpu(plugin + [str(args.n)], env)
+        py_start = child_cpu(plugin + ["1"], env)
+
+    scale = 1000 / args.n
+    print(f"CPU seconds per 1000 collections ({args.n} run)")
+    print(f"{'axb35.chart.sh':<30} {bash * scale:>8.3f}")
+    print(f"{'axb35.plugin':<30} {py * scale:>8.3f} "
+          f"{bash / py:>6.1f}x less")
+    print(f"{'axb35.plugin w/o startup':<30} "
+          f"{max(py - py_start, 1e-9) * scale:>8.3f} "
+          f"{bash / max(py - py_start, 1e-9):>6.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+How fast a change of a setting is seen, and what it costs to watch:
+ChangeWatcher on a driver that notifies, on one that doesn't (fallback
+polling every --interval), and a loop re-reading all settings every
+--interval like before. Another thread changes the power mode, a fan
+mode or level every 0.2-0.8 s on a simulated EC for --seconds, and the
+curve worker moves levels on its own.
+
+Reported: latency from each change to the watcher seeing it, and
+sysfs reads done by the watching side per second.
+
+Exits 1 when a notified change takes more than --max-latency ms to
+show up, or the watcher reads more than the polling loop.
+
+usage: bench_notify.py [--seconds S] [--interval S]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.device import Device
+from axb35.notify import ChangeWatcher
+from axb35.sim import SimIO, SimulatedEC
+from axb35.sysfs import NOTIFY_ATTRIBUTES, POWER_MODES, SysfsSampler
+
+
+class CountingIO(SimIO):
+    def __init__(self, ec):
+        super().__init__(ec)
+        self.reads = 0
+
+    def preadv(self, fd, buffers, offset):
+        self.reads += 1
+        return super().preadv(fd, buffers, offset)
+
+
+def changes(device, seconds, written, stop, seed):
+    """Other software writing settings, `written` gets (time, name, value)"""
+    rnd = random.Random(seed)
+    end = time.monotonic() + seconds
+    device.set_fan_mode(2, "fixed")
+    choices = {"power_mode": POWER_MODES, "fan1_mode": ("fixed", "curve"),
+               "fan2_level": range(6)}
+    while time.monotonic() < end and not stop.is_set():
+        time.sleep(rnd.uniform(0.2, 0.8))
+        name = rnd.choice(sorted(choices))
+        # only real changes, the same value again isn't one
+        current = str(device.read(name))
+        value = rnd.choice([v for v in choices[name] if str(v) != current])
+        written.append((time.monotonic(), name, value))
+        device.write(name, value)
+
+
+class Polling:
+    """Re-read every setting every `interval` seconds"""
+
+    def __init__(self, io, interval):
+        self.sampler = SysfsSampler(attributes=NOTIFY_ATTRIBUTES, io=io)
+        self.interval = interval
+        self.values = self.sampler.read_values()
+
+    def wait(self, timeout):
+        time.sleep(self.interval)
+        values = self.sampler.read_values()
+        changed = {n: v for n, v in values.items() if v != self.values[n]}
+        self.values = values
+        return changed
+
+    def close(self):
+        self.sampler.close()
+
+
+def run(kind, args):
+    ec = SimulatedEC(latency=0.001, notify=kind != "no notify")
+    io = CountingIO(ec)
+    if kind == "polling":
+        watcher = Polling(io, args.interval)
+    else:
+        watcher = ChangeWatcher(io=io, fallback=args.interval)
+        watcher.wait()
+    writer = Device(io=SimIO(ec))
+    written, seen = [], []
+    stop = threading.Event()
+    thread = threading.Thread(target=changes, args=(
+        writer, args.seconds, written, stop, args.seed))
+    reads0 = io.reads
+    t0 = time.monotonic()
+    thread.start()
+    while thread.is_alive():
+        for name, value in watcher.wait(0.1).items():
+            seen.append((time.monotonic(), name, value))
+    elapsed = time.monotonic() - t0
+    watcher.close()
+
+    # each write against the first time the watcher saw that value after
+    latencies = []
+    for t, name, value in written:
+        for ts, n, v in seen:
+            if n == name and ts >= t and str(v) == str(value):
+                latencies.append(ts - t)
+                break
+    return {
+        "changes": len(written),
+        "seen": len(latencies),
+        "p50": statistics.median(latencies) if latencies else None,
+        "max": max(latencies) if latencies else None,
+        "reads": (io.reads - reads0) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="polling and fallback interval (default 1)")
+    parser.add_argument("--max-latency", type=float, default=50.0,
+                        help="ms a notified change may take (default 50)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1e3:.1f}"
+
+    print(f"{'watcher':<10} {'changes':>7} {'seen':>5} {'p50 ms':>8} "
+          f"{'max ms':>8} {'reads/s':>8}")
+    results = {}
+    for kind in ("notify", "no notify", "polling"):
+        r = results[kind] = run(kind, args)
+        print(f"{kind:<10} {r['changes']:>7} {r['seen']:>5} "
+              f"{ms(r['p50']):>8} {ms(r['max']):>8} {r['reads']:>8.1f}")
+
+    r = results["notify"]
+    failed = False
+    if r["max"] is None or r["max"] * 1e3 > args.max_latency:
+        print(f"notified changes took over {args.max_latency:g} ms")
+        failed = True
+    if r["reads"] > results["polling"]["reads"]:
+        print("the watcher reads more than polling")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
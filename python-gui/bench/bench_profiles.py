@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Sysfs writes, EC transactions and wall time of profile switches on the
+simulated EC, for the old write-everything apply_config() and the
+diff-based profile engine. Each EC transaction costs --latency ms, the
+engine's time includes the snapshot it diffs against.
+
+Switches: quiet-night -> render-farm -> render-farm again (a no-op)
+-> quiet-night, and a failing switch that has to roll back.
+
+usage: bench_profiles.py [--latency MS] [--budget MS]
+"""
+import argparse
+import errno
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35 import profiles
+from axb35.device import Device, apply_config
+from axb35.sim import SimIO, SimulatedEC
+
+QUIET = {
+    "apu_mode": "quiet",
+    "fans": {
+        "1": {"mode": "curve", "level": "1",
+              "rampup_curve": [65, 75, 85, 92, 97],
+              "rampdown_curve": [50, 60, 80, 90, 95]},
+        "2": {"mode": "curve", "level": "1",
+              "rampup_curve": [65, 75, 85, 92, 97],
+              "rampdown_curve": [50, 60, 80, 90, 95]},
+        "3": {"mode": "auto", "level": ""},
+    },
+}
+RENDER = {
+    "apu_mode": "performance",
+    "fans": {
+        "1": {"mode": "fixed", "level": "4",
+              "rampup_curve": [65, 75, 85, 92, 97],
+              "rampdown_curve": [50, 60, 80, 90, 95]},
+        "2": {"mode": "fixed", "level": "4",
+              "rampup_curve": [65, 75, 85, 92, 97],
+              "rampdown_curve": [50, 60, 80, 90, 95]},
+        "3": {"mode": "fixed", "level": "3"},
+    },
+}
+SWITCHES = (("quiet -> render", RENDER), ("render -> render", RENDER),
+            ("render -> quiet", QUIET))
+
+
+class CountingIO(SimIO):
+    def __init__(self, ec):
+        super().__init__(ec)
+        self.writes = 0
+
+    def write(self, fd, data):
+        self.writes += 1
+        return super().write(fd, data)
+
+
+def run(engine, latency, budget):
+    ec = SimulatedEC(latency=latency)
+    io = CountingIO(ec)
+    device = Device(io=io)
+    profiles.apply_profile(device, QUIET)
+    rows = []
+    for label, profile in SWITCHES:
+        writes, ops = io.writes, ec.ec_reads + ec.ec_writes - ec.worker_reads
+        t0 = time.perf_counter()
+        if engine:
+            result = profiles.apply_profile(device, profile, budget=budget)
+            errors = [result.error] if result.error else []
+        else:
+            errors = apply_config(device, profile)
+        elapsed = time.perf_counter() - t0
+        rows.append((label, io.writes - writes,
+                     ec.ec_reads + ec.ec_writes - ec.worker_reads - ops,
+                     elapsed, len(errors)))
+    return rows
+
+
+def run_failure(latency):
+    """fan3 refuses its mode, everything before it has to be undone"""
+    ec = SimulatedEC(latency=latency)
+    device = Device(io=SimIO(ec))
+    profiles.apply_profile(device, QUIET)
+    store = ec.store
+
+    def failing_store(name, data):
+        if name == "fan3_mode":
+            raise OSError(errno.EIO, os.strerror(errno.EIO))
+        return store(name, data)
+    ec.store = failing_store
+    before = profiles.current_state(device.snapshot(profiles.SETTINGS))
+    result = profiles.apply_profile(device, RENDER)
+    after = profiles.current_state(device.snapshot(profiles.SETTINGS))
+    # outside fixed mode the level belongs to the driver
+    changed = [name for name in before if before[name] != after.get(name)
+               and not (name.endswith("_level")
+                        and before[name.replace("_level", "_mode")] != "fixed")]
+    return result, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=2.0,
+                        help="ms per EC transaction (default 2)")
+    parser.add_argument("--budget", type=float, default=500,
+                        help="ms a switch may take (default 500)")
+    args = parser.parse_args()
+    latency = args.latency / 1000
+    budget = args.budget / 1000
+
+    print(f"{'switch':<18} {'method':<12} {'writes':>7} {'EC ops':>7} "
+          f"{'ms':>8} {'errors':>7}")
+    over = False
+    for method, engine in (("apply_config", False), ("profile", True)):
+        for label, writes, ops, elapsed, errors in run(engine, latency,
+                                                        budget):
+            if engine and elapsed > budget:
+                over = True
+            print(f"{label:<18} {method:<12} {writes:>7} {ops:>7} "
+                  f"{elapsed * 1e3:>8.1f} {errors:>7}")
+
+    result, changed = run_failure(latency)
+    print(f"\nfailing switch: {len(result.done)} of {len(result.steps)} "
+          f"writes done, rolled back {result.rolled_back}, "
+          f"settings left changed: {', '.join(changed) or 'none'}")
+    if over:
+        print(f"profile switch over the {args.budget:g} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Size and seek cost of `axb35 record` files. A simulated EC is recorded
+for --samples samples and the bytes per sample are compared with the
+text and NDJSON lines of `axb35 watch`. Then a --size GB recording is
+built from copies of one full block with shifted timestamps (10 Hz,
+i.e. years of samples), and random time lookups through the mmap are
+timed: open, find() and decoding the first record, p50/p99. The file
+has just been written, so its pages are mostly in the page cache.
+
+Exits 1 when the p99 seek is over --max-seek-us.
+
+usage: bench_recording.py [--size GB] [--seeks N] [--dir DIR]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.cli import emit
+from axb35.device import Device
+from axb35.recording import (BLOCK_HEADER, BLOCK_MAGIC, FILE_HEADER,
+                             RECORD_ATTRIBUTES, Recorder, Recording)
+from axb35.sim import SimIO, SimulatedEC
+from axb35.sysfs import Snapshot
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def record_sim(path, samples, rate):
+    now = [0.0]
+    ec = SimulatedEC(clock=lambda: now[0])
+    sampler = Device(io=SimIO(ec)).sampler(RECORD_ATTRIBUTES)
+    text = json = 0
+    t0 = time.perf_counter()
+    append_time = 0.0
+    with Recorder(path) as recorder:
+        for i in range(samples):
+            now[0] = i / rate
+            ec.load = 1.0 if i % 6000 < 3000 else 0.1
+            values = sampler.read_values()
+            a0 = time.perf_counter()
+            recorder.append(1.7e9 + now[0], values)
+            append_time += time.perf_counter() - a0
+            snapshot = Snapshot.from_values(1.7e9 + now[0], values)
+            for as_json in (False, True):
+                out = io.StringIO()
+                emit(snapshot, as_json, out)
+                size = len(out.getvalue().encode())
+                if as_json:
+                    json += size
+                else:
+                    text += size
+    return text / samples, json / samples, append_time / samples
+
+
+def build_large(path, template, size):
+    """Copies of the template's first block, later and later in time"""
+    with Recording(template) as rec:
+        block_size = rec.block_size
+        count, base, last = rec.block_header(0)
+        if count != rec.block_records:
+            raise RuntimeError("template block is not full")
+        block = bytearray(rec.buf[FILE_HEADER.size:
+                                  FILE_HEADER.size + block_size])
+        header = bytes(rec.buf[:FILE_HEADER.size])
+    span = last - base + 0.1
+    blocks = max(1, (size - FILE_HEADER.size) // block_size)
+    batch = 64
+    with open(path, "wb") as f:
+        f.write(header)
+        for first in range(0, blocks, batch):
+            chunk = bytearray()
+            for b in range(first, min(blocks, first + batch)):
+                shift = b * span
+                BLOCK_HEADER.pack_into(block, 0, BLOCK_MAGIC, count,
+                                       base + shift, last + shift)
+                chunk += block
+            f.write(chunk)
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=20000,
+                        help="simulated samples for bytes/sample "
+                        "(default 20000)")
+    parser.add_argument("--size", type=float, default=2.0,
+                        help="size of the large recording, GB (default 2)")
+    parser.add_argument("--seeks", type=int, default=20000)
+    parser.add_argument("--dir", default=None,
+                        help="where to put the files (default $TMPDIR)")
+    parser.add_argument("--max-seek-us", type=float, default=1000.0,
+                        help="p99 seek limit, microseconds (default 1000)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        small = os.path.join(tmp, "sim.axr")
+        text, json, append = record_sim(small, args.samples, 10.0)
+        binary = os.path.getsize(small) / args.samples
+        print(f"{'format':<10} {'bytes/sample':>13} {'1 week @ 1 Hz':>14}")
+        for name, per in (("binary", binary), ("text", text),
+                          ("ndjson", json)):
+            print(f"{name:<10} {per:>13.1f} {per * 604800 / 2 ** 20:>11.1f} "
+                  f"MiB")
+        print(f"append: {append * 1e6:.1f} us/sample")
+
+        large = os.path.join(tmp, "large.axr")
+        t0 = time.perf_counter()
+        blocks = build_large(large, small, int(args.size * 1e9))
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rec = Recording(large)
+        opened = time.perf_counter() - t0
+        first, last = rec.start_time, rec.end_time
+        samples = blocks * rec.block_records
+        print(f"\n{rec.size / 1e9:.2f} GB, {samples} samples in {blocks} "
+              f"blocks, {(last - first) / 86400 / 365:.1f} years at 10 Hz, "
+              f"written in {build:.1f} s")
+        print(f"open: {opened * 1e6:.0f} us")
+
+        rnd = random.Random(1)
+        seeks = []
+        for _ in range(args.seeks):
+            t = rnd.uniform(first, last)
+            t0 = time.perf_counter()
+            row = next(rec.rows(t), None)
+            seeks.append(time.perf_counter() - t0)
+            if row is None or row[0] < t:
+                raise RuntimeError(f"seek to {t} returned {row}")
+        t0 = time.perf_counter()
+        scanned = sum(1 for _ in rec.rows(first, first + 100000))
+        scan = time.perf_counter() - t0
+        rec.close()
+
+    p50, p99 = percentile(seeks, 50), percentile(seeks, 99)
+    print(f"seek: p50 {p50 * 1e6:.1f} us, p99 {p99 * 1e6:.1f} us, "
+          f"max {max(seeks) * 1e6:.1f} us")
+    print(f"scan: {scanned / scan / 1e6:.2f} M records/s")
+    if p99 * 1e6 > args.max_seek_us:
+        print(f"p99 seek over {args.max_seek_us:g} us")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
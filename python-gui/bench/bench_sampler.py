@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Compare the GUI's open()/read()/close() per attribute read path with
+SysfsSampler on a fake sysfs tree.
+
+usage: bench_sampler.py [-n ITERATIONS]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.sim import make_fake_tree
+from axb35.sysfs import ATTRIBUTES, MONITOR_ATTRIBUTES, SysfsSampler
+
+
+def legacy_tick(base_path, attributes):
+    """What FanControlGUI.read_sysfs did for every attribute"""
+    values = []
+    for name in attributes:
+        with open(f"{base_path}/{ATTRIBUTES[name]}", 'r') as f:
+            values.append(f.read().strip())
+    return values
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = make_fake_tree(tmp)
+        print(f"{'attributes':<12} {'legacy us/tick':>15} "
+              f"{'sampler us/tick':>16} {'speedup':>8}")
+        for label, attrs in (("monitor", MONITOR_ATTRIBUTES),
+                             ("all", tuple(ATTRIBUTES))):
+            sampler = SysfsSampler(base, attrs)
+            legacy = timed(lambda: legacy_tick(base, attrs), args.n)
+            pread = timed(sampler.sample, args.n)
+            sampler.close()
+            print(f"{label:<12} {legacy * 1e6:>15.2f} {pread * 1e6:>16.2f} "
+                  f"{legacy / pread:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
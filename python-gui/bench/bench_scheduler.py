@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Replay a synthetic idle trace with one load burst through the fixed
+1 s loop and the AdaptiveScheduler, and compare EC reads per hour and
+how quickly the burst is noticed.
+
+A monitor tick reads temp1/temp and fan{1..3}/rpm, which is 7 ec_read()
+calls in the driver (rpm reads two registers). The fast-poll delay is
+also given from the first sample that is 2 °C above idle: the wait for
+that sample is up to --max seconds whatever the rules, what comes after
+it is up to them.
+
+usage: bench_scheduler.py [--hours H] [--min S] [--max S]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.scheduler import AdaptiveScheduler
+from axb35.sysfs import FanState, Snapshot
+
+EC_READS_PER_TICK = 1 + 3 * 2
+
+
+class IdleTrace:
+    """Idle box with sensor noise and one 2 minute burst per hour"""
+
+    def __init__(self, seed=1, burst_at=1800.0, burst_len=120.0):
+        self.rnd = random.Random(seed)
+        self.burst_at = burst_at
+        self.burst_len = burst_len
+
+    def load(self, t):
+        phase = t % 3600
+        return self.burst_at <= phase < self.burst_at + self.burst_len
+
+    def heat(self, t):
+        """°C above idle"""
+        phase = t % 3600
+        if phase < self.burst_at:
+            return 0.0
+        since = phase - self.burst_at
+        if since < self.burst_len:
+            return 35 * (1 - math.exp(-since / 20))
+        peak = 35 * (1 - math.exp(-self.burst_len / 20))
+        return peak * math.exp(-(since - self.burst_len) / 60)
+
+    def at(self, t):
+        heat = self.heat(t)
+        temp = round(45 + heat + self.rnd.choice((0, 0, 0, 1)))
+        rpm = 1800 + heat * 80
+        rpms = tuple(int(rpm + self.rnd.randint(-25, 25)) for _ in range(2))
+        return Snapshot(t, temp, fans=(FanState(rpms[0]), FanState(rpms[1]),
+                                       FanState(0)))
+
+
+def replay(trace, hours, next_interval):
+    end = hours * 3600
+    t, ticks = 0.0, 0
+    # hour -> seconds from burst start until the loop polls fast again,
+    # and until its first sample 2 °C above idle
+    detect = {}
+    first = {}
+    while t < end:
+        snap = trace.at(t)
+        ticks += 1
+        interval = next_interval(snap)
+        hour = int(t // 3600)
+        if trace.load(t):
+            if trace.heat(t) >= 2:
+                first.setdefault(hour, t % 3600 - trace.burst_at)
+            if hour not in detect and interval <= 1.0:
+                detect[hour] = t % 3600 - trace.burst_at
+        t += interval
+    return ticks, detect, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--min", type=float, default=0.5)
+    parser.add_argument("--max", type=float, default=10.0)
+    args = parser.parse_args()
+
+    fixed_ticks, fixed_detect, fixed_first = replay(
+        IdleTrace(), args.hours, lambda s: 1.0)
+    sched = AdaptiveScheduler(args.min, args.max)
+    ad_ticks, ad_detect, ad_first = replay(IdleTrace(), args.hours,
+                                           sched.next_interval)
+
+    print(f"{args.hours:g} h idle trace, one 2 min burst per hour")
+    print(f"{'loop':<22} {'ticks/h':>8} {'EC reads/h':>11} "
+          f"{'worst fast-poll delay':>22} {'after 2 °C up':>14}")
+    for name, ticks, detect, first in (
+            ("fixed 1 s", fixed_ticks, fixed_detect, fixed_first),
+            (f"adaptive {args.min:g}-{args.max:g} s", ad_ticks, ad_detect,
+             ad_first)):
+        per_hour = ticks / args.hours
+        worst = max(detect.values()) if detect else float("nan")
+        after = max((max(0.0, detect[h] - first[h]) for h in detect
+                     if h in first),
+                    default=float("nan"))
+        print(f"{name:<22} {per_hour:>8.0f} "
+              f"{per_hour * EC_READS_PER_TICK:>11.0f} {worst:>21.1f}s "
+              f"{after:>13.1f}s")
+    saved = (fixed_ticks - ad_ticks) / args.hours * EC_READS_PER_TICK
+    print(f"saved {saved:.0f} EC reads/h "
+          f"({100 * (1 - ad_ticks / fixed_ticks):.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+GUI startup time on a fake sysfs tree: process start to the first
+Expose of the window ("first paint") and to the first values on screen
+("ready"), from the GUI's --print-ready markers. The start of a bare
+interpreter is shown as the floor. Exits 1 when a median is over its
+limit.
+
+Needs Tk and a display (e.g. xvfb-run), skipped otherwise.
+
+usage: bench_startup.py [--runs N] [--max-paint S] [--max-ready S]
+"""
+import argparse
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from axb35.sim import make_fake_tree
+from suite import GUI, gui_available, stop_gui
+
+
+def wait_for_markers(proc, markers, timeout):
+    """time.monotonic() at which each marker line showed up"""
+    seen = {}
+    end = time.monotonic() + timeout
+    buf = b""
+    while len(seen) < len(markers) and time.monotonic() < end:
+        ready, _, _ = select.select([proc.stdout], [], [],
+                                    max(0.0, end - time.monotonic()))
+        if not ready:
+            break
+        chunk = os.read(proc.stdout.fileno(), 4096)
+        if not chunk:
+            break
+        now = time.monotonic()
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            name = line.decode(errors="replace").strip()
+            if name in markers and name not in seen:
+                seen[name] = now
+    return seen
+
+
+def start_once(base, config):
+    t0 = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, GUI, "--base-path", base, "--config", config,
+         "--print-ready"],
+        stdout=subprocess.PIPE)
+    try:
+        seen = wait_for_markers(proc, ("painted", "ready"), 30)
+    finally:
+        stop_gui(proc)
+    if len(seen) < 2:
+        raise RuntimeError(f"GUI did not report {'/'.join(seen) or 'anything'}")
+    return seen["painted"] - t0, seen["ready"] - t0
+
+
+def interpreter_start():
+    t0 = time.monotonic()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.monotonic() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5,
+                        help="GUI starts, medians are checked")
+    parser.add_argument("--max-paint", type=float, default=1.0,
+                        help="limit for the first paint, seconds (default 1)")
+    parser.add_argument("--max-ready", type=float, default=1.5,
+                        help="limit for the first values, seconds "
+                        "(default 1.5)")
+    args = parser.parse_args()
+
+    reason = gui_available()
+    if reason:
+        print(f"skipped ({reason})")
+        return 0
+
+    paints, readies = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        base = make_fake_tree(tmp)
+        config = os.path.join(tmp, "config.json")
+        # the first start warms the page cache and .pyc files
+        start_once(base, config)
+        for _ in range(args.runs):
+            paint, ready = start_once(base, config)
+            paints.append(paint)
+            readies.append(ready)
+    floor = statistics.median(interpreter_start() for _ in range(args.runs))
+
+    failed = []
+    print(f"{'':<22} {'median':>8} {'max':>8} {'limit':>8}")
+    print(f"{'python -c pass (s)':<22} {floor:>8.3f}")
+    for name, values, limit in (("first paint (s)", paints, args.max_paint),
+                                ("first values (s)", readies, args.max_ready)):
+        median = statistics.median(values)
+        status = "ok" if median <= limit else "FAIL"
+        if status == "FAIL":
+            failed.append(name)
+        print(f"{name:<22} {median:>8.3f} {max(values):>8.3f} {limit:>8g}"
+              f"  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+One full read of every attribute: 19 per-file preads through the
+SysfsSampler against one pread of the driver's "state" attribute
+through the StateSampler.
+
+Runs on a simulated EC whose ec_read() takes --latency seconds, and on
+a fake tree of plain files in a temporary directory for the system
+call cost alone. The simulated clock moves --interval seconds between
+reads, like a monitor loop. Reported per path: µs per full read, sysfs
+reads and EC reads per full read (the worker's own reads not counted)
+and, for state, the median age of the values it returned. Then the
+worker's own EC reads per second over --idle simulated seconds without
+a reader of state and with one.
+
+Exits 1 when the state path isn't faster on both trees, costs any EC
+read, or the worker doesn't read the EC less often without a reader.
+
+usage: bench_state.py [--reads N] [--latency S] [--interval S] [--idle S]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC, make_fake_tree
+from axb35.sysfs import OS_IO, STATE_FIELDS
+
+
+class CountingIO:
+    """Counts preadv() calls of the io it wraps"""
+
+    def __init__(self, io):
+        self.io = io
+        self.reads = 0
+
+    def preadv(self, fd, buffers, offset):
+        self.reads += 1
+        return self.io.preadv(fd, buffers, offset)
+
+    def __getattr__(self, name):
+        return getattr(self.io, name)
+
+
+def run(device, io, ec, now, make_sampler, args):
+    sampler = make_sampler(device)
+    sampler.read_values()
+    io.reads = 0
+    ec_reads = ec.ec_reads - ec.worker_reads if ec else 0
+    ages = []
+    elapsed = 0.0
+    for _ in range(args.reads):
+        if ec:
+            # the worker runs outside the timed read, like in the driver
+            now[0] += args.interval
+            ec.advance()
+        t0 = time.perf_counter()
+        sampler.read_values()
+        elapsed += time.perf_counter() - t0
+        age = getattr(sampler, "age", None)
+        if age is not None:
+            ages.append(age)
+    sampler.close()
+    reads = args.reads
+    if ec:
+        ec_reads = ec.ec_reads - ec.worker_reads - ec_reads
+    return {
+        "us": elapsed / reads * 1e6,
+        "sysfs": io.reads / reads,
+        "ec": ec_reads / reads,
+        "age": statistics.median(ages) if ages else None,
+    }
+
+
+def worker_rates(seconds):
+    """Worker EC reads per second without a reader of state and with one"""
+    now = [0.0]
+    ec = SimulatedEC(clock=lambda: now[0])
+    sampler = Device(io=SimIO(ec)).state_sampler()
+    rates = []
+    for reading in (False, True):
+        reads = ec.worker_reads
+        for _ in range(int(seconds)):
+            now[0] += 1.0
+            ec.advance()
+            if reading:
+                sampler.read_values()
+        rates.append((ec.worker_reads - reads) / int(seconds))
+    sampler.close()
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0001,
+                        help="seconds per simulated EC read (default 0.0001)")
+    parser.add_argument("--interval", type=float, default=0.25,
+                        help="simulated seconds between reads (default 0.25)")
+    parser.add_argument("--idle", type=float, default=600.0,
+                        help="simulated seconds per worker run (default 600)")
+    args = parser.parse_args()
+
+    paths = (("files", lambda device: device.sampler(STATE_FIELDS)),
+             ("state", lambda device: device.state_sampler()))
+    print(f"{args.reads} full reads of {len(STATE_FIELDS)} attributes")
+    print(f"{'tree':<6} {'path':<6} {'us/read':>9} {'sysfs':>6} {'ec':>6} "
+          f"{'age ms':>7}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for tree in ("sim", "fake"):
+            for name, make in paths:
+                now = [0.0]
+                if tree == "sim":
+                    ec = SimulatedEC(latency=args.latency,
+                                     clock=lambda: now[0])
+                    # let the worker fill the state
+                    now[0] = 1.0
+                    io = CountingIO(SimIO(ec))
+                    device = Device(io=io)
+                else:
+                    ec = None
+                    io = CountingIO(OS_IO)
+                    device = Device(make_fake_tree(tmp), io=io)
+                r = results[tree, name] = run(device, io, ec, now, make,
+                                              args)
+                age = "-" if r["age"] is None else f"{r['age'] * 1e3:.0f}"
+                print(f"{tree:<6} {name:<6} {r['us']:>9.1f} "
+                      f"{r['sysfs']:>6.1f} {r['ec']:>6.1f} {age:>7}")
+
+    failed = False
+    for tree in ("sim", "fake"):
+        files, state = results[tree, "files"], results[tree, "state"]
+        if state["us"] >= files["us"]:
+            print(f"state isn't faster than the per-file reads on {tree}")
+            failed = True
+        print(f"{tree}: state {files['us'] / state['us']:.1f}x faster")
+    if results["sim", "state"]["ec"]:
+        print("reading state cost EC reads")
+        failed = True
+    idle, reading = worker_rates(args.idle)
+    print(f"worker EC reads/s: {idle:.1f} idle, {reading:.1f} with a reader")
+    if idle >= reading:
+        print("the worker doesn't read the EC less often without a reader")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
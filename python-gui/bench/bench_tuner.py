@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+`axb35 tune` on a day-long load trace: idle stretches of 10-60 min
+with inference jobs (30 s - 30 min at 90% CPU) in between, searched
+with --candidates curve pairs against the driver's default curves.
+
+Reports the search time, the size of the Pareto front and the default
+curves against the pick. The tuner's model is then checked against
+SimulatedEC, which runs the driver's worker and the fan inertia at
+0.1 s steps, on the first --check hours for both.
+
+Exits 1 when the search takes longer than --limit seconds, a front
+entry breaks the GUI's curve rules, or the tuner's peak temperature
+is more than 1 °C or its level-seconds more than 5% off SimulatedEC.
+
+usage: bench_tuner.py [--candidates N] [--seed N] [--limit S] [--check H]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from axb35 import tuner
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC
+
+DAY = 24 * 3600
+IDLE_LOAD = 0.03
+JOB_LOAD = 0.9
+
+
+def day_trace(seed):
+    rnd = random.Random(seed)
+    loads = []
+    while len(loads) < DAY:
+        loads += [IDLE_LOAD] * rnd.randint(600, 3600)
+        loads += [JOB_LOAD] * rnd.randint(30, 1800)
+    return loads[:DAY]
+
+
+def replay(loads, candidate, fans):
+    """Peak °C, level-seconds and switches of `candidate` in SimulatedEC"""
+    now = [0.0]
+    ec = SimulatedEC(load=loads[0], clock=lambda: now[0])
+    device = Device(io=SimIO(ec))
+    for fan in fans:
+        device.set_curve(fan, "rampup", candidate.rampup)
+        device.set_curve(fan, "rampdown", candidate.rampdown)
+        device.set_fan_mode(fan, "curve")
+    peak = ec.temp
+    level_seconds = switches = 0
+    last = [ec.level(fan) for fan in fans]
+    for load in loads:
+        ec.set_load(load)
+        now[0] += 1.0
+        ec.advance()
+        peak = max(peak, ec.temp)
+        levels = [ec.level(fan) for fan in fans]
+        level_seconds += sum(levels)
+        switches += sum(a != b for a, b in zip(levels, last))
+        last = levels
+    return peak, level_seconds, switches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--candidates", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--limit", type=float, default=10.0,
+                        help="seconds the day's search may take")
+    parser.add_argument("--check", type=float, default=4.0,
+                        help="hours checked against SimulatedEC")
+    args = parser.parse_args()
+
+    loads = day_trace(args.seed)
+    trace = tuner.trace_from_loads(loads)
+    fans = tuner.DEFAULT_FANS
+    t0 = time.perf_counter()
+    front, now = tuner.tune(trace, args.candidates, args.seed, fans,
+                            tuner.default_baseline())
+    elapsed = time.perf_counter() - t0
+    best = tuner.pick(front, now.peak, now.switches)
+    print(f"{len(loads) / 3600:.0f} h, {args.candidates} candidates in "
+          f"{elapsed:.2f} s, {len(front)} on the front")
+    print(f"{'':<8} {tuner.HEADER}")
+    print(f"{'default':<8} {tuner.format_candidate(now)}")
+    print(f"{'pick':<8} {tuner.format_candidate(best)}")
+
+    failed = False
+    if elapsed > args.limit:
+        print(f"search took over {args.limit:g} s")
+        failed = True
+    for candidate in front:
+        try:
+            tuner.check_pair(candidate.rampup, candidate.rampdown)
+        except ValueError as e:
+            print(f"front entry {candidate}: {e}")
+            failed = True
+
+    check = loads[:int(args.check * 3600)]
+    short = tuner.trace_from_loads(check)
+    print(f"first {args.check:g} h, tuner / SimulatedEC:")
+    print(f"{'':<8} {'peak °C':>13} {'level h':>13} {'switches':>11}")
+    for name, candidate in (("default", now), ("pick", best)):
+        peak, level_seconds, switches = tuner.simulate(
+            short, np.array([candidate.rampup]),
+            np.array([candidate.rampdown]), fans)
+        model = (float(peak[0]), float(level_seconds[0]), int(switches[0]))
+        sim = replay(check, candidate, fans)
+        print(f"{name:<8} {model[0]:>6.1f}/{sim[0]:<6.1f} "
+              f"{model[1] / 3600:>6.2f}/{sim[1] / 3600:<6.2f} "
+              f"{model[2]:>5}/{sim[2]:<5}")
+        if abs(model[0] - sim[0]) > 1.0:
+            print(f"{name}: peak off by more than 1 °C")
+            failed = True
+        if abs(model[1] - sim[1]) > 0.05 * max(sim[1], 1):
+            print(f"{name}: level-seconds off by more than 5%")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
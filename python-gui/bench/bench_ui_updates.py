@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Count Tk callbacks and widget reconfigurations per monitor tick for the
+old per-label root.after() path and the coalesced UiBatcher path.
+
+Runs headless: a fake root queues after() callbacks and fake labels
+count config() calls. The Tk loop can be made to lag behind the monitor
+with --lag, draining its queue only every LAG ticks.
+
+usage: bench_ui_updates.py [-n TICKS] [--lag TICKS]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.sysfs import FanState, Snapshot
+from axb35.uiupdate import UiBatcher, UiStats, WidgetCache
+
+
+class FakeRoot:
+    def __init__(self):
+        self.queue = []
+        self.callbacks = 0
+
+    def after(self, delay, fn):
+        self.queue.append(fn)
+
+    def drain(self):
+        queue, self.queue = self.queue, []
+        for fn in queue:
+            self.callbacks += 1
+            fn()
+
+
+class FakeLabel:
+    reconfigs = 0
+
+    def config(self, **kw):
+        FakeLabel.reconfigs += 1
+
+
+def trace(ticks, seed=1):
+    """Idle-ish box: temp moves every few seconds, rpm jitters a bit"""
+    rnd = random.Random(seed)
+    temp, rpm = 52, [1830, 1795, 0]
+    for t in range(ticks):
+        if rnd.random() < 0.2:
+            temp += rnd.choice((-1, 1))
+        for i in (0, 1):
+            if rnd.random() < 0.3:
+                rpm[i] += rnd.choice((-15, 15))
+        yield Snapshot(float(t), temp, fans=tuple(FanState(r) for r in rpm))
+
+
+def legacy(ticks, lag):
+    """monitor_loop before the batcher: one after() per label"""
+    root = FakeRoot()
+    temp_label = FakeLabel()
+    top = [FakeLabel() for _ in range(3)]
+    block = [FakeLabel() for _ in range(3)]
+    FakeLabel.reconfigs = 0
+    for n, snap in enumerate(trace(ticks)):
+        root.after(0, lambda t=snap.temp: temp_label.config(text=f"{t}°C"))
+        for i, rpm in enumerate(snap.rpms):
+            root.after(0, lambda i=i, r=rpm: top[i].config(text=str(r)))
+            root.after(0, lambda i=i, r=rpm: block[i].config(text=str(r)))
+        root.after(0, lambda: None)  # chart redraw
+        if n % lag == lag - 1:
+            root.drain()
+    root.drain()
+    return root.callbacks, FakeLabel.reconfigs, 0
+
+
+def batched(ticks, lag):
+    root = FakeRoot()
+    temp_label = FakeLabel()
+    top = [FakeLabel() for _ in range(3)]
+    block = [FakeLabel() for _ in range(3)]
+    FakeLabel.reconfigs = 0
+    stats = UiStats()
+    widgets = WidgetCache(stats)
+
+    def apply(snap):
+        widgets.set_text(temp_label, f"{snap.temp}°C")
+        for i, rpm in enumerate(snap.rpms):
+            widgets.set_text(top[i], str(rpm))
+            widgets.set_text(block[i], str(rpm))
+
+    batcher = UiBatcher(root, apply, stats)
+    for n, snap in enumerate(trace(ticks)):
+        batcher.post(snap)
+        if n % lag == lag - 1:
+            root.drain()
+    root.drain()
+    return root.callbacks, FakeLabel.reconfigs, stats.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=3600, help="ticks at 1 Hz")
+    parser.add_argument("--lag", type=int, default=1,
+                        help="Tk loop drains every LAG ticks")
+    args = parser.parse_args()
+
+    print(f"{args.n} ticks at 1 Hz, Tk loop drains every {args.lag} tick(s)")
+    print(f"{'path':<10} {'callbacks/s':>12} {'reconfigs/s':>12} "
+          f"{'dropped/s':>10}")
+    for name, fn in (("legacy", legacy), ("batched", batched)):
+        callbacks, reconfigs, dropped = fn(args.n, args.lag)
+        print(f"{name:<10} {callbacks / args.n:>12.2f} "
+              f"{reconfigs / args.n:>12.2f} {dropped / args.n:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
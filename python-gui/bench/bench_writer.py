@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Threads, sysfs writes and EC transactions caused by a scripted slider
+drag plus a few mode changes, for the old per-event threading.Timer
+path and the single Writer thread.
+
+The drag moves fan 1's rampup L3 slider from 83 down to 72 and back to
+83, one event every 20 ms, which also pushes rampdown L3 down to 72.
+Verification delays are shortened from 10 s to 0.5 s.
+
+usage: bench_writer.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.device import Device
+from axb35.sim import make_fake_tree
+from axb35.sysfs import EC_READS, EC_WRITES
+from axb35.writer import Writer
+
+CURVE_DELAY = 0.4
+VERIFY_DELAY = 0.5
+EVENT_GAP = 0.02
+
+
+class CountingDevice(Device):
+    def __init__(self, base_path):
+        super().__init__(base_path)
+        self.writes = 0
+        self.reads = 0
+        self.ec = 0
+
+    def write(self, name, value):
+        self.writes += 1
+        self.ec += EC_WRITES[name]
+        super().write(name, value)
+
+    def read(self, name):
+        self.reads += 1
+        self.ec += EC_READS[name]
+        return super().read(name)
+
+
+def drag_events():
+    """(rampup, rampdown, rampdown_changed) after every slider event"""
+    up = [60, 70, 83, 95, 97]
+    down = [40, 50, 80, 94, 96]
+    for v in list(range(82, 71, -1)) + list(range(73, 84)):
+        up[2] = v
+        for i in range(2):
+            up[i] = min(up[i], v)
+        changed = False
+        for i in range(5):
+            if down[i] > up[i]:
+                down[i] = up[i]
+                changed = True
+        yield list(up), list(down), changed
+
+
+def mode_changes(submit):
+    submit("fan2_mode", "fixed")
+    submit("fan2_level", "3")
+    submit("fan2_mode", "curve")
+    submit("power_mode", "performance")
+
+
+def legacy(device):
+    """schedule_curve_write and the 10 s re-read timers of the old GUI"""
+    gens, timers = {}, {}
+
+    def schedule(name, values):
+        gen = gens[name] = gens.get(name, 0) + 1
+        if name in timers:
+            timers[name].cancel()
+
+        def do_write(expected):
+            if gens.get(name) == expected:
+                device.write(name, values)
+
+        timers[name] = threading.Timer(CURVE_DELAY, lambda: do_write(gen))
+        timers[name].start()
+
+    for up, down, changed in drag_events():
+        schedule("fan1_rampup_curve", up)
+        if changed:
+            schedule("fan1_rampdown_curve", down)
+        time.sleep(EVENT_GAP)
+
+    def submit(name, value):
+        device.write(name, value)
+        if name.endswith("_mode"):
+            threading.Timer(VERIFY_DELAY, device.read, (name,)).start()
+
+    mode_changes(submit)
+
+
+def batched(device):
+    writer = Writer(device, verify_delay=VERIFY_DELAY)
+    for name in ("fan1_rampup_curve", "fan1_rampdown_curve", "fan2_mode",
+                 "fan2_level", "power_mode"):
+        writer.note(name, Device.read(device, name))
+    for up, down, changed in drag_events():
+        writer.submit("fan1_rampup_curve", up, delay=CURVE_DELAY)
+        if changed:
+            writer.submit("fan1_rampdown_curve", down, delay=CURVE_DELAY)
+        time.sleep(EVENT_GAP)
+    mode_changes(writer.submit)
+    return writer
+
+
+def run(fn):
+    with tempfile.TemporaryDirectory() as tmp:
+        device = CountingDevice(make_fake_tree(tmp))
+        started = [0]
+        orig_start = threading.Thread.start
+
+        def counting_start(self):
+            started[0] += 1
+            orig_start(self)
+
+        threading.Thread.start = counting_start
+        try:
+            writer = fn(device)
+        finally:
+            threading.Thread.start = orig_start
+        time.sleep(CURVE_DELAY + VERIFY_DELAY + 0.5)
+        if writer:
+            writer.close()
+        return started[0], device.writes, device.reads, device.ec
+
+
+def main():
+    events = sum(1 + changed for _, _, changed in drag_events())
+    print(f"slider drag: {events} curve updates, then 4 mode/level changes")
+    print(f"{'path':<8} {'threads':>8} {'writes':>7} {'reads':>6} "
+          f"{'EC transactions':>16}")
+    for name, fn in (("legacy", legacy), ("writer", batched)):
+        threads, writes, reads, ec = run(fn)
+        print(f"{name:<8} {threads:>8} {writes:>7} {reads:>6} {ec:>16}")
+
+
+if __name__ == "__main__":
+    main()
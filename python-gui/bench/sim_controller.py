@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Run load traces through the simulated EC, once with the driver's
+curve mode and then with the userspace FanController, and compare peak
+and mean temperature, time above 85°C, mean fan level (noise), level
+changes and EC transactions, for the interpolated curve and for a PID
+towards --pid °C. Fans 1 and 2 are controlled, fan3 stays in auto in
+all runs. A controller tick reads temp1/temp (one EC read), so EC
+transactions grow with 1 / --tick.
+
+Traces are "seconds,load" CSV files (load 0..1), or one of the built-in
+synthetic ones. --record samples this machine's CPU load from
+/proc/stat into such a file.
+
+--replay feeds a recording from `axb35 record` to the controller open
+loop instead: the recorded temperature drives the policy, and the
+levels it picks are compared with the ones the driver had.
+
+usage: sim_controller.py [--trace NAME|FILE ...] [--tick S] [--pid TEMP]
+       sim_controller.py --record FILE --seconds N
+       sim_controller.py --replay FILE [--start T] [--end T]
+"""
+import argparse
+import bisect
+import math
+import os
+import random
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.controller import CurvePolicy, FanController, PidPolicy
+from axb35.device import Device
+from axb35.recording import Recording, decode, parse_time
+from axb35.sim import SimIO, SimulatedEC
+
+STEP = 0.1
+CONTROLLED = (1, 2)
+HOT = 85
+
+
+def trace_compile(t):
+    """1 min builds with 30 s pauses"""
+    return 1.0 if t % 90 < 60 else 0.05
+
+
+def trace_gaming(t, _rnd=random.Random(3)):
+    """steady 70% with noise"""
+    return min(1.0, max(0.0, 0.7 + _rnd.uniform(-0.15, 0.15)))
+
+
+def trace_spikes(t):
+    """idle with a 5 s spike every minute"""
+    return 1.0 if t % 60 < 5 else 0.03
+
+
+def trace_ramp(t):
+    """slow 0 -> 100% -> 0 over 20 minutes"""
+    return 0.5 - 0.5 * math.cos(2 * math.pi * t / 1200)
+
+
+BUILTIN = {"compile": trace_compile, "gaming": trace_gaming,
+           "spikes": trace_spikes, "ramp": trace_ramp}
+
+
+def load_trace(path):
+    times, loads = [], []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            t, load = line.split(",")[:2]
+            times.append(float(t))
+            loads.append(float(load))
+    if not times:
+        raise ValueError(f"{path}: empty trace")
+
+    def trace(t):
+        i = bisect.bisect_right(times, t) - 1
+        return loads[max(0, i)]
+    trace.duration = times[-1]
+    return trace
+
+
+def cpu_times():
+    with open("/proc/stat") as f:
+        fields = [int(v) for v in f.readline().split()[1:]]
+    idle = fields[3] + fields[4]
+    return sum(fields), idle
+
+
+def record_trace(path, seconds):
+    total0, idle0 = cpu_times()
+    with open(path, "w") as out:
+        out.write("# seconds,load from /proc/stat\n")
+        for t in range(int(seconds)):
+            time.sleep(1)
+            total, idle = cpu_times()
+            busy = 1 - (idle - idle0) / max(1, total - total0)
+            out.write(f"{t},{busy:.3f}\n")
+            out.flush()
+            total0, idle0 = total, idle
+
+
+def simulate(trace, duration, policy=None, tick=0.1):
+    now = [0.0]
+    ec = SimulatedEC(load=trace(0), clock=lambda: now[0])
+    controller = None
+    if policy is not None:
+        controller = FanController(Device(io=SimIO(ec)), policy, CONTROLLED,
+                                   tick=tick, clock=lambda: now[0])
+        controller.start()
+    ops0 = ec.ec_reads + ec.ec_writes
+    levels = {n: ec.level(n) for n in CONTROLLED}
+    changes = 0
+    peak = ec.temp
+    temp_sum = level_sum = hot = 0.0
+    steps = int(duration / STEP)
+    next_tick = 0.0
+    tick_time = 0.0
+    for i in range(1, steps + 1):
+        now[0] = i * STEP
+        ec.load = trace(now[0])
+        ec.advance()
+        if controller and now[0] >= next_tick - 1e-9:
+            t0 = time.perf_counter()
+            controller.tick()
+            tick_time += time.perf_counter() - t0
+            next_tick += tick
+        for n in CONTROLLED:
+            level = ec.level(n)
+            if level != levels[n]:
+                changes += 1
+                levels[n] = level
+            level_sum += level
+        peak = max(peak, ec.temp)
+        temp_sum += ec.temp
+        if ec.temp >= HOT:
+            hot += STEP
+    ops = ec.ec_reads + ec.ec_writes - ops0
+    tick_us = None
+    if controller:
+        controller.stop()
+        tick_us = tick_time / controller.ticks * 1e6
+    hours = duration / 3600
+    return {
+        "peak": peak,
+        "mean": temp_sum / steps,
+        "hot": hot,
+        "level": level_sum / steps / len(CONTROLLED),
+        "changes": changes,
+        "ec_per_h": ops / hours,
+        "tick_us": tick_us,
+    }
+
+
+def replay(path, policy, start=None, end=None):
+    """
+    Level statistics of the recorded fans 1/2 and of the policies made
+    by `policy` ticking on every recorded sample with the recorded
+    temperature
+    """
+    now = [0.0]
+    ec = SimulatedEC(clock=lambda: now[0])
+    controller = FanController(Device(io=SimIO(ec)), policy, CONTROLLED,
+                               clock=lambda: now[0])
+    controller.start()
+    stats = {"recorded": [0, 0, None], "controller": [0, 0, None]}
+    samples = 0
+    first = None
+    with Recording(path) as recording:
+        for row in recording.rows(start, end):
+            values = decode(row)
+            if values["temp"] is None:
+                continue
+            if first is None:
+                first = row[0]
+            now[0] = row[0] - first
+            ec.advance()
+            # the recording decides the temperature, not the model
+            ec.temp = float(values["temp"])
+            controller.tick()
+            samples += 1
+            levels = {"recorded": [values[f"fan{n}_level"]
+                                   for n in CONTROLLED],
+                      "controller": [ec.level(n) for n in CONTROLLED]}
+            for key, current in levels.items():
+                total, changes, last = stats[key]
+                total += sum(v or 0 for v in current)
+                if last is not None and current != last:
+                    changes += sum(a != b for a, b in zip(current, last))
+                stats[key] = [total, changes, current]
+    controller.stop()
+    if not samples:
+        raise ValueError(f"{path}: no samples in range")
+    return samples, {key: (total / samples / len(CONTROLLED), changes)
+                     for key, (total, changes, _) in stats.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trace", action="append",
+                        help=f"built-in ({', '.join(BUILTIN)}) or CSV file, "
+                        "repeatable (default all built-in)")
+    parser.add_argument("--minutes", type=float, default=30,
+                        help="length of built-in traces (default 30)")
+    parser.add_argument("--tick", type=float, default=0.1,
+                        help="controller tick (default 0.1)")
+    parser.add_argument("--hysteresis", type=float, default=3.0)
+    parser.add_argument("--pid", type=float, default=75.0, metavar="TEMP",
+                        help="target of the PID runs (default 75)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record a CSV trace of this machine's CPU load")
+    parser.add_argument("--seconds", type=float, default=600,
+                        help="length of --record (default 600)")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="run the controller on a recorded temperature")
+    parser.add_argument("--start", help="replay from, unix or ISO time")
+    parser.add_argument("--end", help="replay until, unix or ISO time")
+    args = parser.parse_args()
+
+    if args.record:
+        record_trace(args.record, args.seconds)
+        return
+
+    if args.replay:
+        start = parse_time(args.start) if args.start else None
+        end = parse_time(args.end) if args.end else None
+        policies = [("curve", partial(CurvePolicy,
+                                      hysteresis=args.hysteresis)),
+                    (f"pid {args.pid:g}°C", partial(PidPolicy, args.pid))]
+        print(f"{'control':<14} {'samples':>8} {'mean lvl':>9} "
+              f"{'changes':>8}")
+        for label, policy in policies:
+            samples, stats = replay(args.replay, policy, start, end)
+            if label == policies[0][0]:
+                level, changes = stats["recorded"]
+                print(f"{'recorded':<14} {samples:>8} {level:>9.2f} "
+                      f"{changes:>8}")
+            level, changes = stats["controller"]
+            print(f"{label:<14} {samples:>8} {level:>9.2f} {changes:>8}")
+        return
+
+    traces = []
+    for name in args.trace or list(BUILTIN):
+        if name in BUILTIN:
+            traces.append((name, BUILTIN[name], args.minutes * 60))
+        else:
+            trace = load_trace(name)
+            traces.append((os.path.basename(name), trace, trace.duration))
+
+    print(f"{'trace':<10} {'control':<14} {'peak °C':>8} {'mean °C':>8} "
+          f">{HOT}°C s {'mean lvl':>9} {'changes':>8} {'EC ops/h':>9} "
+          f"{'us/tick':>8}")
+    for name, trace, duration in traces:
+        runs = [("kernel curve", None),
+                (f"curve {args.tick:g}s",
+                 partial(CurvePolicy, hysteresis=args.hysteresis)),
+                (f"pid {args.pid:g}°C {args.tick:g}s",
+                 partial(PidPolicy, args.pid))]
+        for label, policy in runs:
+            r = simulate(trace, duration, policy, args.tick)
+            tick_us = "-" if r["tick_us"] is None else f"{r['tick_us']:.0f}"
+            print(f"{name:<10} {label:<14} {r['peak']:>8.1f} {r['mean']:>8.1f} "
+                  f"{r['hot']:>8.0f} {r['level']:>9.2f} {r['changes']:>8} "
+                  f"{r['ec_per_h']:>9.0f} {tick_us:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks against the simulated EC (axb35.sim), so they
+run on any Linux box without the driver. Exits 1 when a result is
+over its limit.
+
+  sampling     monitor and full snapshot latency through SimIO, plus
+               the EC reads one sample costs
+  curve edit   sysfs writes caused by one slider drag through Writer
+  gui startup  seconds until FanControlGUI shows its first values
+  gui cpu      steady-state CPU use of FanControlGUI at the 1 s interval
+
+The GUI benchmarks start ec-su_axb35-linux-gui.py on a TreeMirror and
+need Tk and a display (e.g. xvfb-run), they are skipped otherwise.
+
+usage: suite.py [--ticks N] [--ec-latency S] [--runs N] [--cpu-seconds S]
+                [--skip-gui]
+"""
+import argparse
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC, TreeMirror
+from axb35.sysfs import MONITOR_ATTRIBUTES, SysfsSampler
+from axb35.writer import Writer
+from bench_writer import CURVE_DELAY, EVENT_GAP, drag_events
+
+GUI = os.path.join(os.path.dirname(HERE), "ec-su_axb35-linux-gui.py")
+
+# limits, generous enough for a loaded laptop
+LIMITS = {
+    "monitor sample p99 (us)": 2000,
+    "full sample p99 (us)": 5000,
+    "EC reads per monitor sample": 7,
+    "EC reads per full sample": 14,
+    "sysfs writes per curve drag": 2,
+    "gui startup (s)": 2.0,
+    "gui cpu (%)": 3.0,
+}
+
+
+class CountingIO(SimIO):
+    def __init__(self, ec):
+        super().__init__(ec)
+        self.writes = 0
+
+    def write(self, fd, data):
+        self.writes += 1
+        return super().write(fd, data)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def bench_sampling(ticks, latency):
+    results = {}
+    for label, attributes in (("monitor", MONITOR_ATTRIBUTES),
+                              ("full", None)):
+        ec = SimulatedEC(latency=latency)
+        sampler = SysfsSampler(attributes=attributes, io=SimIO(ec))
+        sampler.sample()
+        reads = ec.ec_reads - ec.worker_reads
+        times = []
+        for _ in range(ticks):
+            t0 = time.perf_counter()
+            sampler.sample()
+            times.append((time.perf_counter() - t0) * 1e6)
+        sampler.close()
+        results[f"{label} sample p50 (us)"] = percentile(times, 50)
+        results[f"{label} sample p99 (us)"] = percentile(times, 99)
+        results[f"EC reads per {label} sample"] = (ec.ec_reads - ec.worker_reads - reads) / ticks
+    return results
+
+
+def bench_curve_edit():
+    io = CountingIO(SimulatedEC())
+    device = Device(io=io)
+    writer = Writer(device, verify_delay=60.0)
+    for name in ("fan1_rampup_curve", "fan1_rampdown_curve"):
+        writer.note(name, device.read(name))
+    for up, down, changed in drag_events():
+        writer.submit("fan1_rampup_curve", up, delay=CURVE_DELAY)
+        if changed:
+            writer.submit("fan1_rampdown_curve", down, delay=CURVE_DELAY)
+        time.sleep(EVENT_GAP)
+    writer.close(flush=True)
+    return {"sysfs writes per curve drag": io.writes}
+
+
+def gui_available():
+    if not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        return "no display"
+    try:
+        import tkinter  # noqa: F401
+    except ImportError:
+        return "no tkinter"
+    return None
+
+
+def wait_for_line(proc, text, timeout):
+    end = time.monotonic() + timeout
+    buf = b""
+    while time.monotonic() < end:
+        ready, _, _ = select.select([proc.stdout], [], [],
+                                    max(0.0, end - time.monotonic()))
+        if not ready:
+            break
+        chunk = os.read(proc.stdout.fileno(), 4096)
+        if not chunk:
+            break
+        buf += chunk
+        if text.encode() in buf.splitlines():
+            return True
+    return False
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime, fields 14 and 15
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_gui(tmp):
+    env = dict(os.environ, AXB35_PATH=tmp)
+    return subprocess.Popen(
+        [sys.executable, GUI, "--base-path", tmp,
+         "--config", os.path.join(tmp, "config.json"), "--print-ready"],
+        stdout=subprocess.PIPE, env=env)
+
+
+def stop_gui(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def bench_gui(runs, cpu_window):
+    results = {}
+    startups = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            TreeMirror(SimulatedEC(), tmp, period=0.2):
+        for i in range(runs):
+            t0 = time.monotonic()
+            proc = start_gui(tmp)
+            try:
+                if not wait_for_line(proc, "ready", 30):
+                    raise RuntimeError("GUI did not become ready")
+                startups.append(time.monotonic() - t0)
+                if i == runs - 1:
+                    # let startup work settle before measuring
+                    time.sleep(2)
+                    c0, w0 = cpu_seconds(proc.pid), time.monotonic()
+                    time.sleep(cpu_window)
+                    c1, w1 = cpu_seconds(proc.pid), time.monotonic()
+                    results["gui cpu (%)"] = 100 * (c1 - c0) / (w1 - w0)
+            finally:
+                stop_gui(proc)
+    results["gui startup (s)"] = statistics.median(startups)
+    return results
+
+
+def report(results, skipped, limits):
+    failed = []
+    print(f"{'benchmark':<30} {'result':>10} {'limit':>8}")
+    for name, value in results.items():
+        limit = limits.get(name)
+        status = ""
+        if limit is not None:
+            status = "ok" if value <= limit else "FAIL"
+            if status == "FAIL":
+                failed.append(name)
+        limit_text = "" if limit is None else f"{limit:g}"
+        print(f"{name:<30} {value:>10.2f} {limit_text:>8}  {status}")
+    for name, reason in skipped.items():
+        print(f"{name:<30} {'skipped':>10} {'':>8}  ({reason})")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=2000,
+                        help="samples per sampling benchmark")
+    parser.add_argument("--ec-latency", type=float, default=0.0,
+                        help="simulated seconds per EC transaction (default 0, "
+                        "which measures Python overhead only,\nlatency limits "
+                        "are only checked then)")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="GUI starts, the median is reported")
+    parser.add_argument("--cpu-seconds", type=float, default=10.0,
+                        help="steady-state CPU measuring window")
+    parser.add_argument("--skip-gui", action="store_true")
+    args = parser.parse_args()
+
+    results, skipped = {}, {}
+    results.update(bench_sampling(args.ticks, args.ec_latency))
+    results.update(bench_curve_edit())
+    reason = "--skip-gui" if args.skip_gui else gui_available()
+    if reason:
+        skipped["gui startup (s)"] = reason
+        skipped["gui cpu (%)"] = reason
+    else:
+        results.update(bench_gui(args.runs, args.cpu_seconds))
+
+    # the latency limits are for Python overhead, sleep() jitter in the
+    # simulated EC would dominate them
+    limits = dict(LIMITS)
+    if args.ec_latency:
+        del limits["monitor sample p99 (us)"], limits["full sample p99 (us)"]
+    failed = report(results, skipped, limits)
+    if failed:
+        print(f"over limit: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
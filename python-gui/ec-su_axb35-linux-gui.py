@@ -3,14 +3,57 @@
 Fan Control GUI for ec_su_axb35 driver
 Requires appropriate permissions to read/write /sys/class/ec_su_axb35/
 """
+import argparse
 import os
 import sys
-import subprocess
 
-def ensure_root():
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from axb35.sysfs import BASE_PATH, DEFAULT_BASE_PATH
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fan control GUI for ec_su_axb35")
+    parser.add_argument("--base-path", default=BASE_PATH,
+                        help=f"sysfs class directory (default {BASE_PATH})")
+    parser.add_argument("--config",
+                        help="config file (default $AXB35_CONFIG or "
+                        "/etc/ec-fan-control.json)")
+    parser.add_argument("--profiles",
+                        help="profiles file (default $AXB35_PROFILES or "
+                        "/etc/ec-fan-control.profiles.json)")
+    parser.add_argument("--broker", nargs="?", const="", default=None,
+                        metavar="SOCKET",
+                        help="run as a normal user through `axb35 broker` "
+                        "(default socket $AXB35_SOCKET or /run/axb35.sock)")
+    parser.add_argument("--ui-stats", action="store_true",
+                        help="print Tk callback and widget update rates")
+    parser.add_argument("--print-ready", action="store_true",
+                        help="print \"painted\" once the window is shown and "
+                        "\"ready\" once the first values are "
+                        "(used by the benchmarks)")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="show a recording from `axb35 record` instead "
+                        "of the device")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed, times real time (default 1)")
+    parser.add_argument("--debug", action="store_true",
+                        help="time EC reads/writes from the start and open "
+                        "the debug panel")
+    return parser.parse_args()
+
+
+def ensure_root(args):
     if os.geteuid() == 0:
         return  # already root
 
+    # a tree other than the driver's (AXB35_PATH / --base-path) does not
+    # need root, and neither does talking to the broker or replaying a
+    # recording
+    if (args.broker is not None or args.replay is not None or
+            os.path.realpath(args.base_path) !=
+            os.path.realpath(DEFAULT_BASE_PATH)):
+        return
+
     # Prevent infinite relaunch loop
     if os.environ.get("EC_FAN_CONTROL_ROOT") == "1":
         sys.exit("Failed to gain root privileges")
@@ -24,71 +67,192 @@ def ensure_root():
         f"DISPLAY={env.get('DISPLAY', '')}",
         f"XAUTHORITY={env.get('XAUTHORITY', '')}",
         sys.executable,
-        os.path.abspath(__file__)
+        os.path.abspath(__file__),
+        *sys.argv[1:]
     ]
 
-    subprocess.run(cmd, env=env)
-    sys.exit(0)
+    # replace this process, there is nothing left for it to do
+    os.execvpe("pkexec", cmd, env)
 
-ensure_root()
+if __name__ == "__main__":
+    # before Tk and the rest of axb35 are loaded, an unprivileged start
+    # that needs root is replaced by pkexec right away
+    ARGS = parse_args()
+    ensure_root(ARGS)
 
-import argparse
-import json
+import math
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, simpledialog
 import threading
 import time
-import os
 
-CONFIG_PATH = "/etc/ec-fan-control.json"
-BASE_PATH = "/sys/class/ec_su_axb35"
+from axb35.chart import HistoryChart
+from axb35.curve import CurveModel
+from axb35.curve_editor import CurveEditor
+from axb35.deadline import DeadlineSampler
+from axb35.governor import PowerGovernor
+from axb35.device import CONFIG_PATH, Device, load_config, save_config
+from axb35.history import History
+from axb35.instrument import Instruments, TracedIO
+from axb35.profiles import (PROFILES_PATH, SETTINGS, apply_profile, check_name,
+                            current_state, desired_state, load_profiles,
+                            save_profiles)
+from axb35.scheduler import AdaptiveScheduler
+from axb35.sysfs import (ATTRIBUTES, FANS, MONITOR_ATTRIBUTES, OS_IO,
+                         StateSampler)
+from axb35.uiupdate import UiBatcher, UiStats, WidgetCache
+from axb35.writer import Writer, format_value
+
+# after a value whose read missed its deadline
+STALE_MARK = " ?"
 
 class FanControlGUI:
-    def __init__(self, root):
+    def __init__(self, root, base_path=BASE_PATH, config_path=CONFIG_PATH,
+                 ui_stats=False, on_ready=None, profiles_path=PROFILES_PATH,
+                 on_paint=None, broker=None, replay=None, speed=1.0,
+                 debug=False):
         self.root = root
         self.root.title("Fan Control - ec_su_axb35")
-        self.root.geometry("900x800")
-        
-        self.config_path = CONFIG_PATH
-        self.base_path = BASE_PATH
+        self.root.geometry("900x1000")
+        # EC latency, loop timers and errors for the debug panel, only
+        # timed while it is open (or with --debug)
+        self.instruments = Instruments(enabled=debug)
+        self.debug_panel = None
+        
+        if broker is not None:
+            # unprivileged, reads and writes go through `axb35 broker`;
+            # imported here, asyncio would add ~50 ms to every start
+            from axb35.broker import RemoteDevice
+            self.device = RemoteDevice(broker or None, config_path)
+        elif replay is not None:
+            # read-only, shows a recording at `speed` times real time
+            from axb35.recording import Recording, ReplayDevice
+            self.device = ReplayDevice(Recording(replay), speed,
+                                       config_path=config_path)
+            self.root.title(f"Fan Control - replay of {replay}")
+        else:
+            base_path = base_path or BASE_PATH
+            self.device = Device(base_path, config_path,
+                                 io=TracedIO(OS_IO, base_path, self.instruments))
+        self.config_path = self.device.config_path
+        self.base_path = self.device.base_path
+        self.profiles_path = profiles_path
         self.update_interval = 1.0
+        # "auto" interval: backs off while temp and rpm are flat
+        self.scheduler = AdaptiveScheduler()
+        self.adaptive = False
+        self.monitor_wake = threading.Event()
         self.running = True
-        self.mode_check_timer = None
         self.curve_write_delay = 0.4  # seconds
-        # (fan, curve) -> generation counter
-        self.curve_write_gen = {}
-        # (fan, curve) -> threading.Timer
-        self.curve_write_timers = {}
+        # one thread for all writes, re-reads what it wrote after 10s
+        self.writer = Writer(self.device, verify_delay=10.0,
+                             on_error=self.on_write_error,
+                             on_verified=self.on_write_verified)
+        # keeps temp and rpm attributes open for the monitor thread
+        if broker is None and replay is None and self.device.has_state():
+            # one read of what the driver's worker cached, never waits
+            # for the EC; older than two worker ticks is marked stale
+            self.sampler = self.device.state_sampler(max_age=2.5)
+        elif broker is None and replay is None:
+            # a hung EC read leaves its value stale instead of stopping
+            # the monitor
+            self.sampler = DeadlineSampler(self.device, MONITOR_ATTRIBUTES,
+                                           deadline=0.25)
+        else:
+            self.sampler = self.device.sampler(MONITOR_ATTRIBUTES)
+        # load driven power mode, started and ticked by the monitor
+        # thread while the "Auto" box is checked
+        self.apu_auto = False
+        self.governor = None
+        # bounded temp/rpm history for the chart
+        self.history = History()
+        if replay is not None:
+            # samples passed over between ticks still go to the chart
+            self.device.on_skipped = self.history.add
+        # one coalesced Tk callback per monitor tick
+        self.ui_stats = UiStats()
+        self.widgets = WidgetCache(self.ui_stats)
+        self.ui_batcher = UiBatcher(
+            root, self.apply_snapshot, self.ui_stats,
+            on_lag=lambda lag: self.instruments.observe("tk queue lag", lag))
+        # called once the first snapshot is on screen
+        self.on_ready = on_ready
+        # called once the window has been exposed
+        self.on_paint = on_paint
         
         # Create GUI
         self.create_widgets()
+        self.root.bind('<Expose>', self.on_expose, add='+')
+        # hand the first frame to the X server before touching sysfs
+        self.root.update_idletasks()
         
-        # Start monitoring thread
+        # Start monitoring thread, it loads the initial state first
         self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.monitor_thread.start()
-        
-        # Initial mode read
-        self.read_all_modes()
-        
-    def read_sysfs(self, path):
-        """Read value from sysfs file"""
-        try:
-            with open(path, 'r') as f:
-                return f.read().strip()
-        except Exception as e:
-            print(f"Error reading {path}: {e}")
-            return None
-    
-    def write_sysfs(self, path, value):
-        """Write value to sysfs file"""
-        try:
-            with open(path, 'w') as f:
-                f.write(str(value))
-            return True
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to write to {path}: {e}")
-            return False
-    
+        if broker is None and replay is None:
+            # modes, levels and curves changed by the driver or anyone
+            # else, as soon as the driver announces them
+            self.watcher = self.device.watcher()
+            threading.Thread(target=self.watch_loop, daemon=True,
+                             name="axb35-watcher").start()
+
+        if ui_stats:
+            self.report_ui_stats()
+        if debug:
+            self.open_debug_panel(keep_enabled=True)
+        
+    def on_expose(self, event):
+        if self.on_paint and event.widget is self.root:
+            on_paint, self.on_paint = self.on_paint, None
+            self.root.after_idle(on_paint)
+
+    def on_write_error(self, name, value, error):
+        """Writer thread reports a failed write"""
+        path = self.device.path(name)
+        self.instruments.error(name, f"write {value!r}: {error}")
+        self.root.after(0, lambda: messagebox.showerror(
+            "Error", f"Failed to write to {path}: {error}"))
+
+    def on_write_verified(self, name, value):
+        """
+        Writer thread read back an attribute it wrote, or the watcher
+        saw it change
+        """
+        if name == "power_mode":
+            self.root.after(0, lambda: self.apu_mode_var.set(value))
+        elif name.endswith("_mode"):
+            fan_num = int(name[3])
+            self.root.after(0, lambda: self.show_fan_mode(fan_num, value))
+        elif name.endswith("_level"):
+            level_var = self.fan_controls[int(name[3])]['level_var']
+            self.root.after(0, lambda: level_var.set(str(value)))
+        elif name.endswith("_curve"):
+            fan_num, curve_type = int(name[3]), name[5:-6]
+            self.root.after(0, lambda: self.show_curve(fan_num, curve_type,
+                                                       value))
+
+    def watch_loop(self):
+        """Background thread showing the changes the watcher reports"""
+        self.watcher.wait()
+        while self.running:
+            try:
+                changed = self.watcher.wait(timeout=1.0)
+            except OSError as e:
+                self.instruments.error("watcher", e)
+                time.sleep(1.0)
+                continue
+            for name, value in changed.items():
+                ours = self.writer.known(name) == format_value(value)
+                self.writer.note(name, value)
+                # a write of our own coming back, or one that a queued
+                # write overrides anyway, e.g. while dragging a curve
+                if not ours and not self.writer.is_pending(name):
+                    self.on_write_verified(name, value)
+            if self.watcher.notified and self.writer.verify_delay is not None:
+                # what gets written is reported back by the driver
+                self.writer.verify_delay = None
+        self.watcher.close()
+
     def create_widgets(self):
         # Top frame - Temperature and Fan RPMs
         top_frame = ttk.LabelFrame(self.root, text="System Status", padding=10)
@@ -111,16 +275,27 @@ class FanControlGUI:
         ttk.Label(top_frame, text="Fan 3 RPM:").grid(row=1, column=2, sticky=tk.W, padx=5)
         self.fan3_rpm_label = ttk.Label(top_frame, text="----", font=('Arial', 12, 'bold'))
         self.fan3_rpm_label.grid(row=1, column=3, sticky=tk.W, padx=5)
+        self.top_rpm_labels = {
+            1: self.fan1_rpm_label,
+            2: self.fan2_rpm_label,
+            3: self.fan3_rpm_label,
+        }
         
         # Update interval selector
         ttk.Label(top_frame, text="Update Interval:").grid(row=0, column=4, sticky=tk.W, padx=5)
         self.interval_var = tk.StringVar(value="1")
         interval_combo = ttk.Combobox(top_frame, textvariable=self.interval_var, 
-                                      values=["0.5", "1", "2", "5"], width=5, state='readonly')
+                                      values=["auto", "0.5", "1", "2", "5"], width=5, state='readonly')
         interval_combo.grid(row=0, column=5, sticky=tk.W, padx=5)
         interval_combo.bind('<<ComboboxSelected>>', self.on_interval_change)
         ttk.Label(top_frame, text="sec").grid(row=0, column=6, sticky=tk.W)
         
+        # History chart
+        chart_frame = ttk.LabelFrame(self.root, text="History", padding=5)
+        chart_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.chart = HistoryChart(chart_frame, self.history)
+        self.chart.pack(fill=tk.X)
+        
         # APU Power Mode frame
         apu_frame = ttk.LabelFrame(self.root, text="APU Power Mode", padding=10)
         apu_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -132,6 +307,13 @@ class FanControlGUI:
                                            width=15, state='readonly')
         self.apu_mode_combo.grid(row=0, column=1, sticky=tk.W, padx=5)
         self.apu_mode_combo.bind('<<ComboboxSelected>>', self.on_apu_mode_change)
+        self.apu_auto_var = tk.BooleanVar()
+        ttk.Checkbutton(apu_frame, text="Auto (CPU load)",
+                        variable=self.apu_auto_var,
+                        command=self.on_apu_auto_change).grid(
+            row=0, column=2, sticky=tk.W, padx=5)
+        self.apu_auto_label = ttk.Label(apu_frame, text="")
+        self.apu_auto_label.grid(row=0, column=3, sticky=tk.W, padx=5)
         
         # Fan control blocks
         fans_frame = ttk.Frame(self.root)
@@ -157,6 +339,31 @@ class FanControlGUI:
             text="Load Config",
             command=self.load_config
         ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(config_frame, text="Profile:").pack(side=tk.LEFT, padx=(20, 5))
+        self.profile_var = tk.StringVar()
+        self.profile_combo = ttk.Combobox(config_frame, textvariable=self.profile_var,
+                                          width=20, state='readonly',
+                                          postcommand=self.refresh_profiles)
+        self.profile_combo.pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(
+            config_frame,
+            text="Apply Profile",
+            command=self.on_apply_profile
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(
+            config_frame,
+            text="Save as Profile",
+            command=self.on_save_profile
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(
+            config_frame,
+            text="Debug",
+            command=self.open_debug_panel
+        ).pack(side=tk.RIGHT, padx=5)
     
     def create_fan_control(self, parent, fan_num, fan_name, column):
         """Create control block for a single fan"""
@@ -191,120 +398,147 @@ class FanControlGUI:
         level_combo.bind('<<ComboboxSelected>>', 
                         lambda e, fn=fan_num: self.on_level_change(fn))
         
-        # Curve controls
-        curve_frame = ttk.LabelFrame(frame, text="Fan Curves", padding=5)
-        
-        # Ramp up curve
-        rampup_frame = ttk.Frame(curve_frame)
-        rampup_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
-        ttk.Label(rampup_frame, text="Ramp Up (°C)").pack()
-        
-        rampup_sliders = []
-        rampup_labels = []
-        slider_frame = ttk.Frame(rampup_frame)
-        slider_frame.pack(fill=tk.BOTH, expand=True)
-        
-        for i in range(5):
-            col_frame = ttk.Frame(slider_frame)
-            col_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=2)
-            
-            value_label = ttk.Label(col_frame, text="--", font=('Arial', 9))
-            value_label.pack()
-            
-            slider = tk.Scale(col_frame, from_=100, to=30, orient=tk.VERTICAL,
-                            length=150, showvalue=0,
-                            command=lambda v, fn=fan_num, idx=i, curve='rampup': 
-                            self.on_curve_change(fn, curve, idx, v))
-            slider.pack()
-            
-            label = ttk.Label(col_frame, text=f"L{i+1}")
-            label.pack()
-            
-            rampup_sliders.append(slider)
-            rampup_labels.append(value_label)
-        
-        # Ramp down curve
-        rampdown_frame = ttk.Frame(curve_frame)
-        rampdown_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
-        ttk.Label(rampdown_frame, text="Ramp Down (°C)").pack()
-        
-        rampdown_sliders = []
-        rampdown_labels = []
-        slider_frame = ttk.Frame(rampdown_frame)
-        slider_frame.pack(fill=tk.BOTH, expand=True)
-        
-        for i in range(5):
-            col_frame = ttk.Frame(slider_frame)
-            col_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=2)
-            
-            value_label = ttk.Label(col_frame, text="--", font=('Arial', 9))
-            value_label.pack()
-            
-            slider = tk.Scale(col_frame, from_=100, to=30, orient=tk.VERTICAL,
-                            length=150, showvalue=0,
-                            command=lambda v, fn=fan_num, idx=i, curve='rampdown': 
-                            self.on_curve_change(fn, curve, idx, v))
-            slider.pack()
-            
-            label = ttk.Label(col_frame, text=f"L{i+1}")
-            label.pack()
-            
-            rampdown_sliders.append(slider)
-            rampdown_labels.append(value_label)
-        
-        # Store references
+        # Store references, the curve editor and sliders are built the
+        # first time the fan is shown in curve mode
         self.fan_controls[fan_num] = {
+            'frame': frame,
             'rpm_label': rpm_label,
             'mode_var': mode_var,
             'mode_combo': mode_combo,
             'level_var': level_var,
             'level_combo': level_combo,
             'level_frame': level_frame,
-            'curve_frame': curve_frame,
-            'rampup_sliders': rampup_sliders,
-            'rampup_labels': rampup_labels,
-            'rampup_values': [None] * 5,
-            'rampdown_sliders': rampdown_sliders,
-            'rampdown_labels': rampdown_labels,
-            'rampdown_values': [None] * 5,
+            'curve': CurveModel(),
+            'curve_frame': None,
+            'curve_editor': None,
+            'rampup_sliders': [],
+            'rampup_labels': [],
+            'rampdown_sliders': [],
+            'rampdown_labels': [],
         }
-        _ = self.read_curve(fan_num, "rampup")
-        _ = self.read_curve(fan_num, "rampdown")
-        
-        # Initially hide level and curve controls
-        level_frame.pack_forget()
-        curve_frame.pack_forget()
-    
+
+    def create_curve_controls(self, fan_num):
+        """Build the curve editor and rampup/rampdown sliders of a fan"""
+        controls = self.fan_controls[fan_num]
+        curve_frame = ttk.LabelFrame(controls['frame'], text="Fan Curves", padding=5)
+        controls['curve_frame'] = curve_frame
+
+        # both views move the same CurveModel
+        editor = CurveEditor(curve_frame, controls['curve'],
+                             on_change=lambda changes, fn=fan_num:
+                             self.on_curve_edit(fn, changes))
+        editor.pack(fill=tk.X)
+        controls['curve_editor'] = editor
+        sliders_frame = ttk.Frame(curve_frame)
+        sliders_frame.pack(fill=tk.BOTH, expand=True)
+
+        for curve_type, title in (("rampup", "Ramp Up (°C)"),
+                                  ("rampdown", "Ramp Down (°C)")):
+            curve_col = ttk.Frame(sliders_frame)
+            curve_col.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+            ttk.Label(curve_col, text=title).pack()
+
+            sliders = controls[f'{curve_type}_sliders']
+            labels = controls[f'{curve_type}_labels']
+            values = controls['curve'].values[curve_type]
+            slider_frame = ttk.Frame(curve_col)
+            slider_frame.pack(fill=tk.BOTH, expand=True)
+
+            for i in range(5):
+                col_frame = ttk.Frame(slider_frame)
+                col_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=2)
+
+                text = "--" if values[i] is None else f"{values[i]}°C"
+                value_label = ttk.Label(col_frame, text=text, font=('Arial', 9))
+                value_label.pack()
+
+                slider = tk.Scale(col_frame, from_=100, to=30, orient=tk.VERTICAL,
+                                length=150, showvalue=0)
+                if values[i] is not None:
+                    slider.set(values[i])
+                slider.config(command=lambda v, fn=fan_num, idx=i, curve=curve_type:
+                              self.on_curve_change(fn, curve, idx, v))
+                slider.pack()
+
+                label = ttk.Label(col_frame, text=f"L{i+1}")
+                label.pack()
+
+                sliders.append(slider)
+                labels.append(value_label)
+        return curve_frame
+
     def on_interval_change(self, event):
         """Handle update interval change"""
-        self.update_interval = float(self.interval_var.get())
+        value = self.interval_var.get()
+        self.adaptive = value == "auto"
+        if self.adaptive:
+            self.scheduler.reset()
+        else:
+            self.update_interval = float(value)
+        self.monitor_wake.set()
     
     def on_apu_mode_change(self, event):
         """Handle APU power mode change"""
         mode = self.apu_mode_var.get()
-        path = f"{self.base_path}/apu/power_mode"
-        if self.write_sysfs(path, mode):
-            # Schedule mode verification after 10 seconds
-            if self.mode_check_timer:
-                self.mode_check_timer.cancel()
-            self.mode_check_timer = threading.Timer(10.0, self.read_apu_mode)
-            self.mode_check_timer.start()
+        # picking a mode by hand ends auto mode
+        self.apu_auto_var.set(False)
+        self.on_apu_auto_change()
+        self.writer.submit("power_mode", mode)
+
+    def on_apu_auto_change(self):
+        """Auto box toggled, the monitor thread acts on it next tick"""
+        self.apu_auto = self.apu_auto_var.get()
+        if not self.apu_auto:
+            self.apu_auto_label.config(text="")
+        self.monitor_wake.set()
+
+    def update_governor(self, snapshot):
+        """Start, tick or stop the power governor, on the monitor thread"""
+        if not self.apu_auto:
+            if self.governor is not None:
+                self.governor.stop(restore=False)
+                self.governor.close()
+                self.governor = None
+            return
+        if self.governor is None:
+            try:
+                # writes go through the Writer, which re-reads them
+                governor = PowerGovernor(
+                    self.device, mode_check=math.inf,
+                    on_switch=self.on_power_switch,
+                    write=lambda mode: self.writer.submit("power_mode", mode))
+                governor.start()
+            except (OSError, ValueError) as e:
+                self.apu_auto = False
+                self.instruments.error("governor", e)
+                self.root.after(0, lambda: (
+                    self.apu_auto_var.set(False),
+                    messagebox.showerror("Error",
+                                         f"Can't run auto mode: {e}")))
+                return
+            self.governor = governor
+        self.governor.tick(snapshot.temp)
+
+    def on_power_switch(self, switch):
+        """Governor changed the power mode, runs on the monitor thread"""
+        util = "-" if switch.util is None else f"{switch.util:.0%}"
+        text = (f"{switch.reason} at {time.strftime('%H:%M:%S')}, "
+                f"cpu {util}")
+        self.root.after(0, lambda: (
+            self.apu_mode_var.set(switch.new),
+            self.apu_auto_label.config(text=text)))
     
     def on_fan_mode_change(self, fan_num):
         """Handle fan mode change"""
         mode = self.fan_controls[fan_num]['mode_var'].get()
-        path = f"{self.base_path}/fan{fan_num}/mode"
-        
-        if self.write_sysfs(path, mode):
-            # Update UI based on mode
-            self.update_fan_mode_ui(fan_num, mode)
-            
-            # If switching to curve mode, read current curve values
-            if mode == "curve":
-                self.read_fan_curves(fan_num)
-            
-            # Schedule mode verification after 10 seconds
-            threading.Timer(10.0, lambda: self.read_fan_mode(fan_num)).start()
+        self.writer.submit(f"fan{fan_num}_mode", mode)
+
+        # Update UI based on mode
+        self.update_fan_mode_ui(fan_num, mode)
+
+        # If switching to curve mode, read current curve values
+        if mode == "curve":
+            self.read_fan_curves(fan_num)
     
     def update_fan_mode_ui(self, fan_num, mode):
         """Show/hide controls based on fan mode"""
@@ -312,231 +546,216 @@ class FanControlGUI:
         
         # Hide everything first
         controls['level_frame'].pack_forget()
-        controls['curve_frame'].pack_forget()
+        if controls['curve_frame'] is not None:
+            controls['curve_frame'].pack_forget()
         
         # Show relevant controls based on mode
         if mode == "fixed":
             controls['level_frame'].pack(pady=5)
         elif mode == "curve":
-            controls['curve_frame'].pack(fill=tk.BOTH, expand=True, pady=5)
+            curve_frame = controls['curve_frame'] or self.create_curve_controls(fan_num)
+            curve_frame.pack(fill=tk.BOTH, expand=True, pady=5)
     
     def on_level_change(self, fan_num):
         """Handle fan level change"""
         level = self.fan_controls[fan_num]['level_var'].get()
-        path = f"{self.base_path}/fan{fan_num}/level"
-        self.write_sysfs(path, level)
+        self.writer.submit(f"fan{fan_num}_level", level)
 
     def schedule_curve_write(self, fan_num, curve_type, values):
-        key = (fan_num, curve_type)
-
-        # Increment generation
-        gen = self.curve_write_gen.get(key, 0) + 1
-        self.curve_write_gen[key] = gen
-
-        # Cancel old timer if it exists
-        old_timer = self.curve_write_timers.get(key)
-        if old_timer:
-            old_timer.cancel()
-
-        def do_write(expected_gen):
-            # Discard if superseded
-            if self.curve_write_gen.get(key) != expected_gen:
-                return
-
-            curve_str = ",".join(map(str, values))
-            path = f"{self.base_path}/fan{fan_num}/{curve_type}_curve"
-
-            self.write_sysfs(path, curve_str)
-
-        timer = threading.Timer(
-            self.curve_write_delay,
-            lambda: do_write(gen)
-        )
-
-        self.curve_write_timers[key] = timer
-        timer.start()
+        """Write a curve once the slider has rested for curve_write_delay"""
+        self.writer.submit(f"fan{fan_num}_{curve_type}_curve", values,
+                           delay=self.curve_write_delay)
 
     def on_curve_change(self, fan_num, curve_type, index, value):
-        """Handle curve slider change with cascading constraints"""
+        """
+        A curve slider moved. The sliders it pushes are set() without
+        unbinding their command: their echo carries the value the model
+        already has and changes nothing.
+        """
+        changes = self.fan_controls[fan_num]['curve'].move(curve_type, index, value)
+        # the dragged slider is already there
+        self.show_curve_changes(fan_num, changes[1:], sliders=True)
+        self.show_curve_changes(fan_num, changes[:1], sliders=False)
+        editor = self.fan_controls[fan_num]['curve_editor']
+        if editor is not None:
+            editor.show(changes)
+        self.write_curve_changes(fan_num, changes)
+
+    def on_curve_edit(self, fan_num, changes):
+        """A point was dragged on the curve editor"""
+        self.show_curve_changes(fan_num, changes)
+        self.write_curve_changes(fan_num, changes)
+
+    def show_curve_changes(self, fan_num, changes, sliders=True):
+        """Move the sliders and labels of the changed points only"""
         controls = self.fan_controls[fan_num]
-        sliders = controls[f'{curve_type}_sliders']
-        labels = controls[f'{curve_type}_labels']
-        values = controls[f'{curve_type}_values']
-        other_curve = 'rampdown' if curve_type == 'rampup' else 'rampup'
-        other_sliders = controls[f'{other_curve}_sliders']
-        other_labels = controls[f'{other_curve}_labels']
-        other_values = controls[f'{other_curve}_values']
-        new_value = int(float(value))
-        other_modified = False
-        
-        # Apply cascading constraints
-        # If we're moving a slider, ensure all subsequent sliders are >= this value
-        if new_value != values[index]:
-            values[index] = new_value
-            
-            # Enforce minimum constraint: each level must be >= previous level
-            for i in range(index + 1, 5):
-                if values[i] < values[index]:
-                    values[i] = values[index]
-                    # Temporarily block the callback to avoid recursion
-                    sliders[i].config(command='')
-                    sliders[i].set(values[i])
-                    sliders[i].config(command=lambda v, fn=fan_num, idx=i, curve=curve_type: 
-                                     self.on_curve_change(fn, curve, idx, v))
-            
-            # Also check backwards: if previous levels are > current, adjust them
-            for i in range(index - 1, -1, -1):
-                if values[i] > values[index]:
-                    values[i] = values[index]
-                    # Temporarily block the callback to avoid recursion
-                    sliders[i].config(command='')
-                    sliders[i].set(values[i])
-                    sliders[i].config(command=lambda v, fn=fan_num, idx=i, curve=curve_type: 
-                                     self.on_curve_change(fn, curve, idx, v))
-
-            # Enforce rampup/rampdown constraint: rampdown <= rampup for each level            
-            if curve_type == 'rampup':
-                for i in range(5):
-                    if other_values[i] > values[i]:
-                        other_values[i] = values[i]
-                        other_sliders[i].config(command='')
-                        other_sliders[i].set(other_values[i])
-                        other_sliders[i].config(command=lambda v, fn=fan_num, idx=i, curve=other_curve: 
-                                               self.on_curve_change(fn, curve, idx, v))
-                        other_modified = True
-            else:  # curve_type == 'rampdown'
-                for i in range(5):
-                    if other_values[i] < values[i]:
-                        other_values[i] = values[i]
-                        other_sliders[i].config(command='')
-                        other_sliders[i].set(other_values[i])
-                        other_sliders[i].config(command=lambda v, fn=fan_num, idx=i, curve=other_curve: 
-                                               self.on_curve_change(fn, curve, idx, v))
-                        other_modified = True
-
-            # If other was modified, enforce cascading constraint on it
-            if other_modified:
-                for i in range(4):
-                    if other_values[i+1] < other_values[i]:
-                        other_values[i+1] = other_values[i]
-                        other_sliders[i+1].config(command='')
-                        other_sliders[i+1].set(other_values[i+1])
-                        other_sliders[i+1].config(command=lambda v, fn=fan_num, idx=i+1, curve=other_curve: 
-                                                self.on_curve_change(fn, curve, idx, v))
-        
-        # Update all labels
-        for i, val in enumerate(values):
-            labels[i].config(text=f"{val}°C")
-        for i, val in enumerate(other_values):
-            other_labels[i].config(text=f"{val}°C")
-        
-        # Schedule Write all values to sysfs
-        self.schedule_curve_write(fan_num, curve_type, values)
-        controls[f'{curve_type}_values'] = values
-        
-        # Also write the other curve if we modified it
-        if other_modified:
-            self.schedule_curve_write(fan_num, other_curve, other_values)
-            controls[f'{other_curve}_values'] = other_values
-    
+        for change in changes:
+            curve_sliders = controls[f'{change.curve}_sliders']
+            if not curve_sliders:
+                return
+            if sliders:
+                curve_sliders[change.index].set(change.value)
+            self.widgets.set_text(
+                controls[f'{change.curve}_labels'][change.index],
+                f"{change.value}°C")
+
+    def write_curve_changes(self, fan_num, changes):
+        model = self.fan_controls[fan_num]['curve']
+        for curve_type in {change.curve for change in changes}:
+            values = model.curve(curve_type)
+            if values is not None:
+                self.schedule_curve_write(fan_num, curve_type, values)
+
     def read_curve(self, fan_num, curve_type):
         """Read a fan curve (rampup_curve or rampdown_curve)"""
-        path = f"{self.base_path}/fan{fan_num}/{curve_type}_curve"
-        data = self.read_sysfs(path)
-        if data:
-            try:
-                values = [int(x) for x in data.replace(',', ' ').split()]
-                self.fan_controls[fan_num][f'{curve_type}_values'] = values
-                return values
-            except:
-                return None
-        return None
+        values = self.device.read_curve(fan_num, curve_type)
+        self.writer.note(f"fan{fan_num}_{curve_type}_curve", values)
+        return list(values) if values else values
     
     def read_fan_curves(self, fan_num):
         """Read and update curve sliders for a fan"""
         rampup = self.read_curve(fan_num, "rampup")
         rampdown = self.read_curve(fan_num, "rampdown")
         
+        self.show_curve(fan_num, "rampup", rampup)
+        self.show_curve(fan_num, "rampdown", rampdown)
+
+    def show_curve(self, fan_num, curve_type, values):
+        """Take a curve read from the device, moves only what differs"""
+        if not values or len(values) != 5:
+            return
         controls = self.fan_controls[fan_num]
-        
-        if rampup and len(rampup) == 5:
-            for i, value in enumerate(rampup):
-                controls['rampup_sliders'][i].set(value)
-                controls['rampup_labels'][i].config(text=f"{value}°C")
-        
-        if rampdown and len(rampdown) == 5:
-            for i, value in enumerate(rampdown):
-                controls['rampdown_sliders'][i].set(value)
-                controls['rampdown_labels'][i].config(text=f"{value}°C")
+        changes = controls['curve'].load(curve_type, values)
+        self.show_curve_changes(fan_num, changes)
+        if controls['curve_editor'] is not None:
+            controls['curve_editor'].show(changes)
     
-    def read_fan_mode(self, fan_num):
-        """Read current fan mode"""
-        path = f"{self.base_path}/fan{fan_num}/mode"
-        mode = self.read_sysfs(path)
-        if mode:
-            # Extract current mode from [auto, fixed, curve] format
-            if '[' in mode:
-                for m in ['auto', 'fixed', 'curve']:
-                    if f'[{m}]' in mode:
-                        mode = m
-                        break
-            self.root.after(0, lambda: self.fan_controls[fan_num]['mode_var'].set(mode))
-            self.root.after(0, lambda: self.update_fan_mode_ui(fan_num, mode))
-            # If mode is curve, read the current curve values
-            if mode == 'curve':
-                self.root.after(0, lambda: self.read_fan_curves(fan_num))
-    
-    def read_all_modes(self):
-        """Read all fan modes and APU mode"""
-        for fan_num in [1, 2, 3]:
-            self.read_fan_mode(fan_num)
-        self.read_apu_mode()
-    
-    def read_apu_mode(self):
-        """Read current APU power mode"""
-        path = f"{self.base_path}/apu/power_mode"
-        mode = self.read_sysfs(path)
-        if mode:
-            # Extract current mode from [quiet, balanced, performance] format
-            if '[' in mode:
-                for m in ['quiet', 'balanced', 'performance']:
-                    if f'[{m}]' in mode:
-                        mode = m
-                        break
-            self.root.after(0, lambda: self.apu_mode_var.set(mode))
+    def show_fan_mode(self, fan_num, mode):
+        """Reflect a fan mode read from the device, runs on the Tk thread"""
+        self.fan_controls[fan_num]['mode_var'].set(mode)
+        self.update_fan_mode_ui(fan_num, mode)
+        # If mode is curve, read the current curve values
+        if mode == 'curve':
+            self.read_fan_curves(fan_num)
     
+    def note_state(self, snapshot):
+        """Tell the writer what the device holds now"""
+        for name, value in current_state(snapshot).items():
+            self.writer.note(name, value)
+
+    def show_state(self, snapshot):
+        """Show modes, levels and curves of a snapshot, runs on the Tk thread"""
+        if snapshot.power_mode:
+            self.apu_mode_var.set(snapshot.power_mode)
+        for fan_num, fan in zip(FANS, snapshot.fans):
+            controls = self.fan_controls[fan_num]
+            if fan.level is not None:
+                controls['level_var'].set(str(fan.level))
+            self.show_curve(fan_num, "rampup", fan.rampup)
+            self.show_curve(fan_num, "rampdown", fan.rampdown)
+            if fan.mode:
+                controls['mode_var'].set(fan.mode)
+                self.update_fan_mode_ui(fan_num, fan.mode)
+
+    def load_state(self):
+        """
+        Read everything the window shows in one batch, runs on the
+        monitor thread before its first tick
+        """
+        if isinstance(self.sampler, DeadlineSampler):
+            snapshot = self.sampler.sample(ATTRIBUTES, deadline=1.0)
+        elif isinstance(self.sampler, StateSampler):
+            snapshot = self.sampler.sample()
+            if self.sampler.age is None:
+                # the module was just loaded, its worker hasn't run yet
+                snapshot = self.device.snapshot()
+        else:
+            snapshot = self.device.snapshot()
+        self.note_state(snapshot)
+        self.root.after(0, lambda: self.show_state(snapshot))
+        return snapshot
+
     def monitor_loop(self):
         """Background thread to monitor temperature and RPM"""
+        loaded = False
         while self.running:
+            t0 = time.perf_counter()
             try:
-                # Read temperature
-                temp_path = f"{self.base_path}/temp1/temp"
-                temp = self.read_sysfs(temp_path)
-                if temp:
-                    self.root.after(0, lambda t=temp: self.temp_label.config(text=f"{t}°C"))
-                
-                # Read fan RPMs
-                for fan_num in [1, 2, 3]:
-                    rpm_path = f"{self.base_path}/fan{fan_num}/rpm"
-                    rpm = self.read_sysfs(rpm_path)
-                    if rpm:
-                        if fan_num == 1:
-                            self.root.after(0, lambda r=rpm: self.fan1_rpm_label.config(text=r))
-                        elif fan_num == 2:
-                            self.root.after(0, lambda r=rpm: self.fan2_rpm_label.config(text=r))
-                        elif fan_num == 3:
-                            self.root.after(0, lambda r=rpm: self.fan3_rpm_label.config(text=r))
-                        
-                        # Update fan control block RPM
-                        self.root.after(0, lambda fn=fan_num, r=rpm: 
-                                      self.fan_controls[fn]['rpm_label'].config(text=r))
-                
+                if loaded:
+                    snapshot = self.sampler.sample()
+                else:
+                    snapshot = self.load_state()
+                    # what missed its deadline is read again next tick
+                    loaded = not snapshot.stale
+                self.history.add(snapshot)
+                self.ui_batcher.post(snapshot)
+                self.update_governor(snapshot)
+                interval = self.update_interval
+                if self.adaptive:
+                    interval = self.scheduler.next_interval(snapshot)
             except Exception as e:
                 print(f"Monitor error: {e}")
+                self.instruments.error("monitor", e)
+                interval = self.update_interval
+            self.instruments.observe("monitor tick", time.perf_counter() - t0)
             
-            time.sleep(self.update_interval)
-
-    def save_config(self):
+            # woken early when the interval setting changes
+            self.monitor_wake.wait(interval)
+            self.monitor_wake.clear()
+        self.sampler.close()
+        if self.governor is not None:
+            self.governor.close()
+
+    def apply_snapshot(self, snapshot):
+        """Show a monitor snapshot, runs on the Tk thread"""
+        stale = snapshot.stale
+        if snapshot.temp is not None:
+            mark = STALE_MARK if "temp" in stale else ""
+            self.widgets.set_text(self.temp_label,
+                                  f"{snapshot.temp}°C{mark}")
+        for fan_num, rpm in enumerate(snapshot.rpms, 1):
+            if rpm is not None:
+                mark = STALE_MARK if f"fan{fan_num}_rpm" in stale else ""
+                rpm = f"{rpm}{mark}"
+                self.widgets.set_text(self.top_rpm_labels[fan_num], rpm)
+                self.widgets.set_text(
+                    self.fan_controls[fan_num]['rpm_label'], rpm)
+        self.chart.redraw()
+        if self.on_ready:
+            on_ready, self.on_ready = self.on_ready, None
+            on_ready()
+
+    def open_debug_panel(self, keep_enabled=False):
+        """Show the instrumentation window, or raise it if it is open"""
+        if self.debug_panel is not None and self.debug_panel.winfo_exists():
+            self.debug_panel.lift()
+            return
+        from axb35.debug_panel import DebugPanel
+
+        def counters():
+            w, ui = self.writer.stats, self.ui_stats
+            values = {"writes": w.writes, "coalesced": w.coalesced,
+                      "write errors": w.errors, "Tk callbacks": ui.callbacks,
+                      "reconfigs": ui.reconfigs, "dropped ticks": ui.dropped}
+            if isinstance(self.sampler, DeadlineSampler):
+                values["partial ticks"] = self.sampler.partial
+                values["late reads"] = self.sampler.missed
+            if isinstance(self.sampler, StateSampler):
+                age = self.sampler.age
+                values["state age ms"] = "-" if age is None else int(age * 1e3)
+                values["state errors"] = self.sampler.error_count
+            return values
+
+        self.debug_panel = DebugPanel(self.root, self.instruments, counters,
+                                      keep_enabled)
+
+    def report_ui_stats(self):
+        """Print Tk callback/reconfigure rates every 5 seconds"""
+        print(self.ui_stats.format())
+        self.root.after(5000, self.report_ui_stats)
+
+    def current_config(self):
+        """Settings shown in the window, in the config file format"""
         data = {
             "apu_mode": self.apu_mode_var.get(),
             "fans": {}
@@ -546,78 +765,133 @@ class FanControlGUI:
             data["fans"][str(fan_num)] = {
                 "mode": c["mode_var"].get(),
                 "level": c["level_var"].get(),
-                "rampup_curve": c["rampup_values"][:],
-                "rampdown_curve": c["rampdown_values"][:],
+                "rampup_curve": c["curve"].values["rampup"][:],
+                "rampdown_curve": c["curve"].values["rampdown"][:],
             }
+        return data
 
+    def save_config(self):
         try:
-            with open(self.config_path, "w") as f:
-                json.dump(data, f, indent=2)
+            save_config(self.current_config(), self.config_path)
             messagebox.showinfo("Saved", "Configuration saved successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save config:\n{e}")
 
     def load_config(self):
         try:
-            with open(self.config_path) as f:
-                data = json.load(f)
+            data = load_config(self.config_path)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load config:\n{e}")
             return
+        self.apply_profile("Configuration", data)
+
+    def refresh_profiles(self):
+        """Re-read the profile names when the combobox opens"""
+        try:
+            names = sorted(load_profiles(self.profiles_path))
+        except (OSError, ValueError) as e:
+            print(f"Failed to load profiles: {e}")
+            names = []
+        self.profile_combo['values'] = names
+
+    def on_apply_profile(self):
+        name = self.profile_var.get()
+        if not name:
+            return
+        try:
+            profile = load_profiles(self.profiles_path).get(name)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load profiles:\n{e}")
+            return
+        if profile is None:
+            messagebox.showerror("Error", f"Profile {name} not found")
+            return
+        self.apply_profile(f"Profile {name}", profile)
 
-        # APU mode
-        apu = data.get("apu_mode")
-        if apu:
-            self.apu_mode_var.set(apu)
-            self.write_sysfs(f"{self.base_path}/apu/power_mode", apu)
+    def on_save_profile(self):
+        name = simpledialog.askstring("Save as Profile", "Profile name:",
+                                      initialvalue=self.profile_var.get(),
+                                      parent=self.root)
+        if not name:
+            return
+        data = self.current_config()
+        try:
+            profiles = load_profiles(self.profiles_path)
+            check_name(name)
+            desired_state(data)
+            profiles[name] = data
+            save_profiles(profiles, self.profiles_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to save profile:\n{e}")
+            return
+        self.profile_var.set(name)
 
-        for fan_num_str, cfg in data.get("fans", {}).items():
-            fan_num = int(fan_num_str)
-            controls = self.fan_controls.get(fan_num)
-            if not controls:
-                continue
+    def apply_profile(self, label, profile):
+        """
+        Write only what differs from the device, in one batch on a
+        worker thread, and report the outcome in a single dialog
+        """
+        try:
+            desired_state(profile)
+        except ValueError as e:
+            messagebox.showerror("Error", f"{label} is invalid:\n{e}")
+            return
+        threading.Thread(target=self._apply_profile, args=(label, profile),
+                         daemon=True).start()
+
+    def _apply_profile(self, label, profile):
+        # slider writes still pending go out first, the diff is taken
+        # against the state they leave behind
+        self.writer.flush()
+        result = apply_profile(self.device, profile)
+        snapshot = self.device.snapshot(SETTINGS)
+        self.note_state(snapshot)
+        self.root.after(0, lambda: self.show_profile_result(label, result,
+                                                            snapshot))
+
+    def show_profile_result(self, label, result, snapshot):
+        self.show_state(snapshot)
+        if result.error:
+            name, error = result.error
+            restored = ("Previous settings restored." if result.rolled_back
+                        else "Could not restore the previous settings.")
+            messagebox.showerror(
+                "Error", f"{label} not applied, writing "
+                f"{self.device.path(name)} failed: {error}\n{restored}")
+            return
+        text = (f"{label} loaded, {len(result.done)} changes in "
+                f"{result.elapsed * 1e3:.0f} ms.")
+        if result.over_budget:
+            text += "\nThat took longer than expected."
+        messagebox.showinfo("Loaded", text)
 
-            mode = cfg.get("mode")
-            if mode:
-                controls["mode_var"].set(mode)
-                self.write_sysfs(f"{self.base_path}/fan{fan_num}/mode", mode)
-                self.update_fan_mode_ui(fan_num, mode)
-
-            level = cfg.get("level")
-            if level and mode == "fixed":
-                controls["level_var"].set(level)
-                self.write_sysfs(f"{self.base_path}/fan{fan_num}/level", level)
-
-            # Curves
-            if mode == "curve":
-                ru = cfg.get("rampup_curve")
-                rd = cfg.get("rampdown_curve")
-
-                if ru and len(ru) == 5:
-                    controls["rampup_values"][:] = ru
-                    for i, s in enumerate(controls["rampup_sliders"]):
-                        s.set(ru[i])
-                    self.schedule_curve_write(fan_num, "rampup", ru)
-
-                if rd and len(rd) == 5:
-                    controls["rampdown_values"][:] = rd
-                    for i, s in enumerate(controls["rampdown_sliders"]):
-                        s.set(rd[i])
-                    self.schedule_curve_write(fan_num, "rampdown", rd)
-        messagebox.showinfo("Loaded", "Configuration loaded successfully.")
-    
     def on_closing(self):
         """Handle window close"""
         self.running = False
-        if self.mode_check_timer:
-            self.mode_check_timer.cancel()
+        self.monitor_wake.set()
+        # pending curve writes still go out, verification is dropped
+        self.writer.close(flush=True)
         self.root.destroy()
 
-def main():
+def main(args):
+    on_ready = on_paint = None
+    if args.print_ready:
+        on_ready = lambda: print("ready", flush=True)
+        on_paint = lambda: print("painted", flush=True)
+
     root = tk.Tk()
-    app = FanControlGUI(root)
+    try:
+        app = FanControlGUI(root, args.base_path, args.config, args.ui_stats,
+                            on_ready, args.profiles, on_paint, args.broker,
+                            args.replay, args.speed, args.debug)
+    except (OSError, ValueError) as e:
+        if args.replay is not None:
+            messagebox.showerror("Error", f"Can't replay {args.replay}:\n{e}")
+        else:
+            messagebox.showerror("Error", f"Can't reach the broker:\n{e}")
+        return
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(ARGS)
\ No newline at end of file
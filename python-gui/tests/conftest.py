@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from axb35.broker import Broker
+from axb35.device import Device
+from axb35.sim import SimIO, SimulatedEC
+
+
+class Clock:
+    """Virtual time for SimulatedEC and the components under test"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def ec(clock):
+    return SimulatedEC(clock=clock, sleep=lambda seconds: None)
+
+
+@pytest.fixture
+def device(ec):
+    with Device(io=SimIO(ec)) as device:
+        yield device
+
+
+class BrokerThread:
+    """Broker on `device`, on its own event loop thread"""
+
+    def __init__(self, device, path, interval=0.05):
+        self.path = path
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.broker = self.call(Broker(device, interval).start(path))
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(5)
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.call(self.broker.stop())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+
+@pytest.fixture
+def broker(device, tmp_path):
+    """A running broker on the simulated device"""
+    broker = BrokerThread(device, str(tmp_path / "axb35.sock"))
+    yield broker
+    broker.stop()
@@ -0,0 +1,153 @@
+import json
+
+import pytest
+
+from axb35.alerts import (AlertEngine, Changed, Rising, Stalled, Threshold,
+                          load_rules, make_rule)
+
+
+def states(alerts):
+    return [(a.rule.name, a.state) for a in alerts]
+
+
+def test_threshold_fires_after_its_duration_and_resolves():
+    engine = AlertEngine([Threshold("hot", "temp", 85, duration=10)])
+    assert engine.feed({"temp": 80}, now=0) == []
+    assert engine.feed({"temp": 90}, now=1) == []
+    assert engine.feed({"temp": 91}, now=5) == []
+    alerts = engine.feed({"temp": 91}, now=11)
+    assert states(alerts) == [("hot", "firing")]
+    assert alerts[0].value == 91
+    assert alerts[0].message == "temp 91 > 85 for 10s"
+    assert engine.active() == ["hot"]
+    # still hot, no second alert
+    assert engine.feed({"temp": 92}, now=12) == []
+    assert states(engine.feed({"temp": 70}, now=13)) == [("hot", "resolved")]
+    assert engine.active() == []
+
+
+def test_short_excursion_does_not_fire():
+    engine = AlertEngine([Threshold("hot", "temp", 85, duration=10)])
+    engine.feed({"temp": 90}, now=0)
+    engine.feed({"temp": 80}, now=5)
+    # the deadline of the first excursion has passed, but it ended
+    assert engine.feed({"temp": 80}, now=11) == []
+    assert engine.fired == 0
+
+
+def test_cooldown():
+    engine = AlertEngine([Threshold("cold", "temp", 40, above=False,
+                                    cooldown=60)])
+    assert states(engine.feed({"temp": 39}, now=0)) == [("cold", "firing")]
+    engine.feed({"temp": 41}, now=1)
+    assert engine.feed({"temp": 39}, now=30) == []
+    engine.feed({"temp": 41}, now=31)
+    assert states(engine.feed({"temp": 39}, now=61)) == [("cold", "firing")]
+
+
+def test_only_rules_between_old_and_new_value_are_checked():
+    rules = [Threshold(f"above {limit}", "temp", limit)
+             for limit in range(50, 100, 5)]
+    engine = AlertEngine(rules)
+    engine.feed({"temp": 70}, now=0)
+    checks = engine.checks
+    alerts = engine.feed({"temp": 71}, now=1)
+    assert states(alerts) == [("above 70", "firing")]
+    assert engine.checks - checks == 1
+    # unchanged values check nothing
+    engine.feed({"temp": 71}, now=2)
+    assert engine.checks - checks == 1
+
+
+def test_changed_from_to():
+    engine = AlertEngine([Changed("back to curve", "fan1_mode",
+                                  "fixed", "curve")])
+    engine.feed({"fan1_mode": "curve"}, now=0)
+    assert engine.feed({"fan1_mode": "auto"}, now=1) == []
+    engine.feed({"fan1_mode": "fixed"}, now=2)
+    # a failed read in between is not a change
+    engine.feed({"fan1_mode": None}, now=3)
+    alerts = engine.feed({"fan1_mode": "curve"}, now=4)
+    assert states(alerts) == [("back to curve", "firing")]
+    assert not engine.active()
+
+
+def test_rising_within_window():
+    engine = AlertEngine([Rising("new high", "temp_max", by=5, within=10)])
+    engine.feed({"temp_max": 70}, now=0)
+    engine.feed({"temp_max": 72}, now=5)
+    # 70 has left the window, 72 + 5 is not reached
+    assert engine.feed({"temp_max": 76}, now=12) == []
+    assert states(engine.feed({"temp_max": 77}, now=13)) == [
+        ("new high", "firing")]
+    # counted from 77 now
+    assert engine.feed({"temp_max": 80}, now=14) == []
+
+
+def test_stalled_fan():
+    engine = AlertEngine([Stalled("stuck", 1)])
+    assert engine.feed({"fan1_rpm": 0, "fan1_level": 0}, now=0) == []
+    alerts = engine.feed({"fan1_rpm": 0, "fan1_level": 3}, now=1)
+    assert states(alerts) == [("stuck", "firing")]
+    assert alerts[0].message == "fan1 at 0 rpm on level 3"
+    assert states(engine.feed({"fan1_rpm": 2600, "fan1_level": 3},
+                              now=2)) == [("stuck", "resolved")]
+
+
+def test_actions_and_on_alert(tmp_path, device):
+    log = tmp_path / "alerts.log"
+    seen = []
+    rule = make_rule({"name": "hot", "attr": "temp", "above": 85,
+                      "actions": [{"log": str(log)},
+                                  {"fan_level": 5, "fans": [1, 2]}]},
+                     device)
+    engine = AlertEngine([rule], on_alert=seen.append)
+    engine.feed({"temp": 90}, now=0)
+    assert states(seen) == [("hot", "firing")]
+    assert log.read_text().rstrip().endswith("firing hot: temp 90 > 85")
+    for fan in (1, 2):
+        assert device.read_fan_mode(fan) == "fixed"
+        assert device.read_fan_level(fan) == 5
+    assert device.read_fan_mode(3) == "auto"
+
+
+def test_failing_action_does_not_stop_the_others(tmp_path, capsys):
+    seen = []
+    rule = make_rule({"name": "hot", "attr": "temp", "above": 85,
+                      "actions": [{"log": str(tmp_path / "no" / "log")}]})
+    AlertEngine([rule], on_alert=seen.append).feed({"temp": 90}, now=0)
+    assert len(seen) == 1
+    assert "alert hot: action failed" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("spec", [
+    {"attr": "temp", "above": 85},
+    {"name": "x", "attr": "nope", "above": 85},
+    {"name": "x", "attr": "fan1_mode", "above": 1},
+    {"name": "x", "attr": "temp", "above": "85"},
+    {"name": "x", "stalled": 4},
+    {"name": "x", "attr": "temp"},
+    {"name": "x", "attr": "temp", "above": 85, "actions": ["page"]},
+    {"name": "x", "attr": "temp", "above": 85,
+     "actions": [{"fan_level": 6}]},
+])
+def test_invalid_rules(spec, device):
+    with pytest.raises(ValueError):
+        make_rule(spec, device)
+
+
+def test_load_rules(tmp_path):
+    path = tmp_path / "alerts.json"
+    path.write_text(json.dumps({"rules": [
+        {"name": "hot", "attr": "temp", "above": 85, "for": 10},
+        {"name": "dup", "stalled": 1},
+        {"name": "dup", "stalled": 2},
+    ]}))
+    rules = load_rules(str(path))
+    assert [type(r) for r in rules] == [Threshold, Stalled, Stalled]
+    assert rules[0].duration == 10
+    with pytest.raises(ValueError):
+        AlertEngine(rules)
+    path.write_text("[]")
+    with pytest.raises(ValueError):
+        load_rules(str(path))
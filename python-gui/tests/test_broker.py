@@ -0,0 +1,69 @@
+import errno
+import time
+
+import pytest
+
+from axb35.broker import RemoteDevice
+from axb35.sysfs import ATTRIBUTES
+
+from conftest import BrokerThread
+
+
+def wait_until(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def remote(broker):
+    device = RemoteDevice(broker.path, timeout=2.0)
+    yield device
+    device.close()
+
+
+def test_remote_reads_and_writes(remote, ec):
+    snapshot = remote.snapshot()
+    assert snapshot.power_mode == "balanced"
+    assert not snapshot.stale
+    remote.set_power_mode("quiet")
+    assert ec.regs[0x31] == 0x02
+    # the broker samples right after a write
+    assert wait_until(lambda: remote.read_power_mode() == "quiet")
+
+
+def test_bad_requests_are_refused(remote):
+    with pytest.raises(OSError) as e:
+        remote.write("fan9_level", 1)
+    assert e.value.errno == errno.EINVAL
+    with pytest.raises(OSError) as e:
+        remote.write("fan1_level", 9999)
+    assert e.value.errno == errno.EINVAL
+
+
+def test_reconnects_after_the_broker_restarts(broker, remote, device):
+    assert remote.snapshot().temp is not None
+    broker.stop()
+    assert wait_until(lambda: not remote.connected, 2.0)
+    snapshot = remote.snapshot()
+    # the last values, all marked stale
+    assert snapshot.temp is not None
+    assert snapshot.stale == frozenset(ATTRIBUTES)
+    t0 = time.monotonic()
+    with pytest.raises(OSError) as e:
+        remote.set_power_mode("quiet")
+    assert e.value.errno == errno.ENOTCONN
+    assert time.monotonic() - t0 < 0.5
+
+    again = BrokerThread(device, broker.path)
+    try:
+        assert wait_until(lambda: remote.connected)
+        assert remote.reconnects == 1
+        assert wait_until(lambda: not remote.snapshot().stale)
+        remote.set_power_mode("quiet")
+        assert device.read_power_mode() == "quiet"
+    finally:
+        again.stop()
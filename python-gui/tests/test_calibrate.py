@@ -0,0 +1,64 @@
+import math
+
+import pytest
+
+from axb35.calibrate import Calibrator, Settled, SteadyState, t90, tables
+from axb35.device import Device
+from axb35.sim import LEVEL_RPMS, SPINDOWN_TAU, SPINUP_TAU, SimIO, SimulatedEC
+from axb35.sysfs import FANS
+
+
+def calibrate(clock, **kw):
+    """Sweep a simulated EC in virtual time, returns the tables"""
+    ec = SimulatedEC(clock=clock, sleep=lambda s: None, **kw)
+    with Device(io=SimIO(ec)) as device:
+        modes = [device.read_fan_mode(fan) for fan in FANS]
+        calibrator = Calibrator(device, clock=clock,
+                                sleep=lambda s: setattr(clock, "now",
+                                                        clock.now + s))
+        steps = calibrator.run()
+        # modes are put back
+        assert [device.read_fan_mode(fan) for fan in FANS] == modes
+    assert not any(step.timed_out for step in steps)
+    return tables(steps), calibrator
+
+
+def test_sweep_finds_the_level_rpms_and_spin_times(clock):
+    result, calibrator = calibrate(clock)
+    # settled as soon as the fit knows the end, long before 6 x 20 s
+    assert calibrator.duration < 30
+    tolerance = SteadyState().tolerance_at
+    for fan in FANS:
+        for level in range(1, 6):
+            row = result[fan][level]
+            rpm = LEVEL_RPMS[fan][level]
+            # within the detector's tolerance
+            assert row["rpm"] == pytest.approx(rpm, abs=tolerance(rpm))
+            assert row["spin_up"] == pytest.approx(SPINUP_TAU * math.log(10),
+                                                   rel=0.1)
+        assert result[fan][0]["spin_down"] == pytest.approx(
+            SPINDOWN_TAU * math.log(10), rel=0.1)
+
+
+def test_noisy_tach(clock):
+    result, _ = calibrate(clock, rpm_noise=0.01, seed=1)
+    for fan in FANS:
+        for level in range(1, 6):
+            assert result[fan][level]["rpm"] == pytest.approx(
+                LEVEL_RPMS[fan][level], rel=0.03)
+            assert result[fan][level]["std"] > 0
+
+
+def test_t90():
+    trace = [(t / 10, 1000 * (1 - math.exp(-t / 10))) for t in range(40)]
+    settled = Settled(1000, 0.0, 1.0, 4.0, False)
+    # reached in the samples
+    assert t90(trace, 0, settled) == 2.4
+    # not reached, from tau
+    assert t90(trace[:10], 0, settled) == pytest.approx(math.log(10))
+    assert t90(trace, 1000, settled) == 0.0
+
+
+def test_invalid_fan(device):
+    with pytest.raises(ValueError):
+        Calibrator(device, fans=(1, 4))
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from axb35 import cli
+from axb35.sim import make_fake_tree
+
+
+def test_changes_are_refused_through_the_broker(broker, capsys):
+    argv = ["--broker", broker.path, "watch", "--changes", "--count", "1"]
+    assert cli.main(argv) == 2
+    assert "need sysfs, not the broker" in capsys.readouterr().err
+
+
+def test_state_is_refused_through_the_broker(broker, capsys):
+    for command in ("snapshot", "watch"):
+        assert cli.main(["--broker", broker.path, command, "--state"]) == 2
+        assert "--state needs" in capsys.readouterr().err
+
+
+def test_snapshot_json(tmp_path, capsys):
+    make_fake_tree(tmp_path, {"temp": "61", "power_mode": "quiet"})
+    assert cli.main(["--base-path", str(tmp_path), "snapshot", "--json"]) == 0
+    values = json.loads(capsys.readouterr().out)
+    assert values["temperature"]["current"] == 61
+    assert values["power_mode"] == "quiet"
+    assert values["fan1"]["mode"] == "curve"
+
+
+def test_watch_stops_after_count(tmp_path, capsys):
+    make_fake_tree(tmp_path)
+    argv = ["--base-path", str(tmp_path), "watch", "--json", "--count", "3",
+            "--interval", "0"]
+    assert cli.main(argv) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3
+    assert all(json.loads(line)["fan2"]["rpm"] == 1795 for line in lines)
+
+
+def test_missing_driver(tmp_path, capsys):
+    assert cli.main(["--base-path", str(tmp_path / "none"), "snapshot"]) == 2
+    assert "is ec_su_axb35 loaded?" in capsys.readouterr().err
+
+
+def test_bad_arguments_exit_with_usage(capsys):
+    with pytest.raises(SystemExit) as e:
+        cli.main(["watch", "--count", "many"])
+    assert e.value.code == 2
+    assert "invalid int value" in capsys.readouterr().err
+
+
+def test_help_lists_every_subcommand(capsys):
+    with pytest.raises(SystemExit):
+        cli.main(["--help"])
+    out = capsys.readouterr().out
+    for command in ("snapshot", "watch", "export", "control", "governor",
+                    "calibrate", "tune", "probe", "profile", "alert",
+                    "record", "replay", "broker", "agent", "fleet"):
+        assert command in out
@@ -0,0 +1,96 @@
+import pytest
+
+from axb35.controller import (CurvePolicy, FanController, PidPolicy,
+                              RateLimiter, parse_points)
+
+
+def test_parse_points():
+    assert parse_points("40:0,50:1.5") == ((40.0, 0.0), (50.0, 1.5))
+    with pytest.raises(ValueError):
+        parse_points("40:0,50")
+
+
+def test_curve_policy_interpolates_with_hysteresis():
+    policy = CurvePolicy(((40, 0), (50, 1), (70, 3)), hysteresis=3.0)
+    assert policy.level_at(30) == 0
+    assert policy.level_at(60) == 2
+    assert policy.level_at(80) == 3
+    assert policy.target(61, 1, 0.1) == 2
+    # down only once 3 °C below where level 2 was reached
+    assert policy.target(58, 2, 0.1) == 2
+    assert policy.target(56, 2, 0.1) == 1
+    with pytest.raises(ValueError):
+        CurvePolicy(((40, 2), (50, 1)))
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(up_interval=0.5, down_interval=5.0)
+    assert limiter.limit(0.0, 1, 4) == 4
+    assert limiter.limit(0.2, 4, 5) == 4
+    assert limiter.limit(0.5, 4, 5) == 5
+    # down one level at a time
+    assert limiter.limit(3.0, 5, 1) == 5
+    assert limiter.limit(5.5, 5, 1) == 4
+
+
+def run(device, ec, clock, fans, policy, temps, tick=0.1):
+    controller = FanController(device, policy, fans, tick=tick, clock=clock)
+    controller.start()
+    for temp in temps:
+        clock.now += tick
+        ec.temp = temp
+        controller.tick()
+    return controller
+
+
+def test_start_and_stop_restore_modes(device, ec, clock):
+    device.set_fan_mode(2, "fixed")
+    device.set_fan_level(2, 3)
+    controller = run(device, ec, clock, (1, 2), CurvePolicy, [45.0])
+    assert device.read_fan_mode(1) == "fixed"
+    controller.stop()
+    assert device.read_fan_mode(1) == "curve"
+    assert device.read_fan_mode(2) == "fixed"
+    assert device.read_fan_level(2) == 3
+
+
+def test_curve_follows_temperature(device, ec, clock):
+    controller = run(device, ec, clock, (1, 2), CurvePolicy, [80.0])
+    assert ec.level(1) == ec.level(2) == 3
+    assert controller.level_writes == 2
+    # no write while the level holds
+    for _ in range(10):
+        clock.now += 0.1
+        controller.tick()
+    assert controller.level_writes == 2
+    controller.stop()
+
+
+def test_each_fan_has_its_own_pid(device, ec, clock):
+    temps = [70.0 + i * 0.05 for i in range(200)]
+    one = run(device, ec, clock, (1,), PidPolicy, temps)
+    one.stop()
+    ec.temp = 50.0
+    two = run(device, ec, clock, (1, 2), PidPolicy, temps)
+    two.stop()
+    for fan in (1, 2):
+        assert two.policies[fan].integral == pytest.approx(
+            one.policies[1].integral)
+        assert two.policies[fan].derivative == pytest.approx(
+            one.policies[1].derivative)
+    assert two.policies[1] is not two.policies[2]
+
+
+def test_panic_and_external_mode_change(device, ec, clock):
+    controller = run(device, ec, clock, (1, 2), CurvePolicy, [60.0],
+                     tick=1.0)
+    ec.temp = 96.0
+    clock.now += 1.0
+    controller.tick()
+    assert ec.level(1) == ec.level(2) == 5
+    device.set_fan_mode(2, "auto")
+    clock.now += 5.0
+    controller.tick()
+    assert list(controller.levels) == [1]
+    controller.stop()
+    assert device.read_fan_mode(2) == "auto"
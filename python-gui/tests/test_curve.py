@@ -0,0 +1,65 @@
+from axb35.curve import Change, CurveModel
+
+RAMPUP = (60, 70, 83, 95, 97)
+RAMPDOWN = (40, 50, 80, 94, 96)
+
+
+def test_move_pushes_later_points_up():
+    model = CurveModel(RAMPUP, RAMPDOWN)
+    assert model.move("rampup", 1, 90) == [Change("rampup", 1, 90),
+                                           Change("rampup", 2, 90)]
+    assert model.curve("rampup") == [60, 90, 90, 95, 97]
+    assert model.curve("rampdown") == list(RAMPDOWN)
+
+
+def test_move_pushes_earlier_points_and_the_other_curve_down():
+    model = CurveModel(RAMPUP, RAMPDOWN)
+    changes = model.move("rampup", 2, 50)
+    assert changes == [Change("rampup", 2, 50), Change("rampup", 0, 50),
+                       Change("rampup", 1, 50), Change("rampdown", 2, 50)]
+    assert model.curve("rampup") == [50, 50, 50, 95, 97]
+    assert model.curve("rampdown") == [40, 50, 50, 94, 96]
+
+
+def test_rampdown_pushes_rampup_up():
+    model = CurveModel(RAMPUP, RAMPDOWN)
+    assert model.move("rampdown", 4, 99) == [Change("rampdown", 4, 99),
+                                             Change("rampup", 4, 99)]
+    up, down = model.curve("rampup"), model.curve("rampdown")
+    assert all(d <= u for d, u in zip(down, up))
+
+
+def test_values_are_rounded_and_clamped():
+    model = CurveModel(RAMPUP, RAMPDOWN)
+    model.move("rampup", 4, 120)
+    assert model.curve("rampup")[4] == 100
+    model.move("rampdown", 0, "12.6")
+    assert model.curve("rampdown")[0] == 30
+    model.move("rampdown", 1, 44.6)
+    assert model.curve("rampdown")[1] == 45
+
+
+def test_moving_to_the_same_place_changes_nothing():
+    model = CurveModel(RAMPUP, RAMPDOWN)
+    loaded = model.changes
+    assert model.move("rampup", 0, 60) == []
+    assert model.moves == 1
+    assert model.changes == loaded
+
+
+def test_load_returns_only_what_differs():
+    model = CurveModel()
+    assert model.curve("rampup") is None
+    assert len(model.load("rampup", RAMPUP)) == 5
+    assert model.load("rampup", (60, 70, 85, 95, 97)) == [
+        Change("rampup", 2, 85)]
+    # short or missing reads are ignored
+    assert model.load("rampup", (60, 70)) == []
+    assert model.load("rampup", None) == []
+    assert model.curve("rampup") == [60, 70, 85, 95, 97]
+
+
+def test_unknown_curve_constrains_nothing():
+    model = CurveModel(rampup=RAMPUP)
+    assert model.move("rampup", 0, 30) == [Change("rampup", 0, 30)]
+    assert model.curve("rampdown") is None
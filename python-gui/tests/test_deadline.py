@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from axb35.deadline import DeadlineSampler
+from axb35.device import Device
+from axb35.sim import SimIO
+
+
+class Hang:
+    """SimIO stall hook, reads of `names` block until release()"""
+
+    def __init__(self, *names):
+        self.names = set(names)
+        self.calls = {}
+        self._released = threading.Event()
+
+    def __call__(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if name in self.names:
+            self._released.wait(5)
+        return 0
+
+    def release(self):
+        self._released.set()
+
+
+@pytest.fixture
+def hang(ec):
+    hang = Hang("fan2_rpm")
+    with Device(io=SimIO(ec, stall=hang)) as device:
+        yield hang, device
+        hang.release()
+
+
+def test_reads_everything_in_time(device):
+    expected = device.snapshot()
+    with DeadlineSampler(device, ["temp", "fan1_rpm", "power_mode"],
+                         deadline=2.0) as sampler:
+        snapshot = sampler.sample()
+    assert snapshot.temp == expected.temp
+    assert snapshot.fans[0].rpm == expected.fans[0].rpm
+    assert snapshot.power_mode == "balanced"
+    assert not snapshot.stale
+    assert sampler.partial == 0
+
+
+def test_hung_read_is_stale_and_not_queued_twice(hang):
+    hang, device = hang
+    hang.names.clear()
+    expected = device.snapshot()
+    hang.names.add("fan2_rpm")
+    hang.calls.clear()
+    attributes = ["temp", "fan1_rpm", "fan2_rpm"]
+    with DeadlineSampler(device, attributes, deadline=0.05,
+                         workers=2) as sampler:
+        t0 = time.monotonic()
+        values = sampler.read_values()
+        assert time.monotonic() - t0 < 1.0
+        assert values["temp"] == expected.temp
+        assert values["fan2_rpm"] is None
+        # never read, no age
+        assert sampler.stale == {"fan2_rpm": None}
+
+        # the other worker keeps reading the rest
+        for _ in range(3):
+            values = sampler.read_values()
+            assert values["fan1_rpm"] == expected.fans[0].rpm
+            assert set(sampler.stale) == {"fan2_rpm"}
+        assert hang.calls["fan2_rpm"] == 1
+        assert sampler.partial == 4
+        assert sampler.missed == 4
+
+        hang.release()
+        values = sampler.read_values(deadline=2.0)
+        assert values["fan2_rpm"] == expected.fans[1].rpm
+        assert sampler.stale == {}
+
+
+def test_stale_value_keeps_its_age(hang):
+    hang, device = hang
+    hang.names.clear()
+    with DeadlineSampler(device, ["fan2_rpm"], deadline=2.0) as sampler:
+        rpm = sampler.read_values()["fan2_rpm"]
+        assert rpm > 0
+        hang.names.add("fan2_rpm")
+        snapshot = sampler.sample(deadline=0.05)
+    assert snapshot.fans[1].rpm == rpm
+    assert snapshot.stale == {"fan2_rpm"}
+    assert sampler.stale["fan2_rpm"] >= 0.05
+
+
+def test_per_attribute_deadline(hang):
+    hang, device = hang
+    with DeadlineSampler(device, ["temp", "fan2_rpm"], deadline=2.0,
+                         deadlines={"fan2_rpm": 0.05}) as sampler:
+        t0 = time.monotonic()
+        sampler.read_values()
+        assert time.monotonic() - t0 < 1.0
+    assert set(sampler.stale) == {"fan2_rpm"}
+
+
+def test_thread_count_is_fixed(hang):
+    hang, device = hang
+    with DeadlineSampler(device, ["temp", "fan2_rpm"], deadline=0.02,
+                         workers=2) as sampler:
+        sampler.read_values()
+        before = threading.active_count()
+        for _ in range(10):
+            sampler.read_values()
+        assert threading.active_count() == before
+        assert len(sampler._threads) == 2
@@ -0,0 +1,93 @@
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from axb35.exporter import CachedSampler, MetricsExporter, make_server
+from axb35.exporter import snapshot_lines
+from axb35.sysfs import FanState, Snapshot
+
+
+def test_snapshot_lines():
+    snapshot = Snapshot(1700000000.5, 61, None, 74,
+                        (FanState(1830, "curve", 1, (60, 70, 83, 95, 97),
+                                  (40, 50, 80, 94, 96)),
+                         FanState(None, "fixed", 3),
+                         FanState(0, None, None)),
+                        "quiet")
+    lines = snapshot_lines(snapshot)
+    assert "axb35_temperature_celsius 61" in lines
+    assert not any(line.startswith("axb35_temperature_min") for line in lines)
+    assert 'axb35_fan_rpm{fan="1"} 1830' in lines
+    assert not any(line.startswith('axb35_fan_rpm{fan="2"}')
+                   for line in lines)
+    assert 'axb35_fan_mode{fan="2",mode="fixed"} 1' in lines
+    assert 'axb35_fan_mode{fan="2",mode="curve"} 0' in lines
+    assert 'axb35_fan_level{fan="2"} 3' in lines
+    assert 'axb35_fan_curve_celsius{fan="1",curve="rampdown",level="3"} 80' \
+        in lines
+    assert 'axb35_power_mode{mode="quiet"} 1' in lines
+    assert "axb35_sample_timestamp_seconds 1700000000.5" in lines
+
+
+@pytest.fixture
+def server(device):
+    # one sample for the whole test
+    exporter = MetricsExporter(device, interval=60.0).start()
+    server = make_server(exporter, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    yield exporter, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    exporter.stop()
+
+
+def metrics(url):
+    with urllib.request.urlopen(url + "/metrics", timeout=5) as response:
+        assert response.headers["Content-Type"].startswith("text/plain")
+        return response.read().decode().splitlines()
+
+
+def test_scrapes_are_served_from_the_cache(server, ec):
+    exporter, url = server
+    reads = ec.ec_reads
+    for _ in range(5):
+        lines = metrics(url)
+    assert ec.ec_reads == reads
+    assert exporter.cache.samples == 1
+    assert "axb35_scrapes_total 5" in lines
+    assert "axb35_samples_total 1" in lines
+    assert f"axb35_ec_reads_total {exporter.ec_reads_per_sample}" in lines
+    assert 'axb35_power_mode{mode="balanced"} 1' in lines
+
+
+def test_other_paths_are_not_found(server):
+    _, url = server
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(url + "/", timeout=5)
+    assert e.value.code == 404
+
+
+class FailingSampler:
+    def __init__(self):
+        self.closed = False
+
+    def sample(self):
+        raise OSError(5, "Input/output error")
+
+    def close(self):
+        self.closed = True
+
+
+def test_sampler_errors_are_counted(capsys):
+    sampler = FailingSampler()
+    cache = CachedSampler(sampler)
+    cache.refresh()
+    assert cache.errors == 1
+    assert cache.get(timeout=0) is None
+    assert "Sampler error" in capsys.readouterr().out
+    cache.stop()
+    assert sampler.closed
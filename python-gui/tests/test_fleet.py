@@ -0,0 +1,139 @@
+import asyncio
+import errno
+import socket
+
+import pytest
+
+from axb35.broker import Broker
+from axb35.device import Device
+from axb35.fleet import Fleet, Node, format_table, parse_node, sort_rows
+from axb35.sim import SimIO, SimulatedEC
+from axb35.sysfs import FanState, Snapshot
+
+TOKEN = "s3cret"
+
+
+def test_parse_node():
+    assert parse_node("box1=10.0.0.5:9000") == ("box1", "10.0.0.5", 9000)
+    assert parse_node("10.0.0.5") == ("10.0.0.5:9536", "10.0.0.5", 9536)
+    assert parse_node("[fe80::1]:9000") == ("fe80::1:9000", "fe80::1", 9000)
+    assert parse_node("[fe80::1]")[1:] == ("fe80::1", 9536)
+    for text in ("box=", "host:port"):
+        with pytest.raises(ValueError):
+            parse_node(text)
+
+
+def test_table_sorts_unknown_values_last():
+    hot, cool, gone = Node("hot", "h", 1), Node("cool", "c", 1), \
+        Node("gone", "g", 1)
+    hot.snapshot = Snapshot(0, 80, fans=(FanState(3400),) * 3,
+                            power_mode="performance")
+    cool.snapshot = Snapshot(0, 50, fans=(FanState(1800),) * 3,
+                             power_mode="quiet")
+    hot.last_seen = cool.last_seen = 9.0
+    gone.error = "connection refused"
+    rows = [n.row(now=10.0) for n in (cool, gone, hot)]
+    assert [r[0] for r in sort_rows(rows, "temp", reverse=True)] == [
+        "hot", "cool", "gone"]
+    assert [r[0] for r in sort_rows(rows, "temp")] == ["cool", "hot", "gone"]
+    lines = format_table([cool, gone, hot], "node", now=10.0).splitlines()
+    assert lines[1].split() == ["cool", "50", "1800", "1800", "1800",
+                                "quiet", "1.0s"]
+    assert lines[2].endswith("connection refused")
+    assert lines[-1] == "0/3 nodes connected"
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def agents(count):
+    """(broker, port, device) per simulated node"""
+    out = []
+    for _ in range(count):
+        device = Device(io=SimIO(SimulatedEC(sleep=lambda s: None)))
+        broker = Broker(device, interval=0.05, token=TOKEN)
+        port = await broker.start_tcp("127.0.0.1", 0)
+        out.append((broker, port, device))
+    return out
+
+
+async def shutdown(fleet, running):
+    await fleet.stop()
+    for broker, _, device in running:
+        await broker.stop()
+        device.close()
+
+
+def test_push_reaches_every_connected_node():
+    async def main():
+        running = await agents(2)
+        nodes = [(f"box{i}", "127.0.0.1", port)
+                 for i, (_, port, _) in enumerate(running)]
+        nodes.append(("down", "127.0.0.1", closed_port()))
+        updates = []
+        fleet = await Fleet(nodes, TOKEN, timeout=2.0,
+                            on_update=updates.append).start()
+        try:
+            assert await fleet.wait_connected(0.5) == 2
+            assert {n.name for n in updates} == {"box0", "box1"}
+            down = fleet.nodes[2]
+            assert not down.connected and down.error
+            results = await fleet.push_power_mode("quiet")
+            assert results["box0"] is None and results["box1"] is None
+            assert results["down"].errno == errno.ENOTCONN
+            for _, _, device in running:
+                assert device.read_power_mode() == "quiet"
+            # only to the named ones
+            results = await fleet.push_power_mode("performance", ["box1"])
+            assert list(results) == ["box1"]
+            assert running[0][2].read_power_mode() == "quiet"
+            with pytest.raises(ValueError):
+                await fleet.push_power_mode("turbo")
+        finally:
+            await shutdown(fleet, running)
+    asyncio.run(main())
+
+
+def test_wrong_token_is_refused():
+    async def main():
+        running = await agents(1)
+        fleet = await Fleet([("box", "127.0.0.1", running[0][1])], "wrong",
+                            timeout=2.0).start()
+        try:
+            assert await fleet.wait_connected(0.3) == 0
+            assert "wrong token" in fleet.nodes[0].error
+        finally:
+            await shutdown(fleet, running)
+    asyncio.run(main())
+
+
+def test_lost_node_is_reconnected():
+    async def main():
+        running = await agents(1)
+        broker, port, device = running[0]
+        fleet = await Fleet([("box", "127.0.0.1", port)], TOKEN,
+                            timeout=2.0).start()
+        try:
+            assert await fleet.wait_connected(2.0) == 1
+            node = fleet.nodes[0]
+            await broker.stop()
+            for _ in range(100):
+                if not node.connected:
+                    break
+                await asyncio.sleep(0.01)
+            assert node.error == "connection closed"
+            again = Broker(device, interval=0.05, token=TOKEN)
+            await again.start_tcp("127.0.0.1", port)
+            running[0] = (again, port, device)
+            for _ in range(300):
+                if node.connected and node.connects == 2:
+                    break
+                await asyncio.sleep(0.01)
+            assert node.connects == 2
+            assert (await fleet.push_power_mode("quiet"))["box"] is None
+        finally:
+            await shutdown(fleet, running)
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+import pytest
+
+from axb35.governor import PowerGovernor
+
+
+class FakeCpu:
+    """CpuStat stand-in, utilization() returns `util`"""
+
+    def __init__(self, util=0.0):
+        self.util = util
+
+    def utilization(self):
+        return self.util
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cpu():
+    return FakeCpu()
+
+
+@pytest.fixture
+def governor(device, cpu, clock):
+    governor = PowerGovernor(device, cpu, mode_check=3600.0, clock=clock)
+    governor.start()
+    yield governor
+    governor.close()
+
+
+def run(governor, cpu, util, start, end, temp=50):
+    """Tick once a second from `start` to `end`, return the switches"""
+    cpu.util = util
+    switches = []
+    for now in range(start, end):
+        switch = governor.tick(temp=temp, now=now)
+        if switch:
+            switches.append((now, switch.new, switch.reason))
+    return switches
+
+
+def test_dwell_holds_the_first_switch(governor, cpu, device):
+    assert governor.mode == "balanced"
+    # 0.6 skips straight to performance, but only after min_dwell
+    assert run(governor, cpu, 0.9, 1, 8) == [(5, "performance", "load")]
+    assert governor.limited == 4
+    assert device.read_power_mode() == "performance"
+
+
+def test_down_needs_a_long_idle_and_steps_once(governor, cpu):
+    run(governor, cpu, 0.9, 5, 6)
+    assert governor.mode == "performance"
+    # a short dip is not enough
+    assert run(governor, cpu, 0.05, 6, 20) == []
+    assert run(governor, cpu, 0.9, 20, 21) == []
+    switches = run(governor, cpu, 0.05, 21, 90)
+    # the idle time counts again from the switch
+    assert switches == [(51, "balanced", "idle"), (82, "quiet", "idle")]
+
+
+def test_rate_limit(device, cpu, clock):
+    governor = PowerGovernor(device, cpu, up=(0.25, 0.6), down=(0.1, 0.4),
+                             min_dwell=1.0, down_dwell=0.0, max_switches=3,
+                             window=60.0, mode_check=3600.0, clock=clock)
+    governor.start()
+    switches = []
+    for now in range(1, 60):
+        cpu.util = 0.9 if now % 2 else 0.0
+        if governor.tick(temp=50, now=now):
+            switches.append(now)
+    # performance, balanced, performance, then nothing for the window
+    assert switches == [1, 2, 3]
+    # every idle tick of the remaining 56 asked for balanced
+    assert governor.limited == 28
+    cpu.util = 0.0
+    assert governor.tick(temp=50, now=61).new == "balanced"
+
+
+def test_hot_leaves_performance_right_away(governor, cpu):
+    run(governor, cpu, 0.9, 5, 6)
+    switch = governor.tick(temp=92, now=6)
+    assert (switch.new, switch.reason) == ("balanced", "hot")
+    # not back until 5 °C below hot_temp
+    assert run(governor, cpu, 0.9, 7, 20, temp=87) == []
+    assert run(governor, cpu, 0.9, 20, 21, temp=85) == [
+        (20, "performance", "load")]
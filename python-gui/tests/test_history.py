@@ -0,0 +1,84 @@
+import math
+
+from axb35.history import History, Ring
+from axb35.sysfs import FanState, Snapshot
+
+
+def fill(history, start, end, temp=lambda t: 50 + t % 7):
+    for t in range(start, end):
+        history.add_row(float(t), (temp(t), 1800.0, 1900.0, None))
+
+
+def test_ring_wraps_at_its_capacity():
+    ring = Ring(3, 1)
+    for t in range(5):
+        ring.append(float(t), [t * 10.0])
+    assert len(ring) == 3
+    assert [ring.time_at(n) for n in range(3)] == [2.0, 3.0, 4.0]
+    assert ring.seq(0) == 2
+    assert ring.find(3.5) == 2
+
+
+def test_memory_does_not_grow():
+    history = History(raw_capacity=60, tiers=((10, 30), (60, 30)))
+    size = history.nbytes()
+    fill(history, 0, 5000)
+    assert history.nbytes() == size
+    assert len(history.raw) == 60
+    assert history.latest_time() == 4999.0
+
+
+def test_raw_series_for_a_short_window():
+    history = History()
+    assert history.latest_time() is None
+    fill(history, 0, 100)
+    times, mins, maxs, avgs = history.series(10, 19, 100)
+    assert times == [float(t) for t in range(10, 20)]
+    assert avgs[0] == [50 + t % 7 for t in range(10, 20)]
+    assert mins[1] == [1800.0] * 10
+    # fan3 was never read
+    assert avgs[3] == [None] * 10
+
+
+def test_points_roll_up_min_max_avg():
+    history = History()
+    fill(history, 0, 100, temp=float)
+    times, mins, maxs, avgs = history.series(0, 99, 50)
+    # two raw samples per point
+    assert len(times) == 50
+    assert times[:2] == [0.0, 2.0]
+    assert (mins[0][0], maxs[0][0], avgs[0][0]) == (0.0, 1.0, 0.5)
+    assert (mins[0][-1], maxs[0][-1]) == (98.0, 99.0)
+
+
+def test_long_window_reads_a_rollup_tier():
+    history = History(raw_capacity=600)
+    fill(history, 0, 7200, temp=lambda t: t // 60)
+    times, mins, maxs, avgs = history.series(0, 7200, 800)
+    # the raw ring only holds the last 10 minutes, the 10 s tier all
+    assert len(times) == 719
+    assert all(t % 10 == 0 for t in times)
+    assert times[0] == 0.0
+    assert avgs[0][:7] == [0.0] * 6 + [1.0]
+
+
+def test_cached_points_match_a_fresh_history():
+    cached = History()
+    fill(cached, 0, 500)
+    cached.series(0, 499, 50)
+    fill(cached, 500, 530)
+    fresh = History()
+    fill(fresh, 0, 530)
+    assert cached.series(30, 529, 50) == fresh.series(30, 529, 50)
+    assert len(cached._points) == 1
+
+
+def test_old_and_repeated_samples_are_dropped():
+    history = History()
+    snapshot = Snapshot(5.0, 50, fans=(FanState(1800),) * 3)
+    assert history.add(snapshot)
+    assert not history.add(snapshot)
+    assert not history.add(snapshot._replace(timestamp=4.0))
+    assert not history.add(Snapshot(None))
+    assert len(history.raw) == 1
+    assert not math.isnan(history.raw.values[0][0])
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from axb35 import cli
+from axb35.device import Device
+from axb35.instrument import Histogram, Instruments, TracedIO
+from axb35.sim import SimIO, make_fake_tree
+
+
+def test_histogram():
+    histogram = Histogram((1, 2, 4))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.state() == ([1, 3, 4, 5], 16.5, 5)
+    # rank 2.5 is half way into the (1, 2] bucket
+    assert histogram.quantile(0.5) == 1.75
+    assert histogram.quantile(1.0) == 10
+    assert histogram.lines("x", 'a="b"')[:2] == ['x_bucket{a="b",le="1"} 1',
+                                                 'x_bucket{a="b",le="2"} 3']
+    assert histogram.lines("x")[-2:] == ["x_sum 16.5", "x_count 5"]
+
+
+@pytest.fixture
+def traced(ec):
+    instruments = Instruments()
+    io = SimIO(ec)
+    with Device(io=TracedIO(io, io.base_path, instruments)) as device:
+        yield device, instruments, io
+
+
+def test_disabled_calls_go_straight_to_the_io(traced):
+    device, instruments, io = traced
+    assert device.io.preadv == io.preadv
+    device.snapshot()
+    assert instruments.attributes == {}
+
+
+def test_reads_writes_and_errors_per_attribute(traced):
+    device, instruments, io = traced
+    instruments.enable()
+    device.snapshot()
+    device.set_power_mode("quiet")
+    with pytest.raises(OSError):
+        device.write("fan1_mode", "turbo")
+    with pytest.raises(OSError):
+        device.write("temp", 40)
+    data = instruments.as_dict()
+    assert data["attributes"]["temp"]["reads"]["count"] >= 1
+    assert data["attributes"]["power_mode"]["writes"]["count"] == 1
+    # refused by the driver, and by the open() of a read-only file
+    assert data["attributes"]["fan1_mode"]["write_errors"] == 1
+    assert data["attributes"]["temp"]["write_errors"] == 1
+    assert [e["source"] for e in data["errors"]] == ["fan1_mode", "temp"]
+    instruments.enable(False)
+    assert device.io.preadv == io.preadv
+
+
+def test_stats_of_a_cli_run(tmp_path):
+    base = make_fake_tree(str(tmp_path / "tree"))
+    stats = tmp_path / "stats.json"
+    assert cli.main(["--base-path", base, "--stats", str(stats),
+                     "snapshot"]) == 0
+    data = json.loads(stats.read_text())
+    assert data["enabled"]
+    assert data["attributes"]["fan1_rpm"]["reads"]["count"] >= 1
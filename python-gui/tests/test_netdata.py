@@ -0,0 +1,71 @@
+import io
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from axb35 import netdata
+from axb35.sim import make_fake_tree
+from axb35.sysfs import SysfsSampler
+
+CHART_SH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), "contrib", "netdata", "axb35.chart.sh")
+
+BASH_UPDATE = r'''
+source "$1"
+axb35_path=$2
+axb35_create
+axb35_update 1000000
+'''
+
+
+def bash_chart(path):
+    result = subprocess.run(["bash", "-c", BASH_UPDATE, "bash", CHART_SH,
+                             path], capture_output=True, text=True,
+                            check=True)
+    return result.stdout
+
+
+def plugin(path):
+    out = io.StringIO()
+    with SysfsSampler(path) as sampler:
+        netdata.run(sampler, update_every=0, count=1, out=out)
+    return out.getvalue()
+
+
+def without_curves(text):
+    """Lines of the charts axb35.chart.sh has too"""
+    lines, skip = [], False
+    for line in text.splitlines():
+        if line.startswith(("CHART", "BEGIN")):
+            skip = ".fancurve" in line
+        if not skip and line:
+            lines.append(line)
+    return lines
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+@pytest.mark.parametrize("state", [True, False])
+@pytest.mark.parametrize("values", [
+    {},
+    {"fan1_mode": "fixed", "fan1_level": "4", "power_mode": "quiet"},
+])
+def test_same_output_as_the_charts_d_module(tmp_path, state, values):
+    path = make_fake_tree(str(tmp_path), values, state=state)
+    expected = without_curves(bash_chart(path))
+    lines = without_curves(plugin(path))
+    # the first collection has no interval yet
+    assert lines == [line.replace(" 1000000", "") for line in expected]
+
+
+def test_curves_and_unknown_values(tmp_path):
+    path = make_fake_tree(str(tmp_path), {"fan2_mode": "bogus"})
+    lines = plugin(path).splitlines()
+    assert "CHART axb35.fancurve 'axb356' \"Fan Curves\" \"Degrees\" " \
+        "\"Fan Curves\" '' line 6 1 '' '' 'axb35'" in lines
+    assert "SET fan3rampup1 = 20" in lines
+    assert "SET fan1rampdown5 = 96" in lines
+    assert "SET fan2mode = 0" in lines
+    # fan3 is on auto
+    assert "SET fan3level = 6" in lines
@@ -0,0 +1,75 @@
+import errno
+import os
+
+from axb35.device import Device
+from axb35.notify import ChangeWatcher
+from axb35.sim import SimIO
+
+
+class GoneIO(SimIO):
+    """SimIO whose files are missing while `gone`, like during rmmod"""
+
+    gone = False
+
+    def open(self, path, flags, mode=0o777):
+        if self.gone:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        return super().open(path, flags, mode)
+
+
+def test_first_wait_returns_everything(device):
+    with device.watcher() as watcher:
+        values = watcher.wait()
+    assert values["power_mode"] == "balanced"
+    assert values["fan1_mode"] == "curve"
+    assert values["fan3_mode"] == "auto"
+
+
+def test_notified_attribute_wakes_the_watcher(device, ec):
+    with device.watcher(fallback=60.0) as watcher:
+        watcher.wait()
+        ec.store("power_mode", "performance")
+        assert watcher.wait(timeout=2.0) == {"power_mode": "performance"}
+        assert watcher.notified
+        assert watcher.notifications == 1
+        assert watcher.polls == 0
+        # nothing else changed
+        assert watcher.wait(timeout=0.05) == {}
+
+
+def test_worker_level_change_is_seen(device, ec, clock):
+    with device.watcher(fallback=60.0) as watcher:
+        watcher.wait()
+        ec.temp = 90.0
+        clock.now = 1.0
+        ec.advance()
+        changed = watcher.wait(timeout=2.0)
+    assert changed["fan1_level"] == 2
+    assert changed["fan2_level"] == 2
+    assert "fan3_level" not in changed
+
+
+def test_unnotified_change_is_found_by_the_fallback(device, ec):
+    with device.watcher(fallback=0.05) as watcher:
+        watcher.wait()
+        # an EC write the driver doesn't know about, no notification
+        ec.regs[0x31] = 0x02
+        assert watcher.wait(timeout=2.0) == {"power_mode": "quiet"}
+        assert watcher.polls >= 1
+        assert not watcher.notified
+
+
+def test_reopens_attributes_after_a_reload(ec):
+    io = GoneIO(ec)
+    with ChangeWatcher(io=io, fallback=60.0, notified_fallback=60.0,
+                       retry=0.05) as watcher:
+        watcher.wait()
+        io.gone = True
+        ec.reload()
+        assert watcher.wait(timeout=0.1) == {}
+        assert not watcher._registered
+        io.gone = False
+        with Device(io=io) as device:
+            device.set_power_mode("quiet")
+        assert watcher.wait(timeout=2.0) == {"power_mode": "quiet"}
+        assert len(watcher._registered) == len(watcher.attributes)
@@ -0,0 +1,83 @@
+import errno
+
+from axb35.device import Device
+from axb35.profiles import Step, apply, apply_profile, current_state, plan
+from axb35.sim import SimIO
+
+CURRENT = {"power_mode": "balanced", "fan1_mode": "curve", "fan1_level": "2",
+           "fan1_rampup_curve": "60,70,83,95,97",
+           "fan1_rampdown_curve": "40,50,80,94,96"}
+
+
+def names(steps):
+    return [s.name for s in steps]
+
+
+def test_power_up_goes_last():
+    desired = {"power_mode": "performance", "fan1_mode": "fixed",
+               "fan1_level": "5"}
+    steps = plan(desired, CURRENT)
+    assert names(steps) == ["fan1_mode", "fan1_level", "power_mode"]
+    assert steps[-1] == Step("power_mode", "performance", "balanced")
+
+
+def test_power_down_goes_first():
+    desired = {"power_mode": "quiet",
+               "fan1_rampup_curve": "50,60,70,80,90"}
+    assert names(plan(desired, CURRENT)) == ["power_mode",
+                                             "fan1_rampup_curve"]
+
+
+def test_curves_before_mode_rampdown_first_when_lowered():
+    desired = {"fan1_mode": "curve", "fan1_rampup_curve": "50,60,70,80,90",
+               "fan1_rampdown_curve": "30,40,60,70,80"}
+    current = dict(CURRENT, fan1_mode="fixed")
+    assert names(plan(desired, current)) == [
+        "fan1_rampdown_curve", "fan1_rampup_curve", "fan1_mode"]
+    desired["fan1_rampup_curve"] = "65,75,85,96,98"
+    assert names(plan(desired, current)) == [
+        "fan1_rampup_curve", "fan1_rampdown_curve", "fan1_mode"]
+
+
+def test_level_only_in_fixed_mode_and_unchanged_values_skipped():
+    assert plan({"fan1_level": "4"}, CURRENT) == []
+    assert plan(dict(CURRENT), CURRENT) == []
+    assert names(plan({"fan1_level": "4"}, dict(CURRENT, fan1_mode="fixed"))) \
+        == ["fan1_level"]
+
+
+class FailingDevice(Device):
+    def __init__(self, ec, fail):
+        super().__init__(io=SimIO(ec))
+        self.fail = fail
+
+    def write(self, name, value):
+        if name == self.fail:
+            raise OSError(errno.EIO, "I/O error")
+        super().write(name, value)
+
+
+def test_failed_write_rolls_back(ec):
+    with FailingDevice(ec, "fan2_mode") as device:
+        device.set_fan_mode(1, "fixed")
+        device.set_fan_level(1, 2)
+        before = current_state(device.snapshot())
+        profile = {"apu_mode": "quiet",
+                   "fans": {"1": {"mode": "curve"},
+                            "2": {"mode": "fixed", "level": 5}}}
+        result = apply_profile(device, profile)
+        assert result.error[0] == "fan2_mode"
+        assert names(result.done) == ["power_mode", "fan1_mode"]
+        assert result.rolled_back
+        after = current_state(device.snapshot())
+    for name in ("power_mode", "fan1_mode", "fan1_level", "fan2_mode"):
+        assert after[name] == before[name]
+
+
+def test_rollback_without_old_value_is_reported(device):
+    steps = [Step("power_mode", "quiet", None),
+             Step("fan1_level", "9999", "1")]
+    result = apply(device, steps)
+    assert result.error[0] == "fan1_level"
+    assert not result.rolled_back
+    assert device.read_power_mode() == "quiet"
@@ -0,0 +1,99 @@
+import os
+
+from axb35.history import History
+from axb35.recording import (BLOCK_HEADER, FILE_HEADER, RECORD, Recorder,
+                             Recording, ReplayDevice, decode)
+
+T0 = 1700000000.0
+
+
+def values(i):
+    return {"temp": 40 + i % 50, "fan1_rpm": 1000 + i, "fan2_rpm": 2000 + i,
+            "fan3_rpm": None, "fan1_mode": "curve", "fan1_level": i % 6,
+            "fan2_mode": "fixed", "fan2_level": 3, "fan3_mode": "auto",
+            "fan3_level": None, "power_mode": "balanced"}
+
+
+def record(path, start, count, **kw):
+    with Recorder(path, block_records=8, flush_every=3, **kw) as recorder:
+        for i in range(start, start + count):
+            recorder.append(T0 + i, values(i))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "rec")
+    record(path, 0, 20)
+    with Recording(path) as recording:
+        assert len(recording) == 20
+        assert recording.blocks == 3
+        assert recording.start_time == T0
+        assert recording.end_time == T0 + 19
+        rows = list(recording.rows())
+        assert [row[0] for row in rows] == [T0 + i for i in range(20)]
+        assert decode(rows[13]) == values(13)
+        # a range across a block boundary
+        assert [row[0] - T0 for row in recording.rows(T0 + 6, T0 + 9.5)] \
+            == [6, 7, 8, 9]
+        assert recording.find(T0 + 8) == (1, 0)
+
+
+def test_reopened_recorder_continues(tmp_path):
+    path = str(tmp_path / "rec")
+    record(path, 0, 5)
+    record(path, 5, 10)
+    with Recording(path) as recording:
+        assert [row[0] - T0 for row in recording.rows()] == list(range(15))
+        assert recording.blocks == 2
+
+
+def test_crash_keeps_flushed_records(tmp_path):
+    path = str(tmp_path / "rec")
+    recorder = Recorder(path, block_records=8, flush_every=3)
+    for i in range(7):
+        recorder.append(T0 + i, values(i))
+    # killed: the fd goes away without the last flush
+    os.close(recorder.fd)
+    with Recording(path) as recording:
+        assert len(recording) == 6
+    record(path, 7, 3)
+    with Recording(path) as recording:
+        assert [row[0] - T0 for row in recording.rows()] == [
+            0, 1, 2, 3, 4, 5, 7, 8, 9]
+
+
+def test_truncated_block(tmp_path):
+    path = str(tmp_path / "rec")
+    record(path, 0, 12)
+    block_size = BLOCK_HEADER.size + 8 * RECORD.size
+    # cut the second block after its header and two records
+    with open(path, "r+b") as f:
+        f.truncate(FILE_HEADER.size + block_size + BLOCK_HEADER.size
+                   + 2 * RECORD.size + 5)
+    with Recording(path) as recording:
+        assert len(recording) == 10
+        assert list(recording.rows())[-1][0] == T0 + 9
+
+
+def test_replay_repeats_are_kept_out_of_the_history(tmp_path):
+    path = str(tmp_path / "rec")
+    record(path, 0, 20)
+    history = History()
+    device = ReplayDevice(Recording(path), speed=1.0,
+                          on_skipped=history.add)
+    with device:
+        first = device.current()
+        assert first.timestamp == T0
+        assert history.add(first)
+        # nothing new is due for another second of replay time
+        again = device.current()
+        assert again.timestamp == T0
+        assert not history.add(again)
+        assert history.raw.count == 1
+
+        device.replay.speed = 1e6
+        last = device.current()
+        assert device.replay.finished
+        assert history.add(last)
+        assert not history.add(device.current())
+        assert history.raw.count == 20
+        assert history.latest_time() == T0 + 19
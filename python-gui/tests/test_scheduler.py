@@ -0,0 +1,80 @@
+import pytest
+
+from axb35.scheduler import AdaptiveScheduler
+from axb35.sysfs import FanState, Snapshot
+
+
+def snap(t, temp=50, rpms=(1800, 1800, 0)):
+    return Snapshot(t, temp, fans=tuple(FanState(rpm) for rpm in rpms))
+
+
+def run(scheduler, temps, start=0.0, **kw):
+    """Feed one sample per returned interval, the intervals used"""
+    t, intervals = start, []
+    for temp in temps:
+        interval = scheduler.next_interval(snap(t, temp, **kw))
+        intervals.append(interval)
+        t += interval
+    return t, intervals
+
+
+def test_backs_off_after_hold_and_caps():
+    scheduler = AdaptiveScheduler(0.5, 10.0, hold=10.0, backoff=1.5)
+    t, intervals = run(scheduler, [50] * 30)
+    # 0.5 s until the first 10 s are over
+    assert intervals[:20] == [0.5] * 20
+    assert intervals[20:23] == [0.75, 1.125, 1.6875]
+    assert intervals[-1] == 10.0
+    assert scheduler.triggers == 1
+
+
+def test_temperature_step_goes_back_to_fast():
+    scheduler = AdaptiveScheduler(0.5, 10.0, temp_step=2)
+    t, _ = run(scheduler, [50] * 30)
+    assert scheduler.interval == 10.0
+    assert scheduler.next_interval(snap(t, 51)) == 10.0
+    # measured against the last active sample, the drift adds up
+    assert scheduler.next_interval(snap(t + 10, 52)) == 0.5
+    assert scheduler.triggers == 2
+
+
+def test_fan_starting_is_activity():
+    scheduler = AdaptiveScheduler(0.5, 10.0, rpm_step=10000)
+    t, _ = run(scheduler, [50] * 30)
+    assert scheduler.next_interval(snap(t, rpms=(1800, 1900, 0))) == 10.0
+    assert scheduler.next_interval(snap(t + 10, rpms=(1800, 1900, 1200))) \
+        == 0.5
+
+
+def test_slope_over_the_window():
+    scheduler = AdaptiveScheduler(1.0, 10.0, temp_step=100, temp_slope=0.5,
+                                  hold=0.0, slope_window=10.0)
+    for t in range(10):
+        scheduler.next_interval(snap(t, 50 + 0.6 * t))
+    assert scheduler.triggers == 1
+    # the window is full now: 0.6 °C/s
+    scheduler.next_interval(snap(10, 56))
+    assert scheduler.triggers == 2
+
+
+def test_one_degree_sensor_step_is_not_a_slope():
+    scheduler = AdaptiveScheduler(1.0, 10.0, temp_step=2, temp_slope=0.5)
+    temps = [50] * 15 + [51] * 15
+    run(scheduler, temps)
+    assert scheduler.triggers == 1
+
+
+def test_reset_and_missing_values():
+    scheduler = AdaptiveScheduler(0.5, 10.0)
+    t, _ = run(scheduler, [50] * 30)
+    assert scheduler.next_interval(snap(t, None, (None,) * 3)) == 10.0
+    scheduler.reset()
+    assert scheduler.interval == 0.5
+    assert scheduler.next_interval(snap(t + 10)) == 0.5
+
+
+def test_invalid_intervals():
+    with pytest.raises(ValueError):
+        AdaptiveScheduler(5.0, 1.0)
+    with pytest.raises(ValueError):
+        AdaptiveScheduler(0, 1.0)
@@ -0,0 +1,71 @@
+from axb35.sim import DEFAULT_CURVES
+
+
+def levels(ec):
+    return [ec.level(n) for n in (1, 2, 3)]
+
+
+def test_curve_steps_one_level_per_tick(ec, clock):
+    # fan1/2 start in curve mode at level 1, fan3 in auto
+    assert levels(ec)[:2] == [1, 1]
+    ec.temp = 90.0
+    seen = []
+    for t in range(1, 5):
+        clock.now = t
+        ec.advance()
+        seen.append(ec.level(1))
+    # up to the level whose rampup threshold (83) is reached, one a tick
+    assert seen == [2, 3, 3, 3]
+    assert ec.level(2) == 3
+
+    ec.temp = 45.0
+    seen = []
+    for t in range(5, 9):
+        clock.now = t
+        ec.advance()
+        seen.append(ec.level(1))
+    # down while temp <= rampdown[level]: 80 and 50, not 40
+    assert seen == [2, 1, 1, 1]
+
+
+def test_curve_step_uses_written_curves(device, ec, clock):
+    device.set_curve(1, "rampup", [30, 40, 50, 60, 70])
+    device.set_curve(1, "rampdown", [20, 30, 40, 50, 60])
+    ec.temp = 65.0
+    for t in range(1, 6):
+        clock.now = t
+        ec.advance()
+    assert ec.level(1) == 4
+    # fan2 kept the defaults
+    assert ec.level(2) == sum(1 for v in DEFAULT_CURVES[2][0][1:] if v <= 65)
+
+
+def test_switch_to_curve_picks_level_from_rampup(device, ec):
+    device.set_fan_mode(1, "fixed")
+    device.set_fan_level(1, 5)
+    ec.temp = 72.0
+    device.set_fan_mode(1, "curve")
+    assert ec.level(1) == 2
+    assert device.read_fan_level(1) == 2
+
+
+def test_worker_notifies_level_changes(ec, clock):
+    before = ec.events["fan1_level"]
+    ec.temp = 90.0
+    clock.now = 1.0
+    ec.advance()
+    assert ec.events["fan1_level"] == before + 1
+
+
+def test_state_refresh_leaves_the_fan_mode_alone(device, ec, clock):
+    device.set_fan_mode(1, "fixed")
+    # the register as fan_mode_store sees it before its write lands
+    ec.regs[0x21] = 0x10
+    clock.now = 1.0
+    ec.advance()
+    assert ec.state["fan1_mode"] == "auto"
+    assert ec.modes[1] == "fixed"
+    ec.regs[0x21] = 0x11
+    clock.now = 2.0
+    ec.advance()
+    assert ec.state["fan1_mode"] == "fixed"
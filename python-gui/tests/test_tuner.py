@@ -0,0 +1,135 @@
+import pytest
+
+from axb35.device import Device
+from axb35.recording import Recorder, Recording
+from axb35.sim import (CONDUCTANCE, EC_AUTO_CURVE, FAN_CONDUCTANCE,
+                       HEAT_CAPACITY, LEVEL_RPMS, SimIO)
+
+np = pytest.importorskip("numpy")
+tuner = pytest.importorskip("axb35.tuner")
+
+# warm up, ten minutes of heavy load, cool down
+LOADS = [0.2] * 300 + [0.9] * 600 + [0.2] * 300
+
+
+def reference(trace, rampup, rampdown, fans=tuner.DEFAULT_FANS):
+    """simulate() for one pair, a plain loop over the worker's rules"""
+    temp = peak = float(trace.temp)
+    level = sum(round(temp) >= point for point in rampup)
+    level_ticks = switches = 0
+    for power in trace.power:
+        reading = min(int(temp + 0.5), tuner.READINGS - 1)
+        old = level
+        if level < 5 and reading >= rampup[level]:
+            level += 1
+        elif level > 0 and reading <= rampdown[level - 1]:
+            level -= 1
+        switches += level != old
+        level_ticks += level
+        auto = sum(reading >= point for point in EC_AUTO_CURVE)
+        airflow = sum(LEVEL_RPMS[f][level if f in fans else auto]
+                      for f in (1, 2, 3))
+        conductance = CONDUCTANCE + FAN_CONDUCTANCE * airflow / 5000.0
+        temp += (power - conductance * (temp - trace.ambient)) \
+            * tuner.STEP / HEAT_CAPACITY
+        peak = max(peak, temp)
+    return peak, level_ticks * len(fans), switches * len(fans)
+
+
+def test_candidates_keep_the_curve_rules():
+    baseline = tuner.default_baseline()
+    up, down = tuner.candidates(500, seed=1, include=[baseline])
+    assert up.shape == down.shape == (500, 5)
+    assert [up[0].tolist(), down[0].tolist()] == list(baseline)
+    for rampup, rampdown in zip(up, down):
+        tuner.check_pair(rampup, rampdown)
+    lo, hi = tuner.TEMP_RANGE
+    assert up.min() >= lo and up.max() <= hi
+    # the random ones, the baseline's gap is 20
+    assert (up[1:] - down[1:]).max() <= 15
+
+
+@pytest.mark.parametrize("rampup,rampdown", [
+    ((60, 70, 83, 95), (40, 50, 80, 94)),
+    ((60, 83, 70, 95, 97), (40, 50, 60, 94, 96)),
+    ((60, 70, 83, 95, 97), (40, 50, 90, 94, 96)),
+])
+def test_invalid_pairs(rampup, rampdown):
+    with pytest.raises(ValueError):
+        tuner.check_pair(rampup, rampdown)
+
+
+def test_simulate_matches_the_plain_worker():
+    trace = tuner.trace_from_loads(LOADS)
+    up, down = tuner.candidates(40, seed=2,
+                                include=[tuner.default_baseline()])
+    peak, level_seconds, switches = tuner.simulate(trace, up, down)
+    for i in range(len(up)):
+        expected = reference(trace, up[i].tolist(), down[i].tolist())
+        assert peak[i] == pytest.approx(expected[0])
+        assert (level_seconds[i], switches[i]) == expected[1:]
+
+
+def test_recording_gives_back_the_heat_behind_it(ec, clock, tmp_path):
+    path = str(tmp_path / "day.axr")
+    temps = []
+    with Device(io=SimIO(ec)) as device, Recorder(path) as recorder:
+        sampler = device.sampler()
+        for t, load in enumerate(LOADS):
+            ec.load = load
+            clock.now = float(t)
+            ec.advance()
+            values = sampler.read_values()
+            temps.append(values["temp"])
+            recorder.append(1000.0 + t, values)
+        sampler.close()
+    rampup, rampdown = tuner.default_baseline()
+    with Recording(path) as recording:
+        trace = tuner.trace_from_recording(recording)
+    # the driver's default curves, run again on the rebuilt heat
+    peak, _, _ = tuner.simulate(trace, [rampup], [rampdown])
+    assert peak[0] == pytest.approx(max(temps), abs=1.5)
+    assert tuner.load_trace(path).power.tolist() == trace.power.tolist()
+
+
+def test_load_csv(tmp_path):
+    path = tmp_path / "load.csv"
+    path.write_text("time,load,power_mode\n0,0.5,quiet\n2,1.0,\n4,0,\n")
+    trace = tuner.load_trace(str(path))
+    quiet = tuner.IDLE_POWER + 0.5 * tuner.PACKAGE_POWER["quiet"]
+    busy = tuner.IDLE_POWER + tuner.PACKAGE_POWER["balanced"]
+    # held until the next sample, on a 1 s grid
+    assert trace.power.tolist() == [quiet, quiet, busy, busy]
+    assert len(tuner.load_trace(str(path), start=1).power) == 2
+    path.write_text("time,level\n0,1\n1,2\n")
+    with pytest.raises(ValueError):
+        tuner.load_trace(str(path))
+
+
+def test_pareto_front():
+    peak = np.array([80.0, 75.0, 80.0, 90.0, 75.0])
+    level = np.array([100, 200, 90, 50, 200])
+    switches = np.array([4, 4, 4, 2, 4])
+    # 0 loses to 2, 4 repeats 1
+    assert tuner.pareto(peak, level, switches).tolist() == [1, 2, 3]
+
+
+def test_tune_and_pick():
+    trace = tuner.trace_from_loads(LOADS)
+    baseline = tuner.default_baseline()
+    front, scored = tuner.tune(trace, count=256, baseline=baseline)
+    assert scored.rampup == baseline[0]
+    assert front == sorted(front, key=lambda c: (c.level_seconds, c.peak,
+                                                 c.switches))
+    for c in front:
+        assert not any(o.peak <= c.peak and o.level_seconds <=
+                       c.level_seconds and o.switches <= c.switches and
+                       o != c for o in front)
+    cool = tuner.pick(front, max_temp=scored.peak)
+    assert cool.peak <= scored.peak
+    assert cool.level_seconds <= scored.level_seconds
+    # out of reach: the coolest one
+    assert tuner.pick(front, max_temp=0).peak == min(c.peak for c in front)
+    profile = tuner.to_profile(cool)
+    assert profile["fans"]["1"]["rampup_curve"] == cool.rampup
+    assert set(profile["fans"]) == {"1", "2"}
@@ -0,0 +1,71 @@
+import threading
+
+from axb35.uiupdate import UiBatcher, UiStats, WidgetCache
+
+
+class FakeRoot:
+    """Tk root stand-in, queued callbacks run on run()"""
+
+    def __init__(self):
+        self.queue = []
+
+    def after(self, ms, callback):
+        self.queue.append(callback)
+
+    def run(self):
+        queue, self.queue = self.queue, []
+        for callback in queue:
+            callback()
+
+
+class Label:
+    def __init__(self):
+        self.configs = []
+
+    def config(self, **kw):
+        self.configs.append(kw)
+
+
+def test_ticks_while_tk_is_busy_are_coalesced():
+    root, applied, lags = FakeRoot(), [], []
+    batcher = UiBatcher(root, applied.append, on_lag=lags.append)
+    for tick in range(5):
+        batcher.post(tick)
+    # one callback queued, and it shows the newest tick
+    assert len(root.queue) == 1
+    root.run()
+    assert applied == [4]
+    assert batcher.stats.dropped == 4
+    assert batcher.stats.callbacks == 1
+    assert len(lags) == 1 and lags[0] >= 0
+    batcher.post(5)
+    root.run()
+    assert applied == [4, 5]
+
+
+def test_posts_from_many_threads():
+    root, applied = FakeRoot(), []
+    batcher = UiBatcher(root, applied.append)
+    threads = [threading.Thread(target=lambda: [batcher.post(i)
+                                                for i in range(100)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    root.run()
+    assert len(applied) == 1
+    assert batcher.stats.dropped == 399
+
+
+def test_widgets_are_only_reconfigured_on_change():
+    stats = UiStats()
+    cache, label = WidgetCache(stats), Label()
+    assert cache.set_text(label, "52°C")
+    assert not cache.set_text(label, "52°C")
+    assert cache.set_text(label, "53°C")
+    assert label.configs == [{"text": "52°C"}, {"text": "53°C"}]
+    cache.forget(label)
+    assert cache.set_text(label, "53°C")
+    assert stats.reconfigs == 3
+    assert "reconfigs/s" in stats.format()
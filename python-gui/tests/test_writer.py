@@ -0,0 +1,112 @@
+import pytest
+
+from axb35.device import Device
+from axb35.sim import SimIO
+from axb35.writer import Writer
+
+
+class CountingDevice(Device):
+    def __init__(self, ec):
+        super().__init__(io=SimIO(ec))
+        self.writes = []
+
+    def write(self, name, value):
+        self.writes.append((name, value))
+        super().write(name, value)
+
+
+@pytest.fixture
+def counting(ec):
+    with CountingDevice(ec) as device:
+        yield device
+
+
+@pytest.fixture
+def writer(counting):
+    writer = Writer(counting, verify_delay=None)
+    yield writer
+    writer.close(flush=False)
+
+
+def test_drag_coalesces_into_one_write(writer, counting, ec):
+    for v in range(82, 71, -1):
+        writer.submit("fan1_rampup_curve", [60, 70, v, 95, 97], delay=5.0)
+    assert writer.is_pending("fan1_rampup_curve")
+    assert writer.flush(timeout=2.0)
+    assert counting.writes == [("fan1_rampup_curve", "60,70,72,95,97")]
+    assert writer.stats.submitted == 11
+    assert writer.stats.coalesced == 10
+    assert ec.curves[1][0][1:] == [60, 70, 72, 95, 97]
+
+
+def test_known_value_is_skipped(writer, counting):
+    writer.note("power_mode", "balanced")
+    writer.submit("power_mode", "balanced")
+    assert writer.flush(timeout=2.0)
+    assert counting.writes == []
+    assert writer.stats.skipped == 1
+    assert writer.stats.skip_reads == 1
+
+
+def test_stale_known_value_is_written(writer, counting, ec):
+    writer.note("power_mode", "balanced")
+    # changed outside the writer, not seen by a watcher yet
+    ec.store("power_mode", "quiet")
+    writer.submit("power_mode", "balanced")
+    assert writer.flush(timeout=2.0)
+    assert counting.writes == [("power_mode", "balanced")]
+    assert counting.read_power_mode() == "balanced"
+
+
+def test_batch_writes_mode_before_level(writer, counting):
+    writer.submit("fan1_level", 4, delay=5.0)
+    writer.submit("fan1_mode", "fixed", delay=5.0)
+    assert writer.flush(timeout=2.0)
+    assert [name for name, _ in counting.writes] == ["fan1_mode", "fan1_level"]
+    assert counting.read_fan_level(1) == 4
+
+
+def test_failed_write_is_reported(writer, counting):
+    errors = []
+    writer.on_error = lambda name, value, exc: errors.append((name, value))
+    writer.submit("fan1_level", 9999)
+    assert writer.flush(timeout=2.0)
+    assert errors == [("fan1_level", "9999")]
+    assert writer.stats.errors == 1
+    assert writer.known("fan1_level") is None
+
+
+def test_unknown_attribute_is_refused(writer):
+    with pytest.raises(KeyError):
+        writer.submit("fan4_level", 1)
+
+
+class BrokenDevice(CountingDevice):
+    """Fails writes of fan1_level with anything, not just OSError"""
+
+    def __init__(self, ec, exc):
+        super().__init__(ec)
+        self.exc = exc
+
+    def write(self, name, value):
+        if name == "fan1_level":
+            raise self.exc
+        super().write(name, value)
+
+
+@pytest.mark.parametrize("exc", [ValueError("bad value"),
+                                 TimeoutError("broker did not answer")])
+def test_any_write_error_keeps_the_thread(ec, exc, capsys):
+    with BrokenDevice(ec, exc) as device:
+        writer = Writer(device, verify_delay=None)
+        try:
+            writer.submit("fan1_level", 3)
+            assert writer.flush(timeout=2.0)
+            assert writer.stats.errors == 1
+            out = capsys.readouterr().out
+            assert "Failed to write '3' to fan1_level" in out
+            writer.submit("power_mode", "quiet")
+            assert writer.flush()
+            assert device.writes == [("power_mode", "quiet")]
+        finally:
+            writer.close(flush=False)
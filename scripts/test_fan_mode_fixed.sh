@@ -1,6 +1,8 @@
 #!/usr/bin/env bash
 
-class_path=/sys/class/ec_su_axb35
+# AXB35_PATH runs this against another tree, e.g. python3 -m axb35.sim DIR
+class_path=${AXB35_PATH:-/sys/class/ec_su_axb35}
+settle=${SETTLE_SECONDS:-5}
 declare -a fan1_rpms fan2_rpms fan3_rpms
 declare -a original_modes original_levels
 
@@ -20,8 +22,8 @@ for level in {0..5}; do
     echo "Setting fans to level $level..."
     echo "$level" | tee $class_path/fan{1..3}/level > /dev/null
 
-    echo "Waiting 5 seconds for fans to adjust..."
-    sleep 5
+    echo "Waiting $settle seconds for fans to adjust..."
+    sleep "$settle"
 
     fan1_rpms[$level]=$(cat $class_path/fan1/rpm)
     fan2_rpms[$level]=$(cat $class_path/fan2/rpm)
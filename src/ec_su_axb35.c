@@ -6,9 +6,11 @@
 #include <linux/fs.h>
 #include <linux/init.h>
 #include <linux/io.h>
+#include <linux/jiffies.h>
 #include <linux/kernel.h>
 #include <linux/module.h>
 #include <linux/mutex.h>
+#include <linux/sysfs.h>
 #include <linux/uaccess.h>
 #include <linux/version.h>
 #include <linux/workqueue.h>
@@ -76,11 +78,40 @@ static struct ec_apu ec_apu = {
     .power_mode_reg = 0x31,
 };
 
-static ssize_t fan_rpm_show(struct device *dev, struct device_attribute *attr,
-                            char *buf)
+// what the worker read from the EC on its last tick, the class attribute
+// "state" serves it without an EC transaction
+struct ec_state {
+    u16           rpm[3];
+    enum fan_mode mode[3];
+    u8            level[3];
+    u8            temp;
+    u8            power_mode;
+    unsigned long updated; // jiffies
+    bool          valid;
+};
+
+static struct ec_state ec_state;
+static DEFINE_MUTEX(ec_state_lock);
+
+// a refresh of ec_state costs 13 EC reads, the worker does one every
+// tick only while "state" was read in the last STATE_ACTIVE_MS, and
+// about every STATE_IDLE_MS otherwise
+#define STATE_ACTIVE_MS 10000
+#define STATE_IDLE_MS   10000
+
+static unsigned long ec_state_read; // jiffies, last read of "state"
+
+// wake up poll()/select() on an attribute, userspace waits for
+// POLLPRI instead of re-reading state that rarely changes
+static void ec_notify(struct device *dev, const char *attr)
 {
-    struct ec_fan *fan = dev_get_drvdata(dev);
-    u8             hi;
+    if (!IS_ERR_OR_NULL(dev))
+        sysfs_notify(&dev->kobj, NULL, attr);
+}
+
+static u16 read_fan_rpm(struct ec_fan *fan)
+{
+    u8 hi;
     // TODO: handle error
     ec_read(fan->speed_reg_high, &hi);
     u8 lo;
@@ -90,60 +121,69 @@ static ssize_t fan_rpm_show(struct device *dev, struct device_attribute *attr,
     // wired fan3 behavior, displaying 8000 before turning to 0
     if (strcmp(fan->name, "fan3") == 0 && rpm == 8000)
         rpm = 0;
-    return sprintf(buf, "%u\n", rpm);
+    return rpm;
+}
+
+static ssize_t fan_rpm_show(struct device *dev, struct device_attribute *attr,
+                            char *buf)
+{
+    struct ec_fan *fan = dev_get_drvdata(dev);
+    return sprintf(buf, "%u\n", read_fan_rpm(fan));
 }
 
 static struct device_attribute dev_attr_fan_rpm =
     __ATTR(rpm, 0444, fan_rpm_show, NULL);
 
-static void update_fan_mode(struct ec_fan *fan)
+// the mode a mode register value stands for, `known` is what the driver
+// has for the fan and is returned for values it doesn't know
+static enum fan_mode fan_mode_of(u8 val, enum fan_mode known)
 {
-    u8 val;
-    // TODO: handle error
-    ec_read(fan->mode_reg, &val);
-
     switch (val) {
     case 0x10:
     case 0x20:
     case 0x30:
-        fan->mode = AUTO;
-        break;
+        return AUTO;
     case 0x11:
     case 0x21:
     case 0x31:
         // curve and fixed use the value in the EC register
         // so fixed is only allowed if it was already know as
         // FIXED to the driver
-        if (fan->mode != FIXED) {
-            fan->mode = CURVE;
-        } else {
-            fan->mode = FIXED;
-        }
-        break;
+        return known == FIXED ? FIXED : CURVE;
     }
+    return known;
 }
 
-static ssize_t fan_mode_show(struct device *dev, struct device_attribute *attr,
-                             char *buf)
+static void update_fan_mode(struct ec_fan *fan)
 {
-    struct ec_fan *fan = dev_get_drvdata(dev);
+    u8 val;
+    // TODO: handle error
+    ec_read(fan->mode_reg, &val);
 
-    update_fan_mode(fan);
+    fan->mode = fan_mode_of(val, fan->mode);
+}
 
-    const char *mode = "unknown";
-    switch (fan->mode) {
+static const char *fan_mode_name(enum fan_mode mode)
+{
+    switch (mode) {
     case AUTO:
-        mode = "auto";
-        break;
+        return "auto";
     case FIXED:
-        mode = "fixed";
-        break;
+        return "fixed";
     case CURVE:
-        mode = "curve";
-        break;
+        return "curve";
     }
+    return "unknown";
+}
 
-    return sprintf(buf, "%s\n", mode);
+static ssize_t fan_mode_show(struct device *dev, struct device_attribute *attr,
+                             char *buf)
+{
+    struct ec_fan *fan = dev_get_drvdata(dev);
+
+    update_fan_mode(fan);
+
+    return sprintf(buf, "%s\n", fan_mode_name(fan->mode));
 }
 
 static u8 read_fan_level(struct ec_fan *fan)
@@ -228,6 +268,11 @@ static ssize_t fan_level_store(struct device           *dev,
         return -EINVAL;
 
     write_fan_level(fan, val);
+    ec_notify(dev, "level");
+
+    mutex_lock(&ec_state_lock);
+    ec_state.level[fan - ec_fans] = min_t(u8, val, 5);
+    mutex_unlock(&ec_state_lock);
 
     return count;
 }
@@ -308,9 +353,19 @@ static ssize_t fan_mode_store(struct device *dev, struct device_attribute *attr,
             }
             
             write_fan_level(fan, initial_level);
+            ec_notify(dev, "level");
+
+            mutex_lock(&ec_state_lock);
+            ec_state.level[fan - ec_fans] = initial_level;
+            mutex_unlock(&ec_state_lock);
         }
     }
 
+    mutex_lock(&ec_state_lock);
+    ec_state.mode[fan - ec_fans] = fan->mode;
+    mutex_unlock(&ec_state_lock);
+
+    ec_notify(dev, "mode");
     return count;
 }
 
@@ -384,7 +439,11 @@ static ssize_t fan_rampup_curve_store(struct device           *dev,
                                       const char *buf, size_t count)
 {
     struct ec_fan *fan = dev_get_drvdata(dev);
-    return fan_curve_store(fan->rampup_curve, buf, count);
+    ssize_t        ret = fan_curve_store(fan->rampup_curve, buf, count);
+
+    if (ret > 0)
+        ec_notify(dev, "rampup_curve");
+    return ret;
 }
 
 static struct device_attribute dev_attr_fan_rampup_curve =
@@ -402,7 +461,11 @@ static ssize_t fan_rampdown_curve_store(struct device           *dev,
                                         const char *buf, size_t count)
 {
     struct ec_fan *fan = dev_get_drvdata(dev);
-    return fan_curve_store(fan->rampdown_curve, buf, count);
+    ssize_t        ret = fan_curve_store(fan->rampdown_curve, buf, count);
+
+    if (ret > 0)
+        ec_notify(dev, "rampdown_curve");
+    return ret;
 }
 
 static struct device_attribute dev_attr_fan_rampdown_curve = __ATTR(
@@ -441,6 +504,19 @@ static ssize_t temp_max_show(struct device *dev, struct device_attribute *attr,
 static struct device_attribute dev_attr_temp_max =
     __ATTR(max, 0444, temp_max_show, NULL);
 
+static const char *power_mode_name(u8 val)
+{
+    switch (val) {
+    case 0x00:
+        return "balanced";
+    case 0x01:
+        return "performance";
+    case 0x02:
+        return "quiet";
+    }
+    return NULL;
+}
+
 static ssize_t apu_power_mode_show(struct device           *dev,
                                    struct device_attribute *attr, char *buf)
 {
@@ -449,20 +525,9 @@ static ssize_t apu_power_mode_show(struct device           *dev,
     // TODO: handle error
     ec_read(apu->power_mode_reg, &val);
 
-    const char *mode = "unknown";
-    switch (val) {
-    case 0x00:
-        mode = "balanced";
-        break;
-    case 0x01:
-        mode = "performance";
-        break;
-    case 0x02:
-        mode = "quiet";
-        break;
-    default:
+    const char *mode = power_mode_name(val);
+    if (!mode)
         return -EINVAL;
-    }
 
     return sprintf(buf, "%s\n", mode);
 }
@@ -484,12 +549,112 @@ static ssize_t apu_power_mode_store(struct device           *dev,
     }
 
     ec_write(apu->power_mode_reg, val);
+    ec_notify(dev, "power_mode");
+
+    mutex_lock(&ec_state_lock);
+    ec_state.power_mode = val;
+    mutex_unlock(&ec_state_lock);
+
     return count;
 }
 
 static struct device_attribute dev_attr_apu_power_mode =
     __ATTR(power_mode, 0644, apu_power_mode_show, apu_power_mode_store);
 
+// one line with everything the fan, temp1 and apu attributes show:
+// fan1-3 rpm, mode, level, rampup_curve, rampdown_curve, then temp, min,
+// max, power_mode and the age of the EC values in ms
+#if LINUX_VERSION_CODE >= KERNEL_VERSION(6, 4, 0)
+static ssize_t state_show(const struct class           *class,
+                          const struct class_attribute *attr, char *buf)
+#else
+static ssize_t state_show(struct class *class, struct class_attribute *attr,
+                          char *buf)
+#endif
+{
+    struct ec_state state;
+    const char     *power;
+    ssize_t         len = 0;
+    int             i;
+
+    mutex_lock(&ec_state_lock);
+    state         = ec_state;
+    ec_state_read = jiffies;
+    mutex_unlock(&ec_state_lock);
+
+    if (!state.valid)
+        return -ENODATA;
+
+    for (i = 0; i < ARRAY_SIZE(ec_fans); i++)
+        len += scnprintf(buf + len, PAGE_SIZE - len, "%u ", state.rpm[i]);
+    for (i = 0; i < ARRAY_SIZE(ec_fans); i++)
+        len += scnprintf(buf + len, PAGE_SIZE - len, "%s ",
+                         fan_mode_name(state.mode[i]));
+    for (i = 0; i < ARRAY_SIZE(ec_fans); i++)
+        len += scnprintf(buf + len, PAGE_SIZE - len, "%u ", state.level[i]);
+    for (i = 0; i < ARRAY_SIZE(ec_fans); i++) {
+        u8 *c = ec_fans[i].rampup_curve;
+        len += scnprintf(buf + len, PAGE_SIZE - len, "%u,%u,%u,%u,%u ", c[1],
+                         c[2], c[3], c[4], c[5]);
+    }
+    for (i = 0; i < ARRAY_SIZE(ec_fans); i++) {
+        u8 *c = ec_fans[i].rampdown_curve;
+        len += scnprintf(buf + len, PAGE_SIZE - len, "%u,%u,%u,%u,%u ", c[1],
+                         c[2], c[3], c[4], c[5]);
+    }
+
+    power = power_mode_name(state.power_mode);
+    len += scnprintf(buf + len, PAGE_SIZE - len, "%u %u %u %s %u\n",
+                     state.temp, ec_temp.temp_min, ec_temp.temp_max,
+                     power ? power : "unknown",
+                     jiffies_to_msecs(jiffies - state.updated));
+    return len;
+}
+
+static CLASS_ATTR_RO(state);
+
+// refresh ec_state. The EC is read under the lock: the stores publish
+// what they wrote after writing it, so holding it from read to publish
+// keeps a read from before a store from overwriting the store's value.
+// fan->mode stays as the stores and userspace reads left it, a mode
+// register read in the middle of fan_mode_store would turn fixed into
+// curve.
+static void ec_update_state(u8 temp)
+{
+    bool idle;
+    u8   val;
+    int  i;
+
+    mutex_lock(&ec_state_lock);
+    idle = ec_state.valid &&
+           time_after(jiffies,
+                      ec_state_read + msecs_to_jiffies(STATE_ACTIVE_MS)) &&
+           time_before(jiffies,
+                       ec_state.updated + msecs_to_jiffies(STATE_IDLE_MS));
+    if (idle) {
+        mutex_unlock(&ec_state_lock);
+        return;
+    }
+
+    for (i = 0; i < ARRAY_SIZE(ec_fans); i++) {
+        struct ec_fan *fan = &ec_fans[i];
+
+        ec_state.rpm[i] = read_fan_rpm(fan);
+        if (ec_read(fan->mode_reg, &val) == 0)
+            ec_state.mode[i] = fan_mode_of(val, READ_ONCE(fan->mode));
+        else if (!ec_state.valid)
+            ec_state.mode[i] = READ_ONCE(fan->mode);
+        ec_state.level[i] = read_fan_level(fan);
+    }
+    ec_state.temp = temp;
+    // keep the last power mode rather than publish a failed read
+    if (ec_read(ec_apu.power_mode_reg, &val) == 0)
+        ec_state.power_mode = val;
+    ec_state.updated = jiffies;
+    ec_state.valid   = true;
+    mutex_unlock(&ec_state_lock);
+}
+
 static struct delayed_work ec_update_work;
 
 static void ec_update_worker(struct work_struct *work)
@@ -500,11 +665,15 @@ static void ec_update_worker(struct work_struct *work)
     int i;
 
     // Update min/max
-    if (ec_temp.temp_min == 0 || temp < ec_temp.temp_min)
+    if (ec_temp.temp_min == 0 || temp < ec_temp.temp_min) {
         ec_temp.temp_min = temp;
+        ec_notify(ec_temp.dev, "min");
+    }
 
-    if (temp > ec_temp.temp_max)
+    if (temp > ec_temp.temp_max) {
         ec_temp.temp_max = temp;
+        ec_notify(ec_temp.dev, "max");
+    }
 
     // update fan level if curve mode is active
     for (i = 0; i < ARRAY_SIZE(ec_fans); i++) {
@@ -514,11 +683,16 @@ static void ec_update_worker(struct work_struct *work)
             u8 level = read_fan_level(fan);
             if (level < 5 && temp >= fan->rampup_curve[level + 1]) {
                 write_fan_level(fan, level + 1);
-            } else if (level > 0 && temp <= fan->rampdown_curve[level])
+                ec_notify(fan->dev, "level");
+            } else if (level > 0 && temp <= fan->rampdown_curve[level]) {
                 write_fan_level(fan, level - 1);
+                ec_notify(fan->dev, "level");
+            }
         }
     }
 
+    ec_update_state(temp);
+
     // Requeue the work
     schedule_delayed_work(&ec_update_work,
                           msecs_to_jiffies(1000)); // every 1 sec
@@ -550,6 +724,9 @@ static int __init ec_su_axb35_init(void)
         return PTR_ERR(ec_class);
     }
 
+    if (class_create_file(ec_class, &class_attr_state))
+        pr_warn("ec_su_axb35: Failed to create the state attribute\n");
+
     for (i = 0; i < ARRAY_SIZE(ec_fans); i++) {
         struct ec_fan *fan = &ec_fans[i];
 
@@ -585,6 +762,7 @@ static int __init ec_su_axb35_init(void)
         device_create_file(ec_apu.dev, &dev_attr_apu_power_mode);
     }
 
+    ec_state_read = jiffies;
     INIT_DELAYED_WORK(&ec_update_work, ec_update_worker);
     schedule_delayed_work(&ec_update_work, msecs_to_jiffies(1000));
 
@@ -595,6 +773,10 @@ static int __init ec_su_axb35_init(void)
 static void __exit ec_su_axb35_exit(void)
 {
     int i;
+
+    // the worker notifies the devices below, stop it before they go
+    cancel_delayed_work_sync(&ec_update_work);
+
     for (i = 0; i < ARRAY_SIZE(ec_fans); i++) {
         if (!IS_ERR(ec_fans[i].dev)) {
             device_remove_file(ec_fans[i].dev, &dev_attr_fan_rpm);
@@ -620,8 +802,7 @@ static void __exit ec_su_axb35_exit(void)
                        MKDEV(MAJOR(ec_su_axb35_dev), ARRAY_SIZE(ec_fans) + 1));
     }
 
-    cancel_delayed_work_sync(&ec_update_work);
-
+    class_remove_file(ec_class, &class_attr_state);
     class_destroy(ec_class);
     unregister_chrdev_region(ec_su_axb35_dev, ARRAY_SIZE(ec_fans) + 2);
     pr_info("ec_su_axb35: Module unloaded\n");